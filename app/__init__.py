@@ -57,6 +57,30 @@ def configure_extensions(app):
     # Inicializar sistema de erros
     error_handler.init_app(app)
     
+    # Contador de queries por requisição (N+1, orçamento de queries)
+    from app.query_profiler import query_profiler
+    query_profiler.init_app(app)
+    
+    # Métricas de latência por endpoint (/metrics e /admin/debug/realtime)
+    from app.request_metrics import request_metrics
+    request_metrics.init_app(app)
+    
+    # Profiler sob demanda (token gerado em /admin/debug/profiles)
+    from app.request_profiler import request_profiler
+    request_profiler.init_app(app)
+    
+    # Profiler contínuo por amostragem (liga/desliga em /admin/debug/profiles)
+    from app.continuous_profiler import continuous_profiler
+    continuous_profiler.init_app(app)
+    
+    # Eventos em tempo real (/api/stream)
+    from app.event_stream import event_broker
+    event_broker.init_app(app)
+    
+    # Logs de segurança em lote (fila + thread com conexão própria)
+    from app.security_audit import security_audit
+    security_audit.init_app(app)
+    
     # Inicializar extensões opcionais apenas se disponíveis
     if HAS_LIMITER and limiter:
         limiter.init_app(app)
@@ -261,7 +285,7 @@ def create_app(config_name=None):
     
     # Configurar agendador de backup
     try:
-        from backup_scheduler import init_scheduler
+        from scripts.backup_scheduler import init_scheduler
         init_scheduler(app)
         app.logger.info("Agendador de backup inicializado")
     except Exception as e:
@@ -277,6 +301,14 @@ def create_app(config_name=None):
     except Exception as e:
         app.logger.warning(f"Erro ao inicializar sistema de horas extras: {str(e)}")
     
+    # Configurar fila de relatórios em segundo plano
+    try:
+        from app.report_jobs import init_report_worker
+        init_report_worker(app)
+        app.logger.info("Fila de relatórios inicializada")
+    except Exception as e:
+        app.logger.warning(f"Erro ao inicializar fila de relatórios: {str(e)}")
+    
     # Configurar filtros personalizados de template
     try:
         from app.template_filters import init_filters
@@ -83,7 +83,7 @@ class LocalStorageManager:
             backups = []
             for filename in os.listdir(self.base_path):
                 file_path = os.path.join(self.base_path, filename)
-                if os.path.isfile(file_path) and filename.endswith(('.zip', '.sql', '.db')):
+                if os.path.isfile(file_path) and filename.endswith(('.zip', '.tar.zst', '.sql', '.db')):
                     stat = os.stat(file_path)
                     backups.append({
                         'name': filename,
@@ -335,12 +335,16 @@ def debug():
 def test_no_auth():
     """Teste do template sem autenticação"""
     try:
+        from app.backup_runner import find_running_backup
+        
         storage_info = storage_manager.get_storage_info()
         backups = storage_manager.list_backups()
+        running_backup = find_running_backup()
         
         return render_template('admin/backup/dashboard.html',
                              storage_info=storage_info,
-                             backups=backups)
+                             backups=backups,
+                             running_backup=running_backup)
     except Exception as e:
         return f"<h1>Erro no template:</h1><pre>{str(e)}</pre>"
 
@@ -355,12 +359,16 @@ def test_simple():
 def dashboard():
     """Dashboard de backup com informações de armazenamento"""
     try:
+        from app.backup_runner import find_running_backup
+        
         storage_info = storage_manager.get_storage_info()
         backups = storage_manager.list_backups()
+        running_backup = find_running_backup()
         
         return render_template('admin/backup/dashboard.html',
                              storage_info=storage_info,
-                             backups=backups)
+                             backups=backups,
+                             running_backup=running_backup)
     except Exception as e:
         flash(f'Erro ao carregar dashboard de backup: {str(e)}', 'error')
         return redirect(url_for('admin.dashboard'))
@@ -400,59 +408,42 @@ def api_list_backups():
 @login_required
 @admin_required
 def create_backup():
-    """Criar um novo backup"""
+    """Inicia um novo backup em segundo plano (subprocesso de baixa prioridade)"""
+    from app.backup_runner import start_backup_process
+    from app.models import BackupType
+    
+    wants_json = request.headers.get('Content-Type') == 'application/json'
+    
     try:
-        # Caminho do banco de dados baseado na configuração
-        from config import Config
-        import re
-        
-        # Extrair o caminho do banco da URI
-        db_uri = Config.SQLALCHEMY_DATABASE_URI
-        if db_uri.startswith('sqlite:///'):
-            db_path = db_uri.replace('sqlite:///', '')
-        else:
-            # Fallback para caminho padrão
-            base_dir = os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-            db_path = os.path.join(base_dir, 'storage', 'database', 'skponto.db')
-        
-        print(f"DEBUG: Tentando criar backup do banco: {db_path}")
-        print(f"DEBUG: Arquivo existe: {os.path.exists(db_path)}")
-        
-        success, message = storage_manager.create_backup(db_path)
-        
-        if success:
-            # Se for uma requisição AJAX, retornar JSON
-            if request.headers.get('Content-Type') == 'application/json':
-                return jsonify({
-                    'status': 'success',
-                    'message': message
-                }), 200
-            
-            flash(message, 'success')
-        else:
-            # Se for uma requisição AJAX, retornar JSON
-            if request.headers.get('Content-Type') == 'application/json':
-                return jsonify({
-                    'status': 'error',
-                    'message': message
-                }), 400
-                
-            flash(message, 'error')
-        
-        return redirect(url_for('backup.dashboard'))
+        record = start_backup_process(BackupType.MANUAL, created_by=current_user.id)
     except Exception as e:
         error_message = f'Erro ao criar backup: {str(e)}'
-        print(f"DEBUG: Exceção na criação de backup: {error_message}")
-        
-        # Se for uma requisição AJAX, retornar JSON
-        if request.headers.get('Content-Type') == 'application/json':
-            return jsonify({
-                'status': 'error',
-                'message': error_message
-            }), 500
-            
+        if wants_json:
+            return jsonify({'status': 'error', 'message': error_message}), 409
         flash(error_message, 'error')
         return redirect(url_for('backup.dashboard'))
+    
+    message = 'Backup iniciado em segundo plano. Acompanhe o progresso no painel.'
+    if wants_json:
+        return jsonify({
+            'status': 'started',
+            'message': message,
+            'backup_id': record.id,
+            'progress_url': url_for('backup.api_backup_progress', backup_id=record.id)
+        }), 202
+    
+    flash(message, 'info')
+    return redirect(url_for('backup.dashboard'))
+
+@bp.route('/api/progress/<int:backup_id>')
+@login_required
+@admin_required
+def api_backup_progress(backup_id):
+    """Progresso de um backup em andamento (polling do dashboard)"""
+    from app.models import BackupHistory
+    
+    record = BackupHistory.query.get_or_404(backup_id)
+    return jsonify(record.progress_dict())
 
 @bp.route('/delete/<backup_name>', methods=['GET', 'DELETE'])
 @login_required
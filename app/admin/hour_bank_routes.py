@@ -2,14 +2,14 @@
 Rotas administrativas para gerenciamento do banco de horas
 """
 from datetime import datetime, date, timedelta
-from flask import render_template, redirect, url_for, flash, request, jsonify, current_app, make_response
+from flask import render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required, current_user
 from sqlalchemy import and_, or_, func
 from app import db
 from app.admin import bp
 from app.decorators import admin_required
 from app.models import (
-    User, HourBank, HourBankTransaction, OvertimeRequest, HourCompensation,
+    User, HourBank, HourBankCheckpoint, HourBankTransaction, OvertimeRequest, HourCompensation,
     OvertimeSettings, OvertimeLimits, OvertimeType, OvertimeStatus,
     HourBankTransactionType, CompensationStatus, Notification, NotificationType
 )
@@ -18,6 +18,7 @@ from app.forms import (
     HourCompensationApprovalForm, OvertimeSettingsForm, HourBankAdjustmentForm,
     HourBankTransferForm, OvertimeLimitsForm, HourBankReportForm
 )
+from app.report_jobs import enqueue_report, follow_job
 
 
 @bp.route('/hour-bank')
@@ -173,18 +174,11 @@ def hour_bank_adjust(user_id):
             user.hour_bank.admin_adjust_hours(
                 hours_adjustment=hours,
                 transaction_type=HourBankTransactionType.AJUSTE,
-                description=f"Ajuste manual: {description}"
+                description=f"Ajuste manual: {description}",
+                reference_date=reference_date,
+                created_by=current_user.id
             )
             
-            # Atualizar referência da transação
-            transaction = HourBankTransaction.query.filter_by(
-                user_id=user.id
-            ).order_by(HourBankTransaction.created_at.desc()).first()
-            
-            if transaction:
-                transaction.reference_date = reference_date
-                transaction.created_by = current_user.id
-            
             db.session.commit()
             
             # Notificar usuário
@@ -237,36 +231,23 @@ def hour_bank_transfer():
                 flash(f'Saldo insuficiente. Saldo atual: {from_user.hour_bank.formatted_balance}', 'error')
                 return render_template('admin/hour_bank/transfer.html', form=form)
             
-            # Criar banco de horas do destinatário se não existir
-            if not to_user.hour_bank:
-                to_hour_bank = HourBank(user_id=to_user.id)
-                db.session.add(to_hour_bank)
-                db.session.flush()
-            
-            # Realizar transferência
+            # Realizar transferência (débito atômico: falha se o saldo acabou neste meio-tempo;
+            # o crédito cria o banco de horas do destinatário se necessário)
             from_user.hour_bank.debit_hours(
                 hours,
                 HourBankTransactionType.DEBITO,
-                f"Transferência para {to_user.nome_completo}: {description}"
+                f"Transferência para {to_user.nome_completo}: {description}",
+                created_by=current_user.id
             )
             
-            to_user.hour_bank.add_hours(
+            HourBank.apply_delta(
+                to_user.id,
                 hours,
                 HourBankTransactionType.CREDITO,
-                f"Transferência de {from_user.nome_completo}: {description}"
+                f"Transferência de {from_user.nome_completo}: {description}",
+                created_by=current_user.id
             )
             
-            # Atualizar transações com criador
-            recent_transactions = HourBankTransaction.query.filter(
-                or_(
-                    HourBankTransaction.user_id == from_user_id,
-                    HourBankTransaction.user_id == to_user_id
-                )
-            ).order_by(HourBankTransaction.created_at.desc()).limit(2).all()
-            
-            for transaction in recent_transactions:
-                transaction.created_by = current_user.id
-            
             db.session.commit()
             
             # Notificar usuários
@@ -450,10 +431,11 @@ def approve_compensation(compensation_id):
                                      compensation=compensation, form=form)
             
             # Aplicar compensação
-            compensation.user.hour_bank.debit_hours(
+            transaction = compensation.user.hour_bank.debit_hours(
                 compensation.hours_to_compensate,
                 HourBankTransactionType.COMPENSACAO,
-                f"Compensação aprovada para {compensation.requested_date.strftime('%d/%m/%Y')}"
+                f"Compensação aprovada para {compensation.requested_date.strftime('%d/%m/%Y')}",
+                created_by=current_user.id
             )
             
             compensation.status = CompensationStatus.APLICADA
@@ -462,12 +444,7 @@ def approve_compensation(compensation_id):
             compensation.applied_at = datetime.now()
             
             # Associar transação
-            transaction = HourBankTransaction.query.filter_by(
-                user_id=compensation.user_id
-            ).order_by(HourBankTransaction.created_at.desc()).first()
-            
-            if transaction:
-                compensation.hour_bank_transaction_id = transaction.id
+            compensation.hour_bank_transaction_id = transaction.id
             
             # Notificar usuário
             notification = Notification(
@@ -537,6 +514,29 @@ def hour_bank_reports():
     form = HourBankReportForm()
     
     if form.validate_on_submit():
+        # PDF e Excel são gerados em segundo plano (fila de relatórios)
+        if form.format_type.data in ('pdf', 'excel'):
+            try:
+                job, coalescido = enqueue_report('hour_bank', form.format_type.data, {
+                    'user_id': form.user_id.data,
+                    'start_date': form.start_date.data,
+                    'end_date': form.end_date.data,
+                    'transaction_type': form.transaction_type.data
+                }, requested_by=current_user.id)
+                
+                if coalescido:
+                    # O job é de outro admin: guarda o id para listá-lo em Relatórios
+                    follow_job(job)
+                    flash('Um relatório com os mesmos filtros já está em geração. Acompanhe em Relatórios.', 'info')
+                else:
+                    flash('Relatório enviado para geração. Acompanhe em Relatórios.', 'success')
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f"Erro ao enfileirar relatório do banco de horas: {str(e)}")
+                flash('Erro ao solicitar relatório.', 'error')
+            
+            return redirect(url_for('admin.relatorios'))
+        
         # Construir query baseada nos filtros
         query = HourBankTransaction.query.join(User)
         
@@ -556,98 +556,14 @@ def hour_bank_reports():
         
         transactions = query.order_by(HourBankTransaction.created_at.desc()).all()
         
-        # Gerar relatório baseado no formato
-        if form.format_type.data == 'pdf':
-            return generate_hour_bank_pdf_report(transactions, form)
-        elif form.format_type.data == 'excel':
-            return generate_hour_bank_excel_report(transactions, form)
-        else:
-            # HTML
-            return render_template('admin/hour_bank/report_result.html',
-                                 transactions=transactions,
-                                 form=form)
+        # HTML
+        return render_template('admin/hour_bank/report_result.html',
+                             transactions=transactions,
+                             form=form)
     
     return render_template('admin/hour_bank/reports.html', form=form)
 
 
-def generate_hour_bank_pdf_report(transactions, form):
-    """Gera relatório em PDF"""
-    try:
-        from app.pdf_utils import create_hour_bank_report_pdf
-        
-        # Preparar dados para o PDF
-        report_data = {
-            'title': 'Relatório de Banco de Horas',
-            'generated_at': datetime.now(),
-            'generated_by': current_user.nome_completo,
-            'filters': {
-                'user': form.user_id.data,
-                'start_date': form.start_date.data,
-                'end_date': form.end_date.data,
-                'transaction_type': form.transaction_type.data
-            },
-            'transactions': transactions
-        }
-        
-        pdf_content = create_hour_bank_report_pdf(report_data)
-        
-        response = make_response(pdf_content)
-        response.headers['Content-Type'] = 'application/pdf'
-        response.headers['Content-Disposition'] = f'attachment; filename=relatorio_banco_horas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf'
-        
-        return response
-        
-    except Exception as e:
-        flash(f'Erro ao gerar PDF: {str(e)}', 'error')
-        return redirect(url_for('admin.hour_bank_reports'))
-
-
-def generate_hour_bank_excel_report(transactions, form):
-    """Gera relatório em Excel"""
-    try:
-        # Gerar CSV (compatível com Excel)
-        from io import StringIO
-        import csv
-        
-        output = StringIO()
-        writer = csv.writer(output)
-        
-        # Cabeçalho
-        writer.writerow([
-            'Data', 'Usuário', 'Email', 'Tipo', 'Horas', 
-            'Saldo Anterior', 'Saldo Após', 'Descrição', 
-            'Data Referência', 'Criado Por'
-        ])
-        
-        # Dados
-        for t in transactions:
-            writer.writerow([
-                t.created_at.strftime('%d/%m/%Y %H:%M'),
-                t.user.nome_completo,
-                t.user.email,
-                t.transaction_type.value,
-                t.hours,
-                t.balance_before or 0,
-                t.balance_after,
-                t.description or '',
-                t.reference_date.strftime('%d/%m/%Y') if t.reference_date else '',
-                t.creator.nome_completo if t.creator else 'Sistema'
-            ])
-        
-        output.seek(0)
-        csv_content = output.getvalue()
-        
-        response = make_response(csv_content)
-        response.headers['Content-Type'] = 'text/csv; charset=utf-8'
-        response.headers['Content-Disposition'] = f'attachment; filename=relatorio_banco_horas_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-        
-        return response
-        
-    except Exception as e:
-        flash(f'Erro ao gerar CSV: {str(e)}', 'error')
-        return redirect(url_for('admin.hour_bank_reports'))
-
-
 @bp.route('/api/hour-bank/stats')
 @login_required
 @admin_required
@@ -687,3 +603,36 @@ def hour_bank_stats_api():
         'positive_balance_users': HourBank.query.filter(HourBank.current_balance > 0).count(),
         'negative_balance_users': HourBank.query.filter(HourBank.current_balance < 0).count()
     })
+
+
+@bp.route('/api/hour-bank/balances-as-of')
+@login_required
+@admin_required
+def hour_bank_balances_as_of_api():
+    """Saldos do banco de horas no início de uma data (fechamento de folha)"""
+    try:
+        as_of = datetime.strptime(request.args.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Informe a data no formato AAAA-MM-DD'}), 400
+
+    user_id = request.args.get('user_id', type=int)
+    if user_id:
+        return jsonify({
+            'success': True,
+            'date': as_of.isoformat(),
+            'user_id': user_id,
+            'balance': round(HourBankCheckpoint.balance_as_of(user_id, as_of), 2)
+        })
+
+    balances = HourBankCheckpoint.balances_as_of(as_of)
+    names = {row.id: f"{row.nome} {row.sobrenome}" for row in db.session.query(
+        User.id, User.nome, User.sobrenome
+    ).filter(User.id.in_(list(balances))).all()} if balances else {}
+    return jsonify({
+        'success': True,
+        'date': as_of.isoformat(),
+        'balances': [
+            {'user_id': uid, 'name': names.get(uid), 'balance': round(balance, 2)}
+            for uid, balance in sorted(balances.items(), key=lambda item: names.get(item[0]) or '')
+        ]
+    })
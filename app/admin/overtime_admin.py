@@ -10,7 +10,7 @@ from flask_login import login_required, current_user
 from app.admin import bp
 from app.decorators import admin_required
 from app.overtime_controller import OvertimeController
-from app.models import User, OvertimeRequest, OvertimeSettings, HourBank, HourBankHistory, OvertimeStatus, UserType, HourBankTransaction, HourBankTransactionType, Notification, NotificationType
+from app.models import User, OvertimeRequest, OvertimeSettings, HourBank, HourBankHistory, OvertimeStatus, UserType, HourBankTransactionType, Notification, NotificationType
 from app import db
 
 @bp.route('/overtime-control')
@@ -365,25 +365,17 @@ def adjust_user_hours():
         
         # APLICAR AJUSTE
         try:
-            # Novo saldo
-            new_balance = old_balance + adjustment_hours
-            
-            # Criar transação
-            transaction = HourBankTransaction(
-                user_id=user.id,
-                transaction_type=HourBankTransactionType.AJUSTE,
-                hours=adjustment_hours,
-                balance_before=old_balance,
-                balance_after=new_balance,
-                description=f"Ajuste manual por {current_user.nome_completo}: {reason}",
+            # Ajuste atômico no saldo: o UPDATE soma o delta ao valor atual do banco
+            transaction = HourBank.apply_delta(
+                user.id,
+                adjustment_hours,
+                HourBankTransactionType.AJUSTE,
+                f"Ajuste manual por {current_user.nome_completo}: {reason}",
                 reference_date=datetime.now().date(),
                 created_by=current_user.id,
                 created_at=datetime.now()
             )
-            
-            # Atualizar saldo do banco de horas
-            user.hour_bank.current_balance = new_balance
-            user.hour_bank.updated_at = datetime.now()
+            old_balance, new_balance = transaction.balance_before, transaction.balance_after
             
             # Criar notificação para o usuário (apenas se não for teste)
             if not any(palavra in reason.lower() for palavra in ['teste', 'test', 'debug', 'mock', 'sample']):
@@ -399,9 +391,6 @@ def adjust_user_hours():
             else:
                 current_app.logger.info(f"Notificação não criada - motivo contém palavra de teste: {reason}")
             
-            # Adicionar transação à sessão
-            db.session.add(transaction)
-            
             current_app.logger.info(f"Transação criada. Novo saldo: {new_balance:.2f}h")
             
         except Exception as e:
@@ -542,8 +531,10 @@ def api_refresh_users_list():
 def overtime_batch_process():
     """Processar lote de ajustes automáticos"""
     try:
-        data = request.get_json()
+        data = request.get_json() or {}
         target_date_str = data.get('target_date')
+        dry_run = bool(data.get('dry_run', False))
+        chunk_size = data.get('chunk_size')
         
         if target_date_str:
             target_date = datetime.strptime(target_date_str, '%Y-%m-%d').date()
@@ -553,13 +544,16 @@ def overtime_batch_process():
         # Inicializar controlador
         controller = OvertimeController()
         
-        # Processar lote
-        processed, errors = controller.process_daily_batch(target_date)
+        # Processar lote (dry_run apenas calcula, sem gravar)
+        report = controller.run_daily_batch(target_date, dry_run=dry_run, chunk_size=chunk_size)
+        processed, errors = report['processed'], report['errors']
         
         return jsonify({
             'success': True,
             'processed': processed,
             'errors': errors,
+            'dry_run': dry_run,
+            'report': report,
             'message': f'Processados {processed} usuários, {errors} erros'
         })
         
@@ -1,22 +1,25 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify, send_file, current_app
+from flask import (render_template, redirect, url_for, flash, request, jsonify, send_file, current_app,
+                   Response, stream_with_context)
 from flask_login import login_required, current_user
 from functools import wraps
-from sqlalchemy import func, desc, and_, or_
+from sqlalchemy import func, desc, and_, or_, select
 from datetime import datetime, date, timedelta
-import io
 import os
-import zipfile
 from app import db
 from app.admin import bp
 from app.models import (User, TimeRecord, MedicalAttestation, Notification, SecurityLog, 
                        UserType, AttestationStatus, AttestationType, NotificationType, WorkClass,
-                       HourBank, HourBankTransaction, HourBankHistory, OvertimeRequest, HourCompensation)
+                       HourBank, HourBankTransaction, HourBankHistory, HourBankCheckpoint, OvertimeRequest, HourCompensation,
+                       MonthlyTimeSummary, ReportJob, ReportJobStatus, NotificationCounter, BroadcastReceipt)
 from app.forms import (UserManagementForm, NotificationForm, ApproveAttestationForm, 
                       ReportForm, EmptyForm, WorkClassForm, BulkWorkClassForm, AssignWorkClassForm)
 from app.utils import (log_security_event, create_notification, send_notification_to_admins,
                       validate_date_range, backup_database, format_hours, allowed_file, save_uploaded_file,
                       backup_to_github, setup_github_backup_schedule)
 from app.attestation_upload_service import AttestationUploadService
+from app.report_export import iter_report_rows, iter_csv_report
+from app.report_jobs import enqueue_report, follow_job, followed_job_ids, MIMETYPES
+from app.notification_service import broadcast, notify_users, recipient_ids_query
 
 def save_shared_link_to_config(shared_link):
     """Salva o link compartilhado no arquivo .env e na configuração da aplicação de forma robusta"""
@@ -273,17 +276,12 @@ def usuario_detalhes(id):
     
     # Estatísticas do usuário
     hoje = date.today()
-    inicio_mes = hoje.replace(day=1)
     
-    registros_mes = TimeRecord.query.filter(
-        and_(TimeRecord.user_id == id,
-             TimeRecord.data >= inicio_mes,
-             TimeRecord.data <= hoje)
-    ).all()
+    resumo_mes = MonthlyTimeSummary.get_for_month(id, hoje.year, hoje.month)
     
-    horas_mes = sum(r.horas_trabalhadas for r in registros_mes)
-    extras_mes = sum(r.horas_extras for r in registros_mes)
-    dias_trabalhados = len([r for r in registros_mes if r.is_completo])
+    horas_mes = resumo_mes.total_hours if resumo_mes else 0.0
+    extras_mes = resumo_mes.total_overtime if resumo_mes else 0.0
+    dias_trabalhados = resumo_mes.complete_days if resumo_mes else 0
     
     # Últimos registros
     ultimos_registros = TimeRecord.query.filter_by(
@@ -356,16 +354,9 @@ def editar_usuario(id):
             usuario.work_class_id = int(form.work_class_id.data) if form.work_class_id.data else None
             
         # Alterar senha se fornecida (nova_senha tem prioridade, senão password)
-        if form.nova_senha.data:
-            usuario.set_password(form.nova_senha.data)
-            log_security_event('PASSWORD_CHANGED_BY_ADMIN', 
-                              f'Senha alterada pelo admin para usuário ID: {id}',
-                              current_user.id)
-        elif form.password.data:
-            usuario.set_password(form.password.data)
-            log_security_event('PASSWORD_CHANGED_BY_ADMIN', 
-                              f'Senha alterada pelo admin para usuário ID: {id}',
-                              current_user.id)
+        nova_senha = form.nova_senha.data or form.password.data
+        if nova_senha:
+            usuario.set_password(nova_senha)
         
         # Processar foto de perfil se enviada
         if form.foto_perfil.data and hasattr(form.foto_perfil.data, 'filename') and form.foto_perfil.data.filename:
@@ -376,6 +367,12 @@ def editar_usuario(id):
         
         db.session.commit()
         
+        # Logs só depois do commit: a troca de senha é gravada na hora, em outra conexão
+        if nova_senha:
+            log_security_event('PASSWORD_CHANGED_BY_ADMIN', 
+                              f'Senha alterada pelo admin para usuário ID: {id}',
+                              current_user.id)
+        
         # Log da alteração
         log_security_event('USER_UPDATED', 
                           f'Usuário atualizado por admin - ID: {id}, '
@@ -513,6 +510,8 @@ def deletar_usuario(id):
     TimeRecord.query.filter_by(user_id=user.id).delete()
     MedicalAttestation.query.filter_by(user_id=user.id).delete()
     Notification.query.filter_by(user_id=user.id).delete()
+    NotificationCounter.query.filter_by(user_id=user.id).delete()
+    BroadcastReceipt.query.filter_by(user_id=user.id).delete()
     SecurityLog.query.filter_by(user_id=user.id).delete()
     
     # Deletar banco de horas (deve ser deletado antes do usuário)
@@ -524,12 +523,18 @@ def deletar_usuario(id):
     # Deletar histórico do banco de horas
     HourBankHistory.query.filter_by(user_id=user.id).delete()
     
+    # Deletar checkpoints de saldo do banco de horas
+    HourBankCheckpoint.query.filter_by(user_id=user.id).delete()
+    
     # Deletar solicitações de horas extras
     OvertimeRequest.query.filter_by(user_id=user.id).delete()
     
     # Deletar compensações
     HourCompensation.query.filter_by(user_id=user.id).delete()
     
+    # Deletar resumos mensais de ponto
+    MonthlyTimeSummary.query.filter_by(user_id=user.id).delete()
+    
     # Deletar usuário
     db.session.delete(user)
     db.session.commit()
@@ -693,51 +698,48 @@ def notificacoes():
     form = NotificationForm()
     
     if form.validate_on_submit():
-        # Determinar destinatários
-        destinatarios = []
         tipo_dest = form.destinatarios.data
+        tipos = {
+            'trabalhadores': UserType.TRABALHADOR,
+            'estagiarios': UserType.ESTAGIARIO,
+            'admins': UserType.ADMIN
+        }
         
-        if tipo_dest == 'todos':
-            destinatarios = User.query.filter_by(is_active=True).all()
-        elif tipo_dest == 'trabalhadores':
-            destinatarios = User.query.filter_by(
-                user_type=UserType.TRABALHADOR, is_active=True
-            ).all()
-        elif tipo_dest == 'estagiarios':
-            destinatarios = User.query.filter_by(
-                user_type=UserType.ESTAGIARIO, is_active=True
-            ).all()
-        elif tipo_dest == 'admins':
-            destinatarios = User.query.filter_by(
-                user_type=UserType.ADMIN, is_active=True
-            ).all()
-        elif tipo_dest == 'individual':
-            if form.usuario_individual.data:
-                usuario = User.query.get(int(form.usuario_individual.data))
-                if usuario and usuario.is_active:
-                    destinatarios = [usuario]
-                else:
-                    flash('Usuário selecionado não encontrado ou inativo.', 'error')
-                    return render_template('admin/notificacoes.html',
-                                         title='Enviar Notificações',
-                                         form=form)
-            else:
+        if tipo_dest == 'individual':
+            if not form.usuario_individual.data:
                 flash('Selecione um usuário para envio individual.', 'error')
                 return render_template('admin/notificacoes.html',
                                      title='Enviar Notificações',
                                      form=form)
+            usuario = User.query.get(int(form.usuario_individual.data))
+            if not usuario or not usuario.is_active:
+                flash('Usuário selecionado não encontrado ou inativo.', 'error')
+                return render_template('admin/notificacoes.html',
+                                     title='Enviar Notificações',
+                                     form=form)
+            total = notify_users([usuario.id], form.titulo.data, form.mensagem.data, 'info',
+                                 sender_id=current_user.id)
+        elif tipo_dest == 'classe':
+            if not form.classe_trabalho.data:
+                flash('Selecione uma classe de trabalho.', 'error')
+                return render_template('admin/notificacoes.html',
+                                     title='Enviar Notificações',
+                                     form=form)
+            classe_id = int(form.classe_trabalho.data)
+            broadcast(form.titulo.data, form.mensagem.data, 'info',
+                      sender_id=current_user.id, work_class_id=classe_id)
+            total = User.query.filter_by(is_active=True, work_class_id=classe_id).count()
+        elif tipo_dest == 'todos' or tipo_dest in tipos:
+            # Comunicado: uma linha para o público inteiro, leitura por usuário em BroadcastReceipt
+            broadcast(form.titulo.data, form.mensagem.data, 'info',
+                      sender_id=current_user.id, user_type=tipos.get(tipo_dest))
+            total = db.session.execute(
+                select(func.count()).select_from(recipient_ids_query(tipos.get(tipo_dest)).subquery())
+            ).scalar()
+        else:
+            total = 0
         
-        # Criar notificações
-        for usuario in destinatarios:
-            create_notification(
-                usuario.id,
-                form.titulo.data,
-                form.mensagem.data,
-                'info',
-                current_user.id
-            )
-        
-        flash(f'Notificação enviada para {len(destinatarios)} usuários!', 'success')
+        flash(f'Notificação enviada para {total} usuários!', 'success')
         return redirect(url_for('admin.notificacoes'))
     
     return render_template('admin/notificacoes.html',
@@ -758,195 +760,79 @@ def relatorios():
     ]
     
     if form.validate_on_submit():
-        # Gerar relatório
-        return gerar_relatorio(
-            form.data_inicio.data,
-            form.data_fim.data,
-            form.user_id.data,
-            form.formato.data
-        )
+        if form.formato.data == 'csv':
+            # CSV é enviado em streaming, sem montar o arquivo
+            registros = iter_report_rows(form.data_inicio.data, form.data_fim.data, form.user_id.data)
+            return gerar_relatorio_csv(registros, form.data_inicio.data, form.data_fim.data)
+        
+        # PDF e Excel são gerados em segundo plano
+        try:
+            job, coalescido = enqueue_report('time_records', form.formato.data, {
+                'data_inicio': form.data_inicio.data,
+                'data_fim': form.data_fim.data,
+                'user_id': form.user_id.data
+            }, requested_by=current_user.id)
+            
+            if coalescido:
+                # O job é de outro admin: guarda o id para listá-lo também para este
+                follow_job(job)
+                flash('Um relatório com os mesmos filtros já está em geração. Acompanhe abaixo.', 'info')
+            else:
+                flash('Relatório enviado para geração. O download ficará disponível abaixo.', 'success')
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Erro ao enfileirar relatório: {str(e)}")
+            flash('Erro ao solicitar relatório.', 'error')
+        
+        return redirect(url_for('admin.relatorios'))
+    
+    jobs = ReportJob.query.filter(
+        or_(ReportJob.requested_by == current_user.id, ReportJob.id.in_(followed_job_ids()))
+    ).order_by(ReportJob.created_at.desc()).limit(10).all()
     
     return render_template('admin/relatorios.html',
                          title='Relatórios',
-                         form=form)
+                         form=form,
+                         jobs=jobs)
 
-def gerar_relatorio(data_inicio, data_fim, user_id, formato):
-    """Gera relatório em PDF ou Excel"""
-    # Query base
-    query = TimeRecord.query.filter(
-        and_(TimeRecord.data >= data_inicio,
-             TimeRecord.data <= data_fim)
+def gerar_relatorio_csv(registros, data_inicio, data_fim):
+    """Gera relatório em CSV (streaming)"""
+    filename = f"relatorio_ponto_{data_inicio}_{data_fim}.csv"
+    response = Response(
+        stream_with_context(iter_csv_report(registros)),
+        mimetype='text/csv; charset=utf-8'
     )
-    
-    if user_id > 0:
-        query = query.filter_by(user_id=user_id)
-    
-    registros = query.order_by(TimeRecord.data, TimeRecord.user_id).all()
-    
-    if formato == 'excel':
-        return gerar_relatorio_excel(registros, data_inicio, data_fim)
-    else:
-        return gerar_relatorio_pdf(registros, data_inicio, data_fim)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
-def gerar_relatorio_excel(registros, data_inicio, data_fim):
-    """Gera relatório em Excel"""
-    try:
-        import xlsxwriter
-    except ImportError:
-        flash('Funcionalidade de Excel não disponível. Instale xlsxwriter.', 'error')
-        return redirect(url_for('admin.relatorios'))
-    
-    # Criar arquivo em memória
-    output = io.BytesIO()
-    workbook = xlsxwriter.Workbook(output)
-    worksheet = workbook.add_worksheet('Relatório de Ponto')
-    
-    # Formatos
-    header_format = workbook.add_format({
-        'bold': True,
-        'bg_color': '#4472C4',
-        'font_color': 'white',
-        'border': 1
-    })
-    
-    date_format = workbook.add_format({'num_format': 'dd/mm/yyyy'})
-    time_format = workbook.add_format({'num_format': 'hh:mm'})
-    
-    # Cabeçalhos
-    headers = ['Funcionário', 'Data', 'Entrada', 'Saída', 
-               'Horas Trabalhadas', 'Horas Extras', 'Observações']
-    
-    for col, header in enumerate(headers):
-        worksheet.write(0, col, header, header_format)
-    
-    # Dados
-    for row, registro in enumerate(registros, 1):
-        worksheet.write(row, 0, registro.usuario.nome_completo)
-        worksheet.write(row, 1, registro.data, date_format)
-        
-        # Verificar se é atestado
-        if registro.is_atestado:
-            worksheet.write(row, 2, 'ATESTADO')
-            worksheet.write(row, 3, 'ATESTADO')
-            worksheet.write(row, 4, 'AFASTAMENTO')
-            worksheet.write(row, 5, '-')
-            worksheet.write(row, 6, registro.motivo_atestado or 'Atestado médico')
-        else:
-            worksheet.write(row, 2, registro.entrada, time_format)
-            worksheet.write(row, 3, registro.saida, time_format)
-            worksheet.write(row, 4, format_hours(registro.horas_trabalhadas))
-            worksheet.write(row, 5, format_hours(registro.horas_extras))
-            worksheet.write(row, 6, registro.observacoes or '')
-    
-    # Ajustar largura das colunas
-    worksheet.set_column('A:A', 25)
-    worksheet.set_column('B:B', 12)
-    worksheet.set_column('C:F', 15)
-    worksheet.set_column('G:G', 30)
-    
-    workbook.close()
-    output.seek(0)
-    
-    # Retornar arquivo
-    filename = f"relatorio_ponto_{data_inicio}_{data_fim}.xlsx"
-    return send_file(
-        output,
-        as_attachment=True,
-        download_name=filename,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
+@bp.route('/relatorios/jobs/<int:job_id>/status')
+@login_required
+@admin_required
+def relatorio_job_status(job_id):
+    """Status de um relatório em segundo plano (polling da interface)"""
+    job = ReportJob.query.get_or_404(job_id)
+    data = job.to_dict()
+    data['download_url'] = (url_for('admin.relatorio_job_download', job_id=job.id)
+                            if job.status == ReportJobStatus.CONCLUIDO else None)
+    return jsonify(data)
 
-def gerar_relatorio_pdf(registros, data_inicio, data_fim):
-    """Gera relatório em PDF"""
-    try:
-        from reportlab.lib.pagesizes import letter, A4
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib import colors
-        from reportlab.lib.units import inch
-    except ImportError:
-        flash('Funcionalidade de PDF não disponível. Instale reportlab.', 'error')
-        return redirect(url_for('admin.relatorios'))
-    
-    # Criar arquivo em memória
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    
-    # Estilos
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=30,
-        alignment=1  # Centro
-    )
-    
-    # Conteúdo
-    story = []
+@bp.route('/relatorios/jobs/<int:job_id>/download')
+@login_required
+@admin_required
+def relatorio_job_download(job_id):
+    """Download do arquivo de um relatório concluído"""
+    job = ReportJob.query.get_or_404(job_id)
     
-    # Título
-    title = Paragraph("Relatório de Controle de Ponto", title_style)
-    story.append(title)
+    if job.status != ReportJobStatus.CONCLUIDO or not job.file_path or not os.path.exists(job.file_path):
+        flash('Relatório não disponível para download.', 'warning')
+        return redirect(url_for('admin.relatorios'))
     
-    # Período
-    periodo = Paragraph(
-        f"Período: {data_inicio.strftime('%d/%m/%Y')} a {data_fim.strftime('%d/%m/%Y')}",
-        styles['Normal']
-    )
-    story.append(periodo)
-    story.append(Spacer(1, 20))
-    
-    # Tabela
-    data = [['Funcionário', 'Data', 'Entrada', 'Saída', 'H. Trabalhadas', 'H. Extras']]
-    
-    for registro in registros:
-        # Verificar se é atestado
-        if registro.is_atestado:
-            row = [
-                registro.usuario.nome_completo,
-                registro.data.strftime('%d/%m/%Y'),
-                'ATESTADO',
-                'ATESTADO',
-                'AFASTAMENTO',
-                registro.motivo_atestado or 'Atestado médico'
-            ]
-        else:
-            row = [
-                registro.usuario.nome_completo,
-                registro.data.strftime('%d/%m/%Y'),
-                registro.entrada.strftime('%H:%M') if registro.entrada else '-',
-                registro.saida.strftime('%H:%M') if registro.saida else '-',
-                format_hours(registro.horas_trabalhadas),
-                format_hours(registro.horas_extras)
-            ]
-        data.append(row)
-    
-    table = Table(data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    story.append(table)
-    
-    # Gerar PDF
-    doc.build(story)
-    buffer.seek(0)
-    
-    # Retornar arquivo
-    filename = f"relatorio_ponto_{data_inicio}_{data_fim}.pdf"
+    extension = job.file_name.rsplit('.', 1)[-1]
     return send_file(
-        buffer,
+        job.file_path,
         as_attachment=True,
-        download_name=filename,
-        mimetype='application/pdf'
+        download_name=job.file_name,
+        mimetype=MIMETYPES.get(extension, 'application/octet-stream')
     )
 
 @bp.route('/backup', methods=['POST'])
@@ -971,21 +857,20 @@ def backup():
 @login_required
 @admin_required
 def backup_completo():
-    """Criar backup completo com upload para GitHub"""
-    from app.utils import backup_to_github
+    """Inicia backup completo em segundo plano, com upload para GitHub se configurado"""
+    from app.backup_runner import start_backup_process
+    from app.models import BackupType
     
     form = EmptyForm()
     
     if form.validate_on_submit():
-        success, result = backup_to_github()
-        
-        if success:
-            github_msg = result.get('github_message', '') if isinstance(result, dict) else ''
-            flash(f'Backup completo criado com sucesso! {github_msg}', 'success')
-            filename = result.get('filename', 'backup') if isinstance(result, dict) else 'backup'
-            log_security_event('BACKUP_COMPLETE', f'Backup completo: {filename}', current_user.id)
-        else:
-            flash(f'Erro ao criar backup completo: {result}', 'error')
+        try:
+            record = start_backup_process(BackupType.COMPLETO, created_by=current_user.id, upload_github=True)
+            flash('Backup completo iniciado em segundo plano. Acompanhe o progresso no painel de backup.', 'info')
+            log_security_event('BACKUP_STARTED', f'Backup completo iniciado (registro {record.id})', current_user.id)
+            return redirect(url_for('backup.dashboard'))
+        except Exception as e:
+            flash(f'Erro ao criar backup completo: {str(e)}', 'error')
     
     return redirect(url_for('admin.dashboard'))
 
@@ -1571,7 +1456,10 @@ def criar_registros_atestado(atestado):
         motivo += f' - {atestado.observacoes}'
     
     # Criar registros para cada dia do período
+    meses_afetados = set()
     while data_atual <= data_fim:
+        meses_afetados.add((data_atual.year, data_atual.month))
+
         # Verificar se já existe um registro para este dia
         registro_existente = TimeRecord.query.filter_by(
             user_id=atestado.user_id,
@@ -1605,6 +1493,10 @@ def criar_registros_atestado(atestado):
         
         # Próximo dia
         data_atual += timedelta(days=1)
+    
+    # Atualizar resumos mensais na mesma transação
+    for ano, mes in sorted(meses_afetados):
+        MonthlyTimeSummary.refresh(atestado.user_id, ano, mes)
 
 # Rotas para Aprovação de Usuários
 @bp.route('/user-approvals')
@@ -1743,6 +1635,7 @@ def bulk_approve_users():
         return redirect(url_for('admin.user_approvals'))
     
     count = 0
+    approved_ids, rejected_ids = [], []
     for request_id in request_ids:
         approval_request = UserApprovalRequest.query.get(request_id)
         if approval_request and approval_request.status == ApprovalStatus.PENDENTE:
@@ -1754,13 +1647,7 @@ def bulk_approve_users():
                 approval_request.reviewed_at = datetime.utcnow()
                 approval_request.reviewed_by = current_user.id
                 
-                # Criar notificação
-                create_notification(
-                    user.id,
-                    'Conta Aprovada!',
-                    'Sua conta foi aprovada pelo administrador. Você já pode fazer login no sistema.',
-                    'success'
-                )
+                approved_ids.append(user.id)
                 
                 log_security_event('USER_APPROVED', f'Usuário {user.email} aprovado por {current_user.email}', user.id)
                 count += 1
@@ -1770,17 +1657,18 @@ def bulk_approve_users():
                 approval_request.reviewed_at = datetime.utcnow()
                 approval_request.reviewed_by = current_user.id
                 
-                # Criar notificação
-                create_notification(
-                    user.id,
-                    'Cadastro Rejeitado',
-                    'Sua solicitação de cadastro foi rejeitada pelo administrador.',
-                    'error'
-                )
+                rejected_ids.append(user.id)
                 
                 log_security_event('USER_REJECTED', f'Usuário {user.email} rejeitado por {current_user.email}', user.id)
                 count += 1
     
+    # Notificações em lote, na mesma transação das aprovações
+    notify_users(approved_ids, 'Conta Aprovada!',
+                 'Sua conta foi aprovada pelo administrador. Você já pode fazer login no sistema.',
+                 'success', sender_id=current_user.id, commit=False)
+    notify_users(rejected_ids, 'Cadastro Rejeitado',
+                 'Sua solicitação de cadastro foi rejeitada pelo administrador.',
+                 'error', sender_id=current_user.id, commit=False)
     db.session.commit()
     
     if action == 'approve':
@@ -1,9 +1,10 @@
-from flask import jsonify, request, current_app
+from flask import jsonify, request, current_app, stream_with_context
 from flask_login import login_required, current_user
 from datetime import datetime, date
-from app import db
+from app import db, notification_service
 from app.api import bp
-from app.models import TimeRecord, Notification, User, UserType
+from app.event_stream import event_broker
+from app.models import TimeRecord, Notification, User, UserType, MonthlyTimeSummary
 
 @bp.route('/status')
 def status():
@@ -123,40 +124,28 @@ def meus_registros_api():
 @bp.route('/notificacoes')
 @login_required
 def notificacoes_api():
-    """API para buscar notificações do usuário"""
-    page = request.args.get('page', 1, type=int)
+    """API para buscar notificações e comunicados do usuário.
+
+    Paginação por cursor: a resposta traz `next_cursor`, enviado de volta em
+    ?cursor= para obter a página seguinte.
+    """
     per_page = request.args.get('per_page', 20, type=int)
+    cursor = request.args.get('cursor')
     apenas_nao_lidas = request.args.get('apenas_nao_lidas', False, type=bool)
     
-    if per_page > 100:
-        per_page = 100
-    
-    query = Notification.query.filter_by(user_id=current_user.id)
-    
-    if apenas_nao_lidas:
-        query = query.filter_by(lida=False)
+    per_page = min(max(per_page, 1), 100)
     
-    notificacoes = query.order_by(
-        Notification.created_at.desc()
-    ).paginate(page=page, per_page=per_page, error_out=False)
+    feed = notification_service.get_feed(
+        current_user, limit=per_page, cursor=cursor, lida=False if apenas_nao_lidas else None
+    )
     
     return jsonify({
-        'notificacoes': [{
-            'id': n.id,
-            'titulo': n.titulo,
-            'mensagem': n.mensagem,
-            'tipo': n.tipo.value,
-            'lida': n.lida,
-            'created_at': n.created_at.isoformat(),
-            'remetente': n.remetente.nome_completo if n.remetente else 'Sistema'
-        } for n in notificacoes.items],
+        'notificacoes': [item.to_dict() for item in feed.items],
         'pagination': {
-            'page': notificacoes.page,
-            'pages': notificacoes.pages,
-            'per_page': notificacoes.per_page,
-            'total': notificacoes.total,
-            'has_next': notificacoes.has_next,
-            'has_prev': notificacoes.has_prev
+            'per_page': per_page,
+            'cursor': cursor,
+            'next_cursor': feed.next_cursor,
+            'has_next': feed.has_next
         }
     })
 
@@ -177,24 +166,63 @@ def marcar_notificacao_lida_api(id):
         'message': 'Notificação marcada como lida'
     })
 
+@bp.route('/marcar_comunicado_lido/<int:id>', methods=['POST'])
+@login_required
+def marcar_comunicado_lido_api(id):
+    """API para confirmar a leitura de um comunicado"""
+    if not notification_service.mark_broadcast_read(current_user, id):
+        return jsonify({'error': 'Comunicado não encontrado'}), 404
+    
+    return jsonify({
+        'success': True,
+        'message': 'Notificação marcada como lida'
+    })
+
+@bp.route('/stream')
+@login_required
+def stream():
+    """Canal Server-Sent Events: notificações novas, contador de não lidas e ponto do usuário.
+
+    O EventSource retoma com o cabeçalho Last-Event-ID; acima do limite de
+    conexões do worker responde 503 e o cliente volta ao polling.
+    """
+    subscription = event_broker.subscribe(current_user)
+    if subscription is None:
+        response = jsonify({'error': 'Limite de conexões em tempo real atingido'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '60'
+        return response
+    
+    user = current_user._get_current_object()
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    
+    def unread():
+        try:
+            return notification_service.unread_count(user)
+        finally:
+            # A conexão do pool não fica presa durante o stream
+            db.session.remove()
+    
+    db.session.remove()
+    response = current_app.response_class(
+        stream_with_context(event_broker.stream(subscription, last_event_id, unread)),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @bp.route('/estatisticas')
 @login_required
 def estatisticas_api():
     """API para estatísticas do usuário"""
     hoje = date.today()
-    inicio_mes = hoje.replace(day=1)
-    
-    # Buscar registros do mês
-    registros_mes = TimeRecord.query.filter(
-        TimeRecord.user_id == current_user.id,
-        TimeRecord.data >= inicio_mes,
-        TimeRecord.data <= hoje
-    ).all()
     
-    # Calcular estatísticas
-    total_horas = sum(r.horas_trabalhadas for r in registros_mes)
-    total_extras = sum(r.horas_extras for r in registros_mes)
-    dias_trabalhados = len([r for r in registros_mes if r.is_completo])
+    # Estatísticas do mês a partir do resumo mensal pré-calculado
+    resumo_mes = MonthlyTimeSummary.get_for_month(current_user.id, hoje.year, hoje.month)
+    total_horas = resumo_mes.total_hours if resumo_mes else 0.0
+    total_extras = resumo_mes.total_overtime if resumo_mes else 0.0
+    dias_trabalhados = resumo_mes.complete_days if resumo_mes else 0
     
     # Registro de hoje
     registro_hoje = TimeRecord.query.filter_by(
@@ -217,10 +245,7 @@ def estatisticas_api():
             'horas_trabalhadas': registro_hoje.horas_trabalhadas if registro_hoje else 0,
             'is_completo': registro_hoje.is_completo if registro_hoje else False
         },
-        'notificacoes_nao_lidas': Notification.query.filter_by(
-            user_id=current_user.id,
-            lida=False
-        ).count()
+        'notificacoes_nao_lidas': notification_service.unread_count(current_user)
     })
 
 @bp.route('/usuarios', methods=['GET'])
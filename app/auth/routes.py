@@ -62,6 +62,7 @@ def login():
                 # Login successful
                 login_user(user, remember=True)
                 user.last_login = datetime.utcnow()
+                db.session.commit()
                 ctx.add_context("login_successful", True)
                 
                 log_security_event('LOGIN_SUCCESS', f'Admin login realizado: {user.email}', user.id)
@@ -0,0 +1,492 @@
+# -*- coding: utf-8 -*-
+"""
+Formatos de Arquivo de Backup para SKPONTO
+ZIP (formato original) e tar + zstandard multi-thread com índice por arquivo
+"""
+
+import hashlib
+import io
+import json
+import os
+import shutil
+import struct
+import tarfile
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple, BinaryIO
+
+import zstandard
+
+FORMAT_ZIP = 'zip'
+FORMAT_TAR_ZSTD = 'tar.zst'
+EXTENSIONS = {FORMAT_ZIP: '.zip', FORMAT_TAR_ZSTD: '.tar.zst'}
+
+# Mídia já comprimida: gravada em blocos "raw" do zstd, sem gastar CPU recomprimindo
+INCOMPRESSIBLE_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.pdf', '.zip', '.gz', '.zst',
+    '.docx', '.xlsx', '.mp4'
+}
+
+ZSTD_MAGIC = 0xFD2FB528
+SKIPPABLE_MAGIC = 0x184D2A50
+INDEX_MAGIC = 0x184D2A5A
+TRAILER_MAGIC = 0x184D2A5B
+RAW_BLOCK_SIZE = 128 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def backup_format_for(path) -> str:
+    """Detecta o formato pelo nome do arquivo"""
+    return FORMAT_TAR_ZSTD if str(path).endswith(EXTENSIONS[FORMAT_TAR_ZSTD]) else FORMAT_ZIP
+
+
+def _raw_zstd_frame_header(size: int) -> bytes:
+    """Cabeçalho de frame zstd com Single_Segment e tamanho de conteúdo de 8 bytes"""
+    descriptor = 0b11100000  # FCS de 8 bytes, single segment, sem checksum
+    return struct.pack('<IB', ZSTD_MAGIC, descriptor) + struct.pack('<Q', size)
+
+
+def _write_raw_zstd_frame(src: BinaryIO, dst: BinaryIO, size: int) -> int:
+    """Grava o conteúdo como frame zstd de blocos raw (válido para qualquer decodificador)"""
+    written = dst.write(_raw_zstd_frame_header(size))
+    remaining = size
+
+    if remaining == 0:
+        # Frame vazio: um único bloco raw, último, de tamanho zero
+        return written + dst.write((1).to_bytes(3, 'little'))
+
+    while remaining > 0:
+        chunk = src.read(min(RAW_BLOCK_SIZE, remaining))
+        if not chunk:
+            raise IOError('Arquivo encolheu durante o backup')
+        remaining -= len(chunk)
+        last = 1 if remaining == 0 else 0
+        block_header = (len(chunk) << 3) | (0 << 1) | last  # tipo 0 = raw
+        written += dst.write(block_header.to_bytes(3, 'little'))
+        written += dst.write(chunk)
+
+    return written
+
+
+def _skippable_frame(magic: int, payload: bytes) -> bytes:
+    return struct.pack('<II', magic, len(payload)) + payload
+
+
+class _CountingWriter:
+    """Arquivo de saída que conhece a posição atual (offset dos frames no índice)"""
+
+    def __init__(self, target: BinaryIO):
+        self.target = target
+        self.offset = 0
+
+    def write(self, data) -> int:
+        self.target.write(data)
+        self.offset += len(data)
+        return len(data)
+
+    def flush(self):
+        self.target.flush()
+
+
+class ReadThrottle:
+    """Limita a leitura dos arquivos de origem a N bytes/s e conta o total lido.
+
+    Com max_bytes_per_sec = 0 apenas conta (usado para o progresso do backup).
+    """
+
+    def __init__(self, max_bytes_per_sec: int = 0):
+        self.max_bytes_per_sec = max(0, int(max_bytes_per_sec or 0))
+        self.bytes_read = 0
+        self._started = time.monotonic()
+
+    def consume(self, size: int):
+        self.bytes_read += size
+        if not self.max_bytes_per_sec:
+            return
+        # Dorme o necessário para a média desde o início não passar do limite
+        expected = self.bytes_read / self.max_bytes_per_sec
+        delay = expected - (time.monotonic() - self._started)
+        if delay > 0:
+            time.sleep(delay)
+
+    def wrap(self, source: BinaryIO) -> BinaryIO:
+        return _ThrottledReader(source, self)
+
+
+class _ThrottledReader(io.RawIOBase):
+    """Arquivo de origem lido através de um ReadThrottle"""
+
+    def __init__(self, source: BinaryIO, throttle: ReadThrottle):
+        self.source = source
+        self.throttle = throttle
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.source.read(min(len(buffer), COPY_CHUNK_SIZE))
+        self.throttle.consume(len(data))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self.source.close()
+        super().close()
+
+
+def _open_source(file_path: Path, throttle: Optional[ReadThrottle]) -> BinaryIO:
+    source = open(file_path, 'rb')
+    return io.BufferedReader(throttle.wrap(source), COPY_CHUNK_SIZE) if throttle else source
+
+
+class ZipBackupWriter:
+    """Escrita de backup em ZIP (deflate, single-thread)"""
+
+    format = FORMAT_ZIP
+
+    def __init__(self, path: Path, throttle: Optional[ReadThrottle] = None):
+        self.path = Path(path)
+        self.zipf = zipfile.ZipFile(self.path, 'w', zipfile.ZIP_DEFLATED)
+        self.throttle = throttle
+
+    def add_file(self, file_path: Path, arcname: str) -> int:
+        if not self.throttle:
+            self.zipf.write(file_path, arcname)
+            return Path(file_path).stat().st_size
+
+        info = zipfile.ZipInfo.from_file(file_path, arcname)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with _open_source(file_path, self.throttle) as src, self.zipf.open(info, 'w', force_zip64=True) as dst:
+            shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+        return info.file_size
+
+    def add_bytes(self, arcname: str, data: bytes) -> int:
+        self.zipf.writestr(arcname, data)
+        return len(data)
+
+    def open_member(self, arcname: str, compressed: bool = False):
+        """Membro gravado em streaming; `compressed` indica conteúdo já comprimido"""
+        info = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_STORED if compressed else zipfile.ZIP_DEFLATED
+        return self.zipf.open(info, 'w', force_zip64=True)
+
+    def close(self):
+        self.zipf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TarZstdBackupWriter:
+    """Escrita de backup em tar + zstandard com índice por arquivo.
+
+    Cada cabeçalho tar e cada conteúdo vira um frame zstd independente, e o
+    arquivo inteiro continua sendo um .tar.zst comum (`tar --zstd -xf`). Ao
+    final vai um frame "skippable" com o índice JSON (offset e tamanho do frame
+    de cada membro) e um trailer de 16 bytes apontando para ele, o que permite
+    extrair um único arquivo com um seek, sem descomprimir o resto.
+    """
+
+    format = FORMAT_TAR_ZSTD
+
+    def __init__(self, path: Path, level: int = 3, threads: int = 0,
+                 throttle: Optional[ReadThrottle] = None):
+        self.path = Path(path)
+        self.throttle = throttle
+        self._file = open(self.path, 'wb')
+        self._out = _CountingWriter(self._file)
+        # threads > 0: o zstd divide membros grandes em jobs paralelos
+        self._compressor = zstandard.ZstdCompressor(level=level, threads=threads,
+                                                     write_content_size=True, write_checksum=True)
+        self._header_compressor = zstandard.ZstdCompressor(level=level)
+        self.index: Dict[str, Dict[str, Any]] = {}
+
+    def _write_header(self, info: tarfile.TarInfo):
+        header = info.tobuf(format=tarfile.PAX_FORMAT, encoding='utf-8', errors='surrogateescape')
+        self._out.write(self._header_compressor.compress(header))
+
+    def _write_padding(self, size: int):
+        padding = (tarfile.BLOCKSIZE - size % tarfile.BLOCKSIZE) % tarfile.BLOCKSIZE
+        if padding:
+            self._out.write(self._header_compressor.compress(b'\0' * padding))
+
+    def _add_stream(self, arcname: str, src: BinaryIO, size: int, mtime: float, raw: bool):
+        info = tarfile.TarInfo(arcname)
+        info.size = size
+        info.mtime = mtime
+        info.mode = 0o644
+        self._write_header(info)
+
+        offset = self._out.offset
+        if raw:
+            _write_raw_zstd_frame(src, self._out, size)
+        else:
+            self._compressor.copy_stream(src, self._out, size=size,
+                                         read_size=COPY_CHUNK_SIZE, write_size=COPY_CHUNK_SIZE)
+
+        self.index[arcname] = {
+            'offset': offset,
+            'length': self._out.offset - offset,
+            'size': size,
+            'mtime': mtime,
+            'codec': 'raw' if raw else 'zstd'
+        }
+        self._write_padding(size)
+        return size
+
+    def add_file(self, file_path: Path, arcname: str) -> int:
+        file_path = Path(file_path)
+        stat = file_path.stat()
+        raw = file_path.suffix.lower() in INCOMPRESSIBLE_EXTENSIONS
+        with _open_source(file_path, self.throttle) as src:
+            return self._add_stream(arcname, src, stat.st_size, stat.st_mtime, raw)
+
+    def add_bytes(self, arcname: str, data: bytes) -> int:
+        return self._add_stream(arcname, io.BytesIO(data), len(data), time.time(), raw=False)
+
+    def open_member(self, arcname: str, compressed: bool = False):
+        """Membro gravado em streaming (tamanho só é conhecido no fim: usa arquivo temporário)"""
+        return _SpooledMember(self, arcname, raw=compressed)
+
+    def close(self):
+        if self._file.closed:
+            return
+        # Fim do tar (dois blocos zerados), índice e trailer
+        self._out.write(self._header_compressor.compress(b'\0' * (tarfile.BLOCKSIZE * 2)))
+        index_offset = self._out.offset
+        payload = json.dumps({'version': 1, 'members': self.index}, ensure_ascii=False).encode('utf-8')
+        self._out.write(_skippable_frame(INDEX_MAGIC, payload))
+        self._out.write(_skippable_frame(TRAILER_MAGIC, struct.pack('<Q', index_offset)))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _SpooledMember(io.RawIOBase):
+    """Acumula um membro em arquivo temporário e o adiciona ao tar ao fechar"""
+
+    def __init__(self, writer: TarZstdBackupWriter, arcname: str, raw: bool):
+        self.writer = writer
+        self.arcname = arcname
+        self.raw = raw
+        self._spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self._spool.write(data)
+
+    def close(self):
+        if self.closed:
+            return
+        size = self._spool.tell()
+        self._spool.seek(0)
+        self.writer._add_stream(self.arcname, self._spool, size, time.time(), self.raw)
+        self._spool.close()
+        super().close()
+
+
+class ZipBackupReader:
+    """Leitura de backups ZIP"""
+
+    format = FORMAT_ZIP
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.zipf = zipfile.ZipFile(self.path, 'r')
+
+    def names(self) -> List[str]:
+        return [name for name in self.zipf.namelist() if not name.endswith('/')]
+
+    def has(self, name: str) -> bool:
+        try:
+            self.zipf.getinfo(name)
+            return True
+        except KeyError:
+            return False
+
+    def open(self, name: str) -> BinaryIO:
+        return self.zipf.open(name)
+
+    def read(self, name: str) -> bytes:
+        return self.zipf.read(name)
+
+    def size(self, name: str) -> int:
+        return self.zipf.getinfo(name).file_size
+
+    def iter_members(self) -> Iterator[Tuple[str, BinaryIO]]:
+        """Percorre os membros na ordem do arquivo (o CRC é conferido na leitura)"""
+        for info in self.zipf.infolist():
+            if not info.is_dir():
+                with self.zipf.open(info) as member:
+                    yield info.filename, member
+
+    def close(self):
+        self.zipf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TarZstdBackupReader:
+    """Leitura de backups tar + zstandard usando o índice para acesso direto"""
+
+    format = FORMAT_TAR_ZSTD
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open(self.path, 'rb')
+        self.index = self._read_index()
+
+    def _read_index(self) -> Dict[str, Dict[str, Any]]:
+        self._file.seek(-16, os.SEEK_END)
+        magic, length = struct.unpack('<II', self._file.read(8))
+        if magic != TRAILER_MAGIC or length != 8:
+            raise ValueError(f"Backup sem índice: {self.path.name}")
+        index_offset, = struct.unpack('<Q', self._file.read(8))
+
+        self._file.seek(index_offset)
+        magic, length = struct.unpack('<II', self._file.read(8))
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"Índice corrompido: {self.path.name}")
+        return json.loads(self._file.read(length).decode('utf-8'))['members']
+
+    def names(self) -> List[str]:
+        return list(self.index)
+
+    def has(self, name: str) -> bool:
+        return name in self.index
+
+    def open(self, name: str) -> BinaryIO:
+        """Abre um único membro: seek até o frame e descompressão só dele"""
+        entry = self.index[name]
+        self._file.seek(entry['offset'])
+        frame = _BoundedReader(self._file, entry['length'])
+        return zstandard.ZstdDecompressor().stream_reader(frame, read_size=COPY_CHUNK_SIZE)
+
+    def read(self, name: str) -> bytes:
+        with self.open(name) as f:
+            return f.read()
+
+    def size(self, name: str) -> int:
+        return self.index[name]['size']
+
+    def iter_members(self) -> Iterator[Tuple[str, BinaryIO]]:
+        """Percorre o arquivo inteiro em streaming, como um .tar.zst comum.
+
+        Cada membro deve ser consumido antes de avançar para o próximo.
+        """
+        with open(self.path, 'rb') as f:
+            reader = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            with tarfile.open(fileobj=reader, mode='r|') as tar:
+                for info in tar:
+                    if info.isfile():
+                        yield info.name, tar.extractfile(info)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _BoundedReader(io.RawIOBase):
+    """Leitura limitada a um trecho do arquivo (um frame)"""
+
+    def __init__(self, source: BinaryIO, length: int):
+        self.source = source
+        self.remaining = length
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.remaining <= 0:
+            return 0
+        data = self.source.read(min(len(buffer), self.remaining))
+        self.remaining -= len(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def open_backup_writer(path, backup_format: str = FORMAT_ZIP, level: int = 3, threads: int = 0,
+                       throttle: Optional[ReadThrottle] = None):
+    """Abre um writer para o formato informado"""
+    if backup_format == FORMAT_TAR_ZSTD:
+        return TarZstdBackupWriter(path, level=level, threads=threads, throttle=throttle)
+    return ZipBackupWriter(path, throttle=throttle)
+
+
+def open_backup_reader(path):
+    """Abre um reader detectando o formato pelo nome do arquivo"""
+    if backup_format_for(path) == FORMAT_TAR_ZSTD:
+        return TarZstdBackupReader(path)
+    return ZipBackupReader(path)
+
+
+def extract_member(reader, name: str, dest_path: Path, mtime: Optional[float] = None):
+    """Copia um membro direto para o destino, em blocos"""
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+    with reader.open(name) as src, open(dest_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+    if mtime is not None:
+        os.utime(dest_path, (mtime, mtime))
+
+
+def verify_archive(reader, expected: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Lê o backup inteiro em streaming, sem extrair, e confere a integridade.
+
+    Cada membro é descomprimido em blocos: o ZIP confere o CRC e o tar.zst o
+    checksum de cada frame zstd. `expected` mapeia membros para o sha256
+    esperado; no tar.zst o tamanho também é comparado com o índice.
+    """
+    expected = expected or {}
+    index = getattr(reader, 'index', None)
+    seen = set()
+    errors = []
+    total_size = 0
+
+    try:
+        for name, member in reader.iter_members():
+            sha256 = hashlib.sha256()
+            size = 0
+            for block in iter(lambda: member.read(COPY_CHUNK_SIZE), b''):
+                sha256.update(block)
+                size += len(block)
+            seen.add(name)
+            total_size += size
+
+            if index is not None and (name not in index or index[name]['size'] != size):
+                errors.append(f"{name}: não confere com o índice")
+            if name in expected and expected[name] != sha256.hexdigest():
+                errors.append(f"{name}: sha256 divergente")
+    except (zipfile.BadZipFile, zstandard.ZstdError, tarfile.TarError, EOFError, OSError) as e:
+        errors.append(f"Arquivo corrompido: {str(e)}")
+
+    missing = sorted(set(expected) - seen)
+    if index is not None:
+        missing = sorted(set(missing) | (set(index) - seen))
+    errors.extend(f"{name}: ausente no arquivo" for name in missing)
+
+    return {
+        'members': len(seen),
+        'size': total_size,
+        'checked': len(set(expected) & seen),
+        'errors': errors
+    }
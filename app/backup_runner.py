@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Execução de Backups em Subprocesso para SKPONTO
+O backup roda fora do processo web, com prioridade baixa de CPU e disco
+(nice/ionice) e leitura limitada, gravando o progresso no BackupHistory
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import Optional
+
+from flask import current_app
+from app import db
+from app.models import BackupHistory, BackupStatus, BackupType
+from app.utils import get_current_datetime
+
+logger = logging.getLogger(__name__)
+
+
+def _low_priority_command(command):
+    """Prefixa o comando com nice/ionice quando disponíveis (Linux)"""
+    nice = current_app.config.get('BACKUP_NICE', 10)
+    ionice_class = current_app.config.get('BACKUP_IONICE_CLASS', 2)
+    ionice_level = current_app.config.get('BACKUP_IONICE_LEVEL', 7)
+
+    if ionice_class and shutil.which('ionice'):
+        ionice = ['ionice', '-c', str(ionice_class)]
+        if ionice_class == 2:
+            ionice += ['-n', str(ionice_level)]
+        command = ionice + command
+    if nice and shutil.which('nice'):
+        command = ['nice', '-n', str(nice)] + command
+    return command
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def find_running_backup() -> Optional[BackupHistory]:
+    """Backup em subprocesso ainda em execução; registros de processos mortos viram FALHOU"""
+    records = BackupHistory.query.filter(
+        BackupHistory.status.in_((BackupStatus.PENDENTE, BackupStatus.EM_PROGRESSO)),
+        BackupHistory.worker_pid.isnot(None)
+    ).all()
+
+    running = None
+    for record in records:
+        if _process_alive(record.worker_pid):
+            running = record
+        else:
+            record.status = BackupStatus.FALHOU
+            record.error_message = record.error_message or 'Processo de backup encerrado inesperadamente'
+            record.completed_at = get_current_datetime()
+    db.session.commit()
+    return running
+
+
+def start_backup_process(backup_type: BackupType = BackupType.MANUAL, created_by: Optional[int] = None,
+                         upload_github: bool = False) -> BackupHistory:
+    """
+    Registra o backup como PENDENTE e o executa em um subprocesso de baixa prioridade
+
+    Returns:
+        BackupHistory: registro a acompanhar (progresso em files_done/bytes_done)
+    """
+    running = find_running_backup()
+    if running:
+        raise RuntimeError(f"Já existe um backup em andamento ({running.filename})")
+
+    record = BackupHistory(
+        filename='(aguardando início)',
+        backup_type=backup_type,
+        status=BackupStatus.PENDENTE,
+        started_at=get_current_datetime(),
+        file_size=0,
+        files_done=0,
+        bytes_done=0,
+        created_by=created_by
+    )
+    db.session.add(record)
+    db.session.commit()
+
+    command = [sys.executable, '-m', 'app.backup_runner', str(record.id), '--type', backup_type.name]
+    if upload_github:
+        command.append('--github')
+
+    env = dict(os.environ)
+    # O create_app do subprocesso não deve iniciar o agendador de backup
+    env['SKPONTO_SCHEDULER_POST_FORK'] = '1'
+
+    try:
+        process = subprocess.Popen(
+            _low_priority_command(command),
+            cwd=str(Path(current_app.root_path).parent),
+            env=env,
+            stdin=subprocess.DEVNULL,
+            start_new_session=True
+        )
+    except Exception as e:
+        record.status = BackupStatus.FALHOU
+        record.error_message = f"Erro ao iniciar processo de backup: {str(e)}"
+        record.completed_at = get_current_datetime()
+        db.session.commit()
+        raise
+
+    record.worker_pid = process.pid
+    db.session.commit()
+
+    # Recolhe o processo ao terminar (evita processos zumbis no worker web)
+    threading.Thread(target=process.wait, name=f'backup-wait-{process.pid}', daemon=True).start()
+
+    logger.info(f"Backup {record.id} iniciado no processo {process.pid}")
+    return record
+
+
+def run_backup(record_id: int, backup_type: BackupType, upload_github: bool = False) -> bool:
+    """Executa o backup do registro informado (dentro do subprocesso)"""
+    from app.backup_archive import ReadThrottle
+    from app.local_backup import LocalBackupManager
+    from app.utils import log_security_event, upload_to_github
+
+    limit_mb = current_app.config.get('BACKUP_READ_LIMIT_MB', 0)
+    throttle = ReadThrottle(int(limit_mb * 1024 * 1024))
+
+    success, message = LocalBackupManager().create_backup(
+        backup_type=backup_type, backup_record_id=record_id, throttle=throttle
+    )
+
+    record = db.session.get(BackupHistory, record_id)
+    if success and upload_github and record and record.local_path:
+        github_token = os.environ.get('GITHUB_TOKEN')
+        github_repo = os.environ.get('GITHUB_BACKUP_REPO')
+        if github_token and github_repo:
+            if upload_to_github(record.local_path, record.filename, github_token, github_repo):
+                message += ' (Enviado para GitHub)'
+            else:
+                message += ' (Erro no upload para GitHub)'
+
+    log_security_event(
+        user_id=record.created_by if record else None,
+        action='BACKUP_COMPLETE' if success else 'BACKUP_FAILED',
+        details=message
+    )
+    logger.info(message)
+    return success
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Executa um backup do SKPONTO em segundo plano')
+    parser.add_argument('record_id', type=int)
+    parser.add_argument('--type', default=BackupType.MANUAL.name, choices=[t.name for t in BackupType])
+    parser.add_argument('--github', action='store_true')
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    app = create_app(os.getenv('FLASK_CONFIG') or 'production')
+
+    with app.app_context():
+        try:
+            success = run_backup(args.record_id, BackupType[args.type], upload_github=args.github)
+        except Exception as e:
+            logger.error(f"Erro no processo de backup {args.record_id}: {str(e)}")
+            db.session.rollback()
+            record = db.session.get(BackupHistory, args.record_id)
+            if record and not record.is_finished:
+                record.status = BackupStatus.FALHOU
+                record.error_message = str(e)
+                record.completed_at = get_current_datetime()
+                db.session.commit()
+            success = False
+
+    return 0 if success else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,6 @@
 import click
 from flask import current_app
+from flask.cli import AppGroup
 from app import db
 from app.models import User, UserType, SystemConfig
 from app.utils import backup_database
@@ -56,6 +57,75 @@ def register_cli_commands(app):
         else:
             click.echo(f'Erro ao criar backup: {result}')
     
+    @app.cli.command()
+    @click.option('--output', required=True, type=click.Path(file_okay=False), help='Diretório de destino')
+    @click.option('--chunk-size', default=1000, help='Linhas por lote do cursor')
+    def logical_dump(output, chunk_size):
+        """Exporta o banco (PostgreSQL/SQLite) em dump lógico comprimido"""
+        from app.database_dump import LogicalDumper
+
+        os.makedirs(output, exist_ok=True)
+        manifest = LogicalDumper(db.engine, chunk_size=chunk_size).dump(
+            lambda name: open(os.path.join(output, name), 'wb')
+        )
+        for table in manifest['tables']:
+            click.echo(f'{table["name"]:<35} {table["rows"]:>10} linhas')
+        click.echo(f'Dump lógico ({manifest["dialect"]}, revisão {manifest["alembic_revision"]}) gravado em {output}')
+
+    @app.cli.command()
+    @click.option('--input', 'input_dir', required=True, type=click.Path(exists=True, file_okay=False),
+                  help='Diretório do dump')
+    @click.option('--table', 'tables', multiple=True, help='Restaurar apenas estas tabelas')
+    @click.option('--chunk-size', default=1000, help='Linhas por lote de inserção')
+    def logical_restore(input_dir, tables, chunk_size):
+        """Restaura um dump lógico (substitui os dados das tabelas)"""
+        from app.database_dump import LogicalRestorer
+
+        if not click.confirm('ATENÇÃO: os dados atuais das tabelas serão substituídos. Continuar?'):
+            return
+
+        restored = LogicalRestorer(db.engine, chunk_size=chunk_size).restore(
+            lambda name: open(os.path.join(input_dir, name), 'rb'),
+            tables=list(tables) or None
+        )
+        for name, rows in restored.items():
+            click.echo(f'{name:<35} {rows:>10} linhas')
+        click.echo('Restauração concluída.')
+
+    @app.cli.command()
+    @click.argument('backup_file', type=click.Path(exists=True, dir_okay=False))
+    def backup_verify(backup_file):
+        """Verifica a integridade de um backup sem extraí-lo"""
+        from app.local_backup import get_local_backup_manager
+
+        ok, report = get_local_backup_manager().verify_backup(backup_file)
+        for error in report['errors']:
+            click.echo(f'ERRO: {error}')
+        if ok:
+            click.echo(f'Backup íntegro ({report["format"]}): {report["members"]} membros, '
+                       f'{report["checked"]} com sha256 conferido')
+        else:
+            click.echo(f'Backup com {len(report["errors"])} problemas.')
+
+    @app.cli.command()
+    @click.argument('backup_file', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--path', 'paths', multiple=True,
+                  help='Arquivo ou prefixo relativo a storage/ (ex.: attestations/user_42)')
+    @click.option('--user-id', 'user_ids', type=int, multiple=True, help='Restaurar os atestados deste usuário')
+    @click.option('--table', 'tables', multiple=True, help='Tabela do dump lógico a restaurar')
+    def backup_restore(backup_file, paths, user_ids, tables):
+        """Restaura apenas os arquivos ou tabelas selecionados de um backup"""
+        from app.local_backup import get_local_backup_manager
+
+        paths = list(paths) + [f'attestations/user_{user_id}' for user_id in user_ids]
+        if tables and not click.confirm('ATENÇÃO: os dados atuais das tabelas serão substituídos. Continuar?'):
+            return
+
+        success, message = get_local_backup_manager().restore_selected(
+            backup_file, paths=paths or None, tables=list(tables) or None
+        )
+        click.echo(message if success else f'Erro: {message}')
+
     @app.cli.command()
     @click.option('--days', default=30, help='Dias de logs para manter')
     def cleanup_logs(days):
@@ -72,6 +142,90 @@ def register_cli_commands(app):
         db.session.commit()
         click.echo(f'{deleted} logs removidos (mais antigos que {days} dias).')
     
+    @app.cli.command()
+    @click.option('--user-id', type=int, default=None, help='Reconstruir apenas este usuário')
+    def rebuild_monthly_summaries(user_id):
+        """Reconstrói os resumos mensais de ponto a partir dos registros"""
+        from app.models import MonthlyTimeSummary
+
+        total = MonthlyTimeSummary.rebuild(user_id=user_id)
+        alvo = f'usuário {user_id}' if user_id else 'todos os usuários'
+        click.echo(f'{total} resumos mensais reconstruídos ({alvo}).')
+
+    @app.cli.command()
+    @click.option('--user-id', 'user_ids', type=int, multiple=True, help='Recalcular apenas este usuário')
+    def rebuild_notification_counters(user_ids):
+        """Recalcula os contadores de notificações não lidas"""
+        from app.notification_service import rebuild_counters
+
+        total = rebuild_counters(user_ids=list(user_ids) or None)
+        click.echo(f'{total} contadores de notificações recalculados.')
+
+    @app.cli.command()
+    @click.option('--month', default=None, help='Grava apenas o checkpoint do dia 1º deste mês (AAAA-MM)')
+    @click.option('--since', default=None, help='Primeiro mês a gerar (AAAA-MM, padrão: primeira transação)')
+    def hour_bank_checkpoints(month, since):
+        """Grava os checkpoints mensais de saldo do banco de horas"""
+        from app.models import HourBankCheckpoint
+
+        try:
+            if month:
+                as_of = datetime.strptime(month, '%Y-%m').date()
+                total = HourBankCheckpoint.create(as_of)
+            else:
+                since_date = datetime.strptime(since, '%Y-%m').date() if since else None
+                total = HourBankCheckpoint.create_monthly(since=since_date)
+        except ValueError as e:
+            click.echo(f'Erro: {e}')
+            return
+        db.session.commit()
+        click.echo(f'{total} checkpoints de saldo gravados.')
+
+    @app.cli.command()
+    @click.option('--date', 'target_date', default=None, help='Data a processar (AAAA-MM-DD, padrão: ontem)')
+    @click.option('--dry-run', is_flag=True, help='Apenas calcula, sem gravar')
+    @click.option('--chunk-size', type=int, default=None, help='Usuários por commit')
+    def overtime_batch(target_date, dry_run, chunk_size):
+        """Processa o lote diário do banco de horas"""
+        from app.overtime_controller import OvertimeController
+
+        if target_date:
+            target_date = datetime.strptime(target_date, '%Y-%m-%d').date()
+
+        report = OvertimeController().run_daily_batch(target_date, dry_run=dry_run, chunk_size=chunk_size)
+        if 'chunks' not in report:
+            click.echo(f'Erro no lote diário: {report.get("error")}')
+            return
+
+        modo = ' (simulação)' if dry_run else ''
+        click.echo(f'Lote de {report["target_date"]}{modo}: {report["users"]} usuários')
+        click.echo(f'Processados: {report["processed"]} | Ignorados: {report["skipped"]} | Erros: {report["errors"]}')
+        click.echo(f'Créditos: {report["credits"]} ({report["hours_credited"]}h) | '
+                   f'Débitos: {report["debits"]} ({report["hours_debited"]}h) | '
+                   f'Saldo insuficiente: {report["insufficient_balance"]}')
+        for chunk in report['chunks']:
+            status = f' ERRO: {chunk["error"]}' if 'error' in chunk else ''
+            click.echo(f'  Bloco {chunk["index"]}: {chunk["users"]} usuários, '
+                       f'{chunk["transactions"]} transações em {chunk["seconds"]}s{status}')
+        click.echo(f'Carga: {report["load_seconds"]}s | Total: {report["total_seconds"]}s')
+
+    @app.cli.command()
+    def report_worker():
+        """Processa a fila de relatórios em um processo dedicado"""
+        from app.report_jobs import ReportWorker, recover_stale_jobs
+
+        recovered = recover_stale_jobs(current_app.config.get('REPORT_STALE_MINUTES', 30))
+        if recovered:
+            click.echo(f'{recovered} relatórios devolvidos à fila.')
+
+        click.echo('Worker de relatórios iniciado (Ctrl+C para sair).')
+        worker = ReportWorker(current_app._get_current_object(),
+                              poll_seconds=current_app.config.get('REPORT_POLL_SECONDS', 5))
+        try:
+            worker.run_forever()
+        except KeyboardInterrupt:
+            click.echo('Worker de relatórios encerrado.')
+
     @app.cli.command()
     def init_config():
         """Inicializa configurações padrão do sistema"""
@@ -187,3 +341,112 @@ def register_cli_commands(app):
         except Exception as e:
             click.echo(f'Erro no teste de email: {e}')
             click.echo(f'Erro no teste de email: {e}')
+
+    perf = AppGroup('perf', help='Dataset sintético e benchmark de carga')
+
+    @perf.command('seed')
+    @click.option('--users', default=100, show_default=True, help='Quantidade de usuários')
+    @click.option('--years', default=1.0, show_default=True, help='Anos de histórico de ponto')
+    @click.option('--notifications', default=50, show_default=True, help='Notificações por usuário')
+    @click.option('--logs', default=200, show_default=True, help='Logs de segurança por usuário')
+    @click.option('--attestations', default=2, show_default=True, help='Atestados (com arquivo) por usuário')
+    @click.option('--chunk-size', default=5000, show_default=True, help='Linhas por inserção em lote')
+    @click.option('--seed', default=42, show_default=True, help='Semente do gerador aleatório')
+    @click.option('--reset', is_flag=True, help='Remove o dataset anterior antes de gerar')
+    def perf_seed(users, years, notifications, logs, attestations, chunk_size, seed, reset):
+        """Gera um dataset sintético realista para testes de desempenho"""
+        from app.perf_bench import reset_dataset, seed_dataset
+
+        if reset:
+            removed = reset_dataset()
+            click.echo(f'{removed} usuários de teste removidos.')
+
+        result = seed_dataset(users=users, years=years, notifications=notifications, logs=logs,
+                              attestations=attestations, chunk_size=chunk_size, seed=seed,
+                              progress=click.echo)
+        click.echo(f'Dataset gerado em {result["seconds"]}s ({result["workdays"]} dias úteis):')
+        for table, count in sorted(result['rows'].items()):
+            click.echo(f'  {table:<28} {count}')
+
+    @perf.command('bench')
+    @click.option('--requests', 'requests_total', default=2000, show_default=True, help='Total de requisições medidas')
+    @click.option('--concurrency', default=4, show_default=True, help='Usuários virtuais simultâneos')
+    @click.option('--warmup', default=50, show_default=True, help='Requisições de aquecimento (não medidas)')
+    @click.option('--url', default=None, help='Servidor HTTP alvo (ex.: http://127.0.0.1:8000); padrão: test client')
+    @click.option('--scenario', multiple=True, help='Executa apenas os cenários informados')
+    @click.option('--output', default=None, help='Arquivo JSON de saída (padrão: storage/perf/)')
+    @click.option('--compare', 'baseline', type=click.Path(exists=True), help='Resultado anterior para comparação')
+    @click.option('--seed', default=42, show_default=True, help='Semente do gerador aleatório')
+    def perf_bench(requests_total, concurrency, warmup, url, scenario, output, baseline, seed):
+        """Executa o mix ponderado de endpoints e mede latência e vazão"""
+        import json
+        from app.perf_bench import compare_results, run_benchmark, save_results
+
+        try:
+            result = run_benchmark(requests_total=requests_total, concurrency=concurrency, warmup=warmup,
+                                   base_url=url, scenarios=list(scenario) or None, seed=seed,
+                                   progress=click.echo)
+        except (RuntimeError, ValueError) as e:
+            click.echo(f'Erro: {e}')
+            return
+
+        click.echo(f'{"Cenário":<24} {"Req":>6} {"Erros":>6} {"req/s":>8} {"p50":>8} {"p95":>8} {"p99":>8} {"máx":>8}')
+        click.echo('-' * 84)
+        for name, row in list(result['scenarios'].items()) + [('TOTAL', result['overall'])]:
+            if not row['requests']:
+                continue
+            click.echo(f'{name:<24} {row["requests"]:>6} {row["errors"]:>6} {row["throughput_rps"]:>8} '
+                       f'{row["p50_ms"]:>8} {row["p95_ms"]:>8} {row["p99_ms"]:>8} {row["max_ms"]:>8}')
+
+        path = save_results(result, output)
+        click.echo(f'Resultado salvo em {path}')
+
+        if baseline:
+            with open(baseline, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+            click.echo(f'\nComparação com {previous.get("commit") or baseline} (antes → agora, variação %):')
+            for row in compare_results(result, previous):
+                parts = [f'{key} {before} → {now} ({delta:+}%)' for key, (before, now, delta) in
+                         ((key, row[key]) for key in ('p50_ms', 'p95_ms', 'throughput_rps') if key in row)]
+                click.echo(f'  {row["scenario"]:<24} ' + ' | '.join(parts))
+
+    @perf.command('micro')
+    @click.option('--rows', multiple=True, type=int, help='Tamanho da fixture (repetível; padrão: 10000 e 100000)')
+    @click.option('--repeat', default=5, show_default=True, help='Repetições por benchmark (vale o menor tempo)')
+    @click.option('--only', multiple=True, help='Executa apenas benchmarks cujo nome contém o texto')
+    @click.option('--baseline', 'baseline_path', default=None, help='Arquivo da linha de base (padrão: storage/perf/micro_baseline.json)')
+    @click.option('--threshold', default=0.15, show_default=True, help='Regressão tolerada (0.15 = 15% mais lento)')
+    @click.option('--save-baseline', is_flag=True, help='Grava o resultado como nova linha de base')
+    @click.option('--output', default=None, help='Arquivo JSON com o resultado desta execução')
+    def perf_micro(rows, repeat, only, baseline_path, threshold, save_baseline, output):
+        """Micro-benchmarks de cálculo de horas, formatação e relatórios"""
+        from app.micro_bench import (DEFAULT_BASELINE, find_regressions, load_baseline,
+                                     run_micro_benchmarks, save_baseline as write_baseline)
+
+        baseline_path = baseline_path or DEFAULT_BASELINE
+        result = run_micro_benchmarks(sizes=rows or (10000, 100000), repeat=repeat,
+                                      only=list(only) or None, progress=click.echo)
+
+        if output:
+            write_baseline(result, output)
+            click.echo(f'Resultado salvo em {output}')
+        if save_baseline:
+            click.echo(f'Linha de base salva em {write_baseline(result, baseline_path)}')
+            return
+
+        baseline = load_baseline(baseline_path)
+        if baseline is None:
+            click.echo(f'Sem linha de base em {baseline_path}; use --save-baseline para criar.')
+            return
+
+        regressions = find_regressions(result, baseline, threshold)
+        if not regressions:
+            click.echo(f'Nenhuma regressão acima de {threshold:.0%}.')
+            return
+        click.echo(f'\n{len(regressions)} regressão(ões) acima de {threshold:.0%}:')
+        for item in regressions:
+            click.echo(f'  {item["benchmark"]:<48} {item["baseline_us"]} → {item["current_us"]} µs/linha '
+                       f'(+{item["slower_percent"]}%)')
+        raise SystemExit(1)
+
+    app.cli.add_command(perf)
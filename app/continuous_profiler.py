@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Profiler Contínuo por Amostragem para SKPONTO
+Thread de baixa frequência que amostra as pilhas das threads do worker
+(sys._current_frames) ao longo do dia e grava resumos periódicos em
+storage/logs/profiles/continuous/
+"""
+
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.request_profiler import MAX_STACK_DEPTH, frame_label, top_from_samples
+
+logger = logging.getLogger(__name__)
+
+OTHER_STACKS = '(outras pilhas)'
+FLAG_NAME = '.enabled'
+
+# Quadros do topo que indicam thread ociosa (esperando trabalho ou I/O de rede)
+IDLE_FRAMES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('selectors.py', 'select'),
+    ('socket.py', 'accept'),
+    ('queue.py', 'get'),
+    ('sync.py', 'wait'),
+    ('arbiter.py', 'sleep'),
+}
+
+
+class ContinuousProfiler:
+    """Amostrador de pilhas contínuo com custo limitado.
+
+    - Frequência PROFILER_CONTINUOUS_HZ; se o custo medido passar de
+      PROFILER_CONTINUOUS_MAX_OVERHEAD o intervalo é dobrado automaticamente
+    - Pilhas distintas limitadas a PROFILER_CONTINUOUS_MAX_STACKS; o excedente
+      é somado em "(outras pilhas)"
+    - A cada PROFILER_CONTINUOUS_FLUSH_SECONDS grava `<período>_<pid>.collapsed`
+      e `.json` (funções mais frequentes, custo) e recomeça a contagem
+    - Liga/desliga pelo arquivo `.enabled` no diretório, visto por todos os
+      workers; cada worker confere o arquivo no fim das requisições
+    """
+
+    def __init__(self, app=None):
+        self.directory = Path('storage/logs/profiles/continuous')
+        self.interval = 0.1
+        self.max_overhead = 0.02
+        self.max_stacks = 5000
+        self.flush_seconds = 3600
+        self.include_idle = False
+        self.default_enabled = False
+        self.keep_days = 7
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._last_flag_check = 0.0
+        self._reset_counters()
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = Path(app.config.get('PROFILER_CONTINUOUS_DIR', 'storage/logs/profiles/continuous'))
+        self.interval = 1.0 / max(app.config.get('PROFILER_CONTINUOUS_HZ', 10), 0.1)
+        self.max_overhead = app.config.get('PROFILER_CONTINUOUS_MAX_OVERHEAD', 0.02)
+        self.max_stacks = app.config.get('PROFILER_CONTINUOUS_MAX_STACKS', 5000)
+        self.flush_seconds = app.config.get('PROFILER_CONTINUOUS_FLUSH_SECONDS', 3600)
+        self.include_idle = app.config.get('PROFILER_CONTINUOUS_INCLUDE_IDLE', False)
+        self.default_enabled = app.config.get('PROFILER_CONTINUOUS', False)
+        self.keep_days = app.config.get('PROFILER_CONTINUOUS_KEEP_DAYS', 7)
+        app.after_request(self._after_request)
+        app.extensions['continuous_profiler'] = self
+        atexit.register(self.stop)
+
+    def _reset_counters(self):
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.sampling_seconds = 0.0
+        self.period_started = time.time()
+        self._period_monotonic = time.monotonic()
+
+    # Liga/desliga
+
+    @property
+    def flag_path(self) -> Path:
+        return self.directory / FLAG_NAME
+
+    def is_enabled(self) -> bool:
+        """Estado desejado: arquivo .enabled ou, sem ele, PROFILER_CONTINUOUS"""
+        try:
+            return self.flag_path.read_text().strip() == '1'
+        except FileNotFoundError:
+            return self.default_enabled
+        except OSError:
+            return False
+
+    def set_enabled(self, enabled: bool):
+        """Altera o estado para todos os workers (aplicado na próxima requisição de cada um)"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.flag_path.write_text('1' if enabled else '0')
+        self.sync(force=True)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def sync(self, force: bool = False):
+        """Inicia ou para a thread conforme o estado desejado (verificado a cada 10 s)"""
+        now = time.monotonic()
+        if not force and now - self._last_flag_check < 10:
+            return
+        self._last_flag_check = now
+
+        if self._pid != os.getpid():
+            # Processo filho (fork): a thread do pai não existe aqui
+            self._pid = os.getpid()
+            self._thread = None
+            self._stop = threading.Event()
+            self._lock = threading.Lock()
+            self._reset_counters()
+
+        enabled = self.is_enabled()
+        if enabled and not self.running:
+            self.start()
+        elif not enabled and self.running:
+            self.stop()
+
+    def _after_request(self, response):
+        self.sync()
+        return response
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self._stop = threading.Event()
+            self._reset_counters()
+            self._thread = threading.Thread(target=self._run, name='continuous-profiler', daemon=True)
+            self._thread.start()
+        logger.info(f"Profiler contínuo iniciado no processo {os.getpid()} ({1 / self.interval:.1f} Hz)")
+
+    def stop(self):
+        """Para a thread e grava o período em andamento"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None or self._pid != os.getpid():
+            return
+        self._stop.set()
+        thread.join(timeout=5)
+        self.flush()
+
+    # Amostragem
+
+    def _run(self):
+        own_id = threading.get_ident()
+        interval = self.interval
+        while not self._stop.wait(interval):
+            started = time.perf_counter()
+            self._sample(own_id)
+            elapsed = time.perf_counter() - started
+
+            with self._lock:
+                self.sampling_seconds += elapsed
+            # Mantém o custo abaixo do limite: custo ≈ tempo de amostra / intervalo
+            if elapsed / interval > self.max_overhead:
+                interval = self.interval = min(interval * 2, 10.0)
+                logger.info(f"Profiler contínuo: intervalo ajustado para {interval:.2f}s")
+
+            if time.monotonic() - self._period_monotonic >= self.flush_seconds:
+                self.flush()
+
+    def _sample(self, own_id: int):
+        frames = sys._current_frames()
+        collected: List[str] = []
+        idle = 0
+        for thread_id, frame in frames.items():
+            if thread_id == own_id:
+                continue
+            code = frame.f_code
+            if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                idle += 1
+                continue
+            names = []
+            while frame is not None and len(names) < MAX_STACK_DEPTH:
+                names.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            collected.append(';'.join(reversed(names)))
+        del frames
+
+        with self._lock:
+            self.samples += 1
+            self.idle_samples += idle
+            for stack in collected:
+                if stack in self.stacks or len(self.stacks) < self.max_stacks:
+                    self.stacks[stack] += 1
+                else:
+                    self.stacks[OTHER_STACKS] += 1
+
+    # Resumos
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = max(time.monotonic() - self._period_monotonic, 1e-9)
+            return {
+                'enabled': self.is_enabled(),
+                'running': self.running,
+                'pid': os.getpid(),
+                'hz': round(1 / self.interval, 2),
+                'samples': self.samples,
+                'stacks': len(self.stacks),
+                'idle_samples': self.idle_samples,
+                'overhead_percent': round(self.sampling_seconds / elapsed * 100, 3),
+                'period_started': datetime.fromtimestamp(self.period_started).isoformat(timespec='seconds')
+            }
+
+    def flush(self) -> Optional[str]:
+        """Grava o período atual (collapsed + resumo JSON) e zera os contadores"""
+        with self._lock:
+            if not self.stacks:
+                return None
+            stacks, samples, idle = self.stacks, self.samples, self.idle_samples
+            sampling_seconds, period_started = self.sampling_seconds, self.period_started
+            elapsed = time.monotonic() - self._period_monotonic
+            self._reset_counters()
+
+        name = f"{datetime.fromtimestamp(period_started).strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / f'{name}.collapsed', 'w', encoding='utf-8') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f'{stack} {count}\n')
+            summary = {
+                'id': name,
+                'pid': os.getpid(),
+                'started_at': datetime.fromtimestamp(period_started).isoformat(timespec='seconds'),
+                'ended_at': datetime.now().isoformat(timespec='seconds'),
+                'samples': samples,
+                'idle_samples': idle,
+                'stacks': len(stacks),
+                'overhead_percent': round(sampling_seconds / max(elapsed, 1e-9) * 100, 3),
+                # Tempo estimado: cada amostra de uma pilha representa um intervalo de amostragem
+                'top': top_from_samples(stacks, elapsed * 1000 / max(samples, 1), 40)
+            }
+            with open(self.directory / f'{name}.json', 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+            self._prune()
+            return name
+        except OSError as e:
+            logger.error(f"Erro ao gravar resumo do profiler contínuo: {str(e)}")
+            return None
+
+    def _prune(self):
+        """Remove resumos mais antigos que PROFILER_CONTINUOUS_KEEP_DAYS"""
+        cutoff = time.time() - self.keep_days * 86400
+        for path in self.directory.glob('*.json'):
+            if path.stat().st_mtime < cutoff:
+                path.unlink(missing_ok=True)
+                path.with_suffix('.collapsed').unlink(missing_ok=True)
+
+    def list_summaries(self) -> List[Dict[str, Any]]:
+        summaries = []
+        if not self.directory.exists():
+            return summaries
+        for path in self.directory.glob('*.json'):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    summaries.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(summaries, key=lambda item: item['started_at'], reverse=True)
+
+    def summary_path(self, name: str, kind: str) -> Optional[Path]:
+        if kind not in ('json', 'collapsed') or not all(c.isalnum() or c == '_' for c in name):
+            return None
+        path = self.directory / f'{name}.{kind}'
+        return path if path.exists() else None
+
+
+continuous_profiler = ContinuousProfiler()
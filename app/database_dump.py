@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+"""
+Dump Lógico do Banco de Dados para SKPONTO
+Exporta e restaura tabelas em streaming (PostgreSQL ou SQLite), um arquivo
+JSON Lines comprimido com zstandard por tabela, mais um manifesto com o
+esquema e a revisão do alembic
+"""
+
+import base64
+import decimal
+import hashlib
+import io
+import json
+import logging
+import tempfile
+import uuid
+import warnings
+from contextlib import ExitStack
+from datetime import datetime, date, time
+from typing import Callable, Dict, Any, List, Optional, BinaryIO
+
+import zstandard
+from sqlalchemy import MetaData, and_, bindparam, inspect, or_, select, text
+from sqlalchemy.schema import CreateTable, sort_tables_and_constraints
+
+logger = logging.getLogger(__name__)
+
+DUMP_FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+DEFAULT_CHUNK_SIZE = 1000
+ZSTD_LEVEL = 6
+
+
+def _encode_value(value):
+    """Converte valores do banco em tipos JSON, marcando os que não são nativos"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'$d': value.isoformat()}
+    if isinstance(value, time):
+        return {'$t': value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {'$dec': str(value)}
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {'$b': base64.b64encode(bytes(value)).decode('ascii')}
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if hasattr(value, 'value') and hasattr(value, 'name'):
+        # Enum Python (quando a coluna não foi refletida como texto)
+        return value.name
+    if isinstance(value, (dict, list)):
+        return value
+    return str(value)
+
+
+def _decode_value(value):
+    """Inverso de _encode_value"""
+    if isinstance(value, dict) and len(value) == 1:
+        tag, raw = next(iter(value.items()))
+        if tag == '$dt':
+            return datetime.fromisoformat(raw)
+        if tag == '$d':
+            return date.fromisoformat(raw)
+        if tag == '$t':
+            return time.fromisoformat(raw)
+        if tag == '$dec':
+            return decimal.Decimal(raw)
+        if tag == '$b':
+            return base64.b64decode(raw)
+    return value
+
+
+def _sorted_tables(metadata: MetaData):
+    """Tabelas em ordem de dependência (users <-> work_classes é um ciclo conhecido)"""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return metadata.sorted_tables
+
+
+def _restore_plan(metadata: MetaData, names: List[str]):
+    """Ordem de carga das tabelas e as FKs preenchidas só depois da carga.
+
+    As FKs que fecham um ciclo entre as tabelas restauradas (users <->
+    work_classes) e as auto-referências são gravadas como NULL no INSERT e
+    atualizadas ao final, então nenhuma FK precisa ser desligada (o que exigiria
+    superusuário no PostgreSQL gerenciado).
+    """
+    selected = [metadata.tables[name] for name in names]
+    selected_set = set(selected)
+
+    def nullable(fkc):
+        return all(column.nullable for column in fkc.columns)
+
+    def filter_fn(fkc):
+        # False: dependência fixa; None: pode ser adiada se estiver em um ciclo
+        if fkc.referred_table not in selected_set or not nullable(fkc):
+            return False
+        return None
+
+    ordered = []
+    deferred: Dict[str, List[str]] = {}
+    for table, fkcs in sort_tables_and_constraints(selected, filter_fn=filter_fn):
+        if table is not None:
+            ordered.append(table)
+            continue
+        for fkc in fkcs:
+            deferred.setdefault(fkc.table.name, []).extend(column.name for column in fkc.columns)
+
+    for table in ordered:
+        for fkc in table.foreign_key_constraints:
+            if fkc.referred_table is table and nullable(fkc):
+                deferred.setdefault(table.name, []).extend(column.name for column in fkc.columns)
+
+    for name, columns in deferred.items():
+        if not metadata.tables[name].primary_key.columns:
+            raise ValueError(f"Tabela {name} sem chave primária: referências cíclicas não podem ser restauradas")
+        deferred[name] = sorted(set(columns))
+    return ordered, deferred
+
+
+def _kept_references(metadata: MetaData, names: List[str]) -> Dict[str, List]:
+    """FKs anuláveis de tabelas mantidas (fora da restauração) para tabelas restauradas.
+
+    Ex.: backup_history.created_by -> users. Essas colunas são anuladas antes
+    de apagar as linhas restauradas e regravadas depois da carga.
+    """
+    restored = set(names)
+    references: Dict[str, List] = {}
+    for table in metadata.tables.values():
+        if table.name in restored:
+            continue
+        for fkc in table.foreign_key_constraints:
+            if (fkc.referred_table.name in restored and len(fkc.columns) == 1
+                    and all(column.nullable for column in fkc.columns)):
+                references.setdefault(table.name, []).append(fkc)
+    for name in references:
+        if not metadata.tables[name].primary_key.columns:
+            raise ValueError(f"Tabela {name} sem chave primária: referências às tabelas restauradas não podem ser preservadas")
+    return references
+
+
+class _HashingWriter(io.RawIOBase):
+    """Repassa a escrita para outro arquivo calculando sha256 e tamanho"""
+
+    def __init__(self, target: BinaryIO):
+        self.target = target
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        self.target.write(data)
+        return len(data)
+
+
+class LogicalDumper:
+    """Exporta o banco tabela a tabela com cursores no servidor.
+
+    `open_member(name)` deve devolver um context manager com um arquivo binário
+    gravável; assim o mesmo dump serve para diretório, ZIP ou tar.
+    """
+
+    def __init__(self, engine, chunk_size: int = DEFAULT_CHUNK_SIZE, level: int = ZSTD_LEVEL):
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.level = level
+
+    def _reflect(self) -> MetaData:
+        metadata = MetaData()
+        metadata.reflect(bind=self.engine)
+        return metadata
+
+    def _alembic_revision(self, connection) -> Optional[str]:
+        if not inspect(connection).has_table('alembic_version'):
+            return None
+        return connection.execute(text('SELECT version_num FROM alembic_version')).scalar()
+
+    def dump(self, open_member: Callable[[str], Any]) -> Dict[str, Any]:
+        """Grava todas as tabelas e o manifesto; retorna o manifesto"""
+        metadata = self._reflect()
+        tables = _sorted_tables(metadata)
+        dialect = self.engine.dialect
+
+        manifest = {
+            'format': 'skponto-logical-dump',
+            'version': DUMP_FORMAT_VERSION,
+            'dialect': dialect.name,
+            'created_at': datetime.now().isoformat(),
+            'alembic_revision': None,
+            'compression': 'zstd',
+            'tables': []
+        }
+
+        with self.engine.connect() as connection:
+            if dialect.name == 'postgresql':
+                # Snapshot consistente entre todas as tabelas
+                connection.exec_driver_sql(
+                    'SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY'
+                )
+            manifest['alembic_revision'] = self._alembic_revision(connection)
+
+            for table in tables:
+                manifest['tables'].append(self._dump_table(connection, table, open_member))
+
+        with open_member(MANIFEST_NAME) as f:
+            f.write(json.dumps(manifest, indent=2, ensure_ascii=False).encode('utf-8'))
+
+        return manifest
+
+    def _dump_table(self, connection, table, open_member) -> Dict[str, Any]:
+        file_name = f"{table.name}.jsonl.zst"
+        columns = [column.name for column in table.columns]
+        rows = 0
+
+        compressor = zstandard.ZstdCompressor(level=self.level)
+        with open_member(file_name) as raw:
+            hashing = _HashingWriter(raw)
+            with compressor.stream_writer(hashing, closefd=False) as writer:
+                # stream_results usa cursor nomeado no PostgreSQL (memória limitada ao lote)
+                result = connection.execution_options(
+                    stream_results=True, yield_per=self.chunk_size
+                ).execute(table.select())
+
+                for partition in result.partitions(self.chunk_size):
+                    buffer = []
+                    for row in partition:
+                        buffer.append(json.dumps(
+                            [_encode_value(value) for value in row],
+                            ensure_ascii=False, separators=(',', ':')
+                        ))
+                    writer.write(('\n'.join(buffer) + '\n').encode('utf-8'))
+                    rows += len(partition)
+
+        return {
+            'name': table.name,
+            'file': file_name,
+            'rows': rows,
+            'columns': columns,
+            'sha256': hashing.sha256.hexdigest(),
+            'compressed_size': hashing.size,
+            'schema': str(CreateTable(table).compile(dialect=connection.dialect)).strip()
+        }
+
+
+class LogicalRestorer:
+    """Restaura um dump lógico lendo cada tabela em streaming.
+
+    `open_member(name)` deve devolver um context manager com um arquivo binário
+    legível. As tabelas de destino são substituídas por completo, dentro de
+    uma única transação, em ordem de dependência das FKs (sem desligá-las).
+    """
+
+    def __init__(self, engine, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.engine = engine
+        self.chunk_size = chunk_size
+
+    def read_manifest(self, open_member) -> Dict[str, Any]:
+        with open_member(MANIFEST_NAME) as f:
+            manifest = json.loads(f.read().decode('utf-8'))
+        if manifest.get('format') != 'skponto-logical-dump':
+            raise ValueError('Arquivo não é um dump lógico do SKPONTO')
+        return manifest
+
+    def restore(self, open_member, tables: Optional[List[str]] = None,
+                exclude: Optional[List[str]] = None) -> Dict[str, int]:
+        """Restaura as tabelas do dump (ou apenas as informadas); retorna linhas por tabela"""
+        manifest = self.read_manifest(open_member)
+        entries = [entry for entry in manifest['tables']
+                   if (tables is None or entry['name'] in tables)
+                   and entry['name'] not in (exclude or ())]
+
+        metadata = MetaData()
+        metadata.reflect(bind=self.engine)
+        missing = [entry['name'] for entry in entries if entry['name'] not in metadata.tables]
+        if missing:
+            raise ValueError(f"Tabelas ausentes no banco de destino: {', '.join(missing)}")
+
+        by_name = {entry['name']: entry for entry in entries}
+        ordered, deferred = _restore_plan(metadata, list(by_name))
+        kept = _kept_references(metadata, list(by_name))
+
+        restored = {}
+        pending = {}
+        is_postgres = self.engine.dialect.name == 'postgresql'
+
+        with ExitStack() as spills, self.engine.begin() as connection:
+            # Tabelas mantidas soltam as referências às linhas que serão apagadas
+            kept_pending = {}
+            for name, fkcs in kept.items():
+                kept_pending[name] = self._detach_references(connection, metadata.tables[name], fkcs)
+                if kept_pending[name] is not None:
+                    spills.callback(kept_pending[name].close)
+
+            # Desfaz as referências cíclicas para poder apagar as linhas atuais
+            for name, columns in deferred.items():
+                connection.execute(metadata.tables[name].update().values({column: None for column in columns}))
+
+            # Limpa na ordem inversa de dependência
+            for table in reversed(ordered):
+                connection.execute(table.delete())
+
+            for table in ordered:
+                restored[table.name], pending[table.name] = self._restore_table(
+                    connection, table, by_name[table.name], open_member, deferred.get(table.name, ())
+                )
+                if pending[table.name] is not None:
+                    spills.callback(pending[table.name].close)
+
+            for table in ordered:
+                if pending[table.name] is not None:
+                    self._apply_deferred(connection, table, deferred[table.name], pending[table.name])
+                if is_postgres:
+                    self._reset_sequences(connection, table)
+
+            for name, fkcs in kept.items():
+                self._reattach_references(connection, metadata.tables[name], fkcs, kept_pending[name])
+
+        return restored
+
+    def _detach_references(self, connection, table, fkcs):
+        """Guarda (chave primária + FKs) das linhas que apontam para tabelas restauradas e anula as FKs"""
+        columns = [fkc.columns[0] for fkc in fkcs]
+        primary_key = list(table.primary_key.columns)
+        condition = or_(*[column.isnot(None) for column in columns])
+
+        pending = None
+        result = connection.execution_options(stream_results=True, yield_per=self.chunk_size).execute(
+            select(*primary_key, *columns).where(condition)
+        )
+        for partition in result.partitions(self.chunk_size):
+            if pending is None:
+                pending = tempfile.TemporaryFile('w+', encoding='utf-8')
+            for row in partition:
+                pending.write(json.dumps([_encode_value(value) for value in row],
+                                         ensure_ascii=False, separators=(',', ':')) + '\n')
+        if pending is not None:
+            connection.execute(table.update().where(condition).values({column.name: None for column in columns}))
+        return pending
+
+    def _reattach_references(self, connection, table, fkcs, pending):
+        """Regrava as FKs soltas; as que apontam para linhas que não existem mais ficam NULL"""
+        if pending is None:
+            return
+        # Subconsulta devolve NULL quando a linha referenciada não veio no dump
+        values = {}
+        for fkc in fkcs:
+            referred = fkc.elements[0].column
+            name = fkc.columns[0].name
+            values[name] = select(referred).where(referred == bindparam(f'_{name}')).scalar_subquery()
+        self._apply_deferred(connection, table, list(values), pending, values)
+
+    def _restore_table(self, connection, table, entry, open_member, deferred=()):
+        """Carrega a tabela; retorna (linhas, arquivo temporário com as FKs adiadas ou None).
+
+        As FKs adiadas (chave primária + valores) vão para um arquivo temporário
+        em JSON Lines, então a memória continua limitada ao lote.
+        """
+        columns = [name for name in entry['columns'] if name in table.columns]
+        positions = [entry['columns'].index(name) for name in columns]
+        primary_key = [column.name for column in table.primary_key.columns]
+        rows = 0
+        batch = []
+        pending = None
+
+        decompressor = zstandard.ZstdDecompressor()
+        with open_member(entry['file']) as raw:
+            with decompressor.stream_reader(raw, closefd=False) as reader:
+                for line in io.TextIOWrapper(reader, encoding='utf-8'):
+                    if not line.strip():
+                        continue
+                    values = json.loads(line)
+                    row = {name: _decode_value(values[pos]) for name, pos in zip(columns, positions)}
+                    if any(row.get(name) is not None for name in deferred):
+                        if pending is None:
+                            pending = tempfile.TemporaryFile('w+', encoding='utf-8')
+                        pending.write(json.dumps(
+                            [_encode_value(row.get(name)) for name in primary_key + list(deferred)],
+                            ensure_ascii=False, separators=(',', ':')
+                        ) + '\n')
+                        row.update({name: None for name in deferred if name in row})
+                    batch.append(row)
+                    if len(batch) >= self.chunk_size:
+                        connection.execute(table.insert(), batch)
+                        rows += len(batch)
+                        batch = []
+
+        if batch:
+            connection.execute(table.insert(), batch)
+            rows += len(batch)
+
+        if rows != entry['rows']:
+            raise ValueError(
+                f"Tabela {table.name}: {rows} linhas restauradas, manifesto indica {entry['rows']}"
+            )
+        return rows, pending
+
+    def _apply_deferred(self, connection, table, columns, pending, values=None):
+        """Preenche as FKs adiadas depois que todas as tabelas foram carregadas (em lotes)"""
+        names = [column.name for column in table.primary_key.columns] + list(columns)
+        statement = table.update().where(and_(*[
+            column == bindparam(f'_{column.name}') for column in table.primary_key.columns
+        ])).values(values or {name: bindparam(f'_{name}') for name in columns})
+
+        pending.seek(0)
+        batch = []
+        for line in pending:
+            values = json.loads(line)
+            batch.append({f'_{name}': _decode_value(value) for name, value in zip(names, values)})
+            if len(batch) >= self.chunk_size:
+                connection.execute(statement, batch)
+                batch = []
+        if batch:
+            connection.execute(statement, batch)
+
+    def _reset_sequences(self, connection, table):
+        """Ajusta as sequências do PostgreSQL para o maior id restaurado"""
+        for column in table.primary_key.columns:
+            sequence = connection.execute(
+                text('SELECT pg_get_serial_sequence(:table, :column)'),
+                {'table': table.name, 'column': column.name}
+            ).scalar()
+            if sequence:
+                connection.execute(
+                    text(f'SELECT setval(:sequence, COALESCE((SELECT MAX("{column.name}") '
+                         f'FROM "{table.name}"), 0) + 1, false)'),
+                    {'sequence': sequence}
+                )
@@ -3,11 +3,15 @@ Blueprint para Dashboard de Debug - SKPONTO V2
 Interface web para visualizar erros e logs em tempo real
 """
 
-from flask import Blueprint, render_template, jsonify, request, current_app
+from flask import Blueprint, render_template, jsonify, request, current_app, abort, send_file
 from flask_login import login_required, current_user
 from app.models import UserType
 from app.decorators import admin_required
 from app.debug_system import debug_logger, get_debug_stats
+from app.query_profiler import query_profiler
+from app.continuous_profiler import continuous_profiler
+from app.request_profiler import PROFILE_HEADER, PROFILE_PARAM, request_profiler
+from app.request_metrics import LATENCY_BUCKETS_MS, histogram_quantile, request_metrics
 from datetime import datetime, timedelta
 import json
 import os
@@ -122,7 +126,7 @@ def test_error():
             }
         )
         
-        current_app.logger.info(f"Erro de teste gerado por {current_user.name}")
+        current_app.logger.info(f"Erro de teste gerado por {current_user.nome_completo}")
         
         return jsonify({
             'success': True,
@@ -180,6 +184,121 @@ def api_logs():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@bp.route('/queries')
+@login_required
+@admin_required
+def debug_queries():
+    """Queries por endpoint (janela móvel deste processo)"""
+    return render_template('admin/debug/queries.html',
+                         endpoints=query_profiler.stats.table(),
+                         pid=os.getpid(),
+                         repeat_threshold=current_app.config.get('QUERY_REPEAT_THRESHOLD', 5))
+
+@bp.route('/api/queries')
+@login_required
+@admin_required
+def api_queries():
+    """API com a tabela de queries por endpoint"""
+    try:
+        return jsonify({
+            'success': True,
+            'pid': os.getpid(),
+            'endpoints': query_profiler.stats.table()
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@bp.route('/api/queries/clear', methods=['POST'])
+@login_required
+@admin_required
+def clear_queries():
+    """Zerar a tabela de queries"""
+    query_profiler.stats.clear()
+    return jsonify({'success': True, 'message': 'Estatísticas de queries zeradas'})
+
+@bp.route('/profiles')
+@login_required
+@admin_required
+def debug_profiles():
+    """Perfis de requisições capturados"""
+    return render_template('admin/debug/profiles.html',
+                         profiles=request_profiler.list_profiles(),
+                         continuous=continuous_profiler.status(),
+                         summaries=continuous_profiler.list_summaries(),
+                         profile_param=PROFILE_PARAM,
+                         profile_header=PROFILE_HEADER)
+
+@bp.route('/api/profiles/token', methods=['POST'])
+@login_required
+@admin_required
+def profile_token():
+    """Gera token assinado para perfilar requisições"""
+    try:
+        mode = (request.get_json(silent=True) or request.form).get('mode', 'sample')
+        token = request_profiler.create_token(current_user.id, mode)
+        current_app.logger.info(f"Token de profiler ({mode}) gerado por {current_user.nome_completo}")
+        return jsonify({
+            'success': True,
+            'token': token,
+            'mode': mode,
+            'expires_in': current_app.config.get('PROFILER_TOKEN_MAX_AGE', 3600)
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@bp.route('/profiles/<profile_id>/<kind>')
+@login_required
+@admin_required
+def download_profile(profile_id, kind):
+    """Baixa o perfil (collapsed para flamegraph, prof para pstats, json com o resumo)"""
+    path = request_profiler.profile_path(profile_id, kind)
+    if path is None:
+        abort(404)
+    return send_file(path.resolve(), as_attachment=True, download_name=path.name,
+                     mimetype='application/json' if kind == 'json' else 'application/octet-stream')
+
+@bp.route('/api/profiles/<profile_id>/delete', methods=['POST'])
+@login_required
+@admin_required
+def delete_profile(profile_id):
+    """Remove um perfil capturado"""
+    if not request_profiler.delete(profile_id):
+        return jsonify({'success': False, 'error': 'Perfil não encontrado'}), 404
+    return jsonify({'success': True})
+
+@bp.route('/api/continuous-profiler', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def continuous_profiler_status():
+    """Estado do profiler contínuo; POST {"enabled": bool} liga/desliga em todos os workers"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or request.form
+        enabled = str(data.get('enabled', '')).lower() in ('1', 'true', 'on')
+        continuous_profiler.set_enabled(enabled)
+        current_app.logger.info(
+            f"Profiler contínuo {'ligado' if enabled else 'desligado'} por {current_user.nome_completo}"
+        )
+    return jsonify({'success': True, 'status': continuous_profiler.status()})
+
+@bp.route('/api/continuous-profiler/flush', methods=['POST'])
+@login_required
+@admin_required
+def continuous_profiler_flush():
+    """Grava agora o período em andamento deste worker"""
+    name = continuous_profiler.flush()
+    return jsonify({'success': True, 'summary': name})
+
+@bp.route('/profiles/continuous/<name>/<kind>')
+@login_required
+@admin_required
+def download_continuous_profile(name, kind):
+    """Baixa um resumo do profiler contínuo"""
+    path = continuous_profiler.summary_path(name, kind)
+    if path is None:
+        abort(404)
+    return send_file(path.resolve(), as_attachment=True, download_name=path.name,
+                     mimetype='application/json' if kind == 'json' else 'application/octet-stream')
+
 @bp.route('/realtime')
 @login_required
 @admin_required
@@ -193,12 +312,19 @@ def debug_realtime():
 def api_realtime():
     """API para dados em tempo real"""
     try:
-        # Simular métricas do sistema
+        # Métricas de requisições somadas entre os workers
+        collected = request_metrics.collect()
+        endpoints = request_metrics.table(collected)
+        all_buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        for data in collected['endpoints'].values():
+            all_buckets = [a + b for a, b in zip(all_buckets, data['buckets'])]
+        
+        # CPU/memória continuam simulados
         metrics = {
             'cpu_percent': 15.2,
             'memory_percent': 45.8,
-            'active_connections': 12,
-            'response_time': 85
+            'active_connections': collected['in_flight'],
+            'response_time': histogram_quantile(0.95, all_buckets) or 0
         }
         
         # Contar erros e requisições recentes (última hora)
@@ -206,7 +332,6 @@ def api_realtime():
         one_hour_ago = now - timedelta(hours=1)
         
         recent_errors = 0
-        recent_requests = 0
         
         for error in debug_logger.errors:
             try:
@@ -216,8 +341,8 @@ def api_realtime():
             except:
                 continue
         
-        # Simular contagem de requisições
-        recent_requests = recent_errors * 10  # Estimativa
+        # Total acumulado; a página calcula a diferença entre consultas
+        requests_total = sum(row['count'] for row in endpoints)
         
         # Eventos recentes
         recent_events = []
@@ -231,8 +356,9 @@ def api_realtime():
         return jsonify({
             'success': True,
             'errors_count': recent_errors,
-            'requests_count': recent_requests,
+            'requests_total': requests_total,
             'metrics': metrics,
+            'endpoints': endpoints,
             'recent_events': recent_events,
             'new_errors': []  # Para notificações
         })
@@ -13,6 +13,8 @@ from flask import request, jsonify, current_app, g
 import json
 import os
 
+from app.log_pipeline import log_pipeline
+
 class DebugLogger:
     """Logger especializado para debug de erros"""
     
@@ -45,8 +47,8 @@ class DebugLogger:
         file_handler.setFormatter(formatter)
         console_handler.setFormatter(formatter)
         
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
+        # Escrita feita pela thread do pipeline de logging (não bloqueia a requisição)
+        log_pipeline.attach(self.logger, [file_handler, console_handler])
     
     def log_error(self, error, context=None):
         """Log detalhado de erro"""
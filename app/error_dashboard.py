@@ -11,6 +11,8 @@ from datetime import datetime, timedelta
 from flask import Blueprint, render_template, request, jsonify, current_app
 from flask_login import login_required
 from app.decorators import admin_required
+from app.error_store import get_error_index
+from app.log_pipeline import log_pipeline
 
 # Blueprint para dashboard de erros
 error_dashboard = Blueprint('error_dashboard', __name__, url_prefix='/admin/errors')
@@ -43,6 +45,7 @@ def api_stats():
     
     try:
         stats = get_error_statistics()
+        stats['logging'] = log_pipeline.stats()
         return jsonify(stats)
     except Exception as e:
         current_app.logger.error(f"Erro na API de estatísticas: {str(e)}")
@@ -75,7 +78,7 @@ def clear_logs():
         return jsonify({'error': str(e)}), 500
 
 def get_error_statistics():
-    """Obtém estatísticas de erros"""
+    """Obtém estatísticas de erros (a partir do índice incremental do log)"""
     
     stats = {
         'total_errors': 0,
@@ -87,49 +90,7 @@ def get_error_statistics():
     }
     
     try:
-        log_dir = 'logs'
-        if not os.path.exists(log_dir):
-            return stats
-        
-        error_log_file = os.path.join(log_dir, 'skponto_errors.log')
-        if not os.path.exists(error_log_file):
-            return stats
-        
-        now = datetime.now()
-        
-        with open(error_log_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        for line in lines:
-            if 'ERROR' in line:
-                stats['total_errors'] += 1
-                
-                # Extrair timestamp
-                try:
-                    timestamp_str = line.split(' - ')[0]
-                    timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S,%f')
-                    
-                    # Contar erros recentes
-                    if now - timestamp <= timedelta(hours=24):
-                        stats['errors_24h'] += 1
-                    
-                    if now - timestamp <= timedelta(days=7):
-                        stats['errors_7d'] += 1
-                    
-                    # Contar tipos de erro
-                    if 'KeyError' in line:
-                        stats['error_types']['KeyError'] = stats['error_types'].get('KeyError', 0) + 1
-                    elif 'ValueError' in line:
-                        stats['error_types']['ValueError'] = stats['error_types'].get('ValueError', 0) + 1
-                    elif 'AttributeError' in line:
-                        stats['error_types']['AttributeError'] = stats['error_types'].get('AttributeError', 0) + 1
-                    elif 'TypeError' in line:
-                        stats['error_types']['TypeError'] = stats['error_types'].get('TypeError', 0) + 1
-                    else:
-                        stats['error_types']['Other'] = stats['error_types'].get('Other', 0) + 1
-                        
-                except Exception:
-                    continue
+        stats.update(get_error_index().statistics())
         
         # Calcular taxa de erro (erros por hora nas últimas 24h)
         if stats['errors_24h'] > 0:
@@ -144,113 +105,20 @@ def get_error_statistics():
     return stats
 
 def get_recent_errors(limit=50, hours=24):
-    """Obtém erros recentes"""
-    
-    errors = []
+    """Obtém erros recentes (mais recente primeiro)"""
     
     try:
-        log_dir = 'logs'
-        if not os.path.exists(log_dir):
-            return errors
-        
-        error_log_file = os.path.join(log_dir, 'skponto_errors.log')
-        if not os.path.exists(error_log_file):
-            return errors
-        
-        now = datetime.now()
-        cutoff_time = now - timedelta(hours=hours)
-        
-        with open(error_log_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        current_error = None
-        
-        for line in lines:
-            if 'ERROR' in line and '===' in line:
-                # Início de um novo erro
-                if current_error and len(errors) < limit:
-                    errors.append(current_error)
-                
-                try:
-                    timestamp_str = line.split(' - ')[0]
-                    timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S,%f')
-                    
-                    if timestamp >= cutoff_time:
-                        current_error = {
-                            'timestamp': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                            'content': line.strip(),
-                            'details': []
-                        }
-                    else:
-                        current_error = None
-                        
-                except Exception:
-                    current_error = None
-                    
-            elif current_error and line.strip():
-                current_error['details'].append(line.strip())
-        
-        # Adicionar último erro se existir
-        if current_error and len(errors) < limit:
-            errors.append(current_error)
-        
-        # Ordenar por timestamp (mais recente primeiro)
-        errors.reverse()
-        
+        return get_error_index().recent(limit=limit, hours=hours)
     except Exception as e:
         current_app.logger.error(f"Erro ao obter erros recentes: {str(e)}")
     
-    return errors
+    return []
 
 def get_error_trends():
-    """Obtém tendências de erros por hora"""
-    
-    trends = {}
+    """Obtém tendências de erros por hora nas últimas 24 horas"""
     
     try:
-        log_dir = 'logs'
-        if not os.path.exists(log_dir):
-            return trends
-        
-        error_log_file = os.path.join(log_dir, 'skponto_errors.log')
-        if not os.path.exists(error_log_file):
-            return trends
-        
-        now = datetime.now()
-        
-        # Inicializar últimas 24 horas
-        for i in range(24):
-            hour = (now - timedelta(hours=i)).strftime('%Y-%m-%d %H:00')
-            trends[hour] = 0
-        
-        with open(error_log_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        for line in lines:
-            if 'ERROR' in line:
-                try:
-                    timestamp_str = line.split(' - ')[0]
-                    timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S,%f')
-                    
-                    # Agrupar por hora
-                    hour_key = timestamp.strftime('%Y-%m-%d %H:00')
-                    
-                    if hour_key in trends:
-                        trends[hour_key] += 1
-                        
-                except Exception:
-                    continue
-        
-        # Converter para lista ordenada
-        sorted_trends = []
-        for hour in sorted(trends.keys()):
-            sorted_trends.append({
-                'hour': hour,
-                'count': trends[hour]
-            })
-        
-        return sorted_trends
-        
+        return [{'hour': hour, 'count': count} for hour, count in get_error_index().hourly(24)]
     except Exception as e:
         current_app.logger.error(f"Erro ao obter tendências: {str(e)}")
     
@@ -282,6 +150,9 @@ def clear_old_logs(days=30):
                 current_app.logger.error(f"Erro ao remover log {log_file}: {str(e)}")
                 continue
         
+        # O índice mantém os erros dos arquivos removidos só pelo mesmo período
+        get_error_index().prune(days)
+        
     except Exception as e:
         current_app.logger.error(f"Erro ao limpar logs: {str(e)}")
     
@@ -14,6 +14,7 @@ from typing import Optional
 from datetime import datetime
 from logging.handlers import RotatingFileHandler
 from flask import Flask, request, jsonify, render_template
+from app.log_pipeline import JsonFormatter, SqlStatementSampler, log_pipeline
 
 class AdvancedErrorHandler:
     """Classe para tratamento avançado de erros"""
@@ -43,7 +44,7 @@ class AdvancedErrorHandler:
             '%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(funcName)s() - %(message)s'
         )
         
-        # Handler para arquivo com rotação
+        # Handler para arquivo com rotação (formato texto: lido pelo índice de erros)
         file_handler = RotatingFileHandler(
             'logs/skponto_errors.log', 
             maxBytes=10*1024*1024,  # 10MB
@@ -52,13 +53,13 @@ class AdvancedErrorHandler:
         file_handler.setFormatter(detailed_formatter)
         file_handler.setLevel(logging.ERROR)
         
-        # Handler para debug
+        # Handler para debug (uma linha JSON por registro)
         debug_handler = RotatingFileHandler(
-            'logs/skponto_debug.log', 
+            'logs/skponto_debug.jsonl', 
             maxBytes=10*1024*1024,  # 10MB
             backupCount=3
         )
-        debug_handler.setFormatter(detailed_formatter)
+        debug_handler.setFormatter(JsonFormatter())
         debug_handler.setLevel(logging.DEBUG)
         
         # Handler para console
@@ -66,15 +67,18 @@ class AdvancedErrorHandler:
         console_handler.setFormatter(detailed_formatter)
         console_handler.setLevel(logging.INFO)
         
-        # Configurar logger principal
-        self.app.logger.setLevel(logging.DEBUG)
-        self.app.logger.addHandler(file_handler)
-        self.app.logger.addHandler(debug_handler)
-        self.app.logger.addHandler(console_handler)
+        # Configurar logger principal: a requisição só enfileira, a escrita
+        # nos arquivos fica com a thread do pipeline
+        level = logging.DEBUG if self.app.debug else self.app.config.get('LOG_LEVEL', 'INFO')
+        self.app.logger.setLevel(level)
+        log_pipeline.configure(self.app.config.get('LOG_QUEUE_SIZE', 10000))
+        log_pipeline.attach(self.app.logger, [file_handler, debug_handler, console_handler])
         
-        # Configurar logger do SQLAlchemy
-        logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
-        logging.getLogger('sqlalchemy.engine').addHandler(debug_handler)
+        # SQL: só por amostragem/requisições lentas (logger app.sql), nunca sempre ligado
+        SqlStatementSampler(
+            sample_rate=self.app.config.get('SQL_LOG_SAMPLE_RATE', 0.0),
+            slow_ms=self.app.config.get('SQL_LOG_SLOW_MS', 0)
+        ).init_app(self.app)
     
     def setup_error_handlers(self):
         """Configura handlers de erro específicos"""
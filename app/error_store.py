@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+Índice de Erros do SKPONTO
+Lê o log de erros (e os arquivos rotacionados) de forma incremental e mantém
+um índice SQLite com cada erro, contadores por hora e por tipo
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+LOG_DIR = 'logs'
+ERROR_LOG_NAME = 'skponto_errors.log'
+INDEX_NAME = 'error_index.sqlite3'
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Início de cada registro do logging: "2025-07-16 13:01:11,597 - app - ERROR - ..."
+RECORD_START = re.compile(rb'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),(\d{3}) - [^\n]*? - (\w+) - ')
+ERROR_TYPE_LINE = re.compile(r'^Tipo: (\w+)', re.MULTILINE)
+EXCEPTION_NAME = re.compile(r'\b([A-Z]\w*(?:Error|Exception))\b')
+ERROR_LEVELS = (b'ERROR', b'CRITICAL')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS errors (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    hour TEXT NOT NULL,
+    error_type TEXT NOT NULL,
+    content TEXT NOT NULL,
+    details TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_errors_ts ON errors (ts);
+CREATE TABLE IF NOT EXISTS hour_buckets (
+    hour TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS type_counts (
+    error_type TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cursors (
+    fingerprint TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def _error_type(text: str) -> str:
+    """Tipo do erro: linha 'Tipo:' do error_handler ou o nome da exceção no traceback"""
+    match = ERROR_TYPE_LINE.search(text)
+    if match:
+        return match.group(1)
+    names = EXCEPTION_NAME.findall(text)
+    return names[-1] if names else 'Other'
+
+
+def _fingerprint(path: str) -> Optional[str]:
+    """Identifica o arquivo pela primeira linha (mantida ao ser rotacionado/renomeado)"""
+    with open(path, 'rb') as f:
+        first_line = f.readline(4096)
+    if not first_line.endswith(b'\n'):
+        return None
+    return hashlib.sha1(first_line).hexdigest()
+
+
+class ErrorLogIndex:
+    """Índice incremental do log de erros.
+
+    Cada arquivo de log tem um cursor (offset já lido) identificado pela
+    primeira linha, então a rotação (.log -> .log.1 -> ...) não provoca
+    releitura. Novos registros entram na mesma transação que atualiza os
+    contadores por hora e por tipo; as consultas do dashboard usam só o índice.
+    """
+
+    def __init__(self, log_dir: str = LOG_DIR, log_name: str = ERROR_LOG_NAME,
+                 index_path: Optional[str] = None, refresh_interval: float = 5.0):
+        self.log_dir = log_dir
+        self.log_name = log_name
+        self.index_path = index_path or os.path.join(log_dir, INDEX_NAME)
+        self.refresh_interval = refresh_interval
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+        connection = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.executescript(SCHEMA)
+        return connection
+
+    def _log_files(self) -> List[str]:
+        """Arquivos do log, do mais antigo (.log.N) ao atual"""
+        base = os.path.join(self.log_dir, self.log_name)
+        rotated = []
+        if os.path.isdir(self.log_dir):
+            for name in os.listdir(self.log_dir):
+                suffix = name[len(self.log_name) + 1:]
+                if name.startswith(f"{self.log_name}.") and suffix.isdigit():
+                    rotated.append((int(suffix), os.path.join(self.log_dir, name)))
+        files = [path for _, path in sorted(rotated, reverse=True)]
+        if os.path.exists(base):
+            files.append(base)
+        return files
+
+    def refresh(self, force: bool = False) -> int:
+        """Indexa o que foi escrito desde a última leitura; retorna novos erros"""
+        if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+            return 0
+        with self._lock:
+            self._last_refresh = time.monotonic()
+            connection = self._connect()
+            try:
+                # BEGIN IMMEDIATE: outros processos esperam, e não indexam o mesmo trecho
+                connection.execute('BEGIN IMMEDIATE')
+                added = 0
+                seen = []
+                for path in self._log_files():
+                    fingerprint = _fingerprint(path)
+                    if fingerprint is None:
+                        continue
+                    seen.append(fingerprint)
+                    added += self._ingest_file(connection, path, fingerprint)
+
+                if seen:
+                    # Cursores de arquivos que já saíram da rotação
+                    placeholders = ','.join('?' * len(seen))
+                    connection.execute(f'DELETE FROM cursors WHERE fingerprint NOT IN ({placeholders})', seen)
+                connection.execute('COMMIT')
+                return added
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+            finally:
+                connection.close()
+
+    def _ingest_file(self, connection: sqlite3.Connection, path: str, fingerprint: str) -> int:
+        row = connection.execute('SELECT offset FROM cursors WHERE fingerprint = ?', (fingerprint,)).fetchone()
+        offset = row[0] if row else 0
+        size = os.path.getsize(path)
+        if size < offset:
+            offset = 0  # arquivo truncado com a mesma primeira linha
+
+        added = 0
+        if size > offset:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                data = f.read(size - offset)
+            # Só linhas completas; o restante fica para a próxima leitura
+            end = data.rfind(b'\n') + 1
+            if end:
+                added = self._index_records(connection, data[:end])
+                offset += end
+
+        connection.execute(
+            'INSERT INTO cursors (fingerprint, path, offset, updated_at) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(fingerprint) DO UPDATE SET path = excluded.path, offset = excluded.offset, '
+            'updated_at = excluded.updated_at',
+            (fingerprint, path, offset, time.time())
+        )
+        return added
+
+    def _index_records(self, connection: sqlite3.Connection, data: bytes) -> int:
+        rows = []
+        current = None
+        for line in data.splitlines():
+            match = RECORD_START.match(line)
+            if match:
+                if current:
+                    rows.append(current)
+                current = None
+                if match.group(3) in ERROR_LEVELS:
+                    timestamp = datetime.strptime(match.group(1).decode('ascii'), '%Y-%m-%d %H:%M:%S')
+                    current = (timestamp.timestamp() + int(match.group(2)) / 1000.0, timestamp,
+                               line.decode('utf-8', errors='replace').strip(), [])
+            elif current and line.strip():
+                current[3].append(line.decode('utf-8', errors='replace').strip())
+        if current:
+            rows.append(current)
+
+        hours: Dict[str, int] = {}
+        types: Dict[str, int] = {}
+        records = []
+        for ts, timestamp, content, details in rows:
+            hour = timestamp.strftime('%Y-%m-%d %H:00')
+            error_type = _error_type('\n'.join([content] + details))
+            hours[hour] = hours.get(hour, 0) + 1
+            types[error_type] = types.get(error_type, 0) + 1
+            records.append((ts, hour, error_type, content, '\n'.join(details)))
+
+        connection.executemany(
+            'INSERT INTO errors (ts, hour, error_type, content, details) VALUES (?, ?, ?, ?, ?)', records
+        )
+        connection.executemany(
+            'INSERT INTO hour_buckets (hour, count) VALUES (?, ?) '
+            'ON CONFLICT(hour) DO UPDATE SET count = count + excluded.count', hours.items()
+        )
+        connection.executemany(
+            'INSERT INTO type_counts (error_type, count) VALUES (?, ?) '
+            'ON CONFLICT(error_type) DO UPDATE SET count = count + excluded.count', types.items()
+        )
+        return len(records)
+
+    def prune(self, days: int) -> int:
+        """Remove do índice erros mais antigos que `days` dias (com os contadores)"""
+        cutoff = datetime.now() - timedelta(days=days)
+        with self._lock:
+            connection = self._connect()
+            try:
+                connection.execute('BEGIN IMMEDIATE')
+                removed_types = connection.execute(
+                    'SELECT error_type, COUNT(*) FROM errors WHERE ts < ? GROUP BY error_type',
+                    (cutoff.timestamp(),)
+                ).fetchall()
+                connection.executemany(
+                    'UPDATE type_counts SET count = count - ? WHERE error_type = ?',
+                    [(count, error_type) for error_type, count in removed_types]
+                )
+                connection.execute('DELETE FROM type_counts WHERE count <= 0')
+                removed = connection.execute('DELETE FROM errors WHERE ts < ?', (cutoff.timestamp(),)).rowcount
+                connection.execute('DELETE FROM hour_buckets WHERE hour < ?', (cutoff.strftime('%Y-%m-%d %H:00'),))
+                connection.execute('COMMIT')
+                return removed
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+            finally:
+                connection.close()
+
+    def statistics(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Totais, últimas 24h/7 dias e contagem por tipo"""
+        self.refresh()
+        now = now or datetime.now()
+        connection = self._connect()
+        try:
+            def count_since(delta: timedelta) -> int:
+                return connection.execute(
+                    'SELECT COUNT(*) FROM errors WHERE ts >= ?', ((now - delta).timestamp(),)
+                ).fetchone()[0]
+
+            error_types = dict(connection.execute(
+                'SELECT error_type, count FROM type_counts ORDER BY count DESC'
+            ).fetchall())
+            return {
+                'total_errors': sum(error_types.values()),
+                'errors_24h': count_since(timedelta(hours=24)),
+                'errors_7d': count_since(timedelta(days=7)),
+                'error_types': error_types
+            }
+        finally:
+            connection.close()
+
+    def recent(self, limit: int = 50, hours: int = 24,
+               now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Erros mais recentes primeiro"""
+        self.refresh()
+        cutoff = (now or datetime.now()) - timedelta(hours=hours)
+        connection = self._connect()
+        try:
+            rows = connection.execute(
+                'SELECT ts, content, details FROM errors WHERE ts >= ? ORDER BY ts DESC, id DESC LIMIT ?',
+                (cutoff.timestamp(), limit)
+            ).fetchall()
+        finally:
+            connection.close()
+        return [{
+            'timestamp': datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S'),
+            'content': content,
+            'details': details.split('\n') if details else []
+        } for ts, content, details in rows]
+
+    def hourly(self, hours: int = 24, now: Optional[datetime] = None) -> List[Tuple[str, int]]:
+        """Contagem por hora nas últimas `hours` horas (incluindo horas sem erro)"""
+        self.refresh()
+        now = now or datetime.now()
+        keys = [(now - timedelta(hours=i)).strftime('%Y-%m-%d %H:00') for i in range(hours)]
+        connection = self._connect()
+        try:
+            counts = dict(connection.execute(
+                'SELECT hour, count FROM hour_buckets WHERE hour >= ?', (min(keys),)
+            ).fetchall())
+        finally:
+            connection.close()
+        return [(hour, counts.get(hour, 0)) for hour in sorted(keys)]
+
+
+_index: Optional[ErrorLogIndex] = None
+
+
+def get_error_index() -> ErrorLogIndex:
+    """Índice compartilhado pelo processo"""
+    global _index
+    if _index is None:
+        _index = ErrorLogIndex()
+    return _index
@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+"""
+Canal de Eventos em Tempo Real (Server-Sent Events) para SKPONTO
+Pub/sub em memória alimentado por um log de eventos em arquivo compartilhado
+entre os workers; /api/stream entrega notificações novas, contador de não
+lidas e mudanças no ponto do próprio usuário
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Notification, TimeRecord
+
+try:
+    import fcntl
+except ImportError:  # Windows: apenas o lock entre threads do processo
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'event_stream_pending'
+LOG_PREFIX = 'events-'
+EVENT_NOTIFICATION = 'notification'
+EVENT_UNREAD = 'unread'
+EVENT_PONTO = 'ponto'
+EVENT_RESET = 'reset'
+
+
+def parse_event_id(value) -> Optional[Tuple[int, int]]:
+    """'<geração>-<posição>' -> (geração, posição); inválido vira None"""
+    try:
+        generation, offset = str(value).split('-', 1)
+        return int(generation), int(offset)
+    except (TypeError, ValueError):
+        return None
+
+
+def format_event(name: str, data: Any, event_id: Optional[Tuple[int, int]] = None) -> str:
+    lines = []
+    if event_id:
+        lines.append(f'id: {event_id[0]}-{event_id[1]}')
+    lines.append(f'event: {name}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False, default=str)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """Conexão SSE de um usuário: fila própria, alimentada pela thread do broker"""
+
+    def __init__(self, user, max_queue: int):
+        self.user_id = user.id
+        self.user_type = user.user_type.value if user.user_type else None
+        self.work_class_id = user.work_class_id
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.overflow = False
+
+    def matches(self, record: Dict[str, Any]) -> bool:
+        if record.get('u') is not None:
+            return self.user_id in record['u']
+        audience = record.get('a') or {}
+        if 'user_type' in audience:
+            return audience['user_type'] == self.user_type
+        if 'work_class_id' in audience:
+            return audience['work_class_id'] == self.work_class_id
+        return True
+
+    def put(self, event_id: Tuple[int, int], record: Dict[str, Any]):
+        try:
+            self.queue.put_nowait((event_id, record['e'], record.get('d') or {}))
+        except queue.Full:
+            # Cliente lento: descarta e pede ao cliente que recarregue o estado
+            self.overflow = True
+
+
+class EventBroker:
+    """Pub/sub de eventos por usuário entre threads e workers.
+
+    - Eventos são anexados a `events-<geração>.log` (JSON por linha, lock com
+      flock); o ID do evento é `<geração>-<posição no arquivo>`, igual em
+      todos os workers, o que permite retomar com Last-Event-ID
+    - Uma thread por worker lê o log (acordada na hora para eventos locais e a
+      cada SSE_POLL_INTERVAL para os dos outros workers) e distribui às
+      conexões abertas do processo
+    - O arquivo é rotacionado em SSE_LOG_MAX_BYTES; ficam a geração atual e
+      a anterior (retomada além disso recebe o evento "reset")
+    - No máximo SSE_MAX_STREAMS conexões por worker, para não ocupar todas
+      as threads que atendem as requisições normais
+    """
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.directory = Path('storage/events')
+        self.poll_interval = 0.5
+        self.heartbeat = 15
+        self.max_seconds = 300
+        self.max_streams = 4
+        self.max_queue = 500
+        self.max_replay = 200
+        self.log_max_bytes = 5 * 1024 * 1024
+        self.retry_ms = 5000
+        self._subscriptions: List[Subscription] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+        self._position: Optional[Tuple[int, int]] = None
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('SSE_ENABLED', True)
+        self.directory = Path(app.config.get('SSE_DIR', 'storage/events'))
+        self.poll_interval = app.config.get('SSE_POLL_INTERVAL', 0.5)
+        self.heartbeat = app.config.get('SSE_HEARTBEAT_SECONDS', 15)
+        self.max_seconds = app.config.get('SSE_MAX_SECONDS', 300)
+        self.max_streams = app.config.get('SSE_MAX_STREAMS') or self._default_max_streams()
+        self.max_queue = app.config.get('SSE_MAX_QUEUE', 500)
+        self.max_replay = app.config.get('SSE_MAX_REPLAY', 200)
+        self.log_max_bytes = app.config.get('SSE_LOG_MAX_BYTES', 5 * 1024 * 1024)
+        self.retry_ms = app.config.get('SSE_RETRY_MS', 5000)
+        app.extensions['event_broker'] = self
+
+    @staticmethod
+    def _default_max_streams() -> int:
+        """Metade das threads do worker (gthread); gevent aguenta muito mais; sync nenhuma"""
+        worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+        if 'gevent' in worker_class or 'eventlet' in worker_class:
+            return 100
+        if worker_class == 'sync':
+            return 0
+        return max(int(os.environ.get('GUNICORN_THREADS', 8)) // 2, 1)
+
+    # Log compartilhado
+
+    def _log_path(self, generation: int) -> Path:
+        return self.directory / f'{LOG_PREFIX}{generation:06d}.log'
+
+    def _generations(self) -> List[int]:
+        generations = []
+        for path in self.directory.glob(f'{LOG_PREFIX}*.log'):
+            try:
+                generations.append(int(path.stem[len(LOG_PREFIX):]))
+            except ValueError:
+                continue
+        return sorted(generations)
+
+    def _current_generation(self) -> int:
+        generations = self._generations()
+        return generations[-1] if generations else 1
+
+    def publish(self, records: Iterable[Dict[str, Any]]):
+        """Anexa eventos ao log compartilhado e acorda a leitura deste worker"""
+        lines = [json.dumps(dict(record, p=os.getpid()), ensure_ascii=False, default=str) + '\n'
+                 for record in records]
+        if not self.enabled or not lines:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._write_lock, open(self.directory / '.lock', 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                generation = self._current_generation()
+                path = self._log_path(generation)
+                if path.exists() and path.stat().st_size >= self.log_max_bytes:
+                    generation += 1
+                    path = self._log_path(generation)
+                    self._log_path(generation - 2).unlink(missing_ok=True)
+                with open(path, 'a', encoding='utf-8') as f:
+                    f.writelines(lines)
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self._wake.set()
+
+    def _read_from(self, position: Tuple[int, int]):
+        """Linhas completas a partir de `position`: [(id, registro)], nova posição"""
+        generation, offset = position
+        items = []
+        while True:
+            path = self._log_path(generation)
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    for raw in f:
+                        if not raw.endswith(b'\n'):
+                            break  # escrita em andamento: relida no próximo ciclo
+                        try:
+                            items.append(((generation, offset), json.loads(raw)))
+                        except ValueError:
+                            pass
+                        offset += len(raw)
+            except FileNotFoundError:
+                pass
+            if not self._log_path(generation + 1).exists():
+                return items, (generation, offset)
+            generation, offset = generation + 1, 0
+
+    def _end_position(self) -> Tuple[int, int]:
+        generation = self._current_generation()
+        path = self._log_path(generation)
+        return generation, path.stat().st_size if path.exists() else 0
+
+    # Conexões
+
+    def subscribe(self, user) -> Optional[Subscription]:
+        """Registra uma conexão; None quando o limite do worker foi atingido"""
+        self._check_fork()
+        with self._lock:
+            if not self.enabled or len(self._subscriptions) >= self.max_streams:
+                return None
+            subscription = Subscription(user, self.max_queue)
+            self._subscriptions.append(subscription)
+            self._ensure_thread()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    @property
+    def active_streams(self) -> int:
+        return len(self._subscriptions)
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            # Processo filho (fork): a thread do pai não existe aqui
+            self._pid = os.getpid()
+            self._thread = None
+            self._subscriptions = []
+            self._lock = threading.Lock()
+            self._write_lock = threading.Lock()
+            self._wake = threading.Event()
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._position = self._end_position()
+        self._thread = threading.Thread(target=self._run, name='event-stream', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            with self._lock:
+                subscriptions = list(self._subscriptions)
+            try:
+                items, self._position = self._read_from(self._position)
+            except OSError as e:
+                logger.error(f"Erro ao ler o log de eventos: {str(e)}")
+                continue
+            for event_id, record in items:
+                for subscription in subscriptions:
+                    if subscription.matches(record):
+                        subscription.put(event_id, record)
+
+    def replay(self, subscription: Subscription, last_event_id: Tuple[int, int]):
+        """Eventos do usuário posteriores a last_event_id; None se não for mais possível"""
+        generation, offset = last_event_id
+        if not self._log_path(generation).exists():
+            return None
+        items, _ = self._read_from((generation, offset))
+        replayed = [(event_id, record) for event_id, record in items
+                    if event_id > last_event_id and subscription.matches(record)]
+        if len(replayed) > self.max_replay:
+            return None
+        return replayed
+
+    # Resposta SSE
+
+    def stream(self, subscription: Subscription, last_event_id=None,
+               unread: Optional[Callable[[], int]] = None):
+        """Gerador da resposta text/event-stream.
+
+        Reenvia o que foi perdido desde Last-Event-ID, manda o contador de não
+        lidas (função `unread`) na conexão e a cada mudança, um comentário de
+        heartbeat a cada SSE_HEARTBEAT_SECONDS e encerra após SSE_MAX_SECONDS
+        (o EventSource reconecta sozinho com o último ID).
+        """
+        last_id = parse_event_id(last_event_id) if last_event_id else None
+        try:
+            yield f'retry: {self.retry_ms}\n\n'
+            if last_id:
+                replayed = self.replay(subscription, last_id)
+                if replayed is None:
+                    yield format_event(EVENT_RESET, {})
+                    replayed = []
+                for event_id, record in replayed:
+                    last_id = event_id
+                    if record['e'] != EVENT_UNREAD:
+                        yield format_event(record['e'], record.get('d') or {}, event_id)
+            if unread:
+                yield format_event(EVENT_UNREAD, {'count': unread()}, last_id)
+
+            deadline = time.monotonic() + self.max_seconds
+            while time.monotonic() < deadline:
+                try:
+                    event_id, name, data = subscription.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ': ping\n\n'
+                    continue
+
+                if subscription.overflow:
+                    subscription.overflow = False
+                    yield format_event(EVENT_RESET, {})
+                if last_id and event_id <= last_id:
+                    continue  # já enviado na retomada
+                last_id = event_id
+
+                if name != EVENT_UNREAD:
+                    yield format_event(name, data, event_id)
+                if unread and name in (EVENT_NOTIFICATION, EVENT_UNREAD):
+                    yield format_event(EVENT_UNREAD, {'count': unread()}, event_id)
+        finally:
+            self.unsubscribe(subscription)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'pid': os.getpid(),
+            'active_streams': self.active_streams,
+            'max_streams': self.max_streams,
+            'position': self._position
+        }
+
+
+event_broker = EventBroker()
+
+
+# Eventos pendentes da transação: publicados só depois do commit
+
+def queue_event(name: str, data: Optional[Dict[str, Any]] = None, user_ids=None, audience=None):
+    """Agenda um evento para depois do commit da sessão atual.
+
+    user_ids: destinatários; audience: {'user_type': ...}, {'work_class_id': ...}
+    ou {} para todos (comunicados)
+    """
+    if not event_broker.enabled:
+        return
+    record = {'e': name, 'd': data or {}}
+    if user_ids is not None:
+        record['u'] = list(user_ids)
+    else:
+        record['a'] = audience or {}
+    db.session.info.setdefault(PENDING_KEY, []).append(record)
+
+
+def _notification_data(state) -> Dict[str, Any]:
+    tipo = state.get('tipo')
+    created_at = state.get('created_at')
+    return {
+        'id': state.get('id'),
+        'kind': 'personal',
+        'titulo': state.get('titulo'),
+        'mensagem': state.get('mensagem'),
+        'tipo': tipo.value if tipo is not None else 'info',
+        'created_at': created_at.isoformat() if created_at else None
+    }
+
+
+def _ponto_data(state) -> Dict[str, Any]:
+    def iso(value):
+        return value.isoformat() if value is not None else None
+    return {
+        'id': state.get('id'),
+        'data': iso(state.get('data')),
+        'entrada': iso(state.get('entrada')),
+        'saida': iso(state.get('saida')),
+        'horas_trabalhadas': state.get('horas_trabalhadas')
+    }
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_events(session, flush_context):
+    """Eventos das notificações e registros de ponto gravados pelo ORM"""
+    if not event_broker.enabled:
+        return
+    pending = session.info.setdefault(PENDING_KEY, [])
+    for obj in session.new:
+        if isinstance(obj, Notification):
+            state = inspect(obj).dict
+            pending.append({'e': EVENT_NOTIFICATION, 'd': _notification_data(state), 'u': [state.get('user_id')]})
+        elif isinstance(obj, TimeRecord):
+            state = inspect(obj).dict
+            pending.append({'e': EVENT_PONTO, 'd': _ponto_data(state), 'u': [state.get('user_id')]})
+    for obj in session.dirty:
+        if isinstance(obj, Notification) and inspect(obj).attrs.lida.history.has_changes():
+            pending.append({'e': EVENT_UNREAD, 'd': {}, 'u': [inspect(obj).dict.get('user_id')]})
+        elif isinstance(obj, TimeRecord):
+            attrs = inspect(obj).attrs
+            if any(attrs[name].history.has_changes() for name in ('entrada', 'saida', 'data')):
+                state = inspect(obj).dict
+                pending.append({'e': EVENT_PONTO, 'd': _ponto_data(state), 'u': [state.get('user_id')]})
+    for obj in session.deleted:
+        if isinstance(obj, Notification):
+            pending.append({'e': EVENT_UNREAD, 'd': {}, 'u': [inspect(obj).dict.get('user_id')]})
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_pending(session):
+    if session.in_nested_transaction():
+        return  # savepoint liberado: aguarda o commit da transação externa
+    pending = session.info.pop(PENDING_KEY, None)
+    if pending:
+        try:
+            event_broker.publish(pending)
+        except OSError as e:
+            logger.error(f"Erro ao publicar eventos: {str(e)}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    if not session.in_nested_transaction():
+        session.info.pop(PENDING_KEY, None)
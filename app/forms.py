@@ -156,7 +156,11 @@ class NotificationForm(FlaskForm):
                                        ('trabalhadores', 'Apenas trabalhadores'),
                                        ('estagiarios', 'Apenas estagiários'),
                                        ('admins', 'Apenas administradores'),
+                                       ('classe', 'Classe de trabalho'),
                                        ('individual', 'Usuário específico')])
+    classe_trabalho = SelectField('Classe de trabalho',
+                                  choices=[],
+                                  validators=[Optional()])
     usuario_individual = SelectField('Usuário', 
                                     choices=[],
                                     validators=[Optional()])
@@ -164,8 +168,12 @@ class NotificationForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         super(NotificationForm, self).__init__(*args, **kwargs)
         # Carregar lista de usuários ativos
-        from app.models import User
+        from app.models import User, WorkClass
         usuarios = User.query.filter_by(is_active=True).order_by(User.nome, User.sobrenome).all()
+        self.classe_trabalho.choices = [('', 'Selecione uma classe...')]
+        self.classe_trabalho.choices.extend([
+            (str(c.id), c.name) for c in WorkClass.query.order_by(WorkClass.name).all()
+        ])
         self.usuario_individual.choices = [('', 'Selecione um usuário...')]
         self.usuario_individual.choices.extend([
             (str(u.id), f"{u.nome_completo} ({u.email})") for u in usuarios
@@ -235,7 +243,7 @@ class ReportForm(FlaskForm):
     data_fim = DateField('Data de Fim', validators=[DataRequired()])
     user_id = SelectField('Funcionário', coerce=int, choices=[], validators=[Optional()])
     formato = SelectField('Formato', 
-                         choices=[('pdf', 'PDF'), ('excel', 'Excel')],
+                         choices=[('pdf', 'PDF'), ('excel', 'Excel'), ('csv', 'CSV')],
                          default='pdf')
     
     def validate_data_fim(self, data_fim):
@@ -9,7 +9,8 @@ import shutil
 import tempfile
 import json
 import logging
-import zipfile
+import hashlib
+import time
 from datetime import datetime, timedelta
 from typing import Tuple, Optional, Dict, Any, List
 from pathlib import Path
@@ -23,9 +24,52 @@ from app.constants import (
     SECURITY_ACTION_DELETE_ATTESTATION
 )
 from app.utils import get_current_datetime, log_security_event
+from app.database_dump import LogicalDumper, LogicalRestorer, MANIFEST_NAME
+from app.backup_archive import (
+    EXTENSIONS, FORMAT_ZIP, ReadThrottle, open_backup_writer, open_backup_reader, extract_member,
+    verify_archive
+)
 
 logger = logging.getLogger(__name__)
 
+LOGICAL_DUMP_PREFIX = 'database/logical/'
+FILE_MANIFEST_NAME = 'backup_manifest.json'
+# Diretórios de storage/ versionados pelo manifesto (base para backups incrementais)
+TRACKED_DIRECTORIES = ('attestations', 'uploads')
+# O histórico descreve os arquivos em disco, não os dados do backup: não é sobrescrito
+RESTORE_EXCLUDED_TABLES = ('backup_history',)
+BACKUP_FILE_PATTERNS = tuple(f"skponto_backup_*{extension}" for extension in EXTENSIONS.values())
+
+class BackupProgress:
+    """Grava o andamento do backup no BackupHistory em intervalos (polling do dashboard)"""
+    
+    def __init__(self, backup_record_id: Optional[int], throttle: ReadThrottle, interval: float = 2.0):
+        self.backup_record_id = backup_record_id
+        self.throttle = throttle
+        self.interval = interval
+        self.files_done = 0
+        self._last_flush = 0.0
+    
+    def start(self, files_total: int, bytes_total: int):
+        self._update(files_total=files_total, bytes_total=bytes_total, files_done=0, bytes_done=0)
+    
+    def file_done(self):
+        self.files_done += 1
+        if time.monotonic() - self._last_flush >= self.interval:
+            self.flush()
+    
+    def flush(self):
+        self._update(files_done=self.files_done, bytes_done=self.throttle.bytes_read)
+    
+    def _update(self, **values):
+        self._last_flush = time.monotonic()
+        if self.backup_record_id is None:
+            return
+        values['progress_updated_at'] = get_current_datetime()
+        BackupHistory.query.filter_by(id=self.backup_record_id).update(values)
+        db.session.commit()
+
+
 class LocalBackupManager:
     """Gerenciador de backups locais"""
     
@@ -79,13 +123,16 @@ class LocalBackupManager:
             self._initialize_paths()
     
     def create_backup(self, backup_type: BackupType = BackupType.MANUAL, 
-                     description: Optional[str] = None) -> Tuple[bool, str]:
+                     description: Optional[str] = None, backup_record_id: Optional[int] = None,
+                     throttle: Optional[ReadThrottle] = None) -> Tuple[bool, str]:
         """
         Cria um backup completo do sistema
         
         Args:
             backup_type: Tipo do backup (MANUAL, SCHEDULED, AUTO)
             description: Descrição do backup
+            backup_record_id: Registro PENDENTE já criado (backup em subprocesso)
+            throttle: Limite de leitura dos arquivos de origem (também mede o progresso)
             
         Returns:
             Tuple[bool, str]: (sucesso, mensagem)
@@ -96,29 +143,48 @@ class LocalBackupManager:
             return False, "Sistema de backup não inicializado"
         
         try:
+            # Incremental precisa de um backup anterior com manifesto; senão vira completo
+            parent_manifest = None
+            if backup_type == BackupType.INCREMENTAL:
+                parent_manifest = self._find_incremental_parent()
+                if parent_manifest is None:
+                    logger.info("Sem base válida para backup incremental, criando backup completo")
+                    backup_type = BackupType.AUTOMATICO
+            
+            archive_format = current_app.config.get('BACKUP_ARCHIVE_FORMAT', FORMAT_ZIP)
+            extension = EXTENSIONS.get(archive_format, EXTENSIONS[FORMAT_ZIP])
+            
             # Registrar início do backup
-            backup_record = BackupHistory(
-                filename=f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
-                backup_type=backup_type,
-                status=BackupStatus.PENDENTE,
-                started_at=get_current_datetime(),
-                file_size=0
-            )
-            db.session.add(backup_record)
+            backup_record = db.session.get(BackupHistory, backup_record_id) if backup_record_id else None
+            if backup_record:
+                backup_record.backup_type = backup_type
+            else:
+                backup_record = BackupHistory(
+                    filename=f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}{extension}",
+                    backup_type=backup_type,
+                    status=BackupStatus.PENDENTE,
+                    started_at=get_current_datetime(),
+                    file_size=0
+                )
+                db.session.add(backup_record)
             db.session.commit()
             
+            # Criar nome do arquivo de backup
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            backup_filename = f"skponto_backup_{timestamp}{extension}"
+            backup_file_path = self.backup_path / backup_filename
+            
             # Atualizar status para em progresso
             backup_record.status = BackupStatus.EM_PROGRESSO
             backup_record.started_at = get_current_datetime()
+            backup_record.filename = backup_filename
             db.session.commit()
             
-            # Criar nome do arquivo de backup
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_filename = f"skponto_backup_{timestamp}.zip"
-            backup_file_path = self.backup_path / backup_filename
-            
-            # Criar backup ZIP
-            file_count, total_size = self._create_backup_zip(backup_file_path)
+            # Criar arquivo de backup (ZIP ou tar.zst)
+            progress = BackupProgress(backup_record.id, throttle or ReadThrottle())
+            file_count, total_size = self._create_backup_archive(
+                backup_file_path, archive_format, parent_manifest, progress
+            )
             
             # Atualizar registro do backup
             backup_record.status = BackupStatus.CONCLUIDO
@@ -126,6 +192,12 @@ class LocalBackupManager:
             backup_record.local_path = str(backup_file_path)
             backup_record.file_size = total_size
             backup_record.filename = backup_filename
+            backup_record.files_done = file_count
+            backup_record.bytes_done = progress.throttle.bytes_read
+            backup_record.duration_seconds = int(
+                (backup_record.completed_at.replace(tzinfo=None)
+                 - backup_record.started_at.replace(tzinfo=None)).total_seconds()
+            )
             db.session.commit()
             
             # Limpar backups antigos
@@ -143,105 +215,194 @@ class LocalBackupManager:
                 db.session.commit()
             return False, f"Erro ao criar backup: {str(e)}"
     
-    def _create_backup_zip(self, backup_file_path: Path) -> Tuple[int, int]:
+    def _create_backup_archive(self, backup_file_path: Path, archive_format: str = FORMAT_ZIP,
+                               parent_manifest: Optional[Dict[str, Any]] = None,
+                               progress: Optional['BackupProgress'] = None) -> Tuple[int, int]:
         """
-        Cria o arquivo ZIP com todos os arquivos do backup
+        Cria o arquivo de backup com todos os arquivos
+        
+        Args:
+            backup_file_path: Caminho do arquivo a criar
+            archive_format: 'zip' ou 'tar.zst'
+            parent_manifest: Manifesto do backup anterior (incremental) ou None (completo)
+            progress: Progresso gravado no BackupHistory durante a escrita
         
         Returns:
             Tuple[int, int]: (número de arquivos, tamanho total)
         """
-        file_count = 0
-        total_size = 0
+        progress = progress or BackupProgress(None, ReadThrottle())
         
-        with zipfile.ZipFile(backup_file_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            # Incluir banco de dados
-            db_count, db_size = self._add_database_files_to_zip(zipf)
-            file_count += db_count
-            total_size += db_size
-            
-            # Incluir atestados
-            att_count, att_size = self._add_directory_to_zip(zipf, self.attestations_path, "attestations")
-            file_count += att_count
-            total_size += att_size
-            
-            # Incluir uploads
-            up_count, up_size = self._add_directory_to_zip(zipf, self.uploads_path, "uploads")
-            file_count += up_count
-            total_size += up_size
-            
-            # Incluir logs importantes
-            log_count, log_size = self._add_logs_to_zip(zipf)
-            file_count += log_count
-            total_size += log_size
-            
-            # Incluir arquivos de configuração
-            config_count, config_size = self._add_config_files_to_zip(zipf)
-            file_count += config_count
-            total_size += config_size
+        # Lista completa antes de escrever: define o total para o progresso/ETA
+        # (atestados e uploads: só os novos/alterados no incremental)
+        manifest = self._build_file_manifest(backup_file_path.name, parent_manifest)
+        sources = [(db_file, f"database/{db_file.name}")
+                   for db_file in self._get_database_files() if db_file.exists()]
+        sources += [(self.base_path / arcname, arcname) for arcname, entry in manifest['files'].items()
+                    if entry['archive'] == backup_file_path.name]
+        sources += self._log_files() + self._config_files()
+        progress.start(len(sources), sum(path.stat().st_size for path, _ in sources))
         
-        return file_count, total_size
-    
-    def _add_database_files_to_zip(self, zipf: zipfile.ZipFile) -> Tuple[int, int]:
-        """Adiciona arquivos de banco de dados ao ZIP"""
         file_count = 0
         total_size = 0
         
-        db_files = self._get_database_files()
-        for db_file in db_files:
-            if db_file.exists():
-                zipf.write(db_file, f"database/{db_file.name}")
+        writer = open_backup_writer(
+            backup_file_path, archive_format,
+            level=current_app.config.get('BACKUP_ZSTD_LEVEL', 3),
+            threads=current_app.config.get('BACKUP_ZSTD_THREADS', -1),
+            throttle=progress.throttle
+        )
+        with writer:
+            # Arquivos .db, atestados, uploads, logs e configuração
+            for source_path, arcname in sources:
+                total_size += writer.add_file(source_path, arcname)
                 file_count += 1
-                total_size += db_file.stat().st_size
+                progress.file_done()
+            writer.add_bytes(FILE_MANIFEST_NAME, json.dumps(manifest, indent=2, ensure_ascii=False).encode('utf-8'))
+            
+            # Dump lógico: cobre PostgreSQL, onde não existe arquivo .db para copiar
+            if current_app.config.get('BACKUP_LOGICAL_DUMP', True):
+                dump_count, dump_size = self._add_logical_dump_to_archive(writer)
+                file_count += dump_count
+                total_size += dump_size
         
+        progress.flush()
         return file_count, total_size
     
-    def _add_directory_to_zip(self, zipf: zipfile.ZipFile, source_path: Path, 
-                             zip_prefix: str) -> Tuple[int, int]:
-        """Adiciona diretório completo ao ZIP"""
-        file_count = 0
-        total_size = 0
+    def _add_logical_dump_to_archive(self, writer) -> Tuple[int, int]:
+        """Grava o dump lógico do banco direto no backup (membros já comprimidos com zstd)"""
+        def open_member(name):
+            return writer.open_member(f"{LOGICAL_DUMP_PREFIX}{name}", compressed=name != MANIFEST_NAME)
         
-        if source_path.exists():
-            for file_path in source_path.rglob('*'):
-                if file_path.is_file():
-                    rel_path = file_path.relative_to(source_path)
-                    zipf.write(file_path, f"{zip_prefix}/{rel_path}")
-                    file_count += 1
-                    total_size += file_path.stat().st_size
+        dumper = LogicalDumper(db.engine, chunk_size=current_app.config.get('BACKUP_DUMP_CHUNK_SIZE', 1000))
+        manifest = dumper.dump(open_member)
         
-        return file_count, total_size
+        total_size = sum(table['compressed_size'] for table in manifest['tables'])
+        logger.info(
+            f"Dump lógico ({manifest['dialect']}): {len(manifest['tables'])} tabelas, "
+            f"{sum(table['rows'] for table in manifest['tables'])} linhas"
+        )
+        return len(manifest['tables']) + 1, total_size
     
-    def _add_logs_to_zip(self, zipf: zipfile.ZipFile) -> Tuple[int, int]:
-        """Adiciona logs importantes ao ZIP"""
-        file_count = 0
-        total_size = 0
+    def _log_files(self) -> List[Tuple[Path, str]]:
+        """Logs importantes incluídos no backup: (caminho, nome no arquivo)"""
+        if not self.logs_path.exists():
+            return []
+        return [(log_file, f"logs/{log_file.relative_to(self.logs_path).as_posix()}")
+                for log_file in self.logs_path.rglob('*.log') if log_file.is_file()]
+    
+    def _config_files(self) -> List[Tuple[Path, str]]:
+        """Arquivos de configuração incluídos no backup: (caminho, nome no arquivo)"""
+        base_project_path = Path(current_app.root_path).parent
+        config_paths = [(base_project_path / name, f"config/{name}")
+                        for name in ('config.py', '.env', 'requirements.txt')]
+        return [(path, arcname) for path, arcname in config_paths if path.exists()]
+    
+    def _file_sha256(self, file_path: Path) -> str:
+        """Calcula o sha256 de um arquivo lendo em blocos"""
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(block)
+        return sha256.hexdigest()
+    
+    def _build_file_manifest(self, backup_filename: str,
+                             parent_manifest: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Monta o manifesto (path, size, mtime, sha256) dos diretórios rastreados
         
-        if self.logs_path.exists():
-            for log_file in self.logs_path.rglob('*.log'):
-                if log_file.is_file():
-                    rel_path = log_file.relative_to(self.logs_path)
-                    zipf.write(log_file, f"logs/{rel_path}")
-                    file_count += 1
-                    total_size += log_file.stat().st_size
+        Cada entrada indica em qual arquivo de backup está o conteúdo: o próprio
+        backup para arquivos novos/alterados, ou o arquivo herdado do backup
+        anterior quando nada mudou. O sha256 só é recalculado quando tamanho ou
+        mtime mudaram.
+        """
+        previous = parent_manifest['files'] if parent_manifest else {}
+        files = {}
+        stats = {'new': 0, 'changed': 0, 'unchanged': 0, 'deleted': 0}
         
-        return file_count, total_size
+        for directory in TRACKED_DIRECTORIES:
+            source_path = self.base_path / directory
+            if not source_path.exists():
+                continue
+            
+            for file_path in source_path.rglob('*'):
+                if not file_path.is_file():
+                    continue
+                
+                arcname = file_path.relative_to(self.base_path).as_posix()
+                stat = file_path.stat()
+                old = previous.get(arcname)
+                
+                if old and old['size'] == stat.st_size and old['mtime'] == stat.st_mtime:
+                    sha256 = old['sha256']
+                else:
+                    sha256 = self._file_sha256(file_path)
+                
+                if old and old['sha256'] == sha256 and old['size'] == stat.st_size:
+                    archive = old['archive']
+                    stats['unchanged'] += 1
+                else:
+                    archive = backup_filename
+                    stats['changed' if old else 'new'] += 1
+                
+                files[arcname] = {
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime,
+                    'sha256': sha256,
+                    'archive': archive
+                }
+        
+        stats['deleted'] = len(set(previous) - set(files))
+        
+        return {
+            'version': 1,
+            'backup': backup_filename,
+            'type': 'INCREMENTAL' if parent_manifest else 'COMPLETO',
+            'parent': parent_manifest['backup'] if parent_manifest else None,
+            'base': parent_manifest['base'] if parent_manifest else backup_filename,
+            'base_created_at': (parent_manifest['base_created_at'] if parent_manifest
+                                else datetime.now().isoformat()),
+            'created_at': datetime.now().isoformat(),
+            'stats': stats,
+            'files': files
+        }
     
-    def _add_config_files_to_zip(self, zipf: zipfile.ZipFile) -> Tuple[int, int]:
-        """Adiciona arquivos de configuração ao ZIP"""
-        file_count = 0
-        total_size = 0
+    def _read_file_manifest(self, archive_path: Path) -> Optional[Dict[str, Any]]:
+        """Lê o manifesto de arquivos de um backup (None para backups antigos)"""
+        try:
+            with open_backup_reader(archive_path) as reader:
+                if not reader.has(FILE_MANIFEST_NAME):
+                    return None
+                return json.loads(reader.read(FILE_MANIFEST_NAME).decode('utf-8'))
+        except Exception as e:
+            logger.warning(f"Manifesto ilegível em {archive_path}: {str(e)}")
+            return None
+    
+    def _find_incremental_parent(self) -> Optional[Dict[str, Any]]:
+        """Manifesto do último backup concluído, se ainda servir de base para um incremental"""
+        last_backup = BackupHistory.query.filter(
+            BackupHistory.status == BackupStatus.CONCLUIDO,
+            BackupHistory.local_path.isnot(None)
+        ).order_by(BackupHistory.completed_at.desc()).first()
         
-        config_files = ['config.py', '.env', 'requirements.txt']
-        base_project_path = Path(current_app.root_path).parent
+        if not last_backup or not Path(last_backup.local_path).exists():
+            return None
         
-        for config_file in config_files:
-            config_path = base_project_path / config_file
-            if config_path.exists():
-                zipf.write(config_path, f"config/{config_file}")
-                file_count += 1
-                total_size += config_path.stat().st_size
+        manifest = self._read_file_manifest(Path(last_backup.local_path))
+        if not manifest:
+            return None
         
-        return file_count, total_size
+        # Cadeia longa demais: força um novo completo
+        full_interval = current_app.config.get('BACKUP_FULL_INTERVAL_DAYS', 7)
+        base_created_at = datetime.fromisoformat(manifest['base_created_at'])
+        if datetime.now() - base_created_at >= timedelta(days=full_interval):
+            return None
+        
+        # Todos os arquivos da cadeia precisam continuar disponíveis
+        archives = {entry['archive'] for entry in manifest['files'].values()}
+        if any(not (self.backup_path / archive).exists() for archive in archives):
+            return None
+        
+        return manifest
     
     def _get_database_files(self) -> List[Path]:
         """Retorna lista de arquivos de banco de dados"""
@@ -275,15 +436,24 @@ class LocalBackupManager:
                 return
             
             # Listar todos os backups
-            backup_files = list(self.backup_path.glob('skponto_backup_*.zip'))
+            backup_files = [f for pattern in BACKUP_FILE_PATTERNS for f in self.backup_path.glob(pattern)]
             
             # Ordenar por data de modificação (mais recente primeiro)
             backup_files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
             
             # Manter apenas os N backups mais recentes
             if len(backup_files) > self.max_backups:
+                # Bases e incrementais ainda usados pelos backups mantidos não podem sair
+                referenced = set()
+                for kept_file in backup_files[:self.max_backups]:
+                    manifest = self._read_file_manifest(kept_file)
+                    if manifest:
+                        referenced.update(entry['archive'] for entry in manifest['files'].values())
+                
                 files_to_remove = backup_files[self.max_backups:]
                 for file_to_remove in files_to_remove:
+                    if file_to_remove.name in referenced:
+                        continue
                     file_to_remove.unlink()
                     logger.info(f"Backup antigo removido: {file_to_remove.name}")
             
@@ -316,17 +486,34 @@ class LocalBackupManager:
             if not backup_path.exists():
                 return False, "Arquivo de backup não encontrado"
             
+            # Backups com manifesto: restauração a partir da cadeia base + incrementais
+            manifest = self._read_file_manifest(backup_path)
+            if manifest:
+                return self._restore_from_manifest(backup_path, manifest)
+            
             # Criar diretório temporário para extração
             with tempfile.TemporaryDirectory() as temp_dir:
                 temp_path = Path(temp_dir)
                 
                 # Extrair backup
-                with zipfile.ZipFile(backup_path, 'r') as zipf:
-                    zipf.extractall(temp_path)
+                with open_backup_reader(backup_path) as reader:
+                    has_logical_dump = reader.has(f"{LOGICAL_DUMP_PREFIX}{MANIFEST_NAME}")
+                    if has_logical_dump:
+                        # Banco restaurado em streaming a partir do dump lógico
+                        restored = LogicalRestorer(db.engine).restore(
+                            lambda name: reader.open(f"{LOGICAL_DUMP_PREFIX}{name}"),
+                            exclude=RESTORE_EXCLUDED_TABLES
+                        )
+                        db.session.remove()
+                        logger.info(f"Dump lógico restaurado: {sum(restored.values())} linhas em {len(restored)} tabelas")
+                    
+                    for name in reader.names():
+                        if not name.startswith(LOGICAL_DUMP_PREFIX):
+                            extract_member(reader, name, self._safe_destination(name, temp_path))
                 
-                # Restaurar banco de dados
+                # Restaurar banco de dados (backups antigos, somente arquivos .db)
                 db_backup_path = temp_path / 'database'
-                if db_backup_path.exists():
+                if db_backup_path.exists() and not has_logical_dump:
                     for db_file in db_backup_path.glob('*.db'):
                         dest_path = self.database_path / db_file.name
                         shutil.copy2(db_file, dest_path)
@@ -352,6 +539,203 @@ class LocalBackupManager:
             logger.error(f"Erro ao restaurar backup: {str(e)}")
             return False, f"Erro ao restaurar backup: {str(e)}"
     
+    def _restore_from_manifest(self, backup_path: Path, manifest: Dict[str, Any]) -> Tuple[bool, str]:
+        """
+        Restaura o estado completo descrito no manifesto de um backup
+        
+        Cada arquivo é lido do backup onde seu conteúdo foi gravado (a base ou
+        um dos incrementais); arquivos locais que não constam no manifesto são
+        removidos dos diretórios rastreados.
+        """
+        missing = self._missing_chain_archives(backup_path, manifest['files'])
+        if missing:
+            return False, f"Backups da cadeia ausentes: {', '.join(missing)}"
+        
+        # Banco de dados: sempre completo no próprio backup
+        with open_backup_reader(backup_path) as reader:
+            if reader.has(f"{LOGICAL_DUMP_PREFIX}{MANIFEST_NAME}"):
+                LogicalRestorer(db.engine).restore(
+                    lambda name: reader.open(f"{LOGICAL_DUMP_PREFIX}{name}"),
+                    exclude=RESTORE_EXCLUDED_TABLES
+                )
+                db.session.remove()
+            else:
+                for name in reader.names():
+                    if name.startswith('database/') and name.endswith('.db'):
+                        extract_member(reader, name, self.database_path / Path(name).name)
+        
+        restored = self._extract_manifest_files(backup_path, manifest['files'])
+        
+        # Remover arquivos que não existiam no momento do backup
+        removed = 0
+        for directory in TRACKED_DIRECTORIES:
+            source_path = self.base_path / directory
+            if not source_path.exists():
+                continue
+            for file_path in source_path.rglob('*'):
+                if file_path.is_file() and file_path.relative_to(self.base_path).as_posix() not in manifest['files']:
+                    file_path.unlink()
+                    removed += 1
+        
+        logger.info(
+            f"Backup restaurado ({manifest['type']}, base {manifest['base']}): "
+            f"{restored} arquivos restaurados, {removed} removidos"
+        )
+        return True, "Backup restaurado com sucesso"
+    
+    def _missing_chain_archives(self, backup_path: Path, files: Dict[str, Dict[str, Any]]) -> List[str]:
+        """Backups da cadeia referenciados pelas entradas e ausentes no disco"""
+        archives = {entry['archive'] for entry in files.values()}
+        return sorted(archive for archive in archives
+                      if archive != backup_path.name and not (self.backup_path / archive).exists())
+    
+    def _extract_manifest_files(self, backup_path: Path, files: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Extrai as entradas do manifesto direto para o destino, um backup da cadeia por vez
+        
+        No tar.zst cada arquivo é lido pelo índice, sem descomprimir o restante.
+        """
+        by_archive: Dict[str, List[str]] = {}
+        for arcname, entry in files.items():
+            by_archive.setdefault(entry['archive'], []).append(arcname)
+        
+        restored = 0
+        for archive, arcnames in by_archive.items():
+            archive_path = backup_path if archive == backup_path.name else self.backup_path / archive
+            with open_backup_reader(archive_path) as reader:
+                for arcname in arcnames:
+                    extract_member(reader, arcname, self._safe_destination(arcname),
+                                   mtime=files[arcname]['mtime'])
+                    restored += 1
+        return restored
+    
+    def restore_selected(self, backup_file_path: str, paths: Optional[List[str]] = None,
+                         tables: Optional[List[str]] = None) -> Tuple[bool, str]:
+        """
+        Restaura apenas parte de um backup, sem extrair o restante
+        
+        Args:
+            backup_file_path: Caminho para o arquivo de backup
+            paths: Arquivos ou prefixos relativos a storage/ (ex.: 'attestations/user_42/')
+            tables: Tabelas a restaurar a partir do dump lógico
+            
+        Returns:
+            Tuple[bool, str]: (sucesso, mensagem)
+        """
+        self._ensure_initialized()
+        
+        try:
+            backup_path = Path(backup_file_path)
+            if not backup_path.exists():
+                return False, "Arquivo de backup não encontrado"
+            if not paths and not tables:
+                return False, "Nada selecionado para restaurar"
+            
+            paths = [path.strip('/') for path in paths or []]
+            invalid = [path for path in paths if path.split('/')[0] not in TRACKED_DIRECTORIES]
+            if invalid:
+                return False, f"Caminhos fora de {', '.join(TRACKED_DIRECTORIES)}: {', '.join(invalid)}"
+            
+            def selected(arcname: str) -> bool:
+                return any(arcname == path or arcname.startswith(f"{path}/") for path in paths)
+            
+            restored_rows = {}
+            if tables:
+                with open_backup_reader(backup_path) as reader:
+                    if not reader.has(f"{LOGICAL_DUMP_PREFIX}{MANIFEST_NAME}"):
+                        return False, "Backup sem dump lógico: restauração por tabela indisponível"
+                    restored_rows = LogicalRestorer(db.engine).restore(
+                        lambda name: reader.open(f"{LOGICAL_DUMP_PREFIX}{name}"),
+                        tables=tables,
+                        exclude=RESTORE_EXCLUDED_TABLES
+                    )
+                    db.session.remove()
+            
+            restored_files = 0
+            if paths:
+                manifest = self._read_file_manifest(backup_path)
+                if manifest:
+                    # Cada arquivo vem do backup da cadeia que guarda seu conteúdo
+                    files = {arcname: entry for arcname, entry in manifest['files'].items()
+                             if selected(arcname)}
+                    missing = self._missing_chain_archives(backup_path, files)
+                    if missing:
+                        return False, f"Backups da cadeia ausentes: {', '.join(missing)}"
+                    restored_files = self._extract_manifest_files(backup_path, files)
+                else:
+                    with open_backup_reader(backup_path) as reader:
+                        for name in reader.names():
+                            if selected(name):
+                                extract_member(reader, name, self._safe_destination(name))
+                                restored_files += 1
+            
+            logger.info(
+                f"Restauração seletiva de {backup_path.name}: {restored_files} arquivos, "
+                f"{sum(restored_rows.values())} linhas em {len(restored_rows)} tabelas"
+            )
+            return True, (f"Restaurados {restored_files} arquivos e {len(restored_rows)} tabelas "
+                          f"de {backup_path.name}")
+            
+        except Exception as e:
+            logger.error(f"Erro na restauração seletiva: {str(e)}")
+            return False, f"Erro na restauração seletiva: {str(e)}"
+    
+    def verify_backup(self, backup_file_path: str) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Verifica a integridade de um backup lendo-o em streaming, sem extrair
+        
+        Confere o CRC (ZIP) ou o checksum dos frames zstd (tar.zst) de todos os
+        membros, o sha256 dos arquivos gravados neste backup segundo o manifesto
+        e o sha256 de cada tabela do dump lógico.
+        
+        Returns:
+            Tuple[bool, Dict]: (íntegro, relatório com membros, tamanho e erros)
+        """
+        self._ensure_initialized()
+        
+        try:
+            backup_path = Path(backup_file_path)
+            if not backup_path.exists():
+                return False, {'errors': ["Arquivo de backup não encontrado"]}
+            
+            expected = {}
+            chain_missing = []
+            manifest = self._read_file_manifest(backup_path)
+            if manifest:
+                expected.update({arcname: entry['sha256'] for arcname, entry in manifest['files'].items()
+                                 if entry['archive'] == backup_path.name})
+                chain_missing = self._missing_chain_archives(backup_path, manifest['files'])
+            
+            with open_backup_reader(backup_path) as reader:
+                dump_manifest_name = f"{LOGICAL_DUMP_PREFIX}{MANIFEST_NAME}"
+                if reader.has(dump_manifest_name):
+                    dump_manifest = json.loads(reader.read(dump_manifest_name).decode('utf-8'))
+                    expected.update({f"{LOGICAL_DUMP_PREFIX}{table['file']}": table['sha256']
+                                     for table in dump_manifest['tables']})
+                
+                report = verify_archive(reader, expected)
+            
+            report['errors'].extend(f"Backup da cadeia ausente: {archive}" for archive in chain_missing)
+            report['format'] = reader.format
+            
+            if report['errors']:
+                logger.warning(f"Backup {backup_path.name} com {len(report['errors'])} problemas")
+            else:
+                logger.info(f"Backup {backup_path.name} verificado: {report['members']} membros íntegros")
+            return not report['errors'], report
+            
+        except Exception as e:
+            logger.error(f"Erro ao verificar backup: {str(e)}")
+            return False, {'errors': [f"Erro ao verificar backup: {str(e)}"]}
+    
+    def _safe_destination(self, arcname: str, root: Optional[Path] = None) -> Path:
+        """Caminho de destino de um membro, impedindo escrita fora de storage/ (ou de root)"""
+        root = root or self.base_path
+        dest_path = (root / arcname).resolve()
+        if not dest_path.is_relative_to(root.resolve()):
+            raise ValueError(f"Caminho inválido no backup: {arcname}")
+        return dest_path
+    
     def list_backups(self) -> List[Dict[str, Any]]:
         """Lista todos os backups disponíveis"""
         backups = []
@@ -514,7 +898,7 @@ class LocalBackupManager:
         try:
             # Estatísticas de backups
             if self.backup_path.exists():
-                backup_files = list(self.backup_path.glob('*.zip'))
+                backup_files = [f for pattern in ('*.zip', '*.tar.zst') for f in self.backup_path.glob(pattern)]
                 stats['backup_count'] = len(backup_files)
                 stats['backup_size'] = sum(f.stat().st_size for f in backup_files)
             
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Pipeline de Logging Assíncrono para SKPONTO
+As threads de requisição só enfileiram os registros (fila limitada); uma
+thread em segundo plano grava nos arquivos. Inclui formatação JSON e o log
+de SQL por amostragem
+"""
+
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import atexit
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterable, List, Optional
+
+from flask import g, request
+
+DEFAULT_QUEUE_SIZE = 10000
+# Registros de ERROR ou acima esperam um pouco por espaço na fila antes de serem descartados
+BLOCKING_LEVEL = logging.ERROR
+BLOCKING_TIMEOUT = 0.05
+
+# Atributos padrão do LogRecord; o restante (extra=...) vai para o JSON
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Um objeto JSON por linha, com os campos `extra` do registro"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'file': record.filename,
+            'line': record.lineno,
+            'function': record.funcName,
+            'pid': record.process,
+            'message': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """QueueHandler que nunca bloqueia a requisição por muito tempo.
+
+    Com a fila cheia, registros abaixo de ERROR são descartados na hora; os de
+    ERROR ou acima esperam até BLOCKING_TIMEOUT. Os contadores ficam no pipeline.
+    """
+
+    def __init__(self, pipeline: 'LogPipeline'):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve mensagem e traceback aqui (objetos podem mudar depois), mas
+        # mantém os atributos para os formatters de cada arquivo
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            self.pipeline.enqueued += 1
+            return
+        except queue.Full:
+            self.pipeline.overflow += 1
+
+        if record.levelno >= BLOCKING_LEVEL:
+            try:
+                self.queue.put(record, timeout=BLOCKING_TIMEOUT)
+                self.pipeline.enqueued += 1
+                return
+            except queue.Full:
+                pass
+        self.pipeline.dropped += 1
+
+
+class LogPipeline:
+    """Fila limitada + QueueListener compartilhados pelos loggers da aplicação.
+
+    Cada destino registrado com `attach` recebe só os registros do seu logger
+    (e filhos). Após um fork a fila e a thread são recriadas no processo filho.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_QUEUE_SIZE):
+        self.maxsize = maxsize
+        self.queue: queue.Queue = queue.Queue(maxsize)
+        self.handler = BoundedQueueHandler(self)
+        self.listener: Optional[QueueListener] = None
+        self._destinations: Dict[str, List[logging.Handler]] = {}
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.overflow = 0
+        self.dropped = 0
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+        atexit.register(self.stop)
+
+    def configure(self, maxsize: int):
+        """Redimensiona a fila (só antes de existir tráfego)"""
+        if maxsize != self.maxsize and self.queue.empty():
+            self.maxsize = maxsize
+            self._replace_queue()
+
+    def _replace_queue(self):
+        self.queue = queue.Queue(self.maxsize)
+        self.handler.queue = self.queue
+        if self.listener:
+            self.listener.queue = self.queue
+
+    def attach(self, logger: logging.Logger, handlers: Iterable[logging.Handler], key: Optional[str] = None):
+        """Liga o logger à fila e define os arquivos que recebem seus registros"""
+        key = key or logger.name
+        handlers = list(handlers)
+        for handler in handlers:
+            handler.addFilter(logging.Filter(logger.name if logger.name != 'root' else ''))
+
+        with self._lock:
+            for old_handler in self._destinations.get(key, []):
+                old_handler.close()
+            self._destinations[key] = handlers
+            if self.listener:
+                self.listener.handlers = self._all_handlers()
+
+        if self.handler not in logger.handlers:
+            logger.addHandler(self.handler)
+        self.start()
+
+    def _all_handlers(self):
+        return tuple(handler for handlers in self._destinations.values() for handler in handlers)
+
+    def start(self):
+        with self._lock:
+            if self.listener is None:
+                self.listener = QueueListener(self.queue, *self._all_handlers(), respect_handler_level=True)
+                self.listener.start()
+
+    def stop(self):
+        """Esvazia a fila e encerra a thread de escrita"""
+        with self._lock:
+            listener, self.listener = self.listener, None
+        if listener:
+            listener.stop()
+
+    def _after_fork(self):
+        # A thread do pai não existe no filho e os locks da fila podem estar presos
+        self._lock = threading.Lock()
+        self.listener = None
+        self._replace_queue()
+        if self._destinations:
+            self.start()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queued': self.queue.qsize(),
+            'capacity': self.maxsize,
+            'enqueued': self.enqueued,
+            'overflow': self.overflow,
+            'dropped': self.dropped,
+            'running': self.listener is not None
+        }
+
+
+log_pipeline = LogPipeline()
+
+
+class SqlStatementSampler:
+    """Log de SQL sob demanda: só em uma amostra das requisições ou nas lentas.
+
+    Usa o registro de queries da requisição (app.query_profiler); o texto dos
+    comandos só é guardado quando a requisição foi sorteada
+    (SQL_LOG_SAMPLE_RATE) ou quando SQL_LOG_SLOW_MS está ativo, e só vai ao
+    logger `app.sql` se a requisição foi sorteada ou ficou lenta.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, slow_ms: int = 0):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.logger = logging.getLogger('app.sql')
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.slow_ms > 0
+
+    def init_app(self, app):
+        if not self.enabled:
+            return
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def _start_request(self):
+        from app.query_profiler import start_recording
+
+        g._sql_log_sampled = random.random() < self.sample_rate
+        if g._sql_log_sampled or self.slow_ms:
+            start_recording().keep_statements = True
+
+    def _finish_request(self, response):
+        from app.query_profiler import current_queries
+
+        queries = current_queries()
+        if queries is None or not queries.count:
+            return response
+
+        duration_ms = queries.elapsed_ms
+        slow = bool(self.slow_ms) and duration_ms >= self.slow_ms
+        if g.get('_sql_log_sampled') or slow:
+            self.logger.info(
+                f"{request.method} {request.path}: {queries.count} comandos SQL",
+                extra={
+                    'reason': 'slow' if slow else 'sample',
+                    'duration_ms': duration_ms,
+                    'db_ms': queries.db_ms,
+                    'status': response.status_code,
+                    'statements': [
+                        {'sql': statement[:1000], 'count': count, 'ms': round(seconds * 1000, 2),
+                         'timings': timings}
+                        for statement, (count, seconds, timings) in queries.statements.items()
+                    ]
+                }
+            )
+        return response
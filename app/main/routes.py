@@ -5,7 +5,9 @@ from datetime import datetime, date, timedelta
 import os
 from app import db
 from app.main import bp
-from app.models import User, TimeRecord, MedicalAttestation, Notification, AttestationStatus
+from app.models import (User, TimeRecord, MedicalAttestation, Notification, AttestationStatus,
+                        MonthlyTimeSummary)
+from app import notification_service
 from app.forms import TimeRecordForm, EditProfileForm, MedicalAttestationForm
 from app.utils import (save_uploaded_file, log_security_event, calculate_work_hours, 
                       format_hours, get_month_name, create_notification)
@@ -43,25 +45,36 @@ def health_check():
             'timestamp': datetime.utcnow().isoformat()
         }), 500
 
+def _notification_poll_response(etag, build):
+    """Resposta do polling de notificações com ETag; 304 sem corpo se nada mudou"""
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = build()
+    response.set_etag(etag)
+    # O navegador revalida a cada poll (If-None-Match) em vez de reutilizar sem perguntar
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
 @bp.route('/api/notifications/recent')
 @login_required
 def get_recent_notifications():
-    """API para buscar as 5 últimas notificações do usuário"""
+    """API para buscar as 5 últimas notificações do usuário (pessoais e comunicados)"""
     try:
-        notifications = Notification.query.filter_by(
-            user_id=current_user.id
-        ).order_by(desc(Notification.created_at)).limit(5).all()
+        unread_count, version = notification_service.counter_state(current_user)
+        # O minuto entra no ETag porque 'time_ago' muda com o tempo
+        etag = f"recent-{current_user.id}-{version}-{unread_count}-{datetime.now():%Y%m%d%H%M}"
+        if request.if_none_match.contains(etag):
+            return _notification_poll_response(etag, None)
         
-        # Contar notificações não lidas
-        unread_count = Notification.query.filter_by(
-            user_id=current_user.id,
-            lida=False
-        ).count()
+        notifications = notification_service.recent_items(current_user, limit=5)
         
         notifications_data = []
         for notification in notifications:
             notifications_data.append({
                 'id': notification.id,
+                'kind': 'broadcast' if notification.is_broadcast else 'personal',
                 'titulo': notification.titulo,
                 'mensagem': notification.mensagem,
                 'tipo': notification.tipo.value,
@@ -70,11 +83,11 @@ def get_recent_notifications():
                 'time_ago': format_time_ago(notification.created_at)
             })
         
-        return jsonify({
+        return _notification_poll_response(etag, lambda: jsonify({
             'success': True,
             'notifications': notifications_data,
             'unread_count': unread_count
-        })
+        }))
     except Exception as e:
         current_app.logger.error(f"Erro ao buscar notificações: {str(e)}")
         return jsonify({
@@ -122,15 +135,9 @@ def dashboard():
         data=hoje
     ).first()
     
-    # Estatísticas do mês atual
-    inicio_mes = hoje.replace(day=1)
-    registros_mes = TimeRecord.query.filter(
-        TimeRecord.user_id == current_user.id,
-        TimeRecord.data >= inicio_mes,
-        TimeRecord.data <= hoje
-    ).all()
-
-    horas_mes = sum(r.horas_trabalhadas for r in registros_mes)
+    # Estatísticas do mês atual (resumo mensal pré-calculado)
+    resumo_mes = MonthlyTimeSummary.get_for_month(current_user.id, hoje.year, hoje.month)
+    horas_mes = resumo_mes.total_hours if resumo_mes else 0.0
     
     # CORREÇÃO: Verificar se banco de horas existe antes de criar
     from app.models import HourBank
@@ -149,13 +156,10 @@ def dashboard():
     # Saldo atual do banco de horas (inclui horas extras e débitos)
     saldo_banco_horas = None  # hour_bank disabled
     
-    dias_trabalhados = len([r for r in registros_mes if r.is_completo])
+    dias_trabalhados = resumo_mes.complete_days if resumo_mes else 0
     
     # Notificações não lidas
-    notificacoes = Notification.query.filter_by(
-        user_id=current_user.id,
-        lida=False
-    ).order_by(desc(Notification.created_at)).limit(5).all()
+    notificacoes = notification_service.recent_items(current_user, limit=5, unread_only=True)
     
     # Atestados pendentes (se for admin)
     atestados_pendentes = []
@@ -355,6 +359,7 @@ def editar_registro(id):
             'saida': registro.saida,
             'observacoes': registro.observacoes
         }
+        data_original = registro.data
         
         # Atualizar registro
         registro.data = form.data.data
@@ -367,6 +372,9 @@ def editar_registro(id):
         
         # Recalcular horas
         registro.calcular_horas()
+        # Se a data mudou de mês, o resumo do mês antigo também precisa ser refeito
+        if (data_original.year, data_original.month) != (registro.data.year, registro.data.month):
+            MonthlyTimeSummary.refresh_for_date(registro.user_id, data_original)
         
         db.session.commit()
         
@@ -624,55 +632,38 @@ def cancelar_atestado(id):
 @bp.route('/notificacoes')
 @login_required
 def notificacoes():
-    """Lista de notificações do usuário com filtros"""
-    page = request.args.get('page', 1, type=int)
+    """Lista de notificações e comunicados do usuário com filtros (paginação por cursor)"""
+    cursor = request.args.get('cursor', '')
     search = request.args.get('search', '')
     tipo_filter = request.args.get('tipo', '')
     status_filter = request.args.get('status', '')
     
-    # Base query
-    query = Notification.query.filter_by(user_id=current_user.id)
-    
-    # Apply filters
-    if search:
-        query = query.filter(
-            (Notification.titulo.ilike(f'%{search}%')) |
-            (Notification.mensagem.ilike(f'%{search}%'))
-        )
-    
+    tipo_enum = None
     if tipo_filter:
-        # Handle enum filtering properly
         from app.models import NotificationType
         try:
             tipo_enum = NotificationType(tipo_filter)
-            query = query.filter(Notification.tipo == tipo_enum)
         except ValueError:
             # If tipo_filter is not a valid enum value, ignore the filter
             pass
     
-    if status_filter == 'lida':
-        query = query.filter(Notification.lida == True)
-    elif status_filter == 'nao_lida':
-        query = query.filter(Notification.lida == False)
+    lida = {'lida': True, 'nao_lida': False}.get(status_filter)
     
-    # Get all notification types for filter dropdown
-    tipos_notificacao = db.session.query(Notification.tipo).filter_by(
-        user_id=current_user.id
-    ).distinct().all()
-    tipos_notificacao = [tipo[0] for tipo in tipos_notificacao]
+    # Tipos presentes no feed para o filtro
+    tipos_notificacao = notification_service.feed_types(current_user)
     
-    # Get notifications with pagination
-    notificacoes = query.order_by(desc(Notification.created_at)).paginate(
-        page=page, per_page=20, error_out=False
+    notificacoes = notification_service.get_feed(
+        current_user, limit=20, cursor=cursor or None, lida=lida, search=search or None, tipo=tipo_enum
     )
     
     # Get statistics
-    total_notificacoes = Notification.query.filter_by(user_id=current_user.id).count()
-    nao_lidas = Notification.query.filter_by(user_id=current_user.id, lida=False).count()
+    total_notificacoes = notification_service.total_count(current_user)
+    nao_lidas = notification_service.unread_count(current_user)
     
     return render_template('main/notificacoes.html',
                          title='Notificações',
                          notificacoes=notificacoes,
+                         current_cursor=cursor,
                          tipos_notificacao=tipos_notificacao,
                          current_search=search,
                          current_tipo=tipo_filter,
@@ -711,21 +702,32 @@ def deletar_notificacao(id):
     
     return redirect(url_for('main.notificacoes'))
 
+@bp.route('/marcar_comunicado_lido/<int:id>', methods=['GET', 'POST'])
+@login_required
+def marcar_comunicado_lido(id):
+    """Confirma a leitura de um comunicado"""
+    if not notification_service.mark_broadcast_read(current_user, id):
+        abort(404)
+    
+    return redirect(url_for('main.notificacoes'))
+
+@bp.route('/ocultar_comunicado/<int:id>', methods=['GET', 'POST'])
+@login_required
+def ocultar_comunicado(id):
+    """Remove um comunicado do feed do usuário (o comunicado continua para os demais)"""
+    if not notification_service.dismiss_broadcast(current_user, id):
+        abort(404)
+    flash('Notificação deletada com sucesso.', 'success')
+    
+    return redirect(url_for('main.notificacoes'))
+
 @bp.route('/marcar_todas_lidas', methods=['POST'])
 @login_required
 def marcar_todas_lidas():
-    """Marca todas as notificações do usuário como lidas"""
+    """Marca todas as notificações e comunicados do usuário como lidos"""
     try:
-        notificacoes_nao_lidas = Notification.query.filter_by(
-            user_id=current_user.id, 
-            lida=False
-        ).all()
-        
-        for notificacao in notificacoes_nao_lidas:
-            notificacao.lida = True
-        
-        db.session.commit()
-        flash(f'{len(notificacoes_nao_lidas)} notificações marcadas como lidas.', 'success')
+        total = notification_service.mark_all_read(current_user)
+        flash(f'{total} notificações marcadas como lidas.', 'success')
         
     except Exception as e:
         current_app.logger.error(f"Erro ao marcar todas como lidas: {str(e)}")
@@ -797,13 +799,11 @@ def api_registrar_ponto():
 @bp.route('/api/notificacoes_nao_lidas')
 @login_required
 def api_notificacoes_nao_lidas():
-    """API para buscar notificações não lidas"""
-    count = Notification.query.filter_by(
-        user_id=current_user.id,
-        lida=False
-    ).count()
+    """API para buscar notificações não lidas (contador mantido + ETag)"""
+    count, version = notification_service.counter_state(current_user)
+    etag = f"unread-{current_user.id}-{version}-{count}"
     
-    return jsonify({'count': count})
+    return _notification_poll_response(etag, lambda: jsonify({'count': count}))
 
 @bp.route('/privacy-policy')
 def privacy_policy():
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks dos Caminhos Quentes do SKPONTO
+Cálculo de horas, formatação e geradores de relatório executados sobre
+fixtures em memória de 10k/100k linhas; `flask perf micro` compara com uma
+linha de base salva e falha quando um caminho fica mais lento que o limite
+"""
+
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+from collections import namedtuple
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import current_app
+
+from app.models import HourBankTransactionType, TimeRecord, User, WorkClass
+from app.time_formatter import TimeFormatter
+
+DEFAULT_BASELINE = os.path.join('storage', 'perf', 'micro_baseline.json')
+# PDF monta a tabela inteira em memória (reportlab): fixture limitada
+PDF_MAX_ROWS = 5000
+
+ReportRow = namedtuple('ReportRow', [
+    'nome', 'sobrenome', 'data', 'entrada', 'saida', 'horas_trabalhadas',
+    'horas_extras', 'observacoes', 'is_atestado', 'motivo_atestado'
+])
+HourBankRow = namedtuple('HourBankRow', [
+    'created_at', 'nome', 'sobrenome', 'email', 'transaction_type', 'hours',
+    'balance_before', 'balance_after', 'description', 'reference_date',
+    'creator_nome', 'creator_sobrenome'
+])
+
+
+class Fixture:
+    """Dados sintéticos determinísticos com as mesmas colunas das queries reais"""
+
+    def __init__(self, rows: int, seed: int = 42):
+        rng = random.Random(seed)
+        self.rows = rows
+        self.hours = [round(rng.uniform(-12, 12), 4) for _ in range(rows)]
+        self.report_rows = []
+        self.hour_bank_rows = []
+        self.time_pairs = []
+        start = date(2024, 1, 1)
+        for index in range(rows):
+            day = start + timedelta(days=index % 730)
+            entrada = dt_time(7 + rng.randint(0, 2), rng.randint(0, 59))
+            saida = dt_time(16 + rng.randint(0, 3), rng.randint(0, 59))
+            atestado = rng.random() < 0.02
+            self.time_pairs.append((entrada, saida, day))
+            self.report_rows.append(ReportRow(
+                f'Usuário{index % 500}', 'Perf', day, entrada, saida,
+                round(rng.uniform(4, 8), 2), round(max(rng.gauss(0.3, 0.8), 0), 2),
+                'Observação' if rng.random() < 0.1 else None, atestado,
+                'Atestado médico' if atestado else None
+            ))
+            hours = round(rng.uniform(-4, 4), 2)
+            self.hour_bank_rows.append(HourBankRow(
+                datetime.combine(day, dt_time(19)), f'Usuário{index % 500}', 'Perf',
+                f'user{index % 500}@perf.skponto.local',
+                HourBankTransactionType.CREDITO if hours >= 0 else HourBankTransactionType.DEBITO,
+                hours, 10.0, 10.0 + hours, 'Movimentação sintética', day,
+                None if index % 3 else 'Admin', None if index % 3 else 'Perf'
+            ))
+
+        # Registros transitórios (fora da sessão) ligados a um usuário com classe
+        work_class = WorkClass(name='Perf Micro', daily_work_hours=8.0, lunch_hours=1.0)
+        user = User(nome='Perf', sobrenome='Micro', work_class=work_class)
+        self.records = [TimeRecord(data=day, entrada=entrada, saida=saida, usuario=user)
+                        for entrada, saida, day in self.time_pairs[:rows]]
+
+
+# Benchmarks: cada função processa a fixture inteira uma vez
+
+def _bench_calcular_horas_detalhado(fixture: Fixture):
+    lunch_out, lunch_back = dt_time(12), dt_time(13)
+    for index, record in enumerate(fixture.records):
+        if index % 2:
+            record.calcular_horas_detalhado(lunch_out, lunch_back)
+        else:
+            record.calcular_horas_detalhado()
+
+
+def _bench_calculate_work_hours(fixture: Fixture):
+    from app.utils import calculate_work_hours
+    for entrada, saida, day in fixture.time_pairs:
+        calculate_work_hours(entrada, saida, day)
+
+
+def _bench_utils_format_hours(fixture: Fixture):
+    from app.utils import format_hours
+    for value in fixture.hours:
+        format_hours(value)
+
+
+def _bench_format_duration(fixture: Fixture):
+    for value in fixture.hours:
+        TimeFormatter.format_duration(value, show_sign=True, short_format=True)
+
+
+def _bench_format_hours_decimal(fixture: Fixture):
+    from app import format_hours_decimal
+    for value in fixture.hours:
+        format_hours_decimal(abs(value))
+
+
+def _bench_jinja_filters(fixture: Fixture):
+    filters = current_app.jinja_env.filters
+    format_hours, signed, badge = filters['format_hours'], filters['format_hours_signed'], filters['format_time_badge']
+    for value in fixture.hours:
+        format_hours(value)
+        signed(value)
+        badge(value)
+
+
+def _bench_format_report_row(fixture: Fixture):
+    from app.report_export import format_report_row
+    for row in fixture.report_rows:
+        format_report_row(row)
+
+
+def _bench_excel_report(fixture: Fixture):
+    from app.report_export import write_excel_report
+    with tempfile.TemporaryDirectory() as directory:
+        write_excel_report(os.path.join(directory, 'relatorio.xlsx'), iter(fixture.report_rows))
+
+
+def _bench_csv_report(fixture: Fixture):
+    from app.report_export import write_csv_report
+    write_csv_report(io.StringIO(), iter(fixture.report_rows))
+
+
+def _bench_pdf_report(fixture: Fixture):
+    from app.report_export import write_pdf_report
+    rows = fixture.report_rows[:PDF_MAX_ROWS]
+    write_pdf_report(io.BytesIO(), iter(rows), rows[0].data, rows[-1].data)
+
+
+def _bench_hour_bank_csv(fixture: Fixture):
+    from app.report_export import write_hour_bank_csv
+    write_hour_bank_csv(io.StringIO(), iter(fixture.hour_bank_rows))
+
+
+def _bench_hour_bank_pdf(fixture: Fixture):
+    from app.report_export import write_hour_bank_pdf
+    write_hour_bank_pdf(io.BytesIO(), iter(fixture.hour_bank_rows[:PDF_MAX_ROWS]))
+
+
+# (nome, função, linhas processadas por execução: None = fixture inteira)
+BENCHMARKS: List[tuple] = [
+    ('timerecord.calcular_horas_detalhado', _bench_calcular_horas_detalhado, None),
+    ('utils.calculate_work_hours', _bench_calculate_work_hours, None),
+    ('utils.format_hours', _bench_utils_format_hours, None),
+    ('time_formatter.format_duration', _bench_format_duration, None),
+    ('app.format_hours_decimal', _bench_format_hours_decimal, None),
+    ('template_filters.format_hours_*', _bench_jinja_filters, None),
+    ('report_export.format_report_row', _bench_format_report_row, None),
+    ('report_export.write_excel_report', _bench_excel_report, None),
+    ('report_export.write_csv_report', _bench_csv_report, None),
+    ('report_export.write_pdf_report', _bench_pdf_report, PDF_MAX_ROWS),
+    ('report_export.write_hour_bank_csv', _bench_hour_bank_csv, None),
+    ('report_export.write_hour_bank_pdf', _bench_hour_bank_pdf, PDF_MAX_ROWS),
+]
+
+
+def run_micro_benchmarks(sizes=(10000,), repeat: int = 5, only: Optional[List[str]] = None,
+                         progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Executa os micro-benchmarks para cada tamanho de fixture
+
+    O valor comparável é o menor tempo entre as repetições (menos sujeito a
+    ruído do sistema), normalizado em microssegundos por linha.
+    """
+    progress = progress or (lambda message: None)
+    results: Dict[str, Any] = {}
+    for size in sizes:
+        fixture = Fixture(size)
+        for name, function, max_rows in BENCHMARKS:
+            if only and not any(pattern in name for pattern in only):
+                continue
+            rows = min(size, max_rows) if max_rows else size
+            timings = []
+            try:
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    function(fixture)
+                    timings.append(time.perf_counter() - started)
+            except ImportError as e:
+                progress(f'{name}: ignorado ({e})')
+                continue
+            key = f'{name}@{size}'
+            results[key] = {
+                'rows': rows,
+                'min_s': round(min(timings), 6),
+                'median_s': round(statistics.median(timings), 6),
+                'us_per_row': round(min(timings) / rows * 1_000_000, 3)
+            }
+            progress(f"{key:<48} {results[key]['us_per_row']:>10} µs/linha")
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'repeat': repeat,
+        'benchmarks': results
+    }
+
+
+def find_regressions(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Benchmarks cujo tempo por linha passou de (1 + threshold) × linha de base"""
+    regressions = []
+    for key, current in results['benchmarks'].items():
+        previous = baseline.get('benchmarks', {}).get(key)
+        if not previous or not previous.get('us_per_row'):
+            continue
+        ratio = current['us_per_row'] / previous['us_per_row']
+        if ratio > 1 + threshold:
+            regressions.append({
+                'benchmark': key,
+                'baseline_us': previous['us_per_row'],
+                'current_us': current['us_per_row'],
+                'slower_percent': round((ratio - 1) * 100, 1)
+            })
+    return regressions
+
+
+def load_baseline(path: str = DEFAULT_BASELINE) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(results: Dict[str, Any], path: str = DEFAULT_BASELINE) -> str:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return path
@@ -1,5 +1,10 @@
-﻿from datetime import datetime, timezone
+﻿from datetime import datetime, date, timezone
 import os
+from collections import Counter
+from sqlalchemy import func, case, and_, or_, extract, insert, select, update, event, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
@@ -53,6 +58,13 @@ class BackupType(enum.Enum):
     COMPLETO = "COMPLETO"
     INCREMENTAL = "INCREMENTAL"
 
+class ReportJobStatus(enum.Enum):
+    """Status de um relatório gerado em segundo plano"""
+    PENDENTE = "PENDENTE"
+    PROCESSANDO = "PROCESSANDO"
+    CONCLUIDO = "CONCLUIDO"
+    FALHOU = "FALHOU"
+
 class ApprovalStatus(enum.Enum):
     """Status de aprovaçéo"""
     PENDENTE = "PENDENTE"
@@ -174,7 +186,9 @@ class User(UserMixin, db.Model):
                                            foreign_keys='OvertimeRequest.user_id', cascade=CASCADE_DELETE_ORPHAN)
     hour_compensations_rel = db.relationship('HourCompensation', lazy='dynamic',
                                            foreign_keys='HourCompensation.user_id', cascade=CASCADE_DELETE_ORPHAN)
-    
+    monthly_summaries_rel = db.relationship('MonthlyTimeSummary', lazy='dynamic',
+                                           foreign_keys='MonthlyTimeSummary.user_id', cascade=CASCADE_DELETE_ORPHAN)
+
     # English aliases for compatibility
     @property
     def time_records(self):
@@ -361,22 +375,25 @@ class TimeRecord(db.Model):
             horas_normais = self.usuario.expected_daily_hours
             self.horas_trabalhadas = min(horas_trabalhadas_brutas, horas_normais)
             self.horas_extras = self.usuario.calculate_overtime(horas_trabalhadas_brutas)
-            
+
+            # Atualizar resumo mensal na mesma transação
+            self.atualizar_resumo_mensal()
+
             # Processar horas extras no banco de horas automaticamente
             self._process_hours_to_bank(horas_trabalhadas_brutas, horas_normais)
         else:
             self.horas_trabalhadas = 0.0
             self.horas_extras = 0.0
+            self.atualizar_resumo_mensal()
+
+    def atualizar_resumo_mensal(self):
+        """Recalcula o resumo mensal do usuário para o mês deste registro"""
+        if self.user_id is None or self.data is None:
+            return
+        MonthlyTimeSummary.refresh_for_date(self.user_id, self.data)
     
     def _process_hours_to_bank(self, horas_trabalhadas_brutas, horas_normais):
         """Processa horas extras e déficit para o banco de horas do usuário"""
-        # Criar ou obter banco de horas do usuário
-        hour_bank = self.usuario.hour_bank
-        if not hour_bank:
-            hour_bank = HourBank(user_id=self.usuario.id)
-            db.session.add(hour_bank)
-            db.session.flush()  # Para obter o ID
-        
         # Verificar se já foi processado para evitar duplicaçéo
         existing_transaction = HourBankTransaction.query.filter_by(
             time_record_id=self.id
@@ -389,44 +406,35 @@ class TimeRecord(db.Model):
         diferenca_horas = horas_trabalhadas_brutas - horas_normais
         
         if diferenca_horas > 0:
-            # Horas extras - creditar no banco
-            hour_bank.add_hours(
+            # Horas extras - creditar no banco (cria o banco de horas se necessário)
+            HourBank.apply_delta(
+                self.user_id,
                 diferenca_horas,
                 HourBankTransactionType.CREDITO,
-                f"Horas extras do dia {self.data.strftime('%d/%m/%Y')} - {diferenca_horas:.2f}h extras"
+                f"Horas extras do dia {self.data.strftime('%d/%m/%Y')} - {diferenca_horas:.2f}h extras",
+                time_record_id=self.id,
+                reference_date=self.data
             )
-            
-            # Associar a transaçéo a este registro de ponto
-            transaction = HourBankTransaction.query.filter_by(
-                user_id=self.usuario.id,
-                time_record_id=None
-            ).order_by(HourBankTransaction.created_at.desc()).first()
-            
-            if transaction:
-                transaction.time_record_id = self.id
-                transaction.reference_date = self.data
                 
-        elif diferenca_horas < 0 and hour_bank.current_balance > 0:
+        elif diferenca_horas < 0:
             # Déficit de horas - debitar do banco se houver saldo
-            horas_deficit = abs(diferenca_horas)
-            horas_a_debitar = min(horas_deficit, hour_bank.current_balance)
+            saldo = db.session.query(HourBank.current_balance).filter_by(user_id=self.user_id).scalar() or 0.0
+            horas_a_debitar = min(abs(diferenca_horas), saldo)
             
             if horas_a_debitar > 0:
-                hour_bank.debit_hours(
-                    horas_a_debitar,
-                    HourBankTransactionType.DEBITO,
-                    f"Compensaçéo de déficit do dia {self.data.strftime('%d/%m/%Y')} - {horas_a_debitar:.2f}h debitadas"
-                )
-                
-                # Associar a transaçéo a este registro de ponto
-                transaction = HourBankTransaction.query.filter_by(
-                    user_id=self.usuario.id,
-                    time_record_id=None
-                ).order_by(HourBankTransaction.created_at.desc()).first()
-                
-                if transaction:
-                    transaction.time_record_id = self.id
-                    transaction.reference_date = self.data
+                try:
+                    HourBank.apply_delta(
+                        self.user_id,
+                        -horas_a_debitar,
+                        HourBankTransactionType.DEBITO,
+                        f"Compensaçéo de déficit do dia {self.data.strftime('%d/%m/%Y')} - {horas_a_debitar:.2f}h debitadas",
+                        allow_negative=False,
+                        time_record_id=self.id,
+                        reference_date=self.data
+                    )
+                except InsufficientHourBalance:
+                    # Saldo consumido por outra operação entre a leitura e o débito
+                    pass
 
 
     def calcular_horas_detalhado(self, saida_almoco=None, volta_almoco=None):
@@ -468,11 +476,148 @@ class TimeRecord(db.Model):
         # Definir horas normais e extras
         horas_normais = self.usuario.expected_daily_hours
         self.horas_trabalhadas = min(horas_trabalhadas_brutas, horas_normais)
-        self.horas_extras = self.usuario.calcular_horas_extras(horas_trabalhadas_brutas)
+        self.horas_extras = self.usuario.calculate_overtime(horas_trabalhadas_brutas)
     
     def __repr__(self):
         return f'<TimeRecord {self.usuario.nome} - {self.data}>'
 
+class MonthlyTimeSummary(db.Model):
+    """Resumo mensal pré-calculado dos registros de ponto por usuário"""
+    __tablename__ = 'monthly_time_summaries'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'year', 'month', name='uq_monthly_summary_user_month'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey(USERS_TABLE_ID), nullable=False, index=True)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    total_hours = db.Column(db.Float, default=0.0, nullable=False)      # Soma de horas_trabalhadas
+    total_overtime = db.Column(db.Float, default=0.0, nullable=False)   # Soma de horas_extras
+    complete_days = db.Column(db.Integer, default=0, nullable=False)    # Dias com entrada e saída
+    attestation_days = db.Column(db.Integer, default=0, nullable=False) # Dias cobertos por atestado
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relacionamento
+    user = db.relationship('User', foreign_keys=[user_id], overlaps="monthly_summaries_rel")
+
+    @staticmethod
+    def _month_bounds(year, month):
+        """Retorna (primeiro dia do mês, primeiro dia do mês seguinte)"""
+        inicio = date(year, month, 1)
+        fim = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        return inicio, fim
+
+    @classmethod
+    def _lock_row(cls, user_id, year, month):
+        """Garante a linha do mês e a bloqueia até o fim da transação do chamador.
+
+        Se outra transação criou a linha ao mesmo tempo, o INSERT falha só no
+        savepoint e a linha dela é usada.
+        """
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(cls.__table__).values(
+                    user_id=user_id, year=year, month=month, total_hours=0.0, total_overtime=0.0,
+                    complete_days=0, attestation_days=0, updated_at=datetime.utcnow()
+                ))
+        except IntegrityError:
+            pass
+        return cls.query.filter_by(user_id=user_id, year=year, month=month).populate_existing().with_for_update().one()
+
+    @classmethod
+    def refresh(cls, user_id, year, month):
+        """Recalcula o resumo de um mês com uma única agregação SQL.
+
+        A linha é bloqueada antes da agregação, então duas batidas simultâneas do
+        mesmo usuário no mesmo mês não gravam somas desatualizadas. Não faz
+        commit: a linha é gravada junto com a transação do chamador.
+        """
+        inicio, fim = cls._month_bounds(year, month)
+        summary = cls._lock_row(user_id, year, month)
+
+        total_hours, total_overtime, complete_days, attestation_days = db.session.query(
+            func.coalesce(func.sum(TimeRecord.horas_trabalhadas), 0.0),
+            func.coalesce(func.sum(TimeRecord.horas_extras), 0.0),
+            func.coalesce(func.sum(case(
+                (and_(TimeRecord.entrada.isnot(None), TimeRecord.saida.isnot(None)), 1), else_=0
+            )), 0),
+            func.coalesce(func.sum(case((TimeRecord.is_atestado.is_(True), 1), else_=0)), 0)
+        ).filter(
+            TimeRecord.user_id == user_id,
+            TimeRecord.data >= inicio,
+            TimeRecord.data < fim
+        ).one()
+
+        summary.total_hours = float(total_hours or 0.0)
+        summary.total_overtime = float(total_overtime or 0.0)
+        summary.complete_days = int(complete_days or 0)
+        summary.attestation_days = int(attestation_days or 0)
+        summary.updated_at = datetime.utcnow()
+        return summary
+
+    @classmethod
+    def refresh_for_date(cls, user_id, day):
+        """Recalcula o resumo do mês que contém a data informada"""
+        return cls.refresh(user_id, day.year, day.month)
+
+    @classmethod
+    def get_for_month(cls, user_id, year, month):
+        """Retorna o resumo do mês, construindo-o na primeira leitura.
+
+        Só faz flush: a linha construída fica gravada se a requisição fizer
+        commit; senão é refeita na próxima leitura ou batida do mês.
+        """
+        summary = cls.query.filter_by(user_id=user_id, year=year, month=month).first()
+        if summary:
+            return summary
+
+        summary = cls.refresh(user_id, year, month)
+        db.session.flush([summary])
+        return summary
+
+    @classmethod
+    def rebuild(cls, user_id=None):
+        """Reconstrói todos os resumos (ou os de um usuário) com um GROUP BY"""
+        year_col = extract('year', TimeRecord.data)
+        month_col = extract('month', TimeRecord.data)
+
+        query = db.session.query(
+            TimeRecord.user_id,
+            year_col,
+            month_col,
+            func.coalesce(func.sum(TimeRecord.horas_trabalhadas), 0.0),
+            func.coalesce(func.sum(TimeRecord.horas_extras), 0.0),
+            func.sum(case(
+                (and_(TimeRecord.entrada.isnot(None), TimeRecord.saida.isnot(None)), 1), else_=0
+            )),
+            func.sum(case((TimeRecord.is_atestado.is_(True), 1), else_=0))
+        )
+        delete_query = cls.query
+        if user_id is not None:
+            query = query.filter(TimeRecord.user_id == user_id)
+            delete_query = delete_query.filter_by(user_id=user_id)
+
+        rows = query.group_by(TimeRecord.user_id, year_col, month_col).all()
+
+        delete_query.delete(synchronize_session=False)
+        now = datetime.utcnow()
+        db.session.bulk_insert_mappings(cls, [{
+            'user_id': row[0],
+            'year': int(row[1]),
+            'month': int(row[2]),
+            'total_hours': float(row[3] or 0.0),
+            'total_overtime': float(row[4] or 0.0),
+            'complete_days': int(row[5] or 0),
+            'attestation_days': int(row[6] or 0),
+            'updated_at': now
+        } for row in rows])
+        db.session.commit()
+        return len(rows)
+
+    def __repr__(self):
+        return f'<MonthlyTimeSummary user={self.user_id} {self.month:02d}/{self.year}>'
+
 class MedicalAttestation(db.Model):
     """Modelo de atestado mé©dico"""
     __tablename__ = 'medical_attestations'
@@ -508,6 +653,12 @@ class MedicalAttestation(db.Model):
 class Notification(db.Model):
     """Modelo de notificaé§éµes"""
     __tablename__ = 'notifications'
+    __table_args__ = (
+        # Feed do usuário: filtro por user_id e paginação por (created_at, id)
+        db.Index('ix_notifications_user_created', 'user_id', 'created_at', 'id'),
+        # Listas de não lidas (dashboard, recontagem do contador)
+        db.Index('ix_notifications_user_lida_created', 'user_id', 'lida', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey(USERS_TABLE_ID), nullable=False)
@@ -521,6 +672,143 @@ class Notification(db.Model):
     def __repr__(self):
         return f'<Notification {self.titulo}>'
 
+class BroadcastNotification(db.Model):
+    """Comunicado gravado uma única vez e exibido a um público (todos, tipo de usuário ou classe)"""
+    __tablename__ = 'broadcast_notifications'
+
+    AUDIENCE_ALL = 'all'
+    AUDIENCE_USER_TYPE = 'user_type'
+    AUDIENCE_WORK_CLASS = 'work_class'
+
+    id = db.Column(db.Integer, primary_key=True)
+    sender_id = db.Column(db.Integer, db.ForeignKey(USERS_TABLE_ID), nullable=True)
+    titulo = db.Column(db.String(200), nullable=False)
+    mensagem = db.Column(db.Text, nullable=False)
+    tipo = db.Column(db.Enum(NotificationType), default=NotificationType.INFO, nullable=False)
+    audience = db.Column(db.String(20), default=AUDIENCE_ALL, nullable=False)
+    audience_user_type = db.Column(db.Enum(UserType), nullable=True)
+    audience_work_class_id = db.Column(db.Integer, db.ForeignKey('work_classes.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    sender = db.relationship('User', foreign_keys=[sender_id])
+    work_class = db.relationship('WorkClass', foreign_keys=[audience_work_class_id])
+
+    @classmethod
+    def visible_to(cls, user):
+        """Condição SQL dos comunicados do público do usuário, enviados após o cadastro dele"""
+        conditions = [cls.audience == cls.AUDIENCE_ALL,
+                      and_(cls.audience == cls.AUDIENCE_USER_TYPE, cls.audience_user_type == user.user_type)]
+        if user.work_class_id:
+            conditions.append(and_(cls.audience == cls.AUDIENCE_WORK_CLASS,
+                                   cls.audience_work_class_id == user.work_class_id))
+        visible = or_(*conditions)
+        if user.created_at:
+            visible = and_(visible, cls.created_at >= user.created_at)
+        return visible
+
+    def recipient_ids_query(self):
+        """SELECT dos IDs dos usuários do público do comunicado"""
+        query = select(User.id)
+        if self.audience == self.AUDIENCE_USER_TYPE:
+            query = query.where(User.user_type == self.audience_user_type)
+        elif self.audience == self.AUDIENCE_WORK_CLASS:
+            query = query.where(User.work_class_id == self.audience_work_class_id)
+        return query
+
+    def __repr__(self):
+        return f'<BroadcastNotification {self.titulo} ({self.audience})>'
+
+class BroadcastReceipt(db.Model):
+    """Confirmação de leitura (ou ocultação) de um comunicado; só existe após a ação do usuário"""
+    __tablename__ = 'broadcast_receipts'
+    __table_args__ = (
+        db.UniqueConstraint('broadcast_id', 'user_id', name='uq_broadcast_receipt_user'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    broadcast_id = db.Column(db.Integer, db.ForeignKey('broadcast_notifications.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey(USERS_TABLE_ID), nullable=False, index=True)
+    read_at = db.Column(db.DateTime, nullable=True)
+    dismissed = db.Column(db.Boolean, default=False, nullable=False)  # Removido da lista pelo usuário
+
+    def __repr__(self):
+        return f'<BroadcastReceipt broadcast={self.broadcast_id} user={self.user_id}>'
+
+class NotificationCounter(db.Model):
+    """Contador de não lidas por usuário (notificações pessoais + comunicados)
+
+    Mantido em cada inserção, leitura e exclusão; `version` muda a cada
+    alteração do feed e compõe o ETag do polling da barra de navegação. Sem
+    linha, o contador ainda não foi calculado (é criado na primeira leitura).
+    """
+    __tablename__ = 'notification_counters'
+
+    user_id = db.Column(db.Integer, db.ForeignKey(USERS_TABLE_ID, ondelete='CASCADE'), primary_key=True)
+    unread = db.Column(db.Integer, default=0, nullable=False)
+    version = db.Column(db.Integer, default=1, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @classmethod
+    def bump(cls, user_ids, delta=0, connection=None):
+        """Soma delta ao contador dos usuários (lista ou SELECT de IDs) e avança a versão.
+
+        Usuários sem linha são ignorados: o valor será recalculado na leitura.
+        """
+        table = cls.__table__
+        unread = table.c.unread + delta
+        stmt = update(table).where(table.c.user_id.in_(user_ids)).values(
+            unread=case((unread < 0, 0), else_=unread),
+            version=table.c.version + 1,
+            updated_at=datetime.utcnow()
+        )
+        (connection or db.session).execute(stmt)
+
+    @classmethod
+    def apply_deltas(cls, deltas, connection=None):
+        """Aplica um Counter {user_id: delta}, com um UPDATE por valor de delta"""
+        by_delta = {}
+        for user_id, delta in deltas.items():
+            if user_id is not None:
+                by_delta.setdefault(delta, []).append(user_id)
+        for delta, user_ids in by_delta.items():
+            cls.bump(user_ids, delta, connection)
+
+    @classmethod
+    def reset(cls, user_id, unread=0):
+        table = cls.__table__
+        db.session.execute(update(table).where(table.c.user_id == user_id).values(
+            unread=unread, version=table.c.version + 1, updated_at=datetime.utcnow()
+        ))
+
+    def __repr__(self):
+        return f'<NotificationCounter user={self.user_id} unread={self.unread}>'
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_notification_counters(session, flush_context):
+    """Atualiza NotificationCounter para notificações criadas, lidas ou removidas via ORM.
+
+    Inserts/updates em lote (insert(Notification), update(Notification))
+    não passam por aqui e chamam NotificationCounter.bump/reset diretamente.
+    """
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, Notification):
+            state = inspect(obj).dict
+            deltas[state.get('user_id')] += 0 if state.get('lida') else 1
+    for obj in session.deleted:
+        if isinstance(obj, Notification):
+            state = inspect(obj).dict
+            # Sem o valor carregado, considera lida (nunca deixa o contador negativo)
+            deltas[state.get('user_id')] -= 0 if state.get('lida', True) else 1
+    for obj in session.dirty:
+        if isinstance(obj, Notification):
+            history = inspect(obj).attrs.lida.history
+            if history.added and history.deleted and bool(history.added[0]) != bool(history.deleted[0]):
+                deltas[inspect(obj).dict.get('user_id')] += -1 if history.added[0] else 1
+    if deltas:
+        NotificationCounter.apply_deltas(deltas, session.connection())
+
 class SecurityLog(db.Model):
     """Modelo de logs de segurané§a"""
     __tablename__ = 'security_logs'
@@ -567,6 +855,13 @@ class BackupHistory(db.Model):
     started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     completed_at = db.Column(db.DateTime, nullable=True)
     created_by = db.Column(db.Integer, db.ForeignKey(USERS_TABLE_ID), nullable=True)
+    # Progresso gravado pelo processo de backup (o dashboard faz polling)
+    files_total = db.Column(db.Integer, nullable=True)
+    files_done = db.Column(db.Integer, default=0, nullable=True)
+    bytes_total = db.Column(db.BigInteger, nullable=True)
+    bytes_done = db.Column(db.BigInteger, default=0, nullable=True)
+    progress_updated_at = db.Column(db.DateTime, nullable=True)
+    worker_pid = db.Column(db.Integer, nullable=True)
     
     # Relacionamento
     creator = db.relationship('User', foreign_keys=[created_by])
@@ -600,9 +895,102 @@ class BackupHistory(db.Model):
         else:
             return f"{self.file_size/1024:.1f} KB"
     
+    @property
+    def is_finished(self):
+        return self.status in (BackupStatus.CONCLUIDO, BackupStatus.FALHOU, BackupStatus.CANCELADO)
+    
+    @property
+    def progress_percent(self):
+        """Percentual concluído pelos bytes lidos (None antes da contagem inicial)"""
+        if self.status == BackupStatus.CONCLUIDO:
+            return 100.0
+        if not self.bytes_total:
+            return None
+        return round(min(100.0, 100.0 * (self.bytes_done or 0) / self.bytes_total), 1)
+    
+    @property
+    def eta_seconds(self):
+        """Estimativa de tempo restante pela taxa média de leitura até agora"""
+        if self.is_finished or not self.bytes_total or not self.bytes_done or not self.progress_updated_at:
+            return None
+        elapsed = (self.progress_updated_at.replace(tzinfo=None) - self.started_at.replace(tzinfo=None)).total_seconds()
+        if elapsed <= 0:
+            return None
+        rate = self.bytes_done / elapsed
+        return int(max(0, self.bytes_total - self.bytes_done) / rate)
+    
+    def progress_dict(self):
+        return {
+            'id': self.id,
+            'filename': self.filename,
+            'status': self.status.value,
+            'files_done': self.files_done or 0,
+            'files_total': self.files_total,
+            'bytes_done': self.bytes_done or 0,
+            'bytes_total': self.bytes_total,
+            'percent': self.progress_percent,
+            'eta_seconds': self.eta_seconds,
+            'error_message': self.error_message,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+    
     def __repr__(self):
         return f'<BackupHistory {self.filename} - {self.status.value}>'
 
+class ReportJob(db.Model):
+    """Fila de relatórios gerados em segundo plano"""
+    __tablename__ = 'report_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    report_type = db.Column(db.String(50), nullable=False)  # time_records, hour_bank
+    formato = db.Column(db.String(20), nullable=False)  # pdf, excel, csv
+    params = db.Column(db.Text, nullable=False)  # JSON normalizado dos filtros
+    params_hash = db.Column(db.String(64), nullable=False, index=True)
+    status = db.Column(db.Enum(ReportJobStatus), nullable=False, default=ReportJobStatus.PENDENTE, index=True)
+    file_name = db.Column(db.String(255), nullable=True)
+    file_path = db.Column(db.String(500), nullable=True)
+    file_size = db.Column(db.BigInteger, nullable=True)
+    row_count = db.Column(db.Integer, nullable=True)
+    error_message = db.Column(db.Text, nullable=True)
+    requested_by = db.Column(db.Integer, db.ForeignKey(USERS_TABLE_ID), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    
+    # Relacionamento
+    requester = db.relationship('User', foreign_keys=[requested_by])
+    
+    @property
+    def is_finished(self):
+        return self.status in (ReportJobStatus.CONCLUIDO, ReportJobStatus.FALHOU)
+    
+    @property
+    def duration_seconds(self):
+        """Tempo de geração em segundos"""
+        if not self.started_at or not self.completed_at:
+            return None
+        return round((self.completed_at - self.started_at).total_seconds(), 1)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'report_type': self.report_type,
+            'formato': self.formato,
+            'status': self.status.value,
+            'file_name': self.file_name,
+            'file_size': self.file_size,
+            'row_count': self.row_count,
+            'error_message': self.error_message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'duration_seconds': self.duration_seconds
+        }
+    
+    def __repr__(self):
+        return f'<ReportJob {self.id} {self.report_type}/{self.formato} - {self.status.value}>'
+
 class UserApprovalRequest(db.Model):
     """Solicitações de aprovaçéo de usuários"""
     __tablename__ = 'user_approval_requests'
@@ -746,6 +1134,10 @@ class OvertimeRequest(db.Model):
     def __repr__(self):
         return f'<OvertimeRequest {self.user.nome if self.user else "N/A"} - {self.date}>'
 
+class InsufficientHourBalance(ValueError):
+    """Débito maior que o saldo disponível no banco de horas"""
+
+
 class HourBank(db.Model):
     """Banco de horas do usuário"""
     __tablename__ = 'hour_bank'
@@ -789,67 +1181,115 @@ class HourBank(db.Model):
         """Verifica se pode debitar horas"""
         return self.current_balance >= hours
     
-    def add_hours(self, hours, transaction_type=HourBankTransactionType.CREDITO, description=""):
-        """Adiciona horas ao banco"""
-        balance_before = self.current_balance  # Capturar saldo antes da alteraçéo
-        self.current_balance += hours
-        self.total_credited += hours
-        self.last_transaction = datetime.now(timezone.utc)
-        
-        # Registrar transaçéo
-        transaction = HourBankTransaction(
-            user_id=self.user_id,
-            transaction_type=transaction_type,
-            hours=hours,
-            balance_before=balance_before,
-            balance_after=self.current_balance,
-            description=description
-        )
-        db.session.add(transaction)
-    
-    def debit_hours(self, hours, transaction_type=HourBankTransactionType.DEBITO, description="", allow_negative=False):
-        """Remove horas do banco"""
-        if not allow_negative and not self.can_debit(hours):
-            raise ValueError(f"Saldo insuficiente. Saldo atual: {self.current_balance}h, tentativa de débito: {hours}h")
-        
-        balance_before = self.current_balance  # Capturar saldo antes da alteraçéo
-        self.current_balance -= hours
-        self.total_debited += hours
-        self.last_transaction = datetime.now(timezone.utc)
-        
-        # Registrar transaçéo
-        transaction = HourBankTransaction(
-            user_id=self.user_id,
-            transaction_type=transaction_type,
-            hours=-hours,  # Negativo para débito
-            balance_before=balance_before,
-            balance_after=self.current_balance,
-            description=description
+    @classmethod
+    def apply_delta(cls, user_id, delta, transaction_type, description="", allow_negative=True, **fields):
+        """
+        Aplica uma variação ao saldo de forma atômica e registra a transação
+
+        O saldo é alterado no próprio banco (UPDATE ... SET current_balance =
+        current_balance + :delta RETURNING), então duas operações simultâneas
+        nunca perdem atualização. Sem RETURNING (MySQL) a linha é travada com
+        SELECT ... FOR UPDATE. Com allow_negative=False o débito só é aplicado
+        se o saldo no momento do UPDATE for suficiente.
+
+        Args:
+            fields: colunas extras da transação (reference_date, time_record_id,
+                created_by, overtime_request_id, expires_at)
+
+        Returns:
+            HourBankTransaction: transação criada (já com id)
+
+        Raises:
+            InsufficientHourBalance: saldo insuficiente para o débito
+        """
+        # Grava pendências (ex.: HourBank recém-adicionado) antes do UPDATE direto
+        db.session.flush()
+        table = cls.__table__
+        now = datetime.now(timezone.utc)
+        conditions = [table.c.user_id == user_id]
+        if not allow_negative and delta < 0:
+            conditions.append(table.c.current_balance + delta >= 0)
+        values = dict(
+            current_balance=table.c.current_balance + delta,
+            total_credited=table.c.total_credited + max(delta, 0.0),
+            total_debited=table.c.total_debited + max(-delta, 0.0),
+            last_transaction=now,
+            updated_at=now
         )
-        db.session.add(transaction)
-    
-    def admin_adjust_hours(self, hours_adjustment, transaction_type=HourBankTransactionType.AJUSTE, description=""):
-        """Ajusta horas permitindo saldo negativo (só para admins)"""
-        balance_before = self.current_balance
-        self.current_balance += hours_adjustment
-        
-        if hours_adjustment > 0:
-            self.total_credited += hours_adjustment
+
+        for attempt in range(2):
+            if db.engine.dialect.update_returning:
+                balance_after = db.session.execute(
+                    table.update().where(*conditions).values(**values).returning(table.c.current_balance)
+                ).scalar()
+            else:
+                locked = db.session.execute(
+                    select(table.c.current_balance).where(*conditions).with_for_update()
+                ).scalar()
+                balance_after = None
+                if locked is not None:
+                    db.session.execute(table.update().where(table.c.user_id == user_id).values(**values))
+                    balance_after = locked + delta
+            if balance_after is not None:
+                break
+
+            current = db.session.execute(
+                select(table.c.current_balance).where(table.c.user_id == user_id)
+            ).scalar()
+            if current is not None:
+                raise InsufficientHourBalance(
+                    f"Saldo insuficiente. Saldo atual: {current}h, tentativa de débito: {abs(delta)}h"
+                )
+            if attempt == 0:
+                cls._create_for_user(user_id)
         else:
-            self.total_debited += abs(hours_adjustment)
-            
-        self.last_transaction = datetime.now(timezone.utc)
-        
-        # Registrar transaçéo
+            raise RuntimeError(f"Banco de horas do usuário {user_id} não pôde ser criado")
+
+        # Mantém coerentes os objetos HourBank já carregados nesta sessão
+        for obj in list(db.session.identity_map.values()):
+            if isinstance(obj, cls) and obj.user_id == user_id:
+                set_committed_value(obj, 'current_balance', balance_after)
+                set_committed_value(obj, 'total_credited', (obj.total_credited or 0.0) + max(delta, 0.0))
+                set_committed_value(obj, 'total_debited', (obj.total_debited or 0.0) + max(-delta, 0.0))
+                set_committed_value(obj, 'last_transaction', now)
+
         transaction = HourBankTransaction(
-            user_id=self.user_id,
+            user_id=user_id,
             transaction_type=transaction_type,
-            hours=hours_adjustment,
-            balance_before=balance_before,
-            balance_after=self.current_balance,
-            description=description
+            hours=delta,
+            balance_before=balance_after - delta,
+            balance_after=balance_after,
+            description=description,
+            **fields
         )
         db.session.add(transaction)
+        db.session.flush([transaction])
+        return transaction
+
+    @classmethod
+    def _create_for_user(cls, user_id):
+        """Cria o banco de horas; se outro processo criou ao mesmo tempo, usa o dele"""
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(cls.__table__).values(
+                    user_id=user_id, current_balance=0.0, total_credited=0.0, total_debited=0.0,
+                    expiration_enabled=True, expiration_months=12, created_at=datetime.utcnow()
+                ))
+        except IntegrityError:
+            pass
+
+    def add_hours(self, hours, transaction_type=HourBankTransactionType.CREDITO, description="", **fields):
+        """Adiciona horas ao banco e retorna a transação criada"""
+        return self.apply_delta(self.user_id, hours, transaction_type, description, **fields)
+    
+    def debit_hours(self, hours, transaction_type=HourBankTransactionType.DEBITO, description="", allow_negative=False, **fields):
+        """Remove horas do banco e retorna a transação criada"""
+        return self.apply_delta(self.user_id, -hours, transaction_type, description,
+                                allow_negative=allow_negative, **fields)
+    
+    def admin_adjust_hours(self, hours_adjustment, transaction_type=HourBankTransactionType.AJUSTE, description="", **fields):
+        """Ajusta horas permitindo saldo negativo (só para admins) e retorna a transação criada"""
+        return self.apply_delta(self.user_id, hours_adjustment, transaction_type, description, **fields)
     
     def __repr__(self):
         return f'<HourBank {self.user.nome if self.user else "N/A"} - {self.formatted_balance}>'
@@ -857,6 +1297,10 @@ class HourBank(db.Model):
 class HourBankTransaction(db.Model):
     """Histórico de transações do banco de horas"""
     __tablename__ = 'hour_bank_transactions'
+    __table_args__ = (
+        # Saldo em uma data: soma das transações do usuário por created_at
+        db.Index('ix_hour_bank_transactions_user_created', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey(USERS_TABLE_ID), nullable=False)
@@ -908,6 +1352,145 @@ class HourBankTransaction(db.Model):
     def __repr__(self):
         return f'<HourBankTransaction {self.user.nome if self.user else "N/A"} - {self.formatted_hours}>'
 
+class HourBankCheckpoint(db.Model):
+    """Saldo consolidado do banco de horas em um instante (normalmente o dia 1º de cada mês).
+
+    O saldo em qualquer data é o do último checkpoint anterior mais a soma das
+    transações entre ele e a data, então a consulta não percorre o histórico
+    inteiro. As transações da aplicação são sempre gravadas com a hora atual e
+    não há checkpoints no futuro, então um checkpoint nunca fica desatualizado;
+    invalidate() existe para cargas externas de transações com data retroativa.
+    """
+    __tablename__ = 'hour_bank_checkpoints'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'as_of', name='uq_hour_bank_checkpoint_user_as_of'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey(USERS_TABLE_ID), nullable=False, index=True)
+    as_of = db.Column(db.DateTime, nullable=False, index=True)   # Saldo das transações anteriores a este instante
+    balance = db.Column(db.Float, default=0.0, nullable=False)
+    transactions_count = db.Column(db.Integer, default=0, nullable=False)  # Transações desde o checkpoint anterior
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    @staticmethod
+    def _boundary(moment):
+        """Data vira o início do dia (00:00); datetime é usado como está"""
+        if isinstance(moment, datetime):
+            return moment.replace(tzinfo=None)
+        return datetime.combine(moment, datetime.min.time())
+
+    @classmethod
+    def _latest_subquery(cls, boundary, strict=False):
+        """Último checkpoint de cada usuário até o instante (strict: antes dele)"""
+        condition = cls.as_of < boundary if strict else cls.as_of <= boundary
+        latest = db.session.query(
+            cls.user_id, func.max(cls.as_of).label('as_of')
+        ).filter(condition).group_by(cls.user_id).subquery()
+        return db.session.query(cls.user_id, cls.as_of, cls.balance).join(
+            latest, and_(cls.user_id == latest.c.user_id, cls.as_of == latest.c.as_of)
+        ).subquery()
+
+    @classmethod
+    def balance_as_of(cls, user_id, moment):
+        """Saldo do usuário no início de `moment` (data) ou no instante (datetime)"""
+        boundary = cls._boundary(moment)
+        checkpoint = cls.query.filter(
+            cls.user_id == user_id, cls.as_of <= boundary
+        ).order_by(cls.as_of.desc()).first()
+
+        tail = db.session.query(func.coalesce(func.sum(HourBankTransaction.hours), 0.0)).filter(
+            HourBankTransaction.user_id == user_id,
+            HourBankTransaction.created_at < boundary
+        )
+        if checkpoint:
+            tail = tail.filter(HourBankTransaction.created_at >= checkpoint.as_of)
+        return (checkpoint.balance if checkpoint else 0.0) + float(tail.scalar() or 0.0)
+
+    @classmethod
+    def _as_of_query(cls, boundary, user_ids=None, strict=False):
+        checkpoint = cls._latest_subquery(boundary, strict)
+        transaction = HourBankTransaction.__table__
+        query = db.session.query(
+            HourBank.user_id,
+            (func.coalesce(checkpoint.c.balance, 0.0) + func.coalesce(func.sum(transaction.c.hours), 0.0)).label('balance'),
+            func.count(transaction.c.id).label('transactions')
+        ).outerjoin(
+            checkpoint, checkpoint.c.user_id == HourBank.user_id
+        ).outerjoin(
+            transaction, and_(
+                transaction.c.user_id == HourBank.user_id,
+                transaction.c.created_at < boundary,
+                or_(checkpoint.c.as_of.is_(None), transaction.c.created_at >= checkpoint.c.as_of)
+            )
+        ).group_by(HourBank.user_id, checkpoint.c.balance)
+        if user_ids is not None:
+            query = query.filter(HourBank.user_id.in_(user_ids))
+        return query
+
+    @classmethod
+    def balances_as_of(cls, moment, user_ids=None):
+        """Saldos de todos os usuários (ou dos informados) no instante, em uma única query
+
+        Returns:
+            dict: {user_id: saldo}
+        """
+        boundary = cls._boundary(moment)
+        return {row.user_id: float(row.balance or 0.0) for row in cls._as_of_query(boundary, user_ids)}
+
+    @classmethod
+    def create(cls, moment, user_ids=None):
+        """Grava (ou regrava) os checkpoints de todos os usuários no instante informado.
+
+        Usa o checkpoint anterior de cada usuário, então gerar os meses em ordem
+        cronológica custa apenas as transações de cada mês. Não faz commit.
+        """
+        boundary = cls._boundary(moment)
+        if boundary > datetime.utcnow():
+            raise ValueError(f"Checkpoint no futuro ({boundary:%Y-%m-%d}): transações até lá ficariam de fora")
+        rows = [{
+            'user_id': row.user_id, 'as_of': boundary, 'balance': float(row.balance or 0.0),
+            'transactions_count': int(row.transactions or 0), 'created_at': datetime.utcnow()
+        } for row in cls._as_of_query(boundary, user_ids, strict=True)]
+
+        delete = cls.__table__.delete().where(cls.as_of == boundary)
+        if user_ids is not None:
+            delete = delete.where(cls.user_id.in_(user_ids))
+        db.session.execute(delete)
+        if rows:
+            db.session.execute(insert(cls), rows)
+        return len(rows)
+
+    @classmethod
+    def create_monthly(cls, until=None, since=None, user_ids=None):
+        """Checkpoints do dia 1º de cada mês, da primeira transação (ou `since`) até `until`"""
+        until = until or date.today()
+        if since is None:
+            first = db.session.query(func.min(HourBankTransaction.created_at)).scalar()
+            if first is None:
+                return 0
+            since = first.date()
+        year, month = since.year, since.month
+        if since.day != 1:
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+        total = 0
+        while date(year, month, 1) <= until:
+            total += cls.create(date(year, month, 1), user_ids)
+            db.session.flush()
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return total
+
+    @classmethod
+    def invalidate(cls, user_id, since):
+        """Remove checkpoints posteriores a uma transação retroativa do usuário (não faz commit)"""
+        return cls.query.filter(cls.user_id == user_id, cls.as_of > cls._boundary(since)).delete(
+            synchronize_session=False
+        )
+
+    def __repr__(self):
+        return f'<HourBankCheckpoint user={self.user_id} {self.as_of:%Y-%m-%d} {self.balance:.2f}h>'
+
 class HourCompensation(db.Model):
     """Compensações de horas (folgas programadas)"""
     __tablename__ = 'hour_compensations'
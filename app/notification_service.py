@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Notificações - SKPONTO
+Envio em lote (insert por bloco, uma transação), comunicados gravados uma
+única vez por público e o feed que junta notificações pessoais e comunicados
+com paginação por cursor (keyset)
+"""
+
+from datetime import datetime
+from sqlalchemy import and_, exists, func, insert, literal, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from app import db
+from app.event_stream import EVENT_NOTIFICATION, EVENT_UNREAD, queue_event
+from app.models import (BroadcastNotification, BroadcastReceipt, Notification, NotificationCounter,
+                        NotificationType, User, UserType)
+
+DEFAULT_CHUNK_SIZE = 1000
+KIND_PERSONAL = 'n'
+KIND_BROADCAST = 'b'
+
+
+def recipient_ids_query(user_type=None, active_only=True):
+    """SELECT dos IDs de destinatários (sem carregar objetos User)"""
+    stmt = select(User.id)
+    if active_only:
+        stmt = stmt.where(User.is_active.is_(True))
+    if user_type is not None:
+        stmt = stmt.where(User.user_type == user_type)
+    return stmt
+
+
+def notify_users(user_ids, titulo, mensagem, tipo='info', sender_id=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE, commit=True):
+    """Cria a mesma notificação para vários usuários.
+
+    Args:
+        user_ids: lista de IDs ou um SELECT de IDs (ver recipient_ids_query)
+        tipo: valor de NotificationType ('info', 'success', ...) ou o próprio enum
+        commit: com False, as linhas ficam na transação do chamador
+
+    Returns:
+        int: número de notificações criadas
+    """
+    if hasattr(user_ids, 'compile'):
+        user_ids = db.session.execute(user_ids).scalars().all()
+
+    tipo = tipo if isinstance(tipo, NotificationType) else NotificationType(tipo)
+    created_at = datetime.utcnow()
+    total = 0
+    batch = []
+
+    def write(batch):
+        db.session.execute(insert(Notification), batch)
+        # insert em lote não passa pelos eventos do ORM: contador atualizado aqui
+        user_ids = [row['user_id'] for row in batch]
+        NotificationCounter.bump(user_ids, 1)
+        queue_event(EVENT_NOTIFICATION, {
+            'kind': 'personal', 'titulo': titulo, 'mensagem': mensagem,
+            'tipo': tipo.value, 'created_at': created_at.isoformat()
+        }, user_ids=user_ids)
+
+    for user_id in user_ids:
+        batch.append({
+            'user_id': user_id,
+            'sender_id': sender_id,
+            'titulo': titulo,
+            'mensagem': mensagem,
+            'tipo': tipo,
+            'lida': False,
+            'created_at': created_at
+        })
+        if len(batch) >= chunk_size:
+            write(batch)
+            total += len(batch)
+            batch = []
+
+    if batch:
+        write(batch)
+        total += len(batch)
+
+    if commit:
+        db.session.commit()
+    return total
+
+
+def notify_admins(titulo, mensagem, tipo='info', sender_id=None, commit=True):
+    """Notifica todos os administradores ativos"""
+    return notify_users(recipient_ids_query(UserType.ADMIN), titulo, mensagem, tipo,
+                        sender_id=sender_id, commit=commit)
+
+
+def broadcast(titulo, mensagem, tipo='info', sender_id=None, user_type=None, work_class_id=None, commit=True):
+    """Grava um comunicado para todos, um tipo de usuário ou uma classe de trabalho.
+
+    Uma única linha, independente do número de destinatários; a leitura de
+    cada usuário fica em BroadcastReceipt.
+    """
+    if work_class_id:
+        audience = BroadcastNotification.AUDIENCE_WORK_CLASS
+    elif user_type is not None:
+        audience = BroadcastNotification.AUDIENCE_USER_TYPE
+    else:
+        audience = BroadcastNotification.AUDIENCE_ALL
+
+    message = BroadcastNotification(
+        sender_id=sender_id,
+        titulo=titulo,
+        mensagem=mensagem,
+        tipo=tipo if isinstance(tipo, NotificationType) else NotificationType(tipo),
+        audience=audience,
+        audience_user_type=user_type,
+        audience_work_class_id=work_class_id
+    )
+    db.session.add(message)
+    db.session.flush()
+    NotificationCounter.bump(message.recipient_ids_query(), 1)
+    if audience == BroadcastNotification.AUDIENCE_WORK_CLASS:
+        target = {'work_class_id': work_class_id}
+    elif audience == BroadcastNotification.AUDIENCE_USER_TYPE:
+        target = {'user_type': message.audience_user_type.value}
+    else:
+        target = {}
+    queue_event(EVENT_NOTIFICATION, {
+        'kind': 'broadcast', 'id': message.id, 'titulo': message.titulo, 'mensagem': message.mensagem,
+        'tipo': message.tipo.value, 'created_at': message.created_at.isoformat()
+    }, audience=target)
+    if commit:
+        db.session.commit()
+    return message
+
+
+# Feed (notificações pessoais + comunicados)
+
+class FeedItem:
+    """Item do feed com os atributos usados pelas telas e APIs"""
+    __slots__ = ('kind', 'id', 'titulo', 'mensagem', 'tipo', 'lida', 'created_at', 'remetente')
+
+    def __init__(self, kind, id, titulo, mensagem, tipo, lida, created_at, remetente=None):
+        self.kind = kind
+        self.id = id
+        self.titulo = titulo
+        self.mensagem = mensagem
+        self.tipo = tipo
+        self.lida = lida
+        self.created_at = created_at
+        self.remetente = remetente
+
+    @property
+    def is_broadcast(self):
+        return self.kind == KIND_BROADCAST
+
+    @property
+    def sort_key(self):
+        return (self.created_at, self.kind, self.id)
+
+    @property
+    def cursor(self):
+        return f"{self.created_at.isoformat()}_{self.kind}{self.id}"
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': 'broadcast' if self.is_broadcast else 'personal',
+            'titulo': self.titulo,
+            'mensagem': self.mensagem,
+            'tipo': self.tipo.value,
+            'lida': self.lida,
+            'created_at': self.created_at.isoformat(),
+            'remetente': self.remetente or 'Sistema'
+        }
+
+
+class Feed:
+    """Uma página do feed e o cursor da próxima"""
+
+    def __init__(self, items, has_next):
+        self.items = items
+        self.has_next = has_next
+        self.next_cursor = items[-1].cursor if has_next and items else None
+
+
+def parse_cursor(cursor):
+    """Converte '<created_at iso>_<tipo><id>' em (created_at, tipo, id); inválido vira None"""
+    try:
+        created_at, key = cursor.rsplit('_', 1)
+        kind, item_id = key[0], int(key[1:])
+        if kind not in (KIND_PERSONAL, KIND_BROADCAST):
+            return None
+        return datetime.fromisoformat(created_at), kind, item_id
+    except (AttributeError, ValueError, IndexError):
+        return None
+
+
+def _after_cursor(created_col, id_col, kind, cursor):
+    """Itens depois do cursor na ordem (created_at, tipo, id) decrescente"""
+    created_at, cursor_kind, cursor_id = cursor
+    if kind < cursor_kind:
+        return created_col <= created_at
+    if kind > cursor_kind:
+        return created_col < created_at
+    return or_(created_col < created_at, and_(created_col == created_at, id_col < cursor_id))
+
+
+def _text_filters(model, search, tipo):
+    conditions = []
+    if search:
+        conditions.append(or_(model.titulo.ilike(f'%{search}%'), model.mensagem.ilike(f'%{search}%')))
+    if tipo is not None:
+        conditions.append(model.tipo == tipo)
+    return conditions
+
+
+def _personal_query(user, lida=None, search=None, tipo=None):
+    sender = aliased(User)
+    stmt = select(
+        Notification.id, Notification.titulo, Notification.mensagem, Notification.tipo,
+        Notification.lida, Notification.created_at, sender.nome, sender.sobrenome
+    ).outerjoin(sender, Notification.sender_id == sender.id).where(
+        Notification.user_id == user.id, *_text_filters(Notification, search, tipo)
+    )
+    if lida is not None:
+        stmt = stmt.where(Notification.lida.is_(lida))
+    return stmt
+
+
+def _broadcast_query(user, lida=None, search=None, tipo=None):
+    sender = aliased(User)
+    receipt = aliased(BroadcastReceipt)
+    stmt = select(
+        BroadcastNotification.id, BroadcastNotification.titulo, BroadcastNotification.mensagem,
+        BroadcastNotification.tipo, receipt.read_at.isnot(None), BroadcastNotification.created_at,
+        sender.nome, sender.sobrenome
+    ).outerjoin(
+        receipt, and_(receipt.broadcast_id == BroadcastNotification.id, receipt.user_id == user.id)
+    ).outerjoin(sender, BroadcastNotification.sender_id == sender.id).where(
+        BroadcastNotification.visible_to(user),
+        or_(receipt.dismissed.is_(None), receipt.dismissed.is_(False)),
+        *_text_filters(BroadcastNotification, search, tipo)
+    )
+    if lida is not None:
+        stmt = stmt.where(receipt.read_at.isnot(None) if lida else receipt.read_at.is_(None))
+    return stmt
+
+
+def get_feed(user, limit=20, cursor=None, lida=None, search=None, tipo=None):
+    """Página do feed do usuário, da mais recente para a mais antiga.
+
+    lida=True/False filtra por status de leitura. Cada fonte devolve no máximo limit + 1 linhas a partir do cursor (índices
+    por created_at) e as duas listas são intercaladas em memória.
+    """
+    position = parse_cursor(cursor) if cursor else None
+    items = []
+    sources = (
+        (KIND_PERSONAL, _personal_query(user, lida, search, tipo), Notification),
+        (KIND_BROADCAST, _broadcast_query(user, lida, search, tipo), BroadcastNotification),
+    )
+    for kind, stmt, model in sources:
+        if position:
+            stmt = stmt.where(_after_cursor(model.created_at, model.id, kind, position))
+        stmt = stmt.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+        for row in db.session.execute(stmt):
+            remetente = f"{row[6]} {row[7]}" if row[6] else None
+            items.append(FeedItem(kind, row[0], row[1], row[2], row[3], bool(row[4]), row[5], remetente))
+
+    items.sort(key=lambda item: item.sort_key, reverse=True)
+    return Feed(items[:limit], has_next=len(items) > limit)
+
+
+def recent_items(user, limit=5, unread_only=False):
+    return get_feed(user, limit=limit, lida=False if unread_only else None).items
+
+
+def _count(stmt):
+    return db.session.execute(select(func.count()).select_from(stmt.subquery())).scalar() or 0
+
+
+def count_unread(user):
+    """Recontagem: notificações pessoais não lidas + comunicados sem confirmação de leitura"""
+    personal = db.session.query(func.count(Notification.id)).filter(
+        Notification.user_id == user.id, Notification.lida.is_(False)
+    ).scalar() or 0
+    return personal + _count(_broadcast_query(user, lida=False))
+
+
+def counter_state(user):
+    """(não lidas, versão) do contador mantido; calcula e grava na primeira leitura.
+
+    A linha nova é gravada em uma conexão própria: a leitura nunca faz commit
+    da sessão da requisição.
+    """
+    table = NotificationCounter.__table__
+    select_row = select(table.c.unread, table.c.version).where(table.c.user_id == user.id)
+    row = db.session.execute(select_row).first()
+    if row is not None:
+        return row.unread, row.version
+
+    unread = count_unread(user)
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(insert(table).values(
+                user_id=user.id, unread=unread, version=1, updated_at=datetime.utcnow()
+            ))
+    except IntegrityError:
+        # Criado por outra requisição ao mesmo tempo
+        row = db.session.execute(select_row).first()
+        if row is not None:
+            return row.unread, row.version
+    return unread, 1
+
+
+def unread_count(user):
+    """Não lidas do usuário a partir do contador mantido (sem COUNT nas tabelas)"""
+    return counter_state(user)[0]
+
+
+def rebuild_counters(user_ids=None):
+    """Recalcula os contadores (todos os usuários ativos ou apenas os informados)"""
+    query = User.query.filter(User.is_active.is_(True))
+    if user_ids:
+        query = query.filter(User.id.in_(user_ids))
+    total = 0
+    for user in query.all():
+        unread = count_unread(user)
+        if db.session.get(NotificationCounter, user.id) is not None:
+            NotificationCounter.reset(user.id, unread)
+        else:
+            db.session.add(NotificationCounter(user_id=user.id, unread=unread))
+        total += 1
+    db.session.commit()
+    return total
+
+
+def total_count(user):
+    personal = db.session.query(func.count(Notification.id)).filter(Notification.user_id == user.id).scalar() or 0
+    return personal + _count(_broadcast_query(user))
+
+
+def feed_types(user):
+    """Tipos presentes no feed do usuário (para o filtro da tela)"""
+    personal = {row[0] for row in db.session.query(Notification.tipo).filter(
+        Notification.user_id == user.id).distinct()}
+    broadcasts = {row[0] for row in db.session.query(BroadcastNotification.tipo).filter(
+        BroadcastNotification.visible_to(user)).distinct()}
+    return sorted(personal | broadcasts, key=lambda tipo: tipo.value)
+
+
+def _visible_broadcast(user, broadcast_id):
+    return db.session.query(BroadcastNotification.id).filter(
+        BroadcastNotification.id == broadcast_id, BroadcastNotification.visible_to(user)
+    ).scalar() is not None
+
+
+def _upsert_receipt(user, broadcast_id, **values):
+    """Cria ou atualiza a confirmação; retorna (confirmação, estava_não_lido, estava_oculto)"""
+    receipt = BroadcastReceipt.query.filter_by(broadcast_id=broadcast_id, user_id=user.id).first()
+    if receipt is None:
+        try:
+            with db.session.begin_nested():
+                receipt = BroadcastReceipt(broadcast_id=broadcast_id, user_id=user.id, **values)
+                db.session.add(receipt)
+            return receipt, True, False
+        except IntegrityError:
+            # Outra requisição criou a confirmação ao mesmo tempo
+            receipt = BroadcastReceipt.query.filter_by(broadcast_id=broadcast_id, user_id=user.id).first()
+    was_unread, was_dismissed = receipt.read_at is None, receipt.dismissed
+    for key, value in values.items():
+        if key != 'read_at' or receipt.read_at is None:
+            setattr(receipt, key, value)
+    return receipt, was_unread, was_dismissed
+
+
+def mark_broadcast_read(user, broadcast_id, commit=True):
+    """Confirma a leitura de um comunicado. Retorna False se não for do público do usuário"""
+    if not _visible_broadcast(user, broadcast_id):
+        return False
+    _, was_unread, was_dismissed = _upsert_receipt(user, broadcast_id, read_at=datetime.utcnow())
+    if was_unread and not was_dismissed:
+        NotificationCounter.bump([user.id], -1)
+        queue_event(EVENT_UNREAD, user_ids=[user.id])
+    if commit:
+        db.session.commit()
+    return True
+
+
+def dismiss_broadcast(user, broadcast_id, commit=True):
+    """Oculta um comunicado do feed do usuário (equivalente a deletar a cópia pessoal)"""
+    if not _visible_broadcast(user, broadcast_id):
+        return False
+    _, was_unread, was_dismissed = _upsert_receipt(user, broadcast_id, read_at=datetime.utcnow(), dismissed=True)
+    if not was_dismissed:
+        NotificationCounter.bump([user.id], -1 if was_unread else 0)
+        queue_event(EVENT_UNREAD, user_ids=[user.id])
+    if commit:
+        db.session.commit()
+    return True
+
+
+def mark_all_read(user, commit=True):
+    """Marca tudo como lido com dois UPDATEs e um INSERT ... SELECT. Retorna quantos itens mudaram"""
+    now = datetime.utcnow()
+    personal = db.session.execute(
+        update(Notification).where(Notification.user_id == user.id, Notification.lida.is_(False))
+        .values(lida=True).execution_options(synchronize_session=False)
+    ).rowcount or 0
+
+    existing = db.session.execute(
+        update(BroadcastReceipt).where(BroadcastReceipt.user_id == user.id, BroadcastReceipt.read_at.is_(None))
+        .values(read_at=now).execution_options(synchronize_session=False)
+    ).rowcount or 0
+
+    has_receipt = exists().where(BroadcastReceipt.broadcast_id == BroadcastNotification.id,
+                                 BroadcastReceipt.user_id == user.id)
+    missing = select(
+        BroadcastNotification.id, literal(user.id), literal(now), literal(False)
+    ).where(BroadcastNotification.visible_to(user), ~has_receipt)
+    created = db.session.execute(
+        insert(BroadcastReceipt).from_select(['broadcast_id', 'user_id', 'read_at', 'dismissed'], missing)
+    ).rowcount or 0
+    NotificationCounter.reset(user.id)
+    queue_event(EVENT_UNREAD, user_ids=[user.id])
+
+    if commit:
+        db.session.commit()
+    return personal + existing + max(created, 0)
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Processamento em Lote do Banco de Horas - SKPONTO
+Motor set-based para o lote diário de créditos e déficits
+"""
+
+import time
+from collections import Counter
+from datetime import datetime, date, timedelta, timezone
+from flask import current_app
+from sqlalchemy import insert, bindparam
+from app import db
+from app.models import (
+    User, TimeRecord, HourBank, HourBankTransaction, OvertimeSettings, WorkClass,
+    HourBankTransactionType, Notification, NotificationCounter, NotificationType
+)
+from app.event_stream import EVENT_NOTIFICATION, queue_event
+from app.utils import calculate_work_hours
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_EXPECTED_HOURS = 8.0
+DEFAULT_LUNCH_HOURS = 1.0
+DEFAULT_OVERTIME_MULTIPLIER = 1.5
+
+
+class OvertimeBatchProcessor:
+    """Calcula e grava os ajustes diários de todos os usuários em poucas queries.
+
+    Em vez de processar usuário a usuário (várias queries e um commit por
+    crédito/débito/notificação), carrega os registros do dia, classes de
+    trabalho, configurações e bancos de horas de uma vez, calcula tudo em
+    memória e grava transações, saldos e notificações com inserts/updates
+    em lote, com um commit por bloco de usuários.
+    """
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+        self.chunk_size = max(1, int(chunk_size or DEFAULT_CHUNK_SIZE))
+        self.dry_run = dry_run
+
+    def run(self, target_date=None):
+        """Executa o lote para a data informada (padrão: dia anterior) e retorna o relatório"""
+        if not target_date:
+            target_date = date.today() - timedelta(days=1)
+
+        started = time.perf_counter()
+        report = {
+            'target_date': target_date.isoformat(),
+            'dry_run': self.dry_run,
+            'chunk_size': self.chunk_size,
+            'users': 0,
+            'processed': 0,
+            'skipped': 0,
+            'errors': 0,
+            'credits': 0,
+            'debits': 0,
+            'insufficient_balance': 0,
+            'hours_credited': 0.0,
+            'hours_debited': 0.0,
+            'load_seconds': 0.0,
+            'total_seconds': 0.0,
+            'chunks': []
+        }
+
+        users, records, already_processed, multipliers, banks = self._load(target_date)
+        report['users'] = len(users)
+        report['load_seconds'] = round(time.perf_counter() - started, 4)
+
+        for index in range(0, len(users), self.chunk_size):
+            chunk = users[index:index + self.chunk_size]
+            chunk_started = time.perf_counter()
+            chunk_report = {
+                'index': index // self.chunk_size,
+                'users': len(chunk),
+                'transactions': 0,
+                'notifications': 0,
+                'seconds': 0.0
+            }
+
+            try:
+                self._lock_banks(chunk, banks)
+                plan = self._plan_chunk(chunk, target_date, records, already_processed,
+                                        multipliers, banks)
+                chunk_report['transactions'] = len(plan['transactions'])
+                chunk_report['notifications'] = len(plan['notifications'])
+
+                if not self.dry_run:
+                    self._write_chunk(plan)
+                    db.session.commit()
+
+                # Contadores só entram no relatório depois que o bloco foi gravado
+                for key, value in plan['stats'].items():
+                    report[key] += value
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(
+                    f"Erro no bloco {chunk_report['index']} do lote diário: {str(e)}"
+                )
+                report['errors'] += len(chunk)
+                chunk_report['error'] = str(e)
+
+            chunk_report['seconds'] = round(time.perf_counter() - chunk_started, 4)
+            report['chunks'].append(chunk_report)
+
+        report['hours_credited'] = round(report['hours_credited'], 2)
+        report['hours_debited'] = round(report['hours_debited'], 2)
+        report['total_seconds'] = round(time.perf_counter() - started, 4)
+
+        current_app.logger.info(
+            f"Lote diário {'(simulação) ' if self.dry_run else ''}{report['target_date']}: "
+            f"{report['processed']} processados, {report['skipped']} ignorados, "
+            f"{report['errors']} erros em {len(report['chunks'])} blocos ({report['total_seconds']}s)"
+        )
+        return report
+
+    def _load(self, target_date):
+        """Carrega em bloco tudo o que o cálculo precisa (5-6 queries no total)"""
+        users = db.session.query(
+            User.id, User.nome, WorkClass.daily_work_hours, WorkClass.lunch_hours
+        ).outerjoin(WorkClass, User.work_class_id == WorkClass.id).filter(
+            User.is_active.is_(True)
+        ).order_by(User.id).all()
+
+        records = {
+            row.user_id: row for row in db.session.query(
+                TimeRecord.id, TimeRecord.user_id, TimeRecord.entrada,
+                TimeRecord.saida, TimeRecord.is_atestado
+            ).join(User, TimeRecord.user_id == User.id).filter(
+                TimeRecord.data == target_date,
+                User.is_active.is_(True)
+            )
+        }
+
+        # Registros que já geraram transação (por calcular_horas ou lote anterior)
+        already_processed = {
+            row[0] for row in db.session.query(HourBankTransaction.time_record_id).join(
+                TimeRecord, HourBankTransaction.time_record_id == TimeRecord.id
+            ).filter(TimeRecord.data == target_date)
+        }
+
+        multipliers = dict(db.session.query(
+            OvertimeSettings.user_id, OvertimeSettings.overtime_multiplier_normal
+        ).all())
+
+        banks = self._load_banks([user.id for user in users])
+        return users, records, already_processed, multipliers, banks
+
+    def _load_banks(self, user_ids):
+        """Retorna {user_id: saldo} criando em lote os bancos de horas que faltam"""
+        columns = (HourBank.id, HourBank.user_id, HourBank.current_balance)
+        rows = db.session.query(*columns).all()
+        existing = {row.user_id for row in rows}
+        missing = [user_id for user_id in user_ids if user_id not in existing]
+
+        if missing and not self.dry_run:
+            db.session.execute(insert(HourBank), [{'user_id': user_id} for user_id in missing])
+            db.session.commit()
+            rows = db.session.query(*columns).all()
+
+        banks = {row.user_id: {'id': row.id, 'current_balance': row.current_balance or 0.0}
+                 for row in rows}
+        for user_id in missing:
+            # Em simulação o banco não é criado: saldo zero e sem id
+            banks.setdefault(user_id, {'id': None, 'current_balance': 0.0})
+        return banks
+
+    def _lock_banks(self, chunk, banks):
+        """Relê os saldos do bloco travando as linhas (FOR UPDATE) até o commit do bloco.
+
+        O saldo carregado em _load pode ter mudado (HourBank.apply_delta em
+        outra sessão); com as linhas travadas, balance_before/after e a
+        checagem de saldo do débito valem até o UPDATE do bloco.
+        """
+        query = db.session.query(HourBank.user_id, HourBank.current_balance).filter(
+            HourBank.user_id.in_([user.id for user in chunk])
+        ).order_by(HourBank.id)
+        if not self.dry_run:
+            query = query.with_for_update()
+        for row in query:
+            banks[row.user_id]['current_balance'] = row.current_balance or 0.0
+
+    def _plan_chunk(self, chunk, target_date, records, already_processed, multipliers, banks):
+        """Calcula créditos, débitos e notificações de um bloco sem tocar no banco"""
+        now = datetime.now(timezone.utc)
+        dia = target_date.strftime('%d/%m/%Y')
+        report = {
+            'processed': 0, 'skipped': 0, 'credits': 0, 'debits': 0,
+            'insufficient_balance': 0, 'hours_credited': 0.0, 'hours_debited': 0.0
+        }
+        plan = {'transactions': [], 'notifications': [], 'bank_updates': [], 'stats': report}
+
+        for user in chunk:
+            record = records.get(user.id)
+            if record is None or record.is_atestado or record.id in already_processed:
+                report['skipped'] += 1
+                continue
+
+            expected_hours = user.daily_work_hours if user.daily_work_hours is not None else DEFAULT_EXPECTED_HOURS
+            lunch_hours = user.lunch_hours if user.lunch_hours is not None else DEFAULT_LUNCH_HOURS
+            worked_hours = 0.0
+            if record.entrada and record.saida:
+                # Total do dia (normais + extras) menos o almoço, como em
+                # TimeRecord.calcular_horas: calculate_work_hours limita as
+                # normais a expected_hours, então só as normais nunca gerariam crédito
+                normal_hours, extra_hours = calculate_work_hours(
+                    record.entrada, record.saida, target_date, expected_hours
+                )
+                worked_hours = max(0.0, normal_hours + extra_hours - lunch_hours)
+
+            overtime_hours = max(0.0, worked_hours - expected_hours)
+            deficit_hours = max(0.0, expected_hours - worked_hours)
+            bank = banks[user.id]
+            balance = bank['current_balance']
+
+            if overtime_hours > 0:
+                multiplier = multipliers.get(user.id) or DEFAULT_OVERTIME_MULTIPLIER
+                effective_hours = overtime_hours * multiplier
+                plan['transactions'].append({
+                    'user_id': user.id,
+                    'transaction_type': HourBankTransactionType.CREDITO,
+                    'hours': effective_hours,
+                    'balance_before': balance,
+                    'balance_after': balance + effective_hours,
+                    'description': f"Horas extras do dia {dia}: {overtime_hours:.2f}h (multiplicador {multiplier}x)",
+                    'reference_date': target_date,
+                    'time_record_id': record.id
+                })
+                plan['bank_updates'].append({
+                    'b_id': bank['id'], 'delta': effective_hours,
+                    'credited': effective_hours, 'debited': 0.0, 'now': now
+                })
+                plan['notifications'].append({
+                    'user_id': user.id,
+                    'titulo': 'Horas Extras Adicionadas',
+                    'mensagem': f'Adicionadas {effective_hours:.2f}h ao seu banco de horas referente ao dia {dia}',
+                    'tipo': NotificationType.SUCCESS
+                })
+                report['credits'] += 1
+                report['hours_credited'] += effective_hours
+
+            elif deficit_hours > 0:
+                if balance >= deficit_hours:
+                    plan['transactions'].append({
+                        'user_id': user.id,
+                        'transaction_type': HourBankTransactionType.DEBITO,
+                        'hours': -deficit_hours,
+                        'balance_before': balance,
+                        'balance_after': balance - deficit_hours,
+                        'description': f"Déficit de horas do dia {dia}: {deficit_hours:.2f}h",
+                        'reference_date': target_date,
+                        'time_record_id': record.id
+                    })
+                    plan['bank_updates'].append({
+                        'b_id': bank['id'], 'delta': -deficit_hours,
+                        'credited': 0.0, 'debited': deficit_hours, 'now': now
+                    })
+                    plan['notifications'].append({
+                        'user_id': user.id,
+                        'titulo': 'Horas Debitadas por Déficit',
+                        'mensagem': f'Debitadas {deficit_hours:.2f}h do seu banco de horas referente ao déficit do dia {dia}',
+                        'tipo': NotificationType.INFO
+                    })
+                    report['debits'] += 1
+                    report['hours_debited'] += deficit_hours
+                else:
+                    plan['notifications'].append({
+                        'user_id': user.id,
+                        'titulo': 'Saldo Insuficiente no Banco de Horas',
+                        'mensagem': f'Déficit de {deficit_hours:.2f}h no dia {dia} não pôde ser debitado. Saldo atual: {balance:.2f}h',
+                        'tipo': NotificationType.WARNING
+                    })
+                    report['insufficient_balance'] += 1
+
+            report['processed'] += 1
+
+        return plan
+
+    def _write_chunk(self, plan):
+        """Grava o plano de um bloco com inserts e updates em lote"""
+        if plan['transactions']:
+            db.session.execute(insert(HourBankTransaction), plan['transactions'])
+
+        if plan['bank_updates']:
+            # Atualização por delta: não sobrescreve alterações concorrentes no saldo
+            table = HourBank.__table__
+            db.session.execute(
+                table.update().where(table.c.id == bindparam('b_id')).values(
+                    current_balance=table.c.current_balance + bindparam('delta'),
+                    total_credited=table.c.total_credited + bindparam('credited'),
+                    total_debited=table.c.total_debited + bindparam('debited'),
+                    last_transaction=bindparam('now')
+                ),
+                plan['bank_updates']
+            )
+
+        if plan['notifications']:
+            db.session.execute(insert(Notification), plan['notifications'])
+            NotificationCounter.apply_deltas(Counter(row['user_id'] for row in plan['notifications']))
+            for row in plan['notifications']:
+                queue_event(EVENT_NOTIFICATION, {
+                    'kind': 'personal', 'titulo': row['titulo'], 'mensagem': row['mensagem'],
+                    'tipo': row['tipo'].value, 'created_at': row.get('created_at')
+                }, user_ids=[row['user_id']])
+
@@ -46,18 +46,22 @@ class OvertimeController:
             
             # Obter classe de trabalho do usuário
             user = User.query.get(user_id)
-            expected_hours = user.work_class.daily_work_hours if user.work_class else 8.0
+            expected_hours = user.expected_daily_hours
+            lunch_hours = user.expected_lunch_hours
             
             # Calcular horas trabalhadas
             worked_hours = 0.0
             if time_record.entrada and time_record.saida:
                 from app.utils import calculate_work_hours
-                worked_hours, _ = calculate_work_hours(
+                # Total do dia (normais + extras) menos o almoço, igual ao lote em
+                # app/overtime_batch.py e a TimeRecord.calcular_horas
+                normal_hours, extra_hours = calculate_work_hours(
                     time_record.entrada,
                     time_record.saida,
                     target_date,
                     expected_hours
                 )
+                worked_hours = max(0.0, normal_hours + extra_hours - lunch_hours)
             
             # Calcular horas extras e déficit
             overtime_hours = max(0.0, worked_hours - expected_hours)
@@ -201,28 +205,12 @@ class OvertimeController:
             if not user or not admin:
                 return False, "Usuário ou administrador não encontrado"
             
-            # Criar ou obter banco de horas
-            hour_bank = user.hour_bank
-            if not hour_bank:
-                hour_bank = HourBank(user_id=user_id)
-                self.db.session.add(hour_bank)
-                self.db.session.flush()  # Para obter o ID
-                user.hour_bank = hour_bank
-            
-            # Armazenar saldo anterior para histórico
-            old_balance = hour_bank.current_balance
-            
-            # Aplicar ajuste usando o novo método que permite saldo negativo
+            # Ajuste atômico no saldo (cria o banco de horas se necessário)
             description = f"Ajuste manual pelo admin {admin.nome_completo}: {reason}"
-            hour_bank.admin_adjust_hours(hours_adjustment, HourBankTransactionType.AJUSTE, description)
-            
-            # Atualizar a transação com o ID do admin
-            transaction = HourBankTransaction.query.filter_by(
-                user_id=user_id
-            ).order_by(HourBankTransaction.created_at.desc()).first()
-            
-            if transaction:
-                transaction.created_by = admin_id
+            transaction = HourBank.apply_delta(
+                user_id, hours_adjustment, HourBankTransactionType.AJUSTE, description, created_by=admin_id
+            )
+            old_balance, new_balance = transaction.balance_before, transaction.balance_after
             
             # Criar registro no histórico
             history = HourBankHistory(
@@ -230,7 +218,7 @@ class OvertimeController:
                 admin_id=admin_id,
                 old_balance=old_balance,
                 adjustment=hours_adjustment,
-                new_balance=hour_bank.current_balance,
+                new_balance=new_balance,
                 reason=reason
             )
             self.db.session.add(history)
@@ -240,7 +228,7 @@ class OvertimeController:
                 user_id=user.id,
                 sender_id=admin_id,
                 titulo='Ajuste Manual no Banco de Horas',
-                mensagem=f'Seu banco de horas foi ajustado em {hours_adjustment:+.2f}h pelo administrador. Motivo: {reason}. Saldo anterior: {old_balance:.2f}h, novo saldo: {hour_bank.current_balance:.2f}h',
+                mensagem=f'Seu banco de horas foi ajustado em {hours_adjustment:+.2f}h pelo administrador. Motivo: {reason}. Saldo anterior: {old_balance:.2f}h, novo saldo: {new_balance:.2f}h',
                 tipo=NotificationType.INFO
             )
             self.db.session.add(notification)
@@ -248,9 +236,9 @@ class OvertimeController:
             # Commit todas as alterações
             self.db.session.commit()
             
-            self.app.logger.info(f"Ajuste manual aplicado: {admin.nome_completo} ajustou {hours_adjustment:+.2f}h para {user.nome_completo}. Saldo: {old_balance:.2f}h → {hour_bank.current_balance:.2f}h")
+            self.app.logger.info(f"Ajuste manual aplicado: {admin.nome_completo} ajustou {hours_adjustment:+.2f}h para {user.nome_completo}. Saldo: {old_balance:.2f}h → {new_balance:.2f}h")
             
-            return True, f"Ajuste aplicado com sucesso. Saldo: {old_balance:.2f}h → {hour_bank.current_balance:.2f}h"
+            return True, f"Ajuste aplicado com sucesso. Saldo: {old_balance:.2f}h → {new_balance:.2f}h"
             
         except Exception as e:
             self.app.logger.error(f"Erro no ajuste manual: {str(e)}")
@@ -476,33 +464,22 @@ class OvertimeController:
             self.app.logger.error(f"Erro ao verificar limites: {str(e)}")
             return []
     
-    def process_daily_batch(self, target_date=None):
+    def process_daily_batch(self, target_date=None, dry_run=False, chunk_size=None):
         """Processa lote diário de ajustes automáticos"""
-        if not target_date:
-            target_date = date.today() - timedelta(days=1)  # Processar dia anterior
-        
+        report = self.run_daily_batch(target_date, dry_run=dry_run, chunk_size=chunk_size)
+        return report['processed'], report['errors']
+
+    def run_daily_batch(self, target_date=None, dry_run=False, chunk_size=None):
+        """Executa o lote diário em modo set-based e retorna o relatório completo"""
+        from app.overtime_batch import OvertimeBatchProcessor
+
         try:
-            # Buscar todos os usuários ativos
-            users = User.query.filter_by(is_active=True).all()
-            processed = 0
-            errors = 0
-            
-            for user in users:
-                try:
-                    if self.process_automatic_adjustments(user.id, target_date):
-                        processed += 1
-                    else:
-                        errors += 1
-                except Exception as e:
-                    self.app.logger.error(f"Erro ao processar usuário {user.id}: {str(e)}")
-                    errors += 1
-            
-            self.app.logger.info(f"Lote diário processado: {processed} usuários, {errors} erros")
-            return processed, errors
-            
+            processor = OvertimeBatchProcessor(chunk_size=chunk_size, dry_run=dry_run)
+            return processor.run(target_date)
         except Exception as e:
+            self.db.session.rollback()
             self.app.logger.error(f"Erro no lote diário: {str(e)}")
-            return 0, 1
+            return {'processed': 0, 'errors': 1, 'error': str(e)}
 
 # Função para inicializar o controlador
 def init_overtime_controller(app):
@@ -0,0 +1,525 @@
+# -*- coding: utf-8 -*-
+"""
+Dataset Sintético e Benchmark de Carga para SKPONTO
+`flask perf seed` gera usuários, anos de ponto, banco de horas, notificações,
+logs e atestados com inserções em lote; `flask perf bench` executa um mix
+ponderado de endpoints reais e grava os resultados em JSON para comparação
+"""
+
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date, datetime, time as dt_time, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.models import (
+    AttestationStatus, AttestationType, HourBank, HourBankCheckpoint, HourBankTransaction, HourBankTransactionType,
+    MedicalAttestation, MonthlyTimeSummary, Notification, NotificationType, SecurityLog,
+    TimeRecord, User, UserType, WorkClass
+)
+
+PERF_EMAIL_DOMAIN = 'perf.skponto.local'
+PERF_ADMIN_EMAIL = f'admin@{PERF_EMAIL_DOMAIN}'
+PERF_PASSWORD = 'perf-senha-123'
+PERF_CLASS_PREFIX = 'Perf '
+PERF_ATTESTATION_DIR = 'perf_atestados'
+
+WORK_CLASSES = (
+    ('Perf Integral', 8.0, 1.0),
+    ('Perf Meio Período', 6.0, 0.25),
+    ('Perf Estágio', 4.0, 0.0),
+    ('Perf Plantão', 10.0, 1.0),
+)
+SECURITY_ACTIONS = ('LOGIN', 'LOGOUT', 'REGISTRO_PONTO', 'VISUALIZAR_RELATORIO', 'ALTERAR_PERFIL')
+NOTIFICATION_TITLES = ('Ponto registrado', 'Banco de horas atualizado', 'Atestado analisado',
+                       'Lembrete de ponto', 'Comunicado geral')
+
+
+# Dataset
+
+def _perf_user_ids() -> List[int]:
+    return [row[0] for row in db.session.query(User.id).filter(User.email.like(f'%@{PERF_EMAIL_DOMAIN}')).all()]
+
+
+def reset_dataset() -> int:
+    """Remove os dados gerados anteriormente (usuários do domínio de teste e dependentes)"""
+    user_ids = _perf_user_ids()
+    if user_ids:
+        # Tabelas dependentes primeiro (ordem inversa das chaves estrangeiras)
+        for table in reversed(db.metadata.sorted_tables):
+            if 'user_id' in table.c and table.name != User.__tablename__:
+                for start in range(0, len(user_ids), 500):
+                    db.session.execute(table.delete().where(table.c.user_id.in_(user_ids[start:start + 500])))
+        for start in range(0, len(user_ids), 500):
+            db.session.execute(User.__table__.delete().where(User.id.in_(user_ids[start:start + 500])))
+    db.session.execute(WorkClass.__table__.delete().where(WorkClass.name.like(f'{PERF_CLASS_PREFIX}%')))
+    db.session.commit()
+
+    attestation_dir = Path(current_app.config['UPLOAD_FOLDER']) / PERF_ATTESTATION_DIR
+    shutil.rmtree(attestation_dir, ignore_errors=True)
+    return len(user_ids)
+
+
+class _BulkWriter:
+    """Acumula linhas por modelo e insere em lotes (executemany)"""
+
+    def __init__(self, chunk_size: int):
+        self.chunk_size = chunk_size
+        self.buffers: Dict[Any, List[Dict]] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, model, row: Dict[str, Any]):
+        buffer = self.buffers.setdefault(model, [])
+        buffer.append(row)
+        if len(buffer) >= self.chunk_size:
+            self.flush(model)
+
+    def flush(self, model=None):
+        for current in ([model] if model else list(self.buffers)):
+            rows = self.buffers.get(current)
+            if rows:
+                db.session.execute(insert(current), rows)
+                self.counts[current.__tablename__] = self.counts.get(current.__tablename__, 0) + len(rows)
+                self.buffers[current] = []
+
+
+def seed_dataset(users: int = 100, years: float = 1.0, notifications: int = 50, logs: int = 200,
+                 attestations: int = 2, chunk_size: int = 5000, seed: int = 42,
+                 progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Gera o dataset sintético com inserções em lote
+
+    Returns:
+        Dict: linhas inseridas por tabela e tempo gasto
+    """
+    progress = progress or (lambda message: None)
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    today = date.today()
+    first_day = today - timedelta(days=int(365 * years))
+
+    # Classes de trabalho
+    classes = []
+    for name, daily_hours, lunch_hours in WORK_CLASSES:
+        work_class = WorkClass.query.filter_by(name=name).first()
+        if not work_class:
+            work_class = WorkClass(name=name, description='Gerada por flask perf seed',
+                                   daily_work_hours=daily_hours, lunch_hours=lunch_hours,
+                                   is_active=True, is_approved=True)
+            db.session.add(work_class)
+        classes.append(work_class)
+    db.session.flush()
+
+    # Usuários (um único hash de senha para todos: o hash é propositalmente lento)
+    password_hash = generate_password_hash(PERF_PASSWORD)
+    existing = len(_perf_user_ids())
+    user_rows = []
+    if not User.query.filter_by(email=PERF_ADMIN_EMAIL).first():
+        user_rows.append({
+            'email': PERF_ADMIN_EMAIL, 'cpf': '90000000000', 'nome': 'Admin', 'sobrenome': 'Perf',
+            'password_hash': password_hash, 'user_type': UserType.ADMIN, 'is_active': True,
+            'is_approved': True, 'created_at': now
+        })
+    for index in range(existing, existing + users):
+        work_class = classes[index % len(classes)]
+        user_rows.append({
+            'email': f'user{index}@{PERF_EMAIL_DOMAIN}',
+            'cpf': f'9{index + 1:010d}',
+            'nome': f'Usuário{index}',
+            'sobrenome': 'Perf',
+            'password_hash': password_hash,
+            'user_type': UserType.ESTAGIARIO if work_class.daily_work_hours <= 4 else UserType.TRABALHADOR,
+            'work_class_id': work_class.id,
+            'is_active': rng.random() > 0.05,
+            'is_approved': True,
+            'created_at': datetime.combine(first_day, dt_time(9)),
+        })
+    writer = _BulkWriter(chunk_size)
+    for start in range(0, len(user_rows), chunk_size):
+        db.session.execute(insert(User), user_rows[start:start + chunk_size])
+    writer.counts['users'] = len(user_rows)
+
+    emails = [row['email'] for row in user_rows if row['email'] != PERF_ADMIN_EMAIL]
+    created = db.session.query(User.id, User.work_class_id).filter(User.email.in_(emails)).all() if emails else []
+    class_hours = {work_class.id: (work_class.daily_work_hours, work_class.lunch_hours) for work_class in classes}
+    progress(f'{len(created)} usuários criados')
+
+    attestation_dir = Path(current_app.config['UPLOAD_FOLDER']) / PERF_ATTESTATION_DIR
+    attestation_dir.mkdir(parents=True, exist_ok=True)
+    workdays = [first_day + timedelta(days=offset) for offset in range((today - first_day).days)
+                if (first_day + timedelta(days=offset)).weekday() < 5]
+
+    for position, (user_id, work_class_id) in enumerate(created, start=1):
+        daily_hours, lunch_hours = class_hours.get(work_class_id, (8.0, 1.0))
+        balance = credited = debited = 0.0
+        writer.add(HourBank, {'user_id': user_id, 'created_at': now})
+
+        for day_index, day in enumerate(workdays):
+            if rng.random() < 0.04:
+                continue  # falta
+            start_minutes = 8 * 60 + rng.randint(-30, 30)
+            worked = daily_hours + max(rng.gauss(0.2, 0.6), -1.0)
+            end_minutes = start_minutes + int((worked + lunch_hours) * 60)
+            lunch_start = start_minutes + int(daily_hours / 2 * 60)
+            extras = max(worked - daily_hours, 0.0)
+            record = {
+                'user_id': user_id,
+                'data': day,
+                'entrada': dt_time(start_minutes // 60, start_minutes % 60),
+                'saida': dt_time(min(end_minutes // 60, 23), end_minutes % 60),
+                'horas_trabalhadas': round(min(worked, daily_hours), 2),
+                'horas_extras': round(extras, 2),
+                'created_at': datetime.combine(day, dt_time(18)),
+            }
+            if lunch_hours:
+                lunch_end = lunch_start + int(lunch_hours * 60)
+                record['saida_almoco'] = dt_time(lunch_start // 60, lunch_start % 60)
+                record['volta_almoco'] = dt_time(lunch_end // 60, lunch_end % 60)
+            writer.add(TimeRecord, record)
+
+            moment = datetime.combine(day, dt_time(19))
+            if extras >= 0.25:
+                writer.add(HourBankTransaction, {
+                    'user_id': user_id, 'transaction_type': HourBankTransactionType.CREDITO,
+                    'hours': round(extras, 2), 'balance_before': round(balance, 2),
+                    'balance_after': round(balance + extras, 2), 'reference_date': day,
+                    'description': f'Horas extras de {day.strftime("%d/%m/%Y")}',
+                    'created_at': moment, 'expires_at': moment + timedelta(days=365)
+                })
+                balance += extras
+                credited += extras
+            if day_index % 20 == 19 and balance >= 1.0:
+                hours = round(min(balance, daily_hours / 2), 2)
+                writer.add(HourBankTransaction, {
+                    'user_id': user_id, 'transaction_type': HourBankTransactionType.DEBITO,
+                    'hours': -hours, 'balance_before': round(balance, 2),
+                    'balance_after': round(balance - hours, 2), 'reference_date': day,
+                    'description': 'Compensação de horas', 'created_at': moment
+                })
+                balance -= hours
+                debited += hours
+
+        # Saldo final do banco (atualizado depois da inserção em lote)
+        writer.flush(HourBank)
+        db.session.execute(
+            HourBank.__table__.update().where(HourBank.user_id == user_id).values(
+                current_balance=round(balance, 2), total_credited=round(credited, 2),
+                total_debited=round(debited, 2), last_transaction=now
+            )
+        )
+
+        for index in range(notifications):
+            created_at = now - timedelta(minutes=rng.randint(0, int(525600 * years)))
+            writer.add(Notification, {
+                'user_id': user_id,
+                'titulo': rng.choice(NOTIFICATION_TITLES),
+                'mensagem': 'Mensagem gerada para teste de desempenho.',
+                'tipo': rng.choice(list(NotificationType)),
+                'lida': rng.random() < 0.8,
+                'created_at': created_at
+            })
+        for index in range(logs):
+            writer.add(SecurityLog, {
+                'user_id': user_id,
+                'acao': rng.choice(SECURITY_ACTIONS),
+                'detalhes': 'Evento sintético',
+                'ip_address': f'10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}',
+                'user_agent': 'perf-seed',
+                'created_at': now - timedelta(minutes=rng.randint(0, int(525600 * years))),
+                'sucesso': rng.random() > 0.02
+            })
+        for index in range(attestations):
+            start = rng.choice(workdays) if workdays else today
+            file_path = attestation_dir / f'attestation_{user_id}_{index}.pdf'
+            file_path.write_bytes(b'%PDF-1.4\n% atestado sintetico\n' + os.urandom(rng.randint(20, 200) * 1024))
+            writer.add(MedicalAttestation, {
+                'user_id': user_id,
+                'tipo': AttestationType.MEDICO,
+                'data_inicio': start,
+                'data_fim': start + timedelta(days=rng.randint(0, 3)),
+                'arquivo': file_path.name,
+                'local_path': str(file_path),
+                'status': rng.choice(list(AttestationStatus)),
+                'created_at': datetime.combine(start, dt_time(10))
+            })
+
+        if position % 10 == 0:
+            writer.flush()
+            db.session.commit()
+            progress(f'{position}/{len(created)} usuários com histórico gerado')
+
+    writer.flush()
+    db.session.commit()
+
+    summaries = MonthlyTimeSummary.rebuild()
+    checkpoint_ids = [user_id for user_id, _ in created]
+    checkpoints = HourBankCheckpoint.create_monthly(since=first_day, user_ids=checkpoint_ids) if checkpoint_ids else 0
+    db.session.commit()
+    return {
+        'rows': dict(writer.counts, monthly_time_summaries=summaries, hour_bank_checkpoints=checkpoints),
+        'workdays': len(workdays),
+        'seconds': round(time.perf_counter() - started, 2)
+    }
+
+
+# Benchmark
+
+# (nome, método, caminho, peso, perfil, corpo JSON)
+# ponto_entrada/ponto_saida se alternam por usuário virtual (ver PUNCH_CYCLE)
+DEFAULT_MIX: List[Tuple[str, str, str, int, str, Optional[Dict]]] = [
+    ('notificacoes_polling', 'GET', '/api/notificacoes_nao_lidas', 35, 'user', None),
+    ('notificacoes_recentes', 'GET', '/api/notifications/recent', 10, 'user', None),
+    ('dashboard', 'GET', '/dashboard', 25, 'user', None),
+    ('meus_registros', 'GET', '/meus_registros', 10, 'user', None),
+    ('ponto_entrada', 'POST', '/api/registrar_ponto', 5, 'user', {'acao': 'entrada'}),
+    ('ponto_saida', 'POST', '/api/registrar_ponto', 5, 'user', {'acao': 'saida'}),
+    ('admin_dashboard', 'GET', '/admin/dashboard', 5, 'admin', None),
+    ('admin_relatorios', 'GET', '/admin/relatorios', 3, 'admin', None),
+    ('admin_usuarios', 'GET', '/admin/usuarios', 2, 'admin', None),
+]
+# Sorteado qualquer um dos dois, o usuário virtual faz o próximo passo do seu
+# ciclo; antes de cada entrada o registro de hoje é apagado (fora da medição),
+# então toda saída passa por calcular_horas
+PUNCH_CYCLE = ('ponto_entrada', 'ponto_saida')
+
+
+def _reset_today_record(user_id: int):
+    """Apaga o registro de hoje do usuário para a próxima entrada ser aceita"""
+    from app.utils import get_current_date
+
+    hoje = get_current_date()
+    deleted = TimeRecord.query.filter_by(user_id=user_id, data=hoje).delete(synchronize_session=False)
+    if deleted:
+        MonthlyTimeSummary.refresh_for_date(user_id, hoje)
+    db.session.commit()
+
+
+def _json_failed(body: bytes) -> bool:
+    """Respostas 200 com {"success": false} contam como erro"""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and data.get('success') is False
+
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    """Percentil com interpolação linear sobre valores ordenados"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def _summarize(latencies: List[float], errors: int, wall_seconds: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    count = len(ordered)
+    return {
+        'requests': count,
+        'errors': errors,
+        'throughput_rps': round(count / wall_seconds, 2) if wall_seconds else None,
+        'mean_ms': round(sum(ordered) / count, 2) if count else None,
+        'p50_ms': round(percentile(ordered, 0.50), 2) if count else None,
+        'p90_ms': round(percentile(ordered, 0.90), 2) if count else None,
+        'p95_ms': round(percentile(ordered, 0.95), 2) if count else None,
+        'p99_ms': round(percentile(ordered, 0.99), 2) if count else None,
+        'max_ms': round(ordered[-1], 2) if count else None,
+    }
+
+
+class _TestClientSession:
+    """Usuário virtual no test client do Flask (login direto na sessão)"""
+
+    def __init__(self, app, user_id: int):
+        self.client = app.test_client()
+        with self.client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+
+    def request(self, method: str, path: str, body: Optional[Dict]) -> Tuple[int, bool]:
+        """Retorna (status, falhou)"""
+        response = self.client.open(path, method=method, json=body)
+        failed = response.status_code >= 400 or (response.is_json and _json_failed(response.get_data()))
+        response.close()
+        return response.status_code, failed
+
+
+class _HttpSession:
+    """Usuário virtual contra um servidor HTTP (login pelo formulário)"""
+
+    def __init__(self, base_url: str, email: str, password: str):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+        data = urllib.parse.urlencode({'email': email, 'password': password}).encode()
+        self.opener.open(f'{self.base_url}/login', data=data, timeout=30).read()
+
+    def request(self, method: str, path: str, body: Optional[Dict]) -> Tuple[int, bool]:
+        """Retorna (status, falhou)"""
+        data = json.dumps(body).encode() if body is not None else None
+        http_request = urllib.request.Request(f'{self.base_url}{path}', data=data, method=method)
+        if data is not None:
+            http_request.add_header('Content-Type', 'application/json')
+        try:
+            with self.opener.open(http_request, timeout=60) as response:
+                content = response.read()
+                is_json = (response.headers.get('Content-Type') or '').startswith('application/json')
+                return response.status, is_json and _json_failed(content)
+        except urllib.error.HTTPError as e:
+            return e.code, True
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, timeout=5, check=True).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmark(requests_total: int = 2000, concurrency: int = 4, warmup: int = 50,
+                  base_url: Optional[str] = None, scenarios: Optional[List[str]] = None,
+                  seed: int = 42, progress: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+    """
+    Executa o mix ponderado de endpoints e mede latência e vazão
+
+    Sem `base_url` usa o test client (mesmo processo); com `base_url` faz
+    requisições HTTP a um servidor em execução (ex.: gunicorn local).
+    """
+    progress = progress or (lambda message: None)
+    app = current_app._get_current_object()
+    mix = [item for item in DEFAULT_MIX if not scenarios or item[0] in scenarios]
+    if not mix:
+        raise ValueError('Nenhum cenário selecionado')
+
+    user_ids = [user_id for user_id, email in db.session.query(User.id, User.email).filter(
+        User.email.like(f'%@{PERF_EMAIL_DOMAIN}'), User.is_active.is_(True)
+    ).all() if email != PERF_ADMIN_EMAIL]
+    admin = User.query.filter_by(email=PERF_ADMIN_EMAIL).first()
+    if not user_ids or not admin:
+        raise RuntimeError('Dataset de desempenho não encontrado: execute `flask perf seed` antes')
+    emails = dict(db.session.query(User.id, User.email).filter(User.id.in_(user_ids[:concurrency * 4])).all())
+
+    def open_session(user_id: int, email: str):
+        if base_url:
+            return _HttpSession(base_url, email, PERF_PASSWORD)
+        return _TestClientSession(app, user_id)
+
+    scenarios_by_name = {item[0]: item for item in DEFAULT_MIX}
+    results: Dict[str, List[float]] = {item[0]: [] for item in mix}
+    errors: Dict[str, int] = {item[0]: 0 for item in mix}
+    if any(item[0] in PUNCH_CYCLE for item in mix):
+        for name in PUNCH_CYCLE:
+            results.setdefault(name, [])
+            errors.setdefault(name, 0)
+    results_lock = threading.Lock()
+    counter = {'next': 0}
+
+    def worker(worker_index: int):
+        rng = random.Random(seed + worker_index)
+        with app.app_context():
+            pool = list(emails.items())
+            user_id, email = pool[worker_index % len(pool)]
+            sessions = {'user': open_session(user_id, email), 'admin': open_session(admin.id, admin.email)}
+            weights = [item[3] for item in mix]
+            punch_step = 0
+            while True:
+                with results_lock:
+                    position = counter['next']
+                    counter['next'] += 1
+                if position >= warmup + requests_total:
+                    return
+                name = rng.choices(mix, weights=weights)[0][0]
+                if name in PUNCH_CYCLE:
+                    name = PUNCH_CYCLE[punch_step % len(PUNCH_CYCLE)]
+                    punch_step += 1
+                    if name == PUNCH_CYCLE[0]:
+                        _reset_today_record(user_id)
+                _, method, path, _, role, body = scenarios_by_name[name]
+                started = time.perf_counter()
+                try:
+                    _, failed = sessions[role].request(method, path, body)
+                except Exception:
+                    failed = True
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if position < warmup:
+                    continue
+                with results_lock:
+                    results[name].append(elapsed_ms)
+                    if failed:
+                        errors[name] += 1
+                    done = position - warmup + 1
+                if done % 500 == 0:
+                    progress(f'{done}/{requests_total} requisições')
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(index,), daemon=True) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - started
+
+    all_latencies = [value for values in results.values() for value in values]
+    engine = db.engine
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'target': base_url or 'test-client',
+        'python': platform.python_version(),
+        'database': engine.dialect.name,
+        'config': {'requests': requests_total, 'concurrency': concurrency, 'warmup': warmup, 'seed': seed},
+        'dataset': {
+            'users': len(user_ids),
+            'time_records': db.session.query(TimeRecord.id).filter(TimeRecord.user_id.in_(user_ids[:1000])).count()
+        },
+        'wall_seconds': round(wall_seconds, 2),
+        'overall': _summarize(all_latencies, sum(errors.values()), wall_seconds),
+        'scenarios': {name: _summarize(values, errors[name], wall_seconds) for name, values in results.items()}
+    }
+
+
+def save_results(results: Dict[str, Any], output: Optional[str] = None) -> str:
+    """Grava o resultado em JSON (padrão: storage/perf/bench_<data>_<commit>.json)"""
+    if output is None:
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        output = os.path.join('storage', 'perf', f"bench_{stamp}_{results.get('commit') or 'local'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return output
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Variação de p50/p95 e vazão por cenário em relação a um resultado anterior"""
+    rows = []
+    for name in ['overall'] + sorted(current['scenarios']):
+        now = current['overall'] if name == 'overall' else current['scenarios'][name]
+        before = baseline['overall'] if name == 'overall' else baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        row = {'scenario': name}
+        for key in ('p50_ms', 'p95_ms', 'throughput_rps'):
+            if now.get(key) is not None and before.get(key):
+                row[key] = (before[key], now[key], round((now[key] - before[key]) / before[key] * 100, 1))
+        rows.append(row)
+    return rows
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Contador de Queries por Requisição para SKPONTO
+Registra quantidade de comandos SQL, tempo no banco e comandos repetidos
+(assinatura de N+1) em cada requisição, com tabela por endpoint em /admin/debug
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache, wraps
+from typing import Any, Dict, List, Optional
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Máximo de comandos guardados por requisição quando o texto é necessário (log de SQL)
+MAX_KEPT_STATEMENTS = 200
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:\?|%\(\w+\)s|%s|:\w+)(?:, *(?:\?|%\(\w+\)s|%s|:\w+))*\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=2048)
+def statement_shape(statement: str) -> str:
+    """Forma do comando, sem literais e com listas IN colapsadas"""
+    shape = _STRING_LITERAL.sub('?', statement)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _IN_LIST.sub('IN (...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Endpoint executou mais queries que o orçamento (modo estrito)"""
+
+
+class RequestQueries:
+    """Queries executadas durante uma requisição"""
+
+    __slots__ = ('count', 'db_seconds', 'statements', 'keep_statements', 'started')
+
+    def __init__(self):
+        self.count = 0
+        self.db_seconds = 0.0
+        self.statements: Dict[str, List] = {}
+        self.keep_statements = False
+        self.started = time.perf_counter()
+
+    def add(self, statement: str, seconds: float, executemany: bool):
+        self.count += 1
+        self.db_seconds += seconds
+        entry = self.statements.get(statement)
+        if entry is None:
+            self.statements[statement] = entry = [0, 0.0, []]
+        entry[0] += 1
+        entry[1] += seconds
+        if self.keep_statements and len(entry[2]) < MAX_KEPT_STATEMENTS:
+            entry[2].append((round(seconds * 1000, 2), executemany))
+
+    @property
+    def db_ms(self) -> float:
+        return round(self.db_seconds * 1000, 2)
+
+    @property
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self.started) * 1000, 2)
+
+    def shapes(self) -> Dict[str, List]:
+        """Contagem e tempo agrupados pela forma do comando"""
+        shapes: Dict[str, List] = {}
+        for statement, (count, seconds, _) in self.statements.items():
+            entry = shapes.setdefault(statement_shape(statement), [0, 0.0])
+            entry[0] += count
+            entry[1] += seconds
+        return shapes
+
+    def repeated(self, threshold: int) -> List[Dict[str, Any]]:
+        """Formas executadas `threshold` vezes ou mais (candidatas a N+1)"""
+        return sorted((
+            {'statement': shape[:500], 'count': count, 'db_ms': round(seconds * 1000, 2)}
+            for shape, (count, seconds) in self.shapes().items() if count >= threshold
+        ), key=lambda item: item['count'], reverse=True)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    # Listener registrado no meio de um comando ou conexão reaproveitada após
+    # erro: sem início não há o que medir, e a query medida nunca pode falhar
+    stack = conn.info.get('_query_start')
+    started = stack.pop() if stack else None
+    if started is None:
+        return
+    if has_request_context():
+        queries = g.get('_queries')
+        if queries is not None:
+            queries.add(statement, time.perf_counter() - started, executemany)
+
+
+def _on_error(exception_context):
+    # Comando que falhou não chega ao after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('_query_start'):
+        connection.info['_query_start'].pop()
+
+
+_listeners_lock = threading.Lock()
+_listeners_installed = False
+
+
+def install_listeners():
+    """Registra os eventos do SQLAlchemy uma única vez por processo"""
+    global _listeners_installed
+    with _listeners_lock:
+        if not _listeners_installed:
+            event.listen(Engine, 'before_cursor_execute', _before_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_execute)
+            event.listen(Engine, 'handle_error', _on_error)
+            _listeners_installed = True
+
+
+def start_recording() -> RequestQueries:
+    """Inicia (ou reaproveita) o registro de queries da requisição atual"""
+    install_listeners()
+    queries = g.get('_queries')
+    if queries is None:
+        queries = g._queries = RequestQueries()
+    return queries
+
+
+def current_queries() -> Optional[RequestQueries]:
+    if not has_request_context():
+        return None
+    return g.get('_queries')
+
+
+def query_budget(max_queries: int):
+    """Define o orçamento de queries de uma rota (verificado pelo QueryProfiler)"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g._query_budget = max_queries
+            return view(*args, **kwargs)
+        wrapper.query_budget = max_queries
+        return wrapper
+    return decorator
+
+
+class EndpointQueryStats:
+    """Janela móvel das últimas requisições de cada endpoint (por processo)"""
+
+    def __init__(self, window: int = 200, max_repeated: int = 10):
+        self.window = window
+        self.max_repeated = max_repeated
+        self._endpoints: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, queries: RequestQueries, repeated: List[Dict[str, Any]]):
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = {
+                    'samples': deque(maxlen=self.window),
+                    'requests': 0,
+                    'repeated': {}
+                }
+            stats['requests'] += 1
+            stats['samples'].append((queries.count, queries.db_ms))
+            stats['last_seen'] = datetime.now()
+            for item in repeated:
+                previous = stats['repeated'].get(item['statement'], 0)
+                stats['repeated'][item['statement']] = max(previous, item['count'])
+            if len(stats['repeated']) > self.max_repeated:
+                top = sorted(stats['repeated'].items(), key=lambda kv: kv[1], reverse=True)
+                stats['repeated'] = dict(top[:self.max_repeated])
+
+    def table(self) -> List[Dict[str, Any]]:
+        """Uma linha por endpoint, ordenada pela média de queries"""
+        with self._lock:
+            rows = []
+            for endpoint, stats in self._endpoints.items():
+                samples = list(stats['samples'])
+                counts = [count for count, _ in samples]
+                db_times = [db_ms for _, db_ms in samples]
+                rows.append({
+                    'endpoint': endpoint,
+                    'requests': stats['requests'],
+                    'window': len(samples),
+                    'avg_queries': round(sum(counts) / len(counts), 1),
+                    'max_queries': max(counts),
+                    'avg_db_ms': round(sum(db_times) / len(db_times), 2),
+                    'max_db_ms': max(db_times),
+                    'last_seen': stats['last_seen'].strftime('%Y-%m-%d %H:%M:%S'),
+                    'repeated': [{'statement': statement, 'count': count}
+                                 for statement, count in stats['repeated'].items()]
+                })
+        return sorted(rows, key=lambda row: row['avg_queries'], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+class QueryProfiler:
+    """Instrumentação de queries por requisição.
+
+    - Cabeçalhos X-Query-* / Server-Timing nas respostas em modo debug
+    - Tabela por endpoint (EndpointQueryStats) exibida em /admin/debug/queries
+    - Orçamento (QUERY_BUDGET ou @query_budget); com QUERY_BUDGET_STRICT o
+      excesso levanta QueryBudgetExceeded, caso contrário só gera um aviso
+    """
+
+    def __init__(self, app=None):
+        self.stats = EndpointQueryStats()
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('QUERY_PROFILER_ENABLED', True):
+            return
+        self.stats.window = app.config.get('QUERY_STATS_WINDOW', 200)
+        install_listeners()
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.extensions['query_profiler'] = self
+
+    def _start_request(self):
+        start_recording()
+
+    def _finish_request(self, response):
+        from flask import current_app
+
+        queries = current_queries()
+        if queries is None or request.endpoint is None or request.endpoint == 'static':
+            return response
+
+        config = current_app.config
+        repeated = queries.repeated(config.get('QUERY_REPEAT_THRESHOLD', 5))
+        self.stats.record(request.endpoint, queries, repeated)
+
+        if current_app.debug:
+            response.headers['X-Query-Count'] = str(queries.count)
+            response.headers['X-Query-Time-Ms'] = str(queries.db_ms)
+            if repeated:
+                response.headers['X-Query-Repeated'] = f"{repeated[0]['count']}x {repeated[0]['statement'][:200]}"
+            response.headers.add('Server-Timing', f'db;dur={queries.db_ms};desc="{queries.count} queries"')
+
+        budget = g.get('_query_budget') or config.get('QUERY_BUDGET', 0)
+        if budget and queries.count > budget:
+            message = (f"{request.endpoint}: {queries.count} queries (orçamento {budget})"
+                       + (f"; mais repetida {repeated[0]['count']}x: {repeated[0]['statement'][:200]}"
+                          if repeated else ''))
+            if config.get('QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+query_profiler = QueryProfiler()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Exportação de Relatórios de Ponto - SKPONTO
+Geração de Excel/CSV em streaming com memória constante
+"""
+
+import csv
+import io
+import os
+from datetime import datetime
+from sqlalchemy import select, and_
+from sqlalchemy.orm import aliased
+from app import db
+from app.models import TimeRecord, User, HourBankTransaction, HourBankTransactionType
+from app.utils import format_hours
+
+YIELD_PER = 1000
+CSV_FLUSH_ROWS = 500
+# Limite de linhas de uma planilha do Excel (inclui o cabeçalho)
+EXCEL_MAX_ROWS = 1048576
+
+REPORT_HEADERS = ['Funcionário', 'Data', 'Entrada', 'Saída',
+                  'Horas Trabalhadas', 'Horas Extras', 'Observações']
+
+HOUR_BANK_HEADERS = ['Data', 'Usuário', 'Email', 'Tipo', 'Horas',
+                     'Saldo Anterior', 'Saldo Após', 'Descrição',
+                     'Data Referência', 'Criado Por']
+
+
+def iter_report_rows(data_inicio, data_fim, user_id=0, yield_per=YIELD_PER):
+    """Itera os registros do período com o usuário na mesma query, em lotes do cursor.
+
+    Retorna linhas leves (não objetos ORM), evitando o N+1 de registro.usuario
+    e mantendo na memória apenas um lote por vez.
+    """
+    stmt = select(
+        User.nome, User.sobrenome, TimeRecord.data, TimeRecord.entrada,
+        TimeRecord.saida, TimeRecord.horas_trabalhadas, TimeRecord.horas_extras,
+        TimeRecord.observacoes, TimeRecord.is_atestado, TimeRecord.motivo_atestado
+    ).join(User, TimeRecord.user_id == User.id).where(
+        and_(TimeRecord.data >= data_inicio, TimeRecord.data <= data_fim)
+    )
+
+    if user_id and user_id > 0:
+        stmt = stmt.where(TimeRecord.user_id == user_id)
+
+    stmt = stmt.order_by(TimeRecord.data, TimeRecord.user_id).execution_options(yield_per=yield_per)
+
+    for row in db.session.execute(stmt):
+        yield row
+
+
+def format_report_row(row):
+    """Converte uma linha do relatório em valores de texto (CSV/PDF)"""
+    nome = f"{row.nome} {row.sobrenome}"
+    data = row.data.strftime('%d/%m/%Y')
+
+    if row.is_atestado:
+        return [nome, data, 'ATESTADO', 'ATESTADO', 'AFASTAMENTO', '-',
+                row.motivo_atestado or 'Atestado médico']
+
+    return [
+        nome,
+        data,
+        row.entrada.strftime('%H:%M') if row.entrada else '-',
+        row.saida.strftime('%H:%M') if row.saida else '-',
+        format_hours(row.horas_trabalhadas),
+        format_hours(row.horas_extras),
+        row.observacoes or ''
+    ]
+
+
+def write_excel_report(path, rows):
+    """Grava o relatório em xlsx no caminho informado usando constant_memory.
+
+    Com constant_memory o xlsxwriter descarrega cada linha no disco assim que a
+    próxima começa, então o consumo de memória não cresce com o período.
+    Retorna o número de registros gravados.
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {
+        'constant_memory': True,
+        'tmpdir': os.path.dirname(path) or None
+    })
+
+    header_format = workbook.add_format({
+        'bold': True,
+        'bg_color': '#4472C4',
+        'font_color': 'white',
+        'border': 1
+    })
+    date_format = workbook.add_format({'num_format': 'dd/mm/yyyy'})
+    time_format = workbook.add_format({'num_format': 'hh:mm'})
+
+    def new_worksheet(index):
+        name = 'Relatório de Ponto' if index == 1 else f'Relatório de Ponto ({index})'
+        worksheet = workbook.add_worksheet(name)
+        worksheet.set_column('A:A', 25)
+        worksheet.set_column('B:B', 12)
+        worksheet.set_column('C:F', 15)
+        worksheet.set_column('G:G', 30)
+        for col, header in enumerate(REPORT_HEADERS):
+            worksheet.write(0, col, header, header_format)
+        return worksheet
+
+    sheets = 1
+    worksheet = new_worksheet(sheets)
+    row_index = 0
+    total = 0
+
+    try:
+        for row in rows:
+            row_index += 1
+            if row_index >= EXCEL_MAX_ROWS:
+                # Planilha cheia: continua em uma nova aba
+                sheets += 1
+                worksheet = new_worksheet(sheets)
+                row_index = 1
+
+            worksheet.write(row_index, 0, f"{row.nome} {row.sobrenome}")
+            worksheet.write_datetime(row_index, 1, row.data, date_format)
+
+            if row.is_atestado:
+                worksheet.write(row_index, 2, 'ATESTADO')
+                worksheet.write(row_index, 3, 'ATESTADO')
+                worksheet.write(row_index, 4, 'AFASTAMENTO')
+                worksheet.write(row_index, 5, '-')
+                worksheet.write(row_index, 6, row.motivo_atestado or 'Atestado médico')
+            else:
+                worksheet.write(row_index, 2, row.entrada, time_format)
+                worksheet.write(row_index, 3, row.saida, time_format)
+                worksheet.write(row_index, 4, format_hours(row.horas_trabalhadas))
+                worksheet.write(row_index, 5, format_hours(row.horas_extras))
+                worksheet.write(row_index, 6, row.observacoes or '')
+            total += 1
+    finally:
+        workbook.close()
+
+    return total
+
+
+def write_csv_report(fileobj, rows):
+    """Grava o relatório em CSV (texto) no arquivo informado. Retorna o número de registros"""
+    writer = csv.writer(fileobj, delimiter=';')
+    writer.writerow(REPORT_HEADERS)
+    total = 0
+    for row in rows:
+        writer.writerow(format_report_row(row))
+        total += 1
+    return total
+
+
+def iter_csv_report(rows, flush_rows=CSV_FLUSH_ROWS):
+    """Gera o CSV em pedaços para uma Response em streaming.
+
+    Começa com BOM UTF-8 e usa ';' como separador para abrir direto no Excel
+    em português.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+
+    buffer.write('\ufeff')
+    writer.writerow(REPORT_HEADERS)
+
+    pending = 0
+    for row in rows:
+        writer.writerow(format_report_row(row))
+        pending += 1
+        if pending >= flush_rows:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+
+    remaining = buffer.getvalue()
+    if remaining:
+        yield remaining.encode('utf-8')
+
+
+def write_pdf_report(output, rows, data_inicio, data_fim):
+    """Grava o relatório de ponto em PDF no caminho ou arquivo informado"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib import colors
+
+    doc = SimpleDocTemplate(output, pagesize=A4)
+
+    # Estilos
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        spaceAfter=30,
+        alignment=1  # Centro
+    )
+
+    story = [
+        Paragraph("Relatório de Controle de Ponto", title_style),
+        Paragraph(
+            f"Período: {data_inicio.strftime('%d/%m/%Y')} a {data_fim.strftime('%d/%m/%Y')}",
+            styles['Normal']
+        ),
+        Spacer(1, 20)
+    ]
+
+    # Tabela
+    data = [['Funcionário', 'Data', 'Entrada', 'Saída', 'H. Trabalhadas', 'H. Extras']]
+    for row in rows:
+        values = format_report_row(row)
+        # Atestado: motivo na última coluna; demais: sem observações
+        data.append(values[:5] + [values[6]] if row.is_atestado else values[:6])
+
+    table = Table(data, repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    story.append(table)
+
+    doc.build(story)
+    return len(data) - 1
+
+
+def iter_hour_bank_rows(user_id=None, start_date=None, end_date=None, transaction_type=None,
+                        yield_per=YIELD_PER):
+    """Itera as transações do banco de horas com usuário e criador na mesma query"""
+    creator = aliased(User)
+    stmt = select(
+        HourBankTransaction.created_at, User.nome, User.sobrenome, User.email,
+        HourBankTransaction.transaction_type, HourBankTransaction.hours,
+        HourBankTransaction.balance_before, HourBankTransaction.balance_after,
+        HourBankTransaction.description, HourBankTransaction.reference_date,
+        creator.nome.label('creator_nome'), creator.sobrenome.label('creator_sobrenome')
+    ).join(User, HourBankTransaction.user_id == User.id).outerjoin(
+        creator, HourBankTransaction.created_by == creator.id
+    )
+
+    if user_id:
+        stmt = stmt.where(HourBankTransaction.user_id == int(user_id))
+    if start_date:
+        stmt = stmt.where(HourBankTransaction.created_at >= start_date)
+    if end_date:
+        stmt = stmt.where(HourBankTransaction.created_at <= datetime.combine(end_date, datetime.max.time()))
+    if transaction_type:
+        stmt = stmt.where(HourBankTransaction.transaction_type == HourBankTransactionType(transaction_type))
+
+    stmt = stmt.order_by(HourBankTransaction.created_at.desc()).execution_options(yield_per=yield_per)
+
+    for row in db.session.execute(stmt):
+        yield row
+
+
+def format_hour_bank_row(row):
+    """Converte uma transação do banco de horas em valores de texto"""
+    return [
+        row.created_at.strftime('%d/%m/%Y %H:%M'),
+        f"{row.nome} {row.sobrenome}",
+        row.email,
+        row.transaction_type.value,
+        row.hours,
+        row.balance_before or 0,
+        row.balance_after,
+        row.description or '',
+        row.reference_date.strftime('%d/%m/%Y') if row.reference_date else '',
+        f"{row.creator_nome} {row.creator_sobrenome}" if row.creator_nome else 'Sistema'
+    ]
+
+
+def write_hour_bank_csv(fileobj, rows):
+    """Grava as transações do banco de horas em CSV. Retorna o número de registros"""
+    writer = csv.writer(fileobj)
+    writer.writerow(HOUR_BANK_HEADERS)
+    total = 0
+    for row in rows:
+        writer.writerow(format_hour_bank_row(row))
+        total += 1
+    return total
+
+
+def write_hour_bank_pdf(output, rows, title='Relatório de Banco de Horas'):
+    """Grava as transações do banco de horas em PDF (paisagem)"""
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib import colors
+
+    doc = SimpleDocTemplate(output, pagesize=landscape(A4))
+    styles = getSampleStyleSheet()
+    story = [
+        Paragraph(title, styles['Heading1']),
+        Paragraph(f"Gerado em {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']),
+        Spacer(1, 12)
+    ]
+
+    data = [['Data', 'Usuário', 'Tipo', 'Horas', 'Saldo Após', 'Descrição']]
+    for row in rows:
+        values = format_hour_bank_row(row)
+        data.append([values[0], values[1], values[3], f"{values[4]:+.2f}",
+                     f"{values[6]:.2f}", (values[7] or '')[:60]])
+
+    table = Table(data, repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+    ]))
+    story.append(table)
+
+    doc.build(story)
+    return len(data) - 1
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fila de Relatórios em Segundo Plano - SKPONTO
+Relatórios pesados são enfileirados no banco e gerados por threads de trabalho
+em storage/reports/, fora do ciclo da requisição
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, date, timedelta
+from flask import current_app, session
+from app import db
+from app.models import ReportJob, ReportJobStatus
+from app.report_export import (
+    iter_report_rows, write_excel_report, write_csv_report, write_pdf_report,
+    iter_hour_bank_rows, write_hour_bank_csv, write_hour_bank_pdf
+)
+
+ACTIVE_STATUSES = (ReportJobStatus.PENDENTE, ReportJobStatus.PROCESSANDO)
+
+# Jobs de outros admins aos quais este se juntou (pedido coalescido), guardados na sessão
+FOLLOWED_JOBS_KEY = 'report_jobs_seguidos'
+FOLLOWED_JOBS_LIMIT = 10
+
+FILE_EXTENSIONS = {'pdf': 'pdf', 'excel': 'xlsx', 'csv': 'csv'}
+
+MIMETYPES = {
+    'pdf': 'application/pdf',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv'
+}
+
+
+def _parse_date(value):
+    return date.fromisoformat(value) if value else None
+
+
+def _render_time_records(path, formato, params):
+    """Relatório de ponto (admin.relatorios)"""
+    data_inicio = _parse_date(params['data_inicio'])
+    data_fim = _parse_date(params['data_fim'])
+    rows = iter_report_rows(data_inicio, data_fim, params.get('user_id') or 0)
+
+    if formato == 'excel':
+        return write_excel_report(path, rows)
+    if formato == 'csv':
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            return write_csv_report(f, rows)
+    return write_pdf_report(path, rows, data_inicio, data_fim)
+
+
+def _render_hour_bank(path, formato, params):
+    """Relatório de transações do banco de horas (admin.hour_bank_reports)"""
+    rows = iter_hour_bank_rows(
+        user_id=params.get('user_id'),
+        start_date=_parse_date(params.get('start_date')),
+        end_date=_parse_date(params.get('end_date')),
+        transaction_type=params.get('transaction_type')
+    )
+
+    if formato == 'pdf':
+        return write_hour_bank_pdf(path, rows)
+    # "Excel" do banco de horas continua sendo CSV compatível
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        return write_hour_bank_csv(f, rows)
+
+
+REPORT_TYPES = {
+    'time_records': {'name': 'relatorio_ponto', 'render': _render_time_records},
+    'hour_bank': {'name': 'relatorio_banco_horas', 'render': _render_hour_bank}
+}
+
+
+def _file_extension(report_type, formato):
+    if report_type == 'hour_bank' and formato != 'pdf':
+        return 'csv'
+    return FILE_EXTENSIONS.get(formato, 'pdf')
+
+
+def normalize_params(report_type, formato, params):
+    """Serializa os parâmetros de forma estável e calcula o hash usado na coalescência"""
+    normalized = {}
+    for key, value in params.items():
+        if isinstance(value, (date, datetime)):
+            value = value.isoformat()
+        if value in ('', 0):
+            value = None
+        normalized[key] = value
+
+    params_json = json.dumps(normalized, sort_keys=True)
+    digest = hashlib.sha256(f"{report_type}|{formato}|{params_json}".encode('utf-8')).hexdigest()
+    return params_json, digest
+
+
+def enqueue_report(report_type, formato, params, requested_by=None):
+    """Enfileira um relatório e retorna (job, coalescido).
+
+    Se já existe um job pendente ou em processamento com os mesmos parâmetros,
+    ele é reaproveitado em vez de gerar o mesmo arquivo duas vezes.
+    """
+    if report_type not in REPORT_TYPES:
+        raise ValueError(f"Tipo de relatório inválido: {report_type}")
+
+    params_json, params_hash = normalize_params(report_type, formato, params)
+
+    existing = ReportJob.query.filter(
+        ReportJob.params_hash == params_hash,
+        ReportJob.status.in_(ACTIVE_STATUSES)
+    ).order_by(ReportJob.id).first()
+    if existing:
+        return existing, True
+
+    job = ReportJob(
+        report_type=report_type,
+        formato=formato,
+        params=params_json,
+        params_hash=params_hash,
+        requested_by=requested_by
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    worker = getattr(current_app, 'report_worker', None)
+    if worker:
+        worker.wake()
+
+    return job, False
+
+
+def follow_job(job):
+    """Lista o job (de outro admin) em admin.relatorios para quem se juntou a ele"""
+    followed = [job.id] + [job_id for job_id in session.get(FOLLOWED_JOBS_KEY, []) if job_id != job.id]
+    session[FOLLOWED_JOBS_KEY] = followed[:FOLLOWED_JOBS_LIMIT]
+
+
+def followed_job_ids():
+    return list(session.get(FOLLOWED_JOBS_KEY, []))
+
+
+def claim_next_job():
+    """Reserva o job pendente mais antigo; retorna o id ou None.
+
+    A troca de status é um UPDATE condicional, então dois workers (threads ou
+    processos) nunca pegam o mesmo job.
+    """
+    candidate = db.session.query(ReportJob.id).filter(
+        ReportJob.status == ReportJobStatus.PENDENTE
+    ).order_by(ReportJob.id).first()
+    if not candidate:
+        return None
+
+    claimed = ReportJob.query.filter(
+        ReportJob.id == candidate.id,
+        ReportJob.status == ReportJobStatus.PENDENTE
+    ).update({
+        'status': ReportJobStatus.PROCESSANDO,
+        'started_at': datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+
+    return candidate.id if claimed else None
+
+
+def run_job(job_id):
+    """Gera o arquivo de um job já reservado"""
+    job = db.session.get(ReportJob, job_id)
+    if not job:
+        return False
+
+    spec = REPORT_TYPES[job.report_type]
+    extension = _file_extension(job.report_type, job.formato)
+    file_name = f"{spec['name']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    reports_path = current_app.config['REPORTS_PATH']
+    os.makedirs(reports_path, exist_ok=True)
+    final_path = os.path.join(reports_path, f"{job.id}_{file_name}")
+    partial_path = final_path + '.part'
+
+    try:
+        row_count = spec['render'](partial_path, job.formato, json.loads(job.params))
+        os.replace(partial_path, final_path)
+
+        job.status = ReportJobStatus.CONCLUIDO
+        job.file_name = file_name
+        job.file_path = final_path
+        job.file_size = os.path.getsize(final_path)
+        job.row_count = row_count
+        job.completed_at = datetime.utcnow()
+        db.session.commit()
+
+        current_app.logger.info(
+            f"Relatório {job.id} ({job.report_type}/{job.formato}) gerado: "
+            f"{row_count} linhas em {job.duration_seconds}s"
+        )
+        return True
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Erro ao gerar relatório {job_id}: {str(e)}")
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+        job = db.session.get(ReportJob, job_id)
+        job.status = ReportJobStatus.FALHOU
+        job.error_message = str(e)[:1000]
+        job.completed_at = datetime.utcnow()
+        db.session.commit()
+        return False
+
+
+def recover_stale_jobs(stale_minutes):
+    """Devolve à fila jobs presos em processamento (ex.: worker reiniciado)"""
+    cutoff = datetime.utcnow() - timedelta(minutes=stale_minutes)
+    recovered = ReportJob.query.filter(
+        ReportJob.status == ReportJobStatus.PROCESSANDO,
+        ReportJob.started_at < cutoff
+    ).update({'status': ReportJobStatus.PENDENTE, 'started_at': None}, synchronize_session=False)
+    db.session.commit()
+    return recovered
+
+
+def cleanup_expired_reports(retention_hours):
+    """Remove arquivos e registros de relatórios mais antigos que a retenção"""
+    cutoff = datetime.utcnow() - timedelta(hours=retention_hours)
+    expired = ReportJob.query.filter(
+        ReportJob.status.in_((ReportJobStatus.CONCLUIDO, ReportJobStatus.FALHOU)),
+        ReportJob.completed_at < cutoff
+    ).all()
+
+    for job in expired:
+        if job.file_path and os.path.exists(job.file_path):
+            try:
+                os.remove(job.file_path)
+            except OSError as e:
+                current_app.logger.warning(f"Não foi possível remover {job.file_path}: {str(e)}")
+        db.session.delete(job)
+
+    db.session.commit()
+    return len(expired)
+
+
+class ReportWorker:
+    """Threads que consomem a fila de relatórios.
+
+    As threads são iniciadas sob demanda no processo que atende requisições
+    (com preload_app o create_app roda no master do gunicorn, e threads não
+    sobrevivem ao fork), por isso ensure_started compara o PID atual.
+    """
+
+    def __init__(self, app, threads=1, poll_seconds=5):
+        self.app = app
+        self.threads = max(0, int(threads))
+        self.poll_seconds = poll_seconds
+        self._pid = None
+        self._workers = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+
+    def ensure_started(self):
+        """Inicia as threads neste processo, se ainda não estiverem rodando"""
+        if self.threads == 0:
+            return
+        if self._pid == os.getpid() and all(t.is_alive() for t in self._workers):
+            return
+
+        with self._lock:
+            if self._pid != os.getpid():
+                self._workers = []
+                self._stop.clear()
+            self._pid = os.getpid()
+            self._workers = [t for t in self._workers if t.is_alive()]
+
+            while len(self._workers) < self.threads:
+                thread = threading.Thread(
+                    target=self._run,
+                    name=f'report-worker-{len(self._workers) + 1}',
+                    daemon=True
+                )
+                thread.start()
+                self._workers.append(thread)
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def _run(self):
+        with self.app.app_context():
+            try:
+                recover_stale_jobs(self.app.config.get('REPORT_STALE_MINUTES', 30))
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.error(f"Erro ao recuperar relatórios pendentes: {str(e)}")
+            finally:
+                db.session.remove()
+
+        self.run_forever()
+
+    def run_forever(self):
+        """Laço principal: processa jobs até a fila esvaziar e então aguarda"""
+        last_cleanup = None
+        retention = self.app.config.get('REPORT_RETENTION_HOURS', 24)
+
+        while not self._stop.is_set():
+            job_id = None
+            with self.app.app_context():
+                try:
+                    if not last_cleanup or datetime.utcnow() - last_cleanup > timedelta(hours=1):
+                        cleanup_expired_reports(retention)
+                        last_cleanup = datetime.utcnow()
+
+                    job_id = claim_next_job()
+                    if job_id:
+                        run_job(job_id)
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.error(f"Erro no worker de relatórios: {str(e)}")
+                finally:
+                    db.session.remove()
+
+            if not job_id:
+                self._wakeup.wait(self.poll_seconds)
+                self._wakeup.clear()
+
+
+def init_report_worker(app):
+    """Registra o worker de relatórios na aplicação"""
+    worker = ReportWorker(
+        app,
+        threads=app.config.get('REPORT_WORKER_THREADS', 1),
+        poll_seconds=app.config.get('REPORT_POLL_SECONDS', 5)
+    )
+    app.report_worker = worker
+
+    if worker.threads:
+        @app.before_request
+        def _ensure_report_worker():
+            worker.ensure_started()
+
+    return worker
@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*-
+"""
+Métricas de Requisições do SKPONTO
+Histogramas de latência por endpoint, contagem por status, requisições em
+andamento, tempo de banco x renderização e tamanho das respostas. Cada worker
+agrega em memória e publica um snapshot em arquivo; a leitura soma os workers
+"""
+
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from flask import Response, before_render_template, g, request, template_rendered
+
+try:
+    import fcntl
+except ImportError:  # Windows: arquivo de histórico sem lock (processo único)
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Limites superiores dos buckets em milissegundos (+Inf implícito)
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+UNMATCHED_ENDPOINT = '<sem rota>'
+ARCHIVE_NAME = 'archive.json'
+
+
+def _new_endpoint() -> Dict[str, Any]:
+    return {
+        'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        'count': 0,
+        'sum_ms': 0.0,
+        'db_ms': 0.0,
+        'render_ms': 0.0,
+        'bytes': 0,
+        'status': {}
+    }
+
+
+def merge_endpoints(target: Dict[str, Dict], source: Dict[str, Dict]):
+    """Soma as métricas de `source` em `target`"""
+    for endpoint, data in source.items():
+        merged = target.setdefault(endpoint, _new_endpoint())
+        merged['buckets'] = [a + b for a, b in zip(merged['buckets'], data['buckets'])]
+        for key in ('count', 'sum_ms', 'db_ms', 'render_ms', 'bytes'):
+            merged[key] += data[key]
+        for status, count in data['status'].items():
+            merged['status'][status] = merged['status'].get(status, 0) + count
+
+
+def merge_gauges(target: Dict[str, List], source: Dict[str, List]):
+    """Soma as métricas extras (filas, contadores) dos workers vivos"""
+    for name, (kind, description, value) in source.items():
+        merged = target.setdefault(name, [kind, description, 0])
+        merged[2] += value
+
+
+def histogram_quantile(quantile: float, buckets: List[int]) -> Optional[float]:
+    """Percentil estimado (ms) por interpolação linear dentro do bucket"""
+    total = sum(buckets)
+    if not total:
+        return None
+    rank = quantile * total
+    cumulative = 0
+    for index, count in enumerate(buckets):
+        if cumulative + count >= rank and count:
+            if index == len(LATENCY_BUCKETS_MS):
+                return float(LATENCY_BUCKETS_MS[-1])
+            lower = LATENCY_BUCKETS_MS[index - 1] if index else 0
+            upper = LATENCY_BUCKETS_MS[index]
+            return round(lower + (upper - lower) * (rank - cumulative) / count, 1)
+        cumulative += count
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsStore:
+    """Snapshots por worker em um diretório compartilhado (ex.: /dev/shm).
+
+    Arquivos de workers encerrados (max_requests, reinício) são somados ao
+    histórico, para que os contadores nunca diminuam.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def _worker_path(self, pid: int) -> Path:
+        return self.directory / f'worker_{pid}.json'
+
+    def publish(self, snapshot: Dict[str, Any]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._worker_path(snapshot['pid'])
+        temp_path = path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+        os.replace(temp_path, path)
+
+    def _read(self, path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _archive_dead(self, dead: List[Tuple[Path, Dict[str, Any]]]):
+        """Move os snapshots de workers encerrados para o histórico"""
+        archive_path = self.directory / ARCHIVE_NAME
+        with open(self.directory / '.archive.lock', 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            archive = self._read(archive_path) or {'endpoints': {}}
+            archived = []
+            for path, snapshot in dead:
+                if path.exists():  # outro processo pode ter arquivado antes
+                    merge_endpoints(archive['endpoints'], snapshot['endpoints'])
+                    archived.append(path)
+            if archived:
+                temp_path = archive_path.with_suffix('.tmp')
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(archive, f, separators=(',', ':'))
+                os.replace(temp_path, archive_path)
+                for path in archived:
+                    path.unlink(missing_ok=True)
+
+    def collect(self, own_snapshot: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Soma o histórico e os workers vivos (o próprio processo usa os dados em memória)"""
+        endpoints: Dict[str, Dict] = {}
+        in_flight = 0
+        workers = 0
+        gauges: Dict[str, List] = {}
+        dead = []
+
+        if self.directory.exists():
+            archive = self._read(self.directory / ARCHIVE_NAME)
+            if archive:
+                merge_endpoints(endpoints, archive['endpoints'])
+            for path in self.directory.glob('worker_*.json'):
+                snapshot = self._read(path)
+                if snapshot is None or (own_snapshot and snapshot['pid'] == own_snapshot['pid']):
+                    continue
+                if _process_alive(snapshot['pid']):
+                    merge_endpoints(endpoints, snapshot['endpoints'])
+                    in_flight += snapshot['in_flight']
+                    merge_gauges(gauges, snapshot.get('gauges', {}))
+                    workers += 1
+                else:
+                    dead.append((path, snapshot))
+
+        if dead:
+            try:
+                self._archive_dead(dead)
+            except OSError as e:
+                logger.warning(f"Erro ao arquivar métricas de workers encerrados: {e}")
+            for _, snapshot in dead:
+                merge_endpoints(endpoints, snapshot['endpoints'])
+
+        if own_snapshot:
+            merge_endpoints(endpoints, own_snapshot['endpoints'])
+            in_flight += own_snapshot['in_flight']
+            merge_gauges(gauges, own_snapshot.get('gauges', {}))
+            workers += 1
+        return {'endpoints': endpoints, 'in_flight': in_flight, 'workers': workers, 'gauges': gauges}
+
+
+class RequestMetrics:
+    """Instrumentação sempre ativa das requisições.
+
+    O custo por requisição é um perf_counter, alguns incrementos sob lock e,
+    no máximo a cada METRICS_FLUSH_SECONDS, a gravação do snapshot do worker.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._gauge_sources: List[Callable[[], List[tuple]]] = []
+        self._reset()
+        self.store: Optional[MetricsStore] = None
+        self.flush_seconds = 5
+        if app:
+            self.init_app(app)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._endpoints: Dict[str, Dict] = {}
+        self._in_flight = 0
+        self._last_publish = 0.0
+
+    def init_app(self, app):
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        self.store = MetricsStore(app.config.get('METRICS_DIR') or 'storage/metrics')
+        self.flush_seconds = app.config.get('METRICS_FLUSH_SECONDS', 5)
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.add_url_rule('/metrics', 'metrics', self.prometheus_view)
+        app.extensions['request_metrics'] = self
+
+    def register_gauges(self, source: Callable[[], List[tuple]]):
+        """Registra uma função que retorna [(nome, tipo, descrição, valor)] deste processo"""
+        if source not in self._gauge_sources:
+            self._gauge_sources.append(source)
+
+    def _gauges(self) -> Dict[str, List]:
+        gauges = {}
+        for source in self._gauge_sources:
+            try:
+                for name, kind, description, value in source():
+                    gauges[name] = [kind, description, value]
+            except Exception as e:
+                logger.warning(f"Erro ao coletar métricas extras: {e}")
+        return gauges
+
+    def _check_fork(self):
+        # Após o fork (preload do gunicorn) o worker começa do zero
+        if os.getpid() != self._pid:
+            with self._lock:
+                self._reset()
+
+    def _start_request(self):
+        self._check_fork()
+        g._metrics_started = time.perf_counter()
+        g._metrics_render = 0.0
+        with self._lock:
+            self._in_flight += 1
+
+    def _before_render(self, sender, template, context, **extra):
+        g._metrics_render_started = time.perf_counter()
+
+    def _after_render(self, sender, template, context, **extra):
+        started = g.pop('_metrics_render_started', None)
+        if started is not None and '_metrics_render' in g:
+            g._metrics_render += time.perf_counter() - started
+
+    def _finish_request(self, response):
+        started = g.get('_metrics_started')
+        if started is None:
+            return response
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        from app.query_profiler import current_queries
+        queries = current_queries()
+        db_ms = queries.db_seconds * 1000 if queries else 0.0
+        size = 0 if response.is_streamed else (response.calculate_content_length() or 0)
+
+        endpoint = request.endpoint or UNMATCHED_ENDPOINT
+        status = str(response.status_code)
+        bucket = len(LATENCY_BUCKETS_MS)
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                bucket = index
+                break
+
+        with self._lock:
+            data = self._endpoints.get(endpoint)
+            if data is None:
+                data = self._endpoints[endpoint] = _new_endpoint()
+            data['buckets'][bucket] += 1
+            data['count'] += 1
+            data['sum_ms'] += elapsed_ms
+            data['db_ms'] += db_ms
+            data['render_ms'] += g._metrics_render * 1000
+            data['bytes'] += size
+            data['status'][status] = data['status'].get(status, 0) + 1
+
+        if time.monotonic() - self._last_publish >= self.flush_seconds:
+            self.publish()
+        return response
+
+    def _teardown_request(self, exception=None):
+        if g.pop('_metrics_started', None) is not None:
+            with self._lock:
+                self._in_flight -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        gauges = self._gauges()
+        with self._lock:
+            return {
+                'pid': self._pid,
+                'updated': time.time(),
+                'in_flight': self._in_flight,
+                'endpoints': json.loads(json.dumps(self._endpoints)),
+                'gauges': gauges
+            }
+
+    def publish(self):
+        """Grava o snapshot deste worker para os demais processos"""
+        if self.store is None:
+            return
+        self._check_fork()
+        self._last_publish = time.monotonic()
+        try:
+            self.store.publish(self.snapshot())
+        except OSError as e:
+            logger.warning(f"Erro ao publicar métricas: {e}")
+
+    def collect(self) -> Dict[str, Any]:
+        """Métricas somadas de todos os workers"""
+        self._check_fork()
+        snapshot = self.snapshot()
+        if self.store is None:
+            return {'endpoints': snapshot['endpoints'], 'in_flight': snapshot['in_flight'], 'workers': 1,
+                    'gauges': snapshot['gauges']}
+        return self.store.collect(snapshot)
+
+    def table(self, collected: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Uma linha por endpoint (percentis em ms, médias por requisição)"""
+        collected = collected or self.collect()
+        rows = []
+        for endpoint, data in collected['endpoints'].items():
+            count = data['count'] or 1
+            rows.append({
+                'endpoint': endpoint,
+                'count': data['count'],
+                'p50_ms': histogram_quantile(0.50, data['buckets']),
+                'p95_ms': histogram_quantile(0.95, data['buckets']),
+                'p99_ms': histogram_quantile(0.99, data['buckets']),
+                'avg_ms': round(data['sum_ms'] / count, 1),
+                'avg_db_ms': round(data['db_ms'] / count, 1),
+                'avg_render_ms': round(data['render_ms'] / count, 1),
+                'avg_bytes': int(data['bytes'] / count),
+                'errors': sum(n for status, n in data['status'].items() if status.startswith('5')),
+                'status': data['status']
+            })
+        return sorted(rows, key=lambda row: row['count'], reverse=True)
+
+    def prometheus_text(self) -> str:
+        """Formato de exposição texto do Prometheus"""
+        collected = self.collect()
+        lines = [
+            '# HELP skponto_http_request_duration_seconds Latência das requisições por endpoint',
+            '# TYPE skponto_http_request_duration_seconds histogram'
+        ]
+        endpoints = sorted(collected['endpoints'].items())
+        for endpoint, data in endpoints:
+            label = _label(endpoint)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS_MS, data['buckets']):
+                cumulative += count
+                lines.append(f'skponto_http_request_duration_seconds_bucket{{endpoint="{label}",le="{bound / 1000:g}"}} {cumulative}')
+            lines.append(f'skponto_http_request_duration_seconds_bucket{{endpoint="{label}",le="+Inf"}} {data["count"]}')
+            lines.append(f'skponto_http_request_duration_seconds_sum{{endpoint="{label}"}} {data["sum_ms"] / 1000:.6f}')
+            lines.append(f'skponto_http_request_duration_seconds_count{{endpoint="{label}"}} {data["count"]}')
+
+        counters = (
+            ('skponto_http_requests_total', 'Requisições por endpoint e status', None),
+            ('skponto_http_request_db_seconds_total', 'Tempo gasto no banco de dados', 'db_ms'),
+            ('skponto_http_request_render_seconds_total', 'Tempo gasto renderizando templates', 'render_ms'),
+            ('skponto_http_response_bytes_total', 'Bytes enviados nas respostas', 'bytes')
+        )
+        for name, description, key in counters:
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} counter']
+            for endpoint, data in endpoints:
+                label = _label(endpoint)
+                if key is None:
+                    for status, count in sorted(data['status'].items()):
+                        lines.append(f'{name}{{endpoint="{label}",status="{status}"}} {count}')
+                elif key == 'bytes':
+                    lines.append(f'{name}{{endpoint="{label}"}} {data[key]}')
+                else:
+                    lines.append(f'{name}{{endpoint="{label}"}} {data[key] / 1000:.6f}')
+
+        lines += [
+            '# HELP skponto_http_requests_in_flight Requisições em andamento',
+            '# TYPE skponto_http_requests_in_flight gauge',
+            f'skponto_http_requests_in_flight {collected["in_flight"]}',
+            '# HELP skponto_metrics_workers Workers com métricas publicadas',
+            '# TYPE skponto_metrics_workers gauge',
+            f'skponto_metrics_workers {collected["workers"]}'
+        ]
+        for name, (kind, description, value) in sorted(collected.get('gauges', {}).items()):
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}', f'{name} {value:g}']
+        return '\n'.join(lines) + '\n'
+
+    def prometheus_view(self):
+        """GET /metrics: token (METRICS_TOKEN) ou administrador logado"""
+        from flask import current_app
+        from flask_login import current_user
+
+        token = current_app.config.get('METRICS_TOKEN')
+        authorization = request.headers.get('Authorization', '')
+        if token and hmac.compare_digest(authorization, f'Bearer {token}'):
+            pass
+        elif not (current_user.is_authenticated and getattr(current_user, 'is_admin', False)):
+            return Response('Acesso negado\n', status=403, mimetype='text/plain')
+        return Response(self.prometheus_text(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,327 @@
+# -*- coding: utf-8 -*-
+"""
+Profiler de Requisições sob Demanda para SKPONTO
+Um administrador gera um token assinado; requisições com o token (cabeçalho
+X-Profile-Token ou parâmetro _profile) rodam sob cProfile ou amostragem de
+pilha e o resultado fica em storage/logs/profiles/
+"""
+
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import g, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile-Token'
+PROFILE_PARAM = '_profile'
+TOKEN_SALT = 'skponto-request-profiler'
+MODES = ('cprofile', 'sample')
+MAX_STACK_DEPTH = 128
+
+
+def frame_label(code) -> str:
+    """Nome de um quadro no formato das pilhas colapsadas"""
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse_frame(frame) -> str:
+    """Pilha do quadro, da raiz para o topo, separada por ';'"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Amostra a pilha de uma thread em intervalos fixos (sys._current_frames)"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            self.stacks[collapse_frame(frame)] += 1
+            del frame
+
+
+def _pstats_label(func: Tuple[str, int, str]) -> str:
+    filename, line, name = func
+    if filename == '~':  # funções embutidas
+        return name
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def pstats_collapsed(stats: pstats.Stats) -> Counter:
+    """Pilhas colapsadas aproximadas a partir do grafo de chamadas do cProfile.
+
+    O tempo de cada função é distribuído entre quem a chamou na proporção do
+    tempo acumulado de cada aresta (mesma aproximação do flameprof/gprof2dot).
+    Valores em microssegundos.
+    """
+    raw = stats.stats
+    callees: Dict[Any, List[Tuple[Any, float]]] = {}
+    roots = []
+    for func, (_, _, _, cumulative, callers) in raw.items():
+        if not callers:
+            roots.append(func)
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    collapsed: Counter = Counter()
+
+    def visit(func, budget: float, stack: List[str], seen: set):
+        total_time, cumulative = raw[func][2], raw[func][3]
+        if cumulative <= 0 or budget <= 0:
+            return
+        scale = min(budget / cumulative, 1.0)
+        stack = stack + [_pstats_label(func)]
+        own = int(total_time * scale * 1_000_000)
+        if own:
+            collapsed[';'.join(stack)] += own
+        if len(stack) >= MAX_STACK_DEPTH:
+            return
+        for callee, edge_cumulative in callees.get(func, []):
+            if callee not in seen:
+                visit(callee, edge_cumulative * scale, stack, seen | {callee})
+
+    for root in roots:
+        visit(root, raw[root][3], [], {root})
+    return collapsed
+
+
+def _top_from_pstats(stats: pstats.Stats, limit: int) -> List[Dict[str, Any]]:
+    rows = []
+    for func, (primitive_calls, calls, total_time, cumulative, _) in stats.stats.items():
+        rows.append({
+            'function': _pstats_label(func),
+            'calls': calls,
+            'own_ms': round(total_time * 1000, 2),
+            'cumulative_ms': round(cumulative * 1000, 2)
+        })
+    rows.sort(key=lambda row: row['cumulative_ms'], reverse=True)
+    return rows[:limit]
+
+
+def top_from_samples(stacks: Counter, ms_per_sample: float, limit: int) -> List[Dict[str, Any]]:
+    cumulative: Counter = Counter()
+    own: Counter = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for frame in set(frames):
+            cumulative[frame] += count
+    return [{
+        'function': function,
+        'samples': count,
+        'own_ms': round(own[function] * ms_per_sample, 2),
+        'cumulative_ms': round(count * ms_per_sample, 2)
+    } for function, count in cumulative.most_common(limit)]
+
+
+class RequestProfiler:
+    """Perfil de requisições individuais, ativado por token de administrador.
+
+    O token (itsdangerous, assinado com a SECRET_KEY) expira em
+    PROFILER_TOKEN_MAX_AGE segundos. Cada perfil gera `<id>.json` (metadados
+    e funções mais custosas), `<id>.collapsed` (flamegraph.pl/speedscope) e,
+    no modo cprofile, `<id>.prof` (pstats/snakeviz).
+    """
+
+    def __init__(self, app=None):
+        self.directory = Path('storage/logs/profiles')
+        self.max_profiles = 50
+        self.top_functions = 40
+        self.sample_interval = 0.005
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directory = Path(app.config.get('PROFILER_DIR', 'storage/logs/profiles'))
+        self.max_profiles = app.config.get('PROFILER_MAX_PROFILES', 50)
+        self.sample_interval = app.config.get('PROFILER_SAMPLE_INTERVAL_MS', 5) / 1000.0
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._teardown_request)
+        app.extensions['request_profiler'] = self
+
+    # Tokens
+
+    def _serializer(self) -> URLSafeTimedSerializer:
+        from flask import current_app
+        return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=TOKEN_SALT)
+
+    def create_token(self, user_id: int, mode: str = 'sample') -> str:
+        if mode not in MODES:
+            raise ValueError(f"Modo de profiler inválido: {mode}")
+        return self._serializer().dumps({'user_id': user_id, 'mode': mode})
+
+    def _read_token(self) -> Optional[Dict[str, Any]]:
+        token = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_PARAM)
+        if not token:
+            return None
+        from flask import current_app
+        try:
+            return self._serializer().loads(token, max_age=current_app.config.get('PROFILER_TOKEN_MAX_AGE', 3600))
+        except BadSignature:
+            logger.warning(f"Token de profiler inválido ou expirado em {request.path}")
+            return None
+
+    # Ciclo da requisição
+
+    def _start_request(self):
+        token = self._read_token()
+        if token is None:
+            return
+        # O token aparece em URLs e logs: só vale para o admin que o gerou
+        from flask_login import current_user
+        if not (current_user.is_authenticated and current_user.is_admin
+                and current_user.id == token.get('user_id')):
+            logger.warning(f"Token de profiler recusado em {request.path}: usuário não é o admin que o gerou")
+            return
+        mode = token.get('mode', 'sample')
+        g._profile = {'token': token, 'mode': mode, 'started': time.perf_counter(), 'wall': datetime.now()}
+        if mode == 'cprofile':
+            profile = cProfile.Profile()
+            g._profile['profile'] = profile
+            profile.enable()
+        else:
+            sampler = StackSampler(threading.get_ident(), self.sample_interval)
+            g._profile['sampler'] = sampler
+            sampler.start()
+
+    def _finish_request(self, response):
+        if '_profile' in g:
+            g._profile['status'] = response.status_code
+        return response
+
+    def _teardown_request(self, exception=None):
+        state = g.pop('_profile', None)
+        if state is None:
+            return
+        if 'profile' in state:
+            state['profile'].disable()
+        if 'sampler' in state:
+            state['sampler'].stop()
+        state['duration_ms'] = round((time.perf_counter() - state['started']) * 1000, 2)
+        try:
+            self._save(state, exception)
+        except Exception as e:
+            logger.error(f"Erro ao salvar perfil de {request.path}: {str(e)}")
+
+    # Armazenamento
+
+    def _save(self, state: Dict[str, Any], exception=None):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        endpoint = request.endpoint or 'sem_rota'
+        profile_id = f"{state['wall'].strftime('%Y%m%d_%H%M%S')}_{re.sub(r'[^A-Za-z0-9_.-]', '_', endpoint)}_{uuid.uuid4().hex[:6]}"
+
+        if state['mode'] == 'cprofile':
+            stats = pstats.Stats(state['profile'], stream=io.StringIO())
+            stats.dump_stats(str(self.directory / f'{profile_id}.prof'))
+            top = _top_from_pstats(stats, self.top_functions)
+            collapsed = pstats_collapsed(stats)
+            unit = 'us'
+        else:
+            collapsed = state['sampler'].stacks
+            # O intervalo real depende do GIL: usa a duração medida da requisição
+            ms_per_sample = state['duration_ms'] / max(sum(collapsed.values()), 1)
+            top = top_from_samples(collapsed, ms_per_sample, self.top_functions)
+            unit = 'samples'
+
+        with open(self.directory / f'{profile_id}.collapsed', 'w', encoding='utf-8') as f:
+            for stack, value in collapsed.most_common():
+                f.write(f'{stack} {value}\n')
+
+        metadata = {
+            'id': profile_id,
+            'mode': state['mode'],
+            'unit': unit,
+            'endpoint': endpoint,
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'status': state.get('status', 500 if exception else None),
+            'duration_ms': state['duration_ms'],
+            'created_at': state['wall'].isoformat(timespec='seconds'),
+            'user_id': state['token'].get('user_id'),
+            'samples': sum(collapsed.values()) if unit == 'samples' else None,
+            'top': top
+        }
+        # Remove o token da URL registrada
+        metadata['path'] = re.sub(rf'([?&]){PROFILE_PARAM}=[^&]*&?', r'\1', metadata['path']).rstrip('?&')
+        with open(self.directory / f'{profile_id}.json', 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+        logger.info(f"Perfil {profile_id} salvo ({state['mode']}, {state['duration_ms']} ms)")
+        self._prune()
+
+    def _prune(self):
+        """Mantém apenas os PROFILER_MAX_PROFILES perfis mais recentes"""
+        profiles = sorted(self.directory.glob('*.json'), key=lambda path: path.stat().st_mtime, reverse=True)
+        for old in profiles[self.max_profiles:]:
+            for suffix in ('.json', '.collapsed', '.prof'):
+                old.with_suffix(suffix).unlink(missing_ok=True)
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        profiles = []
+        if not self.directory.exists():
+            return profiles
+        for path in self.directory.glob('*.json'):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                continue
+            metadata['has_prof'] = path.with_suffix('.prof').exists()
+            profiles.append(metadata)
+        return sorted(profiles, key=lambda item: item['created_at'], reverse=True)
+
+    def profile_path(self, profile_id: str, kind: str) -> Optional[Path]:
+        """Arquivo de um perfil (kind: json, collapsed ou prof), validando o id"""
+        if kind not in ('json', 'collapsed', 'prof') or not re.fullmatch(r'[A-Za-z0-9_.-]+', profile_id):
+            return None
+        path = self.directory / f'{profile_id}.{kind}'
+        return path if path.exists() else None
+
+    def delete(self, profile_id: str) -> bool:
+        found = False
+        for kind in ('json', 'collapsed', 'prof'):
+            path = self.profile_path(profile_id, kind)
+            if path:
+                path.unlink()
+                found = True
+        return found
+
+
+request_profiler = RequestProfiler()
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Gravação em Lote dos Logs de Segurança - SKPONTO
+Fila em memória limitada, esvaziada por uma thread que grava os eventos em
+lotes com conexão própria, sem commit na sessão da requisição
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from flask import has_app_context
+from sqlalchemy import insert
+
+from app import db
+from app.models import SecurityLog
+
+logger = logging.getLogger(__name__)
+
+# Ações gravadas na hora (não podem ser perdidas em uma queda do worker)
+DEFAULT_SYNC_ACTIONS = (
+    'PASSWORD_CHANGED_BY_ADMIN', 'PASSWORD_RESET_SUCCESS', 'USER_DELETED',
+    'USER_DEACTIVATED', 'local_CONFIG_UPDATED', 'local_TOKEN_GENERATED'
+)
+
+
+class SecurityAuditWriter:
+    """Escritor assíncrono de SecurityLog.
+
+    - record() só monta a linha e a coloca na fila (SECURITY_LOG_QUEUE_SIZE);
+      com a fila cheia o evento é descartado e contado em `dropped`
+    - A thread grava a cada SECURITY_LOG_FLUSH_MS ou SECURITY_LOG_BATCH_SIZE
+      eventos, um INSERT em lote por transação da conexão própria
+    - Ações em SECURITY_LOG_SYNC_ACTIONS (ou sync=True) são gravadas na hora,
+      também fora da sessão da requisição
+    - Na saída do processo (atexit / worker_exit do gunicorn) a fila é gravada
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.async_enabled = True
+        self.queue_size = 10000
+        self.batch_size = 200
+        self.flush_interval = 0.5
+        self.sync_actions = set(DEFAULT_SYNC_ACTIONS)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._reset()
+        if app:
+            self.init_app(app)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.write_errors = 0
+        self.sync_writes = 0
+        self.last_flush_at: Optional[float] = None
+
+    def init_app(self, app):
+        self.app = app
+        self.async_enabled = app.config.get('SECURITY_LOG_ASYNC', True)
+        self.queue_size = app.config.get('SECURITY_LOG_QUEUE_SIZE', 10000)
+        self.batch_size = app.config.get('SECURITY_LOG_BATCH_SIZE', 200)
+        self.flush_interval = app.config.get('SECURITY_LOG_FLUSH_MS', 500) / 1000
+        self.sync_actions = set(app.config.get('SECURITY_LOG_SYNC_ACTIONS') or DEFAULT_SYNC_ACTIONS)
+        self._reset()
+        app.extensions['security_audit'] = self
+        atexit.register(self.stop)
+
+        from app.request_metrics import request_metrics
+        request_metrics.register_gauges(self.metrics)
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            # Processo filho (fork): a fila e a thread pertencem ao pai, que grava o que herdou
+            self._thread = None
+            self._stop = threading.Event()
+            self._lock = threading.Lock()
+            self._write_lock = threading.Lock()
+            self._reset()
+
+    # Registro
+
+    def record(self, action: str, details: Optional[str] = None, user_id: Optional[int] = None,
+               success: bool = True, ip_address: Optional[str] = None,
+               user_agent: Optional[str] = None, sync: Optional[bool] = None) -> bool:
+        """Enfileira (ou grava, se síncrono) um evento. Retorna False se foi descartado"""
+        row = {
+            'user_id': user_id,
+            'acao': action,
+            'detalhes': details,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'sucesso': success,
+            'created_at': datetime.utcnow()
+        }
+        if sync is None:
+            sync = action in self.sync_actions
+        if sync or not self.async_enabled or self.app is None:
+            if self.app is None:
+                return False
+            self.sync_writes += 1
+            return self._write([row])
+
+        self._check_fork()
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"Fila de logs de segurança cheia: evento {action} descartado")
+            return False
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='security-audit', daemon=True)
+            self._thread.start()
+
+    # Gravação
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._take_batch(timeout=self.flush_interval)
+            if batch:
+                self._write(batch)
+
+    def _take_batch(self, timeout: float) -> List[Dict[str, Any]]:
+        """Espera o primeiro evento e junta os que chegarem até a janela ou o tamanho do lote"""
+        try:
+            batch = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, rows: List[Dict[str, Any]]) -> bool:
+        # Dentro de uma requisição usa o contexto atual (sem disparar os teardowns de outro)
+        context = nullcontext() if has_app_context() else self.app.app_context()
+        with self._write_lock:
+            try:
+                with context, db.engine.begin() as connection:
+                    connection.execute(insert(SecurityLog.__table__), rows)
+                self.written += len(rows)
+                self.batches += 1
+                self.last_flush_at = time.time()
+                return True
+            except Exception as e:
+                # Log de segurança não deve quebrar a aplicação
+                self.write_errors += 1
+                self.dropped += len(rows)
+                logger.error(f"Erro ao gravar {len(rows)} logs de segurança: {e}")
+                return False
+
+    def flush(self) -> int:
+        """Grava imediatamente tudo o que está na fila (retorna quantos eventos)"""
+        if self._pid != os.getpid():
+            return 0
+        total = 0
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return total
+            self._write(batch)
+            total += len(batch)
+
+    def stop(self):
+        """Para a thread e grava o que restou na fila"""
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and self._pid == os.getpid():
+            thread.join(timeout=self.flush_interval * 2 + 1)
+        if self.app is not None:
+            self.flush()
+
+    # Métricas
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'pid': self._pid,
+            'async': self.async_enabled,
+            'queue_depth': self._queue.qsize(),
+            'queue_size': self.queue_size,
+            'written': self.written,
+            'dropped': self.dropped,
+            'batches': self.batches,
+            'write_errors': self.write_errors,
+            'sync_writes': self.sync_writes,
+            'last_flush_at': datetime.fromtimestamp(self.last_flush_at).isoformat(timespec='seconds')
+            if self.last_flush_at else None
+        }
+
+    def metrics(self) -> List[tuple]:
+        """(nome, tipo, descrição, valor) para o /metrics"""
+        return [
+            ('skponto_security_log_queue_depth', 'gauge', 'Eventos de segurança aguardando gravação',
+             self._queue.qsize()),
+            ('skponto_security_log_dropped_total', 'counter', 'Eventos de segurança descartados',
+             self.dropped),
+            ('skponto_security_log_written_total', 'counter', 'Eventos de segurança gravados',
+             self.written),
+            ('skponto_security_log_batches_total', 'counter', 'Lotes de logs de segurança gravados',
+             self.batches),
+            ('skponto_security_log_write_errors_total', 'counter', 'Falhas ao gravar lotes de logs de segurança',
+             self.write_errors),
+        ]
+
+
+security_audit = SecurityAuditWriter()
@@ -27,10 +27,11 @@ $(document).ready(function() {
     updateClock();
     setInterval(updateClock, 1000);
 
-    // Check for new notifications every 30 seconds (only if user is authenticated)
+    // Notifications: real-time stream (SSE) with polling every 30 seconds as fallback
     if ($('#notification-count').length > 0) {
-        setInterval(checkNotifications, 30000);
-        checkNotifications(); // Check immediately
+        if (!startEventStream()) {
+            startNotificationPolling();
+        }
         
         // Also check for daily notifications every minute
         setInterval(checkDailyNotifications, 60000);
@@ -121,6 +122,58 @@ function checkNotifications() {
         });
 }
 
+let notificationPollTimer = null;
+
+/**
+ * Poll the unread counter (used when the event stream is unavailable)
+ */
+function startNotificationPolling() {
+    if (notificationPollTimer) {
+        return;
+    }
+    notificationPollTimer = setInterval(checkNotifications, 30000);
+    checkNotifications(); // Check immediately
+}
+
+/**
+ * Open the Server-Sent Events channel: unread count, new notifications and punch updates
+ */
+function startEventStream() {
+    if (!window.EventSource) {
+        return false;
+    }
+    
+    const source = new EventSource('/api/stream');
+    
+    source.addEventListener('unread', function(e) {
+        updateNotificationCount(JSON.parse(e.data).count);
+    });
+    
+    source.addEventListener('notification', function(e) {
+        const notification = JSON.parse(e.data);
+        showDesktopNotification(notification.titulo, notification.mensagem);
+    });
+    
+    source.addEventListener('ponto', function(e) {
+        // Pages with punch widgets listen to this event to refresh their state
+        document.dispatchEvent(new CustomEvent('skponto:ponto', {detail: JSON.parse(e.data)}));
+    });
+    
+    source.addEventListener('reset', function() {
+        // Events were lost (slow connection or old Last-Event-ID): reload the counter
+        checkNotifications();
+    });
+    
+    source.onerror = function() {
+        // CLOSED = server refused (limit reached, 503): fall back to polling
+        if (source.readyState === EventSource.CLOSED) {
+            startNotificationPolling();
+        }
+    };
+    
+    return true;
+}
+
 /**
  * Load recent notifications for dropdown
  */
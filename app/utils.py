@@ -6,7 +6,6 @@ from flask import current_app, request
 from werkzeug.utils import secure_filename
 import io
 from app import db
-from app.models import SecurityLog
 
 # Import opcional para processamento de imagens
 try:
@@ -171,19 +170,24 @@ def optimize_image(file, filepath, max_size=(800, 800), quality=85):
         file.seek(0)
         file.save(filepath)
 
-def log_security_event(action, details=None, user_id=None, success=True):
-    """Registra evento de segurança"""
+def log_security_event(action, details=None, user_id=None, success=True, sync=None):
+    """Registra evento de segurança.
+
+    O evento vai para a fila do security_audit e é gravado em lote, com conexão
+    própria: não faz commit (nem flush) da sessão de quem chamou. sync=True
+    (ou ação em SECURITY_LOG_SYNC_ACTIONS) grava antes de retornar.
+    """
     try:
-        log = SecurityLog(
+        from app.security_audit import security_audit
+        security_audit.record(
+            action,
+            details=details,
             user_id=user_id,
-            acao=action,
-            detalhes=details,
+            success=success,
             ip_address=request.remote_addr if request else None,
             user_agent=request.headers.get('User-Agent', '')[:500] if request else None,
-            sucesso=success
+            sync=sync
         )
-        db.session.add(log)
-        db.session.commit()
     except Exception as e:
         # Log de segurança não deve quebrar a aplicação
         current_app.logger.error(f"Erro ao registrar log de segurança: {e}")
@@ -275,12 +279,15 @@ def create_notification(user_id, titulo, mensagem, tipo='info', sender_id=None):
         return None
 
 def send_notification_to_admins(titulo, mensagem, tipo='info'):
-    """Envia notificação para todos os administradores"""
-    from app.models import User, UserType
+    """Envia notificação para todos os administradores (insert em lote, um commit)"""
+    from app.notification_service import notify_admins
     
-    admins = User.query.filter_by(user_type=UserType.ADMIN, is_active=True).all()
-    for admin in admins:
-        create_notification(admin.id, titulo, mensagem, tipo)
+    try:
+        return notify_admins(titulo, mensagem, tipo)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Erro ao notificar administradores: {e}")
+        return 0
 
 def create_admin_notification(titulo, mensagem, notification_type='info'):
     """Cria notificação para todos os administradores"""
@@ -387,12 +394,20 @@ def backup_to_github():
             with open(config_path, 'w', encoding='utf-8') as f:
                 json.dump(config_backup, f, indent=2, ensure_ascii=False)
             
-            # 4. Criar arquivo ZIP do backup
+            # 4. Criar arquivo do backup (ZIP ou tar.zst, conforme BACKUP_ARCHIVE_FORMAT)
+            from app.backup_archive import EXTENSIONS, FORMAT_ZIP, open_backup_writer
+            archive_format = current_app.config.get('BACKUP_ARCHIVE_FORMAT', FORMAT_ZIP)
             timestamp = get_current_datetime().strftime('%Y%m%d_%H%M%S')
-            zip_filename = f'skponto_backup_{timestamp}.zip'
+            zip_filename = f'skponto_backup_{timestamp}{EXTENSIONS.get(archive_format, ".zip")}'
             zip_path = os.path.join(temp_dir, zip_filename)
             
-            shutil.make_archive(zip_path.replace('.zip', ''), 'zip', backup_dir)
+            with open_backup_writer(zip_path, archive_format,
+                                    level=current_app.config.get('BACKUP_ZSTD_LEVEL', 3),
+                                    threads=current_app.config.get('BACKUP_ZSTD_THREADS', -1)) as writer:
+                for root, _, files in os.walk(backup_dir):
+                    for name in files:
+                        file_path = os.path.join(root, name)
+                        writer.add_file(file_path, os.path.relpath(file_path, backup_dir).replace(os.sep, '/'))
             
             # 5. Fazer upload para GitHub (se configurado)
             github_success = False
@@ -92,9 +92,10 @@ class Config:
     ATTESTATIONS_PATH = os.path.join(STORAGE_BASE_PATH, 'attestations')
     BACKUPS_PATH = os.path.join(STORAGE_BASE_PATH, 'backups')
     LOGS_PATH = os.path.join(STORAGE_BASE_PATH, 'logs')
+    REPORTS_PATH = os.path.join(STORAGE_BASE_PATH, 'reports')
     
     # Criar diretórios de armazenamento
-    for storage_path in [ATTESTATIONS_PATH, BACKUPS_PATH, LOGS_PATH]:
+    for storage_path in [ATTESTATIONS_PATH, BACKUPS_PATH, LOGS_PATH, REPORTS_PATH]:
         os.makedirs(storage_path, exist_ok=True)
     
     # Timezone
@@ -104,14 +105,101 @@ class Config:
     BACKUP_RETENTION_DAYS = int(os.environ.get('BACKUP_RETENTION_DAYS', 30))
     BACKUP_SCHEDULE = os.environ.get('BACKUP_SCHEDULE', 'daily')
     LOCAL_BACKUP_ENABLED = True
+    # Dump lógico do banco (obrigatório no PostgreSQL; linhas por lote do cursor)
+    BACKUP_LOGICAL_DUMP = os.environ.get('BACKUP_LOGICAL_DUMP', 'True').lower() == 'true'
+    BACKUP_DUMP_CHUNK_SIZE = int(os.environ.get('BACKUP_DUMP_CHUNK_SIZE', 1000))
+    # Formato do arquivo: 'zip' (deflate) ou 'tar.zst' (zstandard multi-thread com índice)
+    BACKUP_ARCHIVE_FORMAT = os.environ.get('BACKUP_ARCHIVE_FORMAT', 'zip')
+    BACKUP_ZSTD_LEVEL = int(os.environ.get('BACKUP_ZSTD_LEVEL', 3))
+    BACKUP_ZSTD_THREADS = int(os.environ.get('BACKUP_ZSTD_THREADS', -1))
+    # Backups do painel rodam em subprocesso com prioridade baixa (nice/ionice, classe 0 desativa)
+    # e leitura limitada a BACKUP_READ_LIMIT_MB por segundo (0 = sem limite)
+    BACKUP_NICE = int(os.environ.get('BACKUP_NICE', 10))
+    BACKUP_IONICE_CLASS = int(os.environ.get('BACKUP_IONICE_CLASS', 2))
+    BACKUP_IONICE_LEVEL = int(os.environ.get('BACKUP_IONICE_LEVEL', 7))
+    BACKUP_READ_LIMIT_MB = float(os.environ.get('BACKUP_READ_LIMIT_MB', 20))
     
     # Configurações de backup automático
     AUTO_BACKUP_ENABLED = os.environ.get('AUTO_BACKUP_ENABLED', 'True').lower() == 'true'
     BACKUP_FREQUENCY_HOURS = int(os.environ.get('BACKUP_FREQUENCY_HOURS', 24))
     BACKUP_RETENTION_DAYS = int(os.environ.get('BACKUP_RETENTION_DAYS', 30))
+    # Backups automáticos incrementais (só arquivos novos/alterados), com completo periódico
+    BACKUP_INCREMENTAL_ENABLED = os.environ.get('BACKUP_INCREMENTAL_ENABLED', 'True').lower() == 'true'
+    BACKUP_FULL_INTERVAL_DAYS = int(os.environ.get('BACKUP_FULL_INTERVAL_DAYS', 7))
+    # Agendador: só o processo líder executa backups; heartbeat em system_status
+    BACKUP_SCHEDULER_HEARTBEAT_SECONDS = int(os.environ.get('BACKUP_SCHEDULER_HEARTBEAT_SECONDS', 60))
+    BACKUP_SCHEDULER_CHECK_SECONDS = int(os.environ.get('BACKUP_SCHEDULER_CHECK_SECONDS', 3600))
+    
+    # Relatórios em segundo plano
+    # REPORT_WORKER_THREADS=0 desativa as threads no processo web (usar `flask report-worker`)
+    REPORT_WORKER_THREADS = int(os.environ.get('REPORT_WORKER_THREADS', 1))
+    REPORT_POLL_SECONDS = int(os.environ.get('REPORT_POLL_SECONDS', 5))
+    REPORT_RETENTION_HOURS = int(os.environ.get('REPORT_RETENTION_HOURS', 24))
+    REPORT_STALE_MINUTES = int(os.environ.get('REPORT_STALE_MINUTES', 30))
     
     # Logging
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    # Log de SQL desligado por padrão: fração de requisições sorteadas e/ou
+    # requisições mais lentas que SQL_LOG_SLOW_MS (0 = desativado)
+    SQL_LOG_SAMPLE_RATE = float(os.environ.get('SQL_LOG_SAMPLE_RATE', 0.0))
+    SQL_LOG_SLOW_MS = int(os.environ.get('SQL_LOG_SLOW_MS', 0))
+    
+    # Contador de queries por requisição (/admin/debug/queries)
+    # QUERY_BUDGET=0 sem orçamento global; rotas podem usar @query_budget(n)
+    QUERY_PROFILER_ENABLED = os.environ.get('QUERY_PROFILER_ENABLED', 'True').lower() == 'true'
+    QUERY_REPEAT_THRESHOLD = int(os.environ.get('QUERY_REPEAT_THRESHOLD', 5))
+    QUERY_STATS_WINDOW = int(os.environ.get('QUERY_STATS_WINDOW', 200))
+    QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET', 0))
+    QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', 'False').lower() == 'true'
+    
+    # Métricas de requisições: snapshots por worker em diretório compartilhado
+    # (memória em /dev/shm quando disponível); METRICS_TOKEN libera /metrics ao Prometheus
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+    METRICS_DIR = os.environ.get('METRICS_DIR') or (
+        '/dev/shm/skponto_metrics' if os.path.isdir('/dev/shm') else 'storage/metrics'
+    )
+    METRICS_FLUSH_SECONDS = int(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    
+    # Profiler de requisições sob demanda (/admin/debug/profiles)
+    PROFILER_DIR = os.environ.get('PROFILER_DIR', 'storage/logs/profiles')
+    PROFILER_TOKEN_MAX_AGE = int(os.environ.get('PROFILER_TOKEN_MAX_AGE', 3600))
+    PROFILER_MAX_PROFILES = int(os.environ.get('PROFILER_MAX_PROFILES', 50))
+    PROFILER_SAMPLE_INTERVAL_MS = int(os.environ.get('PROFILER_SAMPLE_INTERVAL_MS', 5))
+    
+    # Profiler contínuo: estado inicial (o painel grava o estado em um arquivo
+    # lido por todos os workers); custo limitado a PROFILER_CONTINUOUS_MAX_OVERHEAD
+    PROFILER_CONTINUOUS = os.environ.get('PROFILER_CONTINUOUS', 'False').lower() == 'true'
+    PROFILER_CONTINUOUS_DIR = os.environ.get('PROFILER_CONTINUOUS_DIR', 'storage/logs/profiles/continuous')
+    PROFILER_CONTINUOUS_HZ = float(os.environ.get('PROFILER_CONTINUOUS_HZ', 10))
+    PROFILER_CONTINUOUS_MAX_OVERHEAD = float(os.environ.get('PROFILER_CONTINUOUS_MAX_OVERHEAD', 0.02))
+    PROFILER_CONTINUOUS_MAX_STACKS = int(os.environ.get('PROFILER_CONTINUOUS_MAX_STACKS', 5000))
+    PROFILER_CONTINUOUS_FLUSH_SECONDS = int(os.environ.get('PROFILER_CONTINUOUS_FLUSH_SECONDS', 3600))
+    PROFILER_CONTINUOUS_KEEP_DAYS = int(os.environ.get('PROFILER_CONTINUOUS_KEEP_DAYS', 7))
+    
+    # Canal de eventos em tempo real (/api/stream, Server-Sent Events): log de
+    # eventos em diretório compartilhado pelos workers; SSE_MAX_STREAMS=0 usa
+    # metade de GUNICORN_THREADS (conexões longas não podem ocupar todas as threads)
+    SSE_ENABLED = os.environ.get('SSE_ENABLED', 'True').lower() == 'true'
+    SSE_DIR = os.environ.get('SSE_DIR') or (
+        '/dev/shm/skponto_events' if os.path.isdir('/dev/shm') else 'storage/events'
+    )
+    SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', 0))
+    SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+    SSE_MAX_SECONDS = int(os.environ.get('SSE_MAX_SECONDS', 300))
+    SSE_POLL_INTERVAL = float(os.environ.get('SSE_POLL_INTERVAL', 0.5))
+    SSE_LOG_MAX_BYTES = int(os.environ.get('SSE_LOG_MAX_BYTES', 5 * 1024 * 1024))
+    
+    # Logs de segurança: fila em memória gravada em lotes por uma thread com
+    # conexão própria; as ações de SECURITY_LOG_SYNC_ACTIONS são gravadas na hora
+    SECURITY_LOG_ASYNC = os.environ.get('SECURITY_LOG_ASYNC', 'True').lower() == 'true'
+    SECURITY_LOG_QUEUE_SIZE = int(os.environ.get('SECURITY_LOG_QUEUE_SIZE', 10000))
+    SECURITY_LOG_BATCH_SIZE = int(os.environ.get('SECURITY_LOG_BATCH_SIZE', 200))
+    SECURITY_LOG_FLUSH_MS = int(os.environ.get('SECURITY_LOG_FLUSH_MS', 500))
+    SECURITY_LOG_SYNC_ACTIONS = [
+        action.strip() for action in os.environ.get('SECURITY_LOG_SYNC_ACTIONS', '').split(',') if action.strip()
+    ]
     
     # GitHub Integration (opcional)
     GITHUB_TOKEN = os.environ.get('GITHUB_TOKEN')
@@ -126,11 +214,16 @@ class ProductionConfig(Config):
     SESSION_COOKIE_SECURE = True
     
     # Production database optimizations
+    # Uma conexão por thread do worker (gthread) mais as threads em segundo plano
+    # (relatórios, gravação dos logs de segurança, agendador de backup); a folga
+    # cobre os logs de segurança síncronos gravados durante uma requisição.
+    # Streams SSE não seguram conexão
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
         'pool_recycle': 300,
         'pool_timeout': 20,
-        'max_overflow': 0
+        'pool_size': int(os.environ.get('GUNICORN_THREADS', 8)) + Config.REPORT_WORKER_THREADS + 2,
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 4))
     }
 
 class DevelopmentConfig(Config):
@@ -147,6 +240,13 @@ class TestingConfig(Config):
     SERVER_NAME = 'localhost.localdomain'
     SECRET_KEY = 'test-secret-key'
     UPLOAD_FOLDER = 'test_uploads'
+    REPORT_WORKER_THREADS = 0
+    # Sem thread do agendador de backup disputando a conexão do SQLite em memória
+    AUTO_BACKUP_ENABLED = False
+    # Logs de segurança gravados na hora (sem thread em segundo plano)
+    SECURITY_LOG_ASYNC = False
+    # Estourar o orçamento de queries falha o teste
+    QUERY_BUDGET_STRICT = True
     
     # Configurações de segurança para testes
     SESSION_COOKIE_SECURE = False
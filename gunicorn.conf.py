@@ -3,8 +3,13 @@ import os
 
 # Configurações básicas
 bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
-workers = 1  # Free plan limitation
-worker_class = "sync"
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))  # 1 no plano gratuito
+# gthread: conexões longas de /api/stream (SSE) ocupam uma thread cada, sem
+# bloquear o worker; o app limita os streams a metade das threads (SSE_MAX_STREAMS)
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+os.environ.setdefault('GUNICORN_WORKER_CLASS', worker_class)
+os.environ.setdefault('GUNICORN_THREADS', str(threads))
 timeout = 120
 keepalive = 2
 max_requests = 1000
@@ -12,6 +17,11 @@ max_requests_jitter = 100
 preload_app = True
 worker_connections = 1000
 
+# Com preload_app o create_app roda no master e threads não sobrevivem ao fork:
+# o agendador de backup é iniciado em cada worker (post_fork) e só o líder
+# eleito (advisory lock/flock) executa backups
+os.environ.setdefault('SKPONTO_SCHEDULER_POST_FORK', '1')
+
 # Logging
 accesslog = "-"
 errorlog = "-"
@@ -33,3 +43,27 @@ secure_scheme_headers = {
 # Performance
 max_worker_connections = 1000
 worker_rlimit_nofile = 1000
+
+
+def post_fork(server, worker):
+    """Reinicia no worker o que não sobrevive ao fork do master"""
+    try:
+        from app import db
+        from scripts.backup_scheduler import backup_scheduler, start_in_worker
+
+        if backup_scheduler.app is not None:
+            # Conexões herdadas do master não podem ser compartilhadas
+            with backup_scheduler.app.app_context():
+                db.engine.dispose(close=False)
+        start_in_worker()
+    except Exception as e:
+        server.log.warning(f"Agendador de backup não iniciado no worker {worker.pid}: {e}")
+
+
+def worker_exit(server, worker):
+    """Grava os logs de segurança ainda na fila antes do worker encerrar"""
+    try:
+        from app.security_audit import security_audit
+        security_audit.stop()
+    except Exception as e:
+        server.log.warning(f"Logs de segurança pendentes não gravados no worker {worker.pid}: {e}")
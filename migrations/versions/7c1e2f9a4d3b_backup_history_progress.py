@@ -0,0 +1,36 @@
+"""Backup history progress columns
+
+Revision ID: 7c1e2f9a4d3b
+Revises: 455b35124bab
+Create Date: 2026-10-16 21:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1e2f9a4d3b'
+down_revision = '455b35124bab'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('backup_history', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('files_total', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('files_done', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('bytes_total', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('bytes_done', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('progress_updated_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('worker_pid', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('backup_history', schema=None) as batch_op:
+        batch_op.drop_column('worker_pid')
+        batch_op.drop_column('progress_updated_at')
+        batch_op.drop_column('bytes_done')
+        batch_op.drop_column('bytes_total')
+        batch_op.drop_column('files_done')
+        batch_op.drop_column('files_total')
@@ -0,0 +1,50 @@
+"""Background report jobs
+
+Revision ID: a4d8e2b6f9c3
+Revises: f1b9c3e7a2d4
+Create Date: 2026-10-17 01:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d8e2b6f9c3'
+down_revision = 'f1b9c3e7a2d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'report_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('report_type', sa.String(length=50), nullable=False),
+        sa.Column('formato', sa.String(length=20), nullable=False),
+        sa.Column('params', sa.Text(), nullable=False),
+        sa.Column('params_hash', sa.String(length=64), nullable=False),
+        sa.Column('status', sa.Enum('PENDENTE', 'PROCESSANDO', 'CONCLUIDO', 'FALHOU', name='reportjobstatus'), nullable=False),
+        sa.Column('file_name', sa.String(length=255), nullable=True),
+        sa.Column('file_path', sa.String(length=500), nullable=True),
+        sa.Column('file_size', sa.BigInteger(), nullable=True),
+        sa.Column('row_count', sa.Integer(), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('requested_by', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('completed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['requested_by'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('report_jobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_report_jobs_params_hash'), ['params_hash'], unique=False)
+        batch_op.create_index(batch_op.f('ix_report_jobs_status'), ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('report_jobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_report_jobs_status'))
+        batch_op.drop_index(batch_op.f('ix_report_jobs_params_hash'))
+    op.drop_table('report_jobs')
+    sa.Enum(name='reportjobstatus').drop(op.get_bind(), checkfirst=True)
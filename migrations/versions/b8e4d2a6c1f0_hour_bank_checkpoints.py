@@ -0,0 +1,49 @@
+"""Hour bank checkpoints
+
+Revision ID: b8e4d2a6c1f0
+Revises: 7c1e2f9a4d3b
+Create Date: 2026-10-16 23:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e4d2a6c1f0'
+down_revision = '7c1e2f9a4d3b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'hour_bank_checkpoints',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('as_of', sa.DateTime(), nullable=False),
+        sa.Column('balance', sa.Float(), nullable=False),
+        sa.Column('transactions_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'as_of', name='uq_hour_bank_checkpoint_user_as_of')
+    )
+    with op.batch_alter_table('hour_bank_checkpoints', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_hour_bank_checkpoints_user_id'), ['user_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_hour_bank_checkpoints_as_of'), ['as_of'], unique=False)
+
+    # Consulta da cauda do checkpoint: transações do usuário por data de criação
+    with op.batch_alter_table('hour_bank_transactions', schema=None) as batch_op:
+        batch_op.create_index('ix_hour_bank_transactions_user_created', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('hour_bank_transactions', schema=None) as batch_op:
+        batch_op.drop_index('ix_hour_bank_transactions_user_created')
+
+    with op.batch_alter_table('hour_bank_checkpoints', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_hour_bank_checkpoints_as_of'))
+        batch_op.drop_index(batch_op.f('ix_hour_bank_checkpoints_user_id'))
+
+    op.drop_table('hour_bank_checkpoints')
@@ -0,0 +1,76 @@
+"""Broadcast notifications and read receipts
+
+Revision ID: d3f7a1c9e5b2
+Revises: b8e4d2a6c1f0
+Create Date: 2026-10-16 23:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3f7a1c9e5b2'
+down_revision = 'b8e4d2a6c1f0'
+branch_labels = None
+depends_on = None
+
+
+def _existing_enum(*values, name):
+    # Tipos já criados pela migração inicial: no PostgreSQL não devem ser recriados
+    return sa.Enum(*values, name=name).with_variant(
+        postgresql.ENUM(*values, name=name, create_type=False), 'postgresql'
+    )
+
+
+def upgrade():
+    op.create_table(
+        'broadcast_notifications',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sender_id', sa.Integer(), nullable=True),
+        sa.Column('titulo', sa.String(length=200), nullable=False),
+        sa.Column('mensagem', sa.Text(), nullable=False),
+        sa.Column('tipo', _existing_enum('INFO', 'WARNING', 'ERROR', 'SUCCESS', name='notificationtype'), nullable=False),
+        sa.Column('audience', sa.String(length=20), nullable=False),
+        sa.Column('audience_user_type', _existing_enum('ADMIN', 'TRABALHADOR', 'ESTAGIARIO', name='usertype'), nullable=True),
+        sa.Column('audience_work_class_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['sender_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['audience_work_class_id'], ['work_classes.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('broadcast_notifications', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_broadcast_notifications_created_at'), ['created_at'], unique=False)
+
+    op.create_table(
+        'broadcast_receipts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('broadcast_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('read_at', sa.DateTime(), nullable=True),
+        sa.Column('dismissed', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['broadcast_id'], ['broadcast_notifications.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('broadcast_id', 'user_id', name='uq_broadcast_receipt_user')
+    )
+    with op.batch_alter_table('broadcast_receipts', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_broadcast_receipts_user_id'), ['user_id'], unique=False)
+
+    # Feed por cursor: notificações do usuário em ordem (created_at, id)
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.create_index('ix_notifications_user_created', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_index('ix_notifications_user_created')
+
+    with op.batch_alter_table('broadcast_receipts', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_broadcast_receipts_user_id'))
+    op.drop_table('broadcast_receipts')
+
+    with op.batch_alter_table('broadcast_notifications', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_broadcast_notifications_created_at'))
+    op.drop_table('broadcast_notifications')
@@ -0,0 +1,39 @@
+"""Unread notification counters
+
+Revision ID: e6a2c8f4b1d7
+Revises: d3f7a1c9e5b2
+Create Date: 2026-10-17 00:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a2c8f4b1d7'
+down_revision = 'd3f7a1c9e5b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Sem linha = contador calculado na primeira leitura; não é preciso popular aqui
+    op.create_table(
+        'notification_counters',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('unread', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.create_index('ix_notifications_user_lida_created', ['user_id', 'lida', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_index('ix_notifications_user_lida_created')
+
+    op.drop_table('notification_counters')
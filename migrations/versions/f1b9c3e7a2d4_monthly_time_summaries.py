@@ -0,0 +1,44 @@
+"""Monthly per-user time record summaries
+
+Revision ID: f1b9c3e7a2d4
+Revises: e6a2c8f4b1d7
+Create Date: 2026-10-17 01:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b9c3e7a2d4'
+down_revision = 'e6a2c8f4b1d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Resumos ausentes são calculados na primeira leitura; para popular de uma
+    # vez use "flask rebuild-monthly-summaries"
+    op.create_table(
+        'monthly_time_summaries',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Integer(), nullable=False),
+        sa.Column('total_hours', sa.Float(), nullable=False),
+        sa.Column('total_overtime', sa.Float(), nullable=False),
+        sa.Column('complete_days', sa.Integer(), nullable=False),
+        sa.Column('attestation_days', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'year', 'month', name='uq_monthly_summary_user_month')
+    )
+    with op.batch_alter_table('monthly_time_summaries', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_monthly_time_summaries_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('monthly_time_summaries', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_monthly_time_summaries_user_id'))
+    op.drop_table('monthly_time_summaries')
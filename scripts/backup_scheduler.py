@@ -6,45 +6,182 @@ Sistema de agendamento e execução de backups automáticos
 
 import os
 import time
+import socket
 import logging
-from threading import Thread, Event
+from pathlib import Path
+from threading import Thread, Event, Lock
 from datetime import datetime, timedelta
 from typing import Optional
 
 from flask import current_app
-from app import create_app
-from app.models import BackupHistory, BackupType, BackupStatus
+from sqlalchemy import text
+from app import db
+from app.models import BackupHistory, BackupType, BackupStatus, SystemStatus
+from app.constants import SYSTEM_STATUS_ACTIVE, SYSTEM_STATUS_ERROR
 from app.local_backup import LocalBackupManager
+from app.backup_archive import ReadThrottle
 from app.utils import log_security_event
 
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, apenas o advisory lock do PostgreSQL
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
+AUTOMATIC_BACKUP_TYPES = (BackupType.AUTOMATICO, BackupType.INCREMENTAL)
+SCHEDULER_COMPONENT = 'backup_scheduler'
+# Chave do pg_try_advisory_lock (única no banco: identifica o líder do agendador)
+ADVISORY_LOCK_KEY = 0x534B5042  # 'SKPB'
+# Com esta variável (definida no gunicorn.conf.py) o create_app do master não
+# inicia a thread: cada worker a inicia no post_fork
+DEFER_START_ENV = 'SKPONTO_SCHEDULER_POST_FORK'
+
+
+class SchedulerLeaderLock:
+    """Trava de liderança do agendador entre processos.
+
+    No PostgreSQL usa um advisory lock de sessão, mantido numa conexão
+    dedicada; nos demais bancos, flock em um arquivo de storage/backups. Nos
+    dois casos a trava é liberada pelo sistema se o processo morrer.
+    """
+
+    def __init__(self, engine, lock_path: Path):
+        self.engine = engine
+        self.lock_path = lock_path
+        self._connection = None
+        self._file = None
+
+    @property
+    def held(self) -> bool:
+        return self._connection is not None or self._file is not None
+
+    def acquire(self) -> bool:
+        """Tenta obter a liderança sem bloquear"""
+        if self.held:
+            return True
+        if self.engine.dialect.name == 'postgresql':
+            return self._acquire_advisory()
+        return self._acquire_file()
+
+    def _acquire_advisory(self) -> bool:
+        connection = self.engine.connect()
+        try:
+            acquired = connection.execute(
+                text('SELECT pg_try_advisory_lock(:key)'), {'key': ADVISORY_LOCK_KEY}
+            ).scalar()
+            # A trava é de sessão: encerra a transação para não ficar "idle in transaction"
+            connection.commit()
+        except Exception:
+            connection.close()
+            raise
+        if not acquired:
+            connection.close()
+            return False
+        self._connection = connection
+        return True
+
+    def _acquire_file(self) -> bool:
+        if fcntl is None:
+            # Sem flock não há como coordenar processos: processo único assume
+            self._file = open(self.lock_path, 'a')
+            return True
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.lock_path, 'a+')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(f"{socket.gethostname()}:{os.getpid()}\n")
+        lock_file.flush()
+        self._file = lock_file
+        return True
+
+    def check(self) -> bool:
+        """Confirma que a trava continua válida (a conexão do advisory lock pode cair)"""
+        if self._connection is None:
+            return self.held
+        try:
+            self._connection.execute(text('SELECT 1'))
+            self._connection.commit()
+            return True
+        except Exception as e:
+            logger.warning(f"Conexão da trava do agendador perdida: {e}")
+            self._connection.invalidate()
+            self.release()
+            return False
+
+    def release(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()  # encerrar a sessão libera o advisory lock
+            except Exception:
+                pass
+            self._connection = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def forget(self):
+        """Descarta a trava herdada num processo filho sem liberá-la no pai"""
+        if self._connection is not None:
+            self._connection.invalidate()
+        self._connection = None
+        self._file = None
+
 class BackupScheduler:
-    """Agendador de backups automáticos"""
+    """Agendador de backups automáticos.
+
+    Pode rodar em todos os workers do gunicorn: apenas o processo que obtém a
+    trava de liderança executa backups; os demais ficam em espera e assumem se
+    o líder sair. O líder grava heartbeats em SystemStatus.
+    """
     
     def __init__(self):
         self.app = None
         self.backup_thread = None
         self.stop_event = Event()
         self.is_running = False
+        self.is_leader = False
+        self.leader_lock = None
+        self._pid = None
+        self._start_lock = Lock()
         
     def init_app(self, app):
         """Inicializa o agendador com a aplicação Flask"""
         self.app = app
+        self.leader_lock = None
         
     def start(self):
-        """Inicia o agendador de backup automático"""
-        if self.is_running:
-            logger.warning("Agendador de backup já está executando")
-            return
+        """Inicia o agendador de backup automático neste processo"""
+        with self._start_lock:
+            if self._pid != os.getpid():
+                # Processo filho (fork): a thread do pai não existe aqui
+                self._reset_after_fork()
             
-        logger.info("Iniciando agendador de backup automático")
-        self.stop_event.clear()
-        self.is_running = True
-        
-        # Iniciar thread de backup
-        self.backup_thread = Thread(target=self._backup_loop, daemon=True)
-        self.backup_thread.start()
+            if self.is_running and self.backup_thread and self.backup_thread.is_alive():
+                logger.warning("Agendador de backup já está executando")
+                return
+            
+            logger.info("Iniciando agendador de backup automático")
+            self.stop_event.clear()
+            self.is_running = True
+            self._pid = os.getpid()
+            
+            # Iniciar thread de backup
+            self.backup_thread = Thread(target=self._backup_loop, name='backup-scheduler', daemon=True)
+            self.backup_thread.start()
+    
+    def _reset_after_fork(self):
+        if self.leader_lock:
+            self.leader_lock.forget()
+        self.backup_thread = None
+        self.is_running = False
+        self.is_leader = False
+        self.stop_event = Event()
         
     def stop(self):
         """Para o agendador de backup automático"""
@@ -57,21 +194,85 @@ class BackupScheduler:
         
         if self.backup_thread and self.backup_thread.is_alive():
             self.backup_thread.join(timeout=5)
+        
+        self._release_leadership()
+    
+    def _get_leader_lock(self) -> SchedulerLeaderLock:
+        if self.leader_lock is None:
+            lock_path = Path(self.app.root_path).parent / 'storage' / 'backups' / '.scheduler.lock'
+            self.leader_lock = SchedulerLeaderLock(db.engine, lock_path)
+        return self.leader_lock
+    
+    def _try_become_leader(self) -> bool:
+        """Obtém (ou confirma) a liderança; False deixa este processo em espera"""
+        leader_lock = self._get_leader_lock()
+        was_leader = self.is_leader
+        self.is_leader = leader_lock.check() if leader_lock.held else leader_lock.acquire()
+        
+        if self.is_leader and not was_leader:
+            logger.info(f"Agendador de backup: processo {os.getpid()} assumiu a liderança")
+        elif was_leader and not self.is_leader:
+            logger.warning(f"Agendador de backup: processo {os.getpid()} perdeu a liderança")
+        return self.is_leader
+    
+    def _release_leadership(self):
+        if self.leader_lock:
+            self.leader_lock.release()
+        self.is_leader = False
             
     def _backup_loop(self):
         """Loop principal do agendador"""
+        heartbeat_seconds = self.app.config.get('BACKUP_SCHEDULER_HEARTBEAT_SECONDS', 60)
+        check_seconds = self.app.config.get('BACKUP_SCHEDULER_CHECK_SECONDS', 3600)
+        last_check = None
+        
         while not self.stop_event.is_set():
             try:
                 with self.app.app_context():
-                    self._check_and_run_backup()
+                    if self._try_become_leader():
+                        self._record_heartbeat()
+                        
+                        # Verificar a necessidade de backup a cada hora
+                        if last_check is None or time.monotonic() - last_check >= check_seconds:
+                            last_check = time.monotonic()
+                            self._check_and_run_backup()
+                    else:
+                        last_check = None
                     
-                # Verificar a cada hora
-                self.stop_event.wait(3600)  # 1 hora
+                self.stop_event.wait(heartbeat_seconds)
                 
             except Exception as e:
                 logger.error(f"Erro no loop de backup: {e}")
                 self.stop_event.wait(300)  # 5 minutos em caso de erro
-                
+        
+        self._release_leadership()
+    
+    def _record_heartbeat(self, error: Optional[str] = None, success: bool = False):
+        """Grava em SystemStatus que este processo é o líder e está vivo"""
+        try:
+            status = SystemStatus.query.filter_by(component=SCHEDULER_COMPONENT).first()
+            if not status:
+                status = SystemStatus(component=SCHEDULER_COMPONENT, status=SYSTEM_STATUS_ACTIVE)
+                db.session.add(status)
+            
+            now = datetime.utcnow()
+            status.last_check = now
+            if error:
+                status.status = SYSTEM_STATUS_ERROR
+                status.message = error
+                status.error_count = (status.error_count or 0) + 1
+            elif success or status.status == SYSTEM_STATUS_ACTIVE:
+                # Um erro de backup permanece visível até o próximo backup bem-sucedido
+                if success:
+                    status.last_success = now
+                    status.error_count = 0
+                status.status = SYSTEM_STATUS_ACTIVE
+                status.message = f"Líder: {socket.gethostname()}:{os.getpid()}"
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erro ao gravar heartbeat do agendador: {e}")
+            
     def _check_and_run_backup(self):
         """Verifica se é necessário executar backup e executa se necessário"""
         try:
@@ -81,9 +282,9 @@ class BackupScheduler:
                 
             frequency_hours = current_app.config.get('BACKUP_FREQUENCY_HOURS', 24)
             
-            # Verificar último backup automático
-            last_backup = BackupHistory.query.filter_by(
-                backup_type=BackupType.AUTOMATICO
+            # Verificar último backup automático (completo ou incremental)
+            last_backup = BackupHistory.query.filter(
+                BackupHistory.backup_type.in_(AUTOMATIC_BACKUP_TYPES)
             ).order_by(BackupHistory.started_at.desc()).first()
             
             now = datetime.now()
@@ -111,11 +312,17 @@ class BackupScheduler:
         try:
             backup_manager = LocalBackupManager()
             
-            # Criar backup automático
+            # Criar backup automático (incremental vira completo quando não há base válida)
+            incremental = current_app.config.get('BACKUP_INCREMENTAL_ENABLED', True)
+            # Mesmo limite de leitura dos backups do painel (não satura o disco do worker)
+            throttle = ReadThrottle(int(current_app.config.get('BACKUP_READ_LIMIT_MB', 0) * 1024 * 1024))
             success, message = backup_manager.create_backup(
-                backup_type=BackupType.AUTOMATICO
+                backup_type=BackupType.INCREMENTAL if incremental else BackupType.AUTOMATICO,
+                throttle=throttle
             )
             
+            self._record_heartbeat(error=None if success else message, success=success)
+            
             if success:
                 logger.info(f"Backup automático executado com sucesso: {message}")
                 
@@ -186,8 +393,8 @@ class BackupScheduler:
                     last_backup = None
                     next_backup = None
                     
-                    last_backup_obj = BackupHistory.query.filter_by(
-                        backup_type=BackupType.AUTOMATICO
+                    last_backup_obj = BackupHistory.query.filter(
+                        BackupHistory.backup_type.in_(AUTOMATIC_BACKUP_TYPES)
                     ).order_by(BackupHistory.started_at.desc()).first()
                     
                     if last_backup_obj:
@@ -197,8 +404,13 @@ class BackupScheduler:
                         # Se não há backup anterior, próximo será em breve
                         next_backup = datetime.now() + timedelta(minutes=5)
                     
+                    heartbeat = SystemStatus.query.filter_by(component=SCHEDULER_COMPONENT).first()
+                    
                     return {
                         'is_running': self.is_running,
+                        'is_leader': self.is_leader,
+                        'leader': heartbeat.message if heartbeat else None,
+                        'last_heartbeat': heartbeat.last_check if heartbeat else None,
                         'auto_backup_enabled': auto_backup_enabled,
                         'frequency_hours': frequency_hours,
                         'last_backup': last_backup,
@@ -232,8 +444,18 @@ def init_scheduler(app):
     backup_scheduler.init_app(app)
     
     # Iniciar automaticamente se configurado
-    if app.config.get('AUTO_BACKUP_ENABLED', False):
+    if not app.config.get('AUTO_BACKUP_ENABLED', False):
+        logger.info("Backup automático desabilitado")
+    elif os.environ.get(DEFER_START_ENV):
+        # gunicorn com preload_app: a thread não sobreviveria ao fork
+        logger.info("Agendador de backup será iniciado nos workers (post_fork)")
+    else:
         backup_scheduler.start()
         logger.info("Agendador de backup automático iniciado")
-    else:
-        logger.info("Backup automático desabilitado")
+
+
+def start_in_worker():
+    """Inicia o agendador no worker recém-criado (hook post_fork do gunicorn)"""
+    if backup_scheduler.app is None or not backup_scheduler.app.config.get('AUTO_BACKUP_ENABLED', False):
+        return
+    backup_scheduler.start()
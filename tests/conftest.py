@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Fixtures comuns dos testes - SKPONTO
+Aplicação com TestingConfig (SQLite em memória) e fábrica de usuários
+"""
+
+import itertools
+
+import pytest
+
+from app import create_app, db as _db
+from app.models import User, UserType
+
+_sequence = itertools.count(1)
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        _db.create_all()
+        yield app
+        _db.session.remove()
+        _db.drop_all()
+
+
+@pytest.fixture
+def db(app):
+    return _db
+
+
+@pytest.fixture
+def make_user(db):
+    """Cria e grava um usuário ativo e aprovado"""
+    def factory(user_type=UserType.TRABALHADOR, **fields):
+        number = next(_sequence)
+        user = User(
+            email=fields.pop('email', f'usuario{number}@teste.local'),
+            cpf=fields.pop('cpf', f'{number:011d}'),
+            nome=fields.pop('nome', f'Usuario{number}'),
+            sobrenome=fields.pop('sobrenome', 'Teste'),
+            user_type=user_type,
+            is_active=True,
+            is_approved=True,
+            **fields
+        )
+        user.set_password('senha-teste-123')
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return factory
+
+
+@pytest.fixture
+def login(app):
+    """Test client já autenticado como o usuário informado"""
+    def factory(user):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user.id)
+            session['_fresh'] = True
+        return client
+    return factory
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Testes do dump lógico - restauração com FKs ligadas (SQLite PRAGMA foreign_keys)
+"""
+
+import io
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, event, select
+
+from app import db
+from app.database_dump import LogicalDumper, LogicalRestorer
+from app.local_backup import RESTORE_EXCLUDED_TABLES
+from app.models import BackupStatus, BackupType, UserType
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'restore.db'}")
+
+    @event.listens_for(engine, 'connect')
+    def enforce_foreign_keys(dbapi_connection, connection_record):
+        dbapi_connection.execute('PRAGMA foreign_keys=ON')
+
+    db.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+class MemoryArchive:
+    """Membros do dump guardados em memória"""
+
+    def __init__(self):
+        self.members = {}
+
+    @contextmanager
+    def writer(self, name):
+        buffer = io.BytesIO()
+        yield buffer
+        self.members[name] = buffer.getvalue()
+
+    @contextmanager
+    def reader(self, name):
+        yield io.BytesIO(self.members[name])
+
+
+def insert_user(connection, number):
+    users = db.metadata.tables['users']
+    return connection.execute(users.insert().values(
+        email=f'usuario{number}@teste.local', cpf=f'{number:011d}', nome=f'Usuario{number}',
+        sobrenome='Teste', password_hash='x', user_type=UserType.TRABALHADOR,
+        is_active=True, is_approved=True, created_at=datetime.now()
+    )).inserted_primary_key[0]
+
+
+def insert_backup(connection, filename, created_by):
+    history = db.metadata.tables['backup_history']
+    return connection.execute(history.insert().values(
+        filename=filename, backup_type=BackupType.MANUAL, status=BackupStatus.CONCLUIDO,
+        started_at=datetime.now(), created_by=created_by
+    )).inserted_primary_key[0]
+
+
+def test_restore_keeps_backup_history_references(engine):
+    users = db.metadata.tables['users']
+    work_classes = db.metadata.tables['work_classes']
+    history = db.metadata.tables['backup_history']
+
+    with engine.begin() as connection:
+        admin_id = insert_user(connection, 1)
+        # Ciclo users <-> work_classes também precisa sobreviver com as FKs ligadas
+        class_id = connection.execute(work_classes.insert().values(
+            name='Padrão', daily_work_hours=8.0, lunch_hours=1.0, is_active=True,
+            created_at=datetime.now(), created_by=admin_id
+        )).inserted_primary_key[0]
+        connection.execute(users.update().where(users.c.id == admin_id).values(work_class_id=class_id))
+        kept_backup = insert_backup(connection, 'antes.zip', admin_id)
+
+    archive = MemoryArchive()
+    LogicalDumper(engine).dump(archive.writer)
+
+    with engine.begin() as connection:
+        # Usuário criado depois do dump: não volta na restauração
+        late_id = insert_user(connection, 2)
+        orphan_backup = insert_backup(connection, 'depois.zip', late_id)
+
+    restored = LogicalRestorer(engine).restore(archive.reader, exclude=RESTORE_EXCLUDED_TABLES)
+
+    assert 'backup_history' not in restored
+    with engine.connect() as connection:
+        assert connection.execute(select(users.c.id, users.c.work_class_id)).all() == [(admin_id, class_id)]
+        created_by = dict(connection.execute(select(history.c.id, history.c.created_by)).all())
+    assert created_by == {kept_backup: admin_id, orphan_backup: None}
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Testes do lote diário do banco de horas (OvertimeBatchProcessor)
+"""
+
+from datetime import date, datetime, time
+
+import pytest
+
+from app.models import HourBank, HourBankTransactionType, TimeRecord, WorkClass
+from app.overtime_batch import OvertimeBatchProcessor
+from app.overtime_controller import OvertimeController
+
+TARGET_DATE = date(2026, 10, 15)
+
+
+@pytest.fixture
+def work_class(db):
+    work_class = WorkClass(name='Comercial', daily_work_hours=8.0, lunch_hours=1.0,
+                           is_active=True, is_approved=True, created_at=datetime.now())
+    db.session.add(work_class)
+    db.session.commit()
+    return work_class
+
+
+@pytest.fixture
+def make_record(db):
+    def factory(user, entrada, saida):
+        record = TimeRecord(user_id=user.id, data=TARGET_DATE, entrada=entrada, saida=saida)
+        db.session.add(record)
+        db.session.commit()
+        return record
+    return factory
+
+
+def balance(db, user):
+    return db.session.query(HourBank.current_balance).filter_by(user_id=user.id).scalar()
+
+
+def test_lunch_break_is_not_credited_as_overtime(app, db, make_user, make_record, work_class):
+    regular = make_user(work_class_id=work_class.id)
+    longer = make_user(work_class_id=work_class.id)
+    make_record(regular, time(8, 0), time(17, 0))
+    make_record(longer, time(8, 0), time(18, 0))
+
+    report = OvertimeBatchProcessor().run(TARGET_DATE)
+
+    assert report['processed'] == 2
+    assert report['credits'] == 1
+    assert report['debits'] == 0
+    assert balance(db, regular) == 0.0
+    # Uma hora além das 8h + 1h de almoço, com o multiplicador padrão de 1.5x
+    assert balance(db, longer) == 1.5
+
+    daily = OvertimeController().calculate_daily_hours(regular.id, TARGET_DATE)
+    assert (daily['worked_hours'], daily['overtime_hours'], daily['deficit_hours']) == (8.0, 0.0, 0.0)
+
+
+def test_debit_uses_balance_reread_for_the_chunk(app, db, make_user, make_record, work_class, monkeypatch):
+    user = make_user(work_class_id=work_class.id)
+    make_record(user, time(8, 0), time(16, 0))
+    HourBank.apply_delta(user.id, 2.0, HourBankTransactionType.CREDITO, 'Saldo inicial')
+    db.session.commit()
+
+    load = OvertimeBatchProcessor._load
+
+    def load_then_spend(self, target_date):
+        loaded = load(self, target_date)
+        # Outra operação consome o saldo depois da carga do lote
+        HourBank.apply_delta(user.id, -2.0, HourBankTransactionType.DEBITO, 'Compensação',
+                             allow_negative=False)
+        db.session.commit()
+        return loaded
+
+    monkeypatch.setattr(OvertimeBatchProcessor, '_load', load_then_spend)
+    report = OvertimeBatchProcessor().run(TARGET_DATE)
+
+    assert report['debits'] == 0
+    assert report['insufficient_balance'] == 1
+    assert balance(db, user) == 0.0
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""Fila de relatórios: pedidos coalescidos aparecem para quem se juntou ao job"""
+
+from app.models import ReportJob, UserType
+from app.report_jobs import FOLLOWED_JOBS_KEY
+
+
+def _request_hour_bank_pdf(client):
+    return client.post('/admin/hour-bank/reports', data={
+        'user_id': '', 'transaction_type': '', 'format_type': 'pdf'
+    })
+
+
+def test_coalesced_hour_bank_report_is_followed(make_user, login):
+    first_admin = make_user(UserType.ADMIN)
+    second_admin = make_user(UserType.ADMIN)
+
+    _request_hour_bank_pdf(login(first_admin))
+    job = ReportJob.query.one()
+    assert job.requested_by == first_admin.id
+
+    client = login(second_admin)
+    _request_hour_bank_pdf(client)
+    assert ReportJob.query.count() == 1
+
+    with client.session_transaction() as session:
+        assert session[FOLLOWED_JOBS_KEY] == [job.id]
+
+    page = client.get('/admin/relatorios')
+    assert f'data-job-id="{job.id}"'.encode() in page.data